@@ -1,5 +1,19 @@
+"""
+Entrada serverless (Vercel): o runtime Python chama o app WSGI `app` direto.
+
+O handler antigo chamava app(environ, start_response) descartando o status e
+os cabeçalhos e devolvia o corpo sem consumir; a Vercel já sabe servir um
+app WSGI exportado como `app`. Importar o app aqui liga o modo serverless
+(ver SERVERLESS em app.py): a instância guarda o pool entre as invocações.
+"""
+
+import os
+import sys
+
+os.environ.setdefault('SERVERLESS', '1')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from app import app
 
-# Vercel serverless function handler
-def handler(request):
-    return app(request.environ, lambda *args: None)
+# A Vercel procura o app WSGI pelo nome `app` neste módulo
+__all__ = ['app']
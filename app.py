@@ -1,57 +1,321 @@
-from flask import Flask, render_template, request, jsonify, session, send_from_directory
+import os
+import threading
+
+import psycopg2
+
+import instrumentacao
+from pool_conexoes import ConexaoAntecipada
+
+# Modo serverless (Vercel, que define VERCEL=1, ou SERVERLESS=1; ver
+# api/index.py): cada instância atende uma requisição por vez e congela entre
+# as invocações, e a partida fria é o que o cliente espera ao ler o QR code na
+# porta. Nele: sem .env (as variáveis vêm do painel), log escrito na hora,
+# sem ouvinte de avisos (uma conexão a mais por instância) e a primeira
+# conexão do pool aberta em segundo plano enquanto o resto do app carrega. O
+# pool fica no módulo: as invocações seguintes da instância reaproveitam a
+# conexão. O schema não é tocado na partida (flask --app app init-db).
+SERVERLESS = os.getenv('SERVERLESS', '1' if os.getenv('VERCEL') else '0') == '1'
+
+if not SERVERLESS:
+    from dotenv import load_dotenv
+    load_dotenv()
+
+# Configuração do banco de dados
+DATABASE_URL = os.getenv('POSTGRES_URL', os.getenv('DATABASE_URL', ''))
+
+# Instrumentação por requisição (instrumentacao.py): consultas, conexões e
+# tempo no banco no cabeçalho Server-Timing; requisições a partir de
+# REQUISICAO_LENTA_MS vão para o log com as instruções executadas (0 desliga o log)
+INSTRUMENTACAO = os.getenv('INSTRUMENTACAO', '1') == '1'
+REQUISICAO_LENTA_MS = float(os.getenv('REQUISICAO_LENTA_MS', '500'))
+ARGUMENTOS_CONEXAO = {'connection_factory': instrumentacao.ConexaoMedida} if INSTRUMENTACAO else {}
+
+def com_sslmode(url):
+    """Adiciona sslmode=require na URL se não estiver presente"""
+    if '?' not in url:
+        return url + '?sslmode=require'
+    if 'sslmode' not in url:
+        return url + '&sslmode=require'
+    return url
+
+# Abre já a primeira conexão: o handshake com o banco corre junto com a
+# importação do Flask e o registro das rotas, em vez de depois deles
+conexao_antecipada = None
+if SERVERLESS and DATABASE_URL:
+    conexao_antecipada = ConexaoAntecipada(com_sslmode(DATABASE_URL), **ARGUMENTOS_CONEXAO)
+    conexao_antecipada.start()
+
+from flask import Flask, render_template, request, jsonify, session, send_from_directory, g, Response
 from flask_cors import CORS
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from werkzeug.http import is_resource_modified
 from werkzeug.utils import secure_filename
-import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
 import psycopg2.extras
+import psycopg2.sql
 import secrets
-import os
 import base64
-from dotenv import load_dotenv
+import hashlib
+import time
+from pool_conexoes import PoolConexoes, PoolEsgotado
+from expiracao import executar_varredura, VarredorExpiracao
+from cache_local import CacheLocal
+from niveis import Limiares, NIVEIS
+from streaming_json import com_primeiro_lote, linhas_em_lotes, lista_json
+from ranking_memoria import Placar
+from invalidacao import OuvinteInvalidacao
+from serializacao import ProvedorJSON, comprimir_resposta, comprimir_pedacos
+import metricas
+import registro
 
-load_dotenv()
+registro.configurar(sincrono=SERVERLESS)
+log = registro.obter('app')
 
 app = Flask(__name__)
+app.json = ProvedorJSON(app)
 app.secret_key = os.getenv('SECRET_KEY', secrets.token_hex(16))
 CORS(app, supports_credentials=True)
 
-# Configuração do banco de dados
-DATABASE_URL = os.getenv('POSTGRES_URL', os.getenv('DATABASE_URL', ''))
 UPLOAD_FOLDER = 'static/uploads'
+SQL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql')
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'svg'}
 
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+# Pool de conexões (uma conexão por requisição, reaproveitada por todos os helpers)
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+DB_POOL_VERIFICAR_APOS = float(os.getenv('DB_POOL_VERIFICAR_APOS', '30'))
+
+# Varredura de pontos expirados (0 = sem thread; na Vercel quem dispara é o cron)
+EXPIRACAO_TAMANHO_LOTE = int(os.getenv('EXPIRACAO_TAMANHO_LOTE', '500'))
+EXPIRACAO_INTERVALO_SEGUNDOS = int(os.getenv('EXPIRACAO_INTERVALO_SEGUNDOS', '0'))
+CRON_SECRET = os.getenv('CRON_SECRET', '')
+
+# Segundos que a linha de configuracoes fica em cache (cobre os outros workers)
+CONFIG_CACHE_TTL = float(os.getenv('CONFIG_CACHE_TTL', '30'))
+
+# Paginação de /api/clientes (tamanho de página padrão e máximo)
+CLIENTES_POR_PAGINA = 50
+CLIENTES_POR_PAGINA_MAX = 200
+# Abaixo disso o total estimado é trocado pela contagem exata (barata e mais precisa)
+CONTAGEM_EXATA_ATE = 10000
+
+# Busca do balcão (/api/clientes/busca): chamada a cada tecla, então tem teto de
+# resultados e de tempo; passando do tempo devolve 503 e a próxima tecla tenta de novo
+BUSCA_LIMITE_PADRAO = 10
+BUSCA_LIMITE_MAX = 20
+BUSCA_TIMEOUT_MS = int(os.getenv('BUSCA_TIMEOUT_MS', '200'))
+
+# Itens aceitos por chamada de /api/pontuacao/lote
+PONTUACAO_LOTE_MAX = int(os.getenv('PONTUACAO_LOTE_MAX', '5000'))
+# Solicitações aceitas por chamada de /api/solicitacoes/validar-lote
+SOLICITACOES_LOTE_MAX = 1000
+
+# Listas sem limite (histórico completo, todas as solicitações, exportação de
+# clientes) saem em streaming: linhas lidas do cursor no servidor neste tamanho de lote
+STREAM_TAMANHO_LOTE = int(os.getenv('STREAM_TAMANHO_LOTE', '1000'))
+
+# Ranking em memória (ranking_memoria.py): carregado na primeira consulta e
+# recarregado em segundo plano quando fica mais velho que isto (cobre o que
+# não chega pelos avisos de invalidação, como o ouvinte desconectado)
+RANKING_RESSINCRONIZAR_SEGUNDOS = float(os.getenv('RANKING_RESSINCRONIZAR_SEGUNDOS', '300'))
+RANKING_LIMITE_MAX = 100
+RANKING_RAIO_MAX = 10
+
+# GET condicional (ETag/Last-Modified) de configurações, produtos, ranking e
+# estatísticas: as versões (sql/10_versoes_recursos.sql) ficam em cache por
+# VERSOES_CACHE_TTL segundos em cada worker (sem o ouvinte de avisos, atraso
+# máximo para perceber a escrita de outro worker) e um CDN na frente pode servir a resposta por
+# CACHE_CDN_SEGUNDOS sem perguntar ao app; o navegador sempre revalida
+VERSOES_CACHE_TTL = float(os.getenv('VERSOES_CACHE_TTL', '5'))
+# Saldos não têm versão no banco (os lançamentos não esperam por uma linha de
+# versão): /api/estatisticas conta no máximo uma vez a cada
+# ESTATISTICAS_CACHE_TTL segundos por worker e a ETag é o resumo do conteúdo
+ESTATISTICAS_CACHE_TTL = float(os.getenv('ESTATISTICAS_CACHE_TTL', '5'))
+CACHE_CDN_SEGUNDOS = int(os.getenv('CACHE_CDN_SEGUNDOS', '10'))
+CACHE_CONTROL_PUBLICO = (
+    f'public, max-age=0, s-maxage={CACHE_CDN_SEGUNDOS}, stale-while-revalidate={CACHE_CDN_SEGUNDOS * 6}'
+    if CACHE_CDN_SEGUNDOS > 0 else 'public, no-cache'
+)
+
+# Avisos de invalidação entre workers (LISTEN/NOTIFY, invalidacao.py e
+# sql/11_avisos_invalidacao.sql): com o ouvinte conectado, configurações e
+# versões só saem do cache por aviso (ou depois de INVALIDACAO_TTL_SEGURANCA)
+# e o ranking recebe os saldos dos outros workers; se ele cair, voltam a valer
+# CONFIG_CACHE_TTL e VERSOES_CACHE_TTL até reconectar. LISTEN não passa pelo
+# pooler em modo transação (porta 6543 do Supabase): INVALIDACAO_DATABASE_URL
+# aponta para a conexão direta ou o modo sessão (porta 5432). Desligado por
+# padrão no modo serverless: a instância congelada não ouviria os avisos
+INVALIDACAO_ESCUTAR = os.getenv('INVALIDACAO_ESCUTAR', '0' if SERVERLESS else '1') == '1'
+INVALIDACAO_DATABASE_URL = os.getenv('INVALIDACAO_DATABASE_URL', '')
+INVALIDACAO_TTL_SEGURANCA = float(os.getenv('INVALIDACAO_TTL_SEGURANCA', '300'))
+INVALIDACAO_RECONEXAO_SEGUNDOS = float(os.getenv('INVALIDACAO_RECONEXAO_SEGUNDOS', '5'))
+
+# Respostas (JSON, HTML, CSV...) a partir deste tamanho saem comprimidas com
+# brotli ou gzip, conforme o Accept-Encoding; listas em streaming sempre
+COMPRESSAO_MINIMO_BYTES = int(os.getenv('COMPRESSAO_MINIMO_BYTES', '1024'))
+
+# GET /metrics (metricas.py, formato do Prometheus): admin logado ou
+# Authorization: Bearer METRICAS_TOKEN (o do scraper)
+METRICAS_TOKEN = os.getenv('METRICAS_TOKEN', '')
+
+# Sondas do balanceador: /api/health/live não toca no banco; /api/health/ready
+# (e /api/health) repetem o resultado da última verificação do banco por
+# PRONTIDAO_CACHE_SEGUNDOS, e a verificação falha se o pool não entregar uma
+# conexão em PRONTIDAO_TIMEOUT segundos
+PRONTIDAO_CACHE_SEGUNDOS = float(os.getenv('PRONTIDAO_CACHE_SEGUNDOS', '5'))
+PRONTIDAO_TIMEOUT = float(os.getenv('PRONTIDAO_TIMEOUT', '2'))
+
+# Identifica este processo nas ETags do ranking (o placar é de cada worker)
+INSTANCIA = secrets.token_hex(4)
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Cria (uma única vez) e retorna o pool de conexões do processo"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if not DATABASE_URL:
+                    raise Exception("DATABASE_URL não configurada. Configure POSTGRES_URL ou DATABASE_URL nas variáveis de ambiente.")
+                
+                _pool = PoolConexoes(
+                    com_sslmode(DATABASE_URL),
+                    minimo=DB_POOL_MIN,
+                    maximo=DB_POOL_MAX,
+                    timeout=DB_POOL_TIMEOUT,
+                    verificar_apos=DB_POOL_VERIFICAR_APOS,
+                    **ARGUMENTOS_CONEXAO,
+                )
+                log.info('Pool de conexões criado', minimo=DB_POOL_MIN, maximo=DB_POOL_MAX)
+                if conexao_antecipada is not None:
+                    conn = conexao_antecipada.obter(DB_POOL_TIMEOUT)
+                    if conn is not None:
+                        _pool.adotar(conn)
+                    elif conexao_antecipada.erro is not None:
+                        log.warning('Conexão antecipada falhou; o pool abre outra',
+                                    erro=str(conexao_antecipada.erro))
+                if INVALIDACAO_ESCUTAR:
+                    iniciar_ouvinte()
+    return _pool
+
 def get_db():
-    """Conecta ao PostgreSQL usando a URL do Supabase"""
+    """Retorna a conexão da requisição atual, retirada do pool na primeira chamada"""
+    conn = g.get('db')
+    if conn is not None:
+        return conn
     try:
-        if not DATABASE_URL:
-            raise Exception("DATABASE_URL não configurada. Configure POSTGRES_URL ou DATABASE_URL nas variáveis de ambiente.")
-        
-        # Adicionar sslmode=require na URL se não estiver presente
-        url = DATABASE_URL
-        if '?' not in url:
-            url += '?sslmode=require'
-        elif 'sslmode' not in url:
-            url += '&sslmode=require'
-        
-        print(f"Tentando conectar ao banco... (URL configurada: {'Sim' if DATABASE_URL else 'Não'})")
-        conn = psycopg2.connect(url)
-        print("✅ Conexão com banco estabelecida com sucesso!")
+        inicio = time.perf_counter()
+        conn = g.db = get_pool().getconn()
+        instrumentacao.registrar_espera_pool(time.perf_counter() - inicio)
         return conn
     except Exception as e:
-        print(f"❌ ERRO DE CONEXÃO: {e}")
-        print(f"DATABASE_URL configurada: {'Sim' if DATABASE_URL else 'Não'}")
-        print(f"Tipo de erro: {type(e).__name__}")
+        log.error('Erro de conexão', erro=str(e), tipo=type(e).__name__,
+                  database_url_configurada=bool(DATABASE_URL))
         raise
 
+@app.before_request
+def iniciar_requisicao():
+    """Id da requisição (X-Request-ID do proxy ou novo) e rota nos logs; começa a medição"""
+    g.inicio_requisicao = time.perf_counter()
+    # Sem rota (404/405) tudo cai num rótulo só nas métricas
+    g.rota = request.url_rule.rule if request.url_rule else 'sem_rota'
+    # Montado no modo assíncrono, quem conta as em andamento é o InstrumentacaoASGI
+    g.contar_em_andamento = 'asgi.scope' not in request.environ
+    if g.contar_em_andamento:
+        metricas.EM_ANDAMENTO.incrementar()
+    g.id_requisicao = request.headers.get('X-Request-ID', '')[:64] or secrets.token_hex(8)
+    registro.iniciar_requisicao(g.id_requisicao, request.url_rule.rule if request.url_rule else request.path)
+    if INSTRUMENTACAO:
+        instrumentacao.iniciar()
+
+def _encerrar_requisicao(medicao, inicio, rota, contar_em_andamento, metodo, caminho, status):
+    if inicio is not None:
+        metricas.registrar_requisicao(rota, metodo, status, time.perf_counter() - inicio, medicao)
+        if contar_em_andamento:
+            metricas.EM_ANDAMENTO.decrementar()
+    if medicao is not None:
+        if REQUISICAO_LENTA_MS > 0 and medicao.duracao() * 1000 >= REQUISICAO_LENTA_MS:
+            log.warning('Requisição lenta', metodo=metodo, caminho=caminho, status=status, **medicao.resumo())
+        instrumentacao.encerrar()
+    registro.encerrar_requisicao()
+
+@app.after_request
+def medir(resposta):
+    """Server-Timing com o que a requisição fez no banco (o que um streaming
+    ainda vai ler entra só no log e nas métricas, quando a resposta termina de sair)"""
+    medicao = instrumentacao.atual()
+    if medicao is not None:
+        resposta.headers['Server-Timing'] = medicao.server_timing()
+    if 'id_requisicao' in g:
+        resposta.headers['X-Request-ID'] = g.id_requisicao
+    argumentos = (medicao, g.get('inicio_requisicao'), g.get('rota'), g.get('contar_em_andamento'),
+                  request.method, request.path, resposta.status_code)
+    resposta.call_on_close(lambda: _encerrar_requisicao(*argumentos))
+    return resposta
+
+@app.after_request
+def comprimir(resposta):
+    """Brotli ou gzip conforme o Accept-Encoding (serializacao.py)"""
+    return comprimir_resposta(resposta, request.accept_encodings, COMPRESSAO_MINIMO_BYTES)
+
+@app.teardown_appcontext
+def liberar_db(exc):
+    """Devolve a conexão da requisição ao pool (transações não confirmadas são desfeitas)"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        get_pool().putconn(conn)
+
 def dict_cursor(conn):
     """Retorna um cursor que retorna dicionários em vez de tuplas"""
     return conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
+def resposta_json_streaming(sql, params=(), objeto=None, chave=None):
+    """Resposta JSON escrita em lotes de um cursor nomeado no servidor.
+
+    Sem `objeto` o corpo é a lista; com `objeto` a lista vai no campo `chave`.
+    As linhas são lidas por uma conexão própria do pool, depois que a da
+    requisição já foi devolvida. O primeiro lote é lido antes da resposta:
+    pool esgotado vira 503 e erro na consulta vira 500, os dois em JSON.
+    """
+    try:
+        lotes = com_primeiro_lote(linhas_em_lotes(get_pool(), sql, params, STREAM_TAMANHO_LOTE))
+    except PoolEsgotado:
+        return jsonify({'error': 'Servidor ocupado, tente novamente'}), 503
+    except psycopg2.Error as e:
+        return jsonify({'error': str(e)}), 500
+    return Response(lista_json(lotes, app.json.dumps, objeto, chave), mimetype='application/json')
+
+def executar_atomico(sql, params=()):
+    """Executa uma chamada de função do banco em uma única ida e volta.
+
+    Sem transação aberta na requisição, a instrução roda em autocommit: ela
+    mesma é a transação, sem BEGIN/COMMIT extras pela rede.
+    """
+    conn = get_db()
+    cursor = dict_cursor(conn)
+    if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    conn.autocommit = True
+    try:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    finally:
+        conn.autocommit = False
+
+def aplicar_scripts_sql(cursor):
+    """Aplica, em ordem, os scripts idempotentes de sql/ (funções, índices e migrações)"""
+    for nome in sorted(os.listdir(SQL_DIR)):
+        if nome.endswith('.sql'):
+            with open(os.path.join(SQL_DIR, nome), encoding='utf-8') as f:
+                cursor.execute(f.read())
+
 def init_db():
     conn = get_db()
     cursor = dict_cursor(conn)  # PostgreSQL com dict
@@ -134,146 +398,354 @@ def init_db():
         )
     ''')
     
-    cursor.execute('SELECT COUNT(*) FROM configuracoes')
-    count = cursor.fetchone()[0]
+    cursor.execute('SELECT COUNT(*) AS total FROM configuracoes')
+    count = cursor.fetchone()['total']
     if count == 0:
         cursor.execute('''
             INSERT INTO configuracoes (nome_bar, senha_admin) 
             VALUES ('Semáforo I Hop So', 'admin123')
         ''')
     
+    aplicar_scripts_sql(cursor)
+    
     conn.commit()
-    conn.close()
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def get_configuracoes():
+def carregar_configuracoes(versao):
     conn = get_db()
     cursor = dict_cursor(conn)  # PostgreSQL com dict
     cursor.execute('SELECT * FROM configuracoes LIMIT 1')
     config = cursor.fetchone()
-    conn.close()
+    config = dict(config) if config else None
+    return config, Limiares.de_configuracoes(config, versao)
+
+# Invalidado por atualizar_configuracoes e upload_logo
+cache_configuracoes = CacheLocal(carregar_configuracoes, CONFIG_CACHE_TTL)
+
+def get_configuracoes():
+    config, _ = cache_configuracoes.obter()
     return dict(config) if config else None
 
-def calcular_pontos_validos(cliente_id):
+def get_limiares():
+    """Limiares dos níveis em cache (imutáveis, com número de versão)"""
+    _, limiares = cache_configuracoes.obter()
+    return limiares
+
+_versoes_vistas = {}
+
+def carregar_versoes(versao):
     conn = get_db()
-    cursor = dict_cursor(conn)  # PostgreSQL com dict
-    
-    cursor.execute('''
-        SELECT SUM(pontos) as total
-        FROM pontuacoes
-        WHERE cliente_id = %s
-        AND (data_validade IS NULL OR data_validade > NOW())
-    ''', (cliente_id,))
-    
-    resultado = cursor.fetchone()
-    conn.close()
+    cursor = dict_cursor(conn)
+    cursor.execute('SELECT recurso, versao, alterado_em FROM versoes_recursos')
+    versoes = {row['recurso']: (row['versao'], row['alterado_em']) for row in cursor.fetchall()}
+    # Configurações alteradas em outro worker: o cache delas vence junto,
+    # senão a versão nova sairia com o conteúdo antigo
+    if versoes.get('configuracoes') != _versoes_vistas.get('configuracoes'):
+        cache_configuracoes.invalidar()
+    _versoes_vistas.update(versoes)
+    return versoes
+
+# Invalidado depois do commit das escritas deste worker e pelos avisos
+cache_versoes = CacheLocal(carregar_versoes, VERSOES_CACHE_TTL)
+
+def incrementar_versoes(cursor, *recursos):
+    """Nova versão dos recursos, na transação da escrita: chamar logo antes do commit"""
+    cursor.execute('SELECT * FROM incrementar_versoes(%s::TEXT[])', (list(recursos),))
+
+def publicar_clientes(cursor, clientes):
+    """Avisa aos rankings dos workers os clientes cadastrados, renomeados ou apagados pela escrita"""
+    cursor.execute('SELECT publicar_clientes(%s::INTEGER[])', (list(clientes),))
+
+def etag_versoes(versoes, recursos, variante=''):
+    return '-'.join(f'{recurso}{versoes[recurso][0]}' for recurso in recursos) + variante
+
+def resposta_condicional(recursos, gerar, variante='', com_last_modified=True):
+    """Resposta de `gerar()` com ETag/Last-Modified pelas versões de `recursos`.
+
+    Se quem pede já tem essa versão (If-None-Match / If-Modified-Since),
+    devolve 304 sem chamar `gerar`, só com as versões em cache. A versão é
+    lida antes do conteúdo: uma escrita no meio do caminho no máximo faz a
+    próxima revalidação baixar tudo de novo. Sem `com_last_modified`, só a
+    ETag vale (quando `variante` muda sem nova versão dos recursos).
+    """
+    versoes = cache_versoes.obter()
+    etag = etag_versoes(versoes, recursos, variante)
+    alterado_em = max(versoes[recurso][1] for recurso in recursos) if com_last_modified else None
+    
+    if is_resource_modified(request.environ, etag=etag, last_modified=alterado_em):
+        resposta = app.make_response(gerar())
+        if resposta.status_code != 200:
+            return resposta
+    else:
+        resposta = Response(status=304)
     
-    return resultado['total'] if resultado and resultado['total'] else 0
+    resposta.set_etag(etag)
+    if alterado_em is not None:
+        resposta.last_modified = alterado_em
+    resposta.headers['Cache-Control'] = CACHE_CONTROL_PUBLICO
+    return resposta
+
+def calcular_pontos_validos(cliente_id):
+    """Saldo válido mantido incrementalmente em clientes (aplica expiração pendente, se houver)"""
+    resultado = executar_atomico('SELECT pontos_totais FROM saldo_cliente(%s)', (cliente_id,))
+    return resultado[0]['pontos_totais'] if resultado else 0
 
 def calcular_nivel(pontos):
-    config = get_configuracoes()
-    if config:
-        if pontos >= config['pontos_verde_min']:
-            return 'verde'
-        elif pontos >= config['pontos_amarelo_min']:
-            return 'amarelo'
-    else:
-        if pontos >= 500:
-            return 'verde'
-        elif pontos >= 200:
-            return 'amarelo'
-    return 'vermelho'
+    return get_limiares().nivel(pontos)
 
 def calcular_pontos_frequencia(cliente_id):
+    """Bônus e dias visitados nos últimos 30 dias, pelo mapa de visitas do cliente (uma linha por PK)"""
     conn = get_db()
     cursor = dict_cursor(conn)  # PostgreSQL com dict
-    
-    cursor.execute('''
-        SELECT COUNT(DISTINCT DATE(data_checkin)) as dias_visitados
-        FROM checkins
-        WHERE cliente_id = %s
-        AND data_checkin >= NOW() - INTERVAL '30 days'
-    ''', (cliente_id,))
-    
+    cursor.execute('SELECT * FROM frequencia_cliente(%s, dia_negocio())', (cliente_id,))
     resultado = cursor.fetchone()
-    dias_visitados = resultado['dias_visitados'] if resultado and resultado['dias_visitados'] else 0
-    
-    pontos_bonus = 0
-    if dias_visitados >= 20:
-        pontos_bonus = 100
-    elif dias_visitados >= 15:
-        pontos_bonus = 75
-    elif dias_visitados >= 10:
-        pontos_bonus = 50
-    elif dias_visitados >= 5:
-        pontos_bonus = 25
-    
-    conn.close()
-    return pontos_bonus, dias_visitados
+    return resultado['pontos_bonus'] or 0, resultado['dias_visitados'] or 0
+
+# Atualizado pelos avisos de invalidação (ou pelas próprias rotas, sem o ouvinte)
+placar = Placar()
+_placar_lock = threading.Lock()
+
+def ler_clientes_ranking():
+    """(id, nome, pontos) de todos os clientes, lidos em lotes por uma conexão própria do pool"""
+    sql = 'SELECT id, nome, pontos_totais FROM clientes'
+    for lote in linhas_em_lotes(get_pool(), sql, (), 10000, cursor_factory=None):
+        yield from lote
+
+def ressincronizar_ranking():
+    try:
+        placar.ressincronizar(ler_clientes_ranking)
+    except Exception:
+        log.exception('Erro ao ressincronizar o ranking')
+
+def ressincronizar_ranking_em_segundo_plano():
+    if not placar.ressincronizando:
+        threading.Thread(target=ressincronizar_ranking, name='ranking-ressincronizar', daemon=True).start()
+
+def apos_expiracao(resumo):
+    """A varredura muda saldos direto no banco: sem os avisos, o ranking é recarregado"""
+    if resumo.get('clientes_atualizados') and not avisos_ativos():
+        ressincronizar_ranking_em_segundo_plano()
+
+def get_placar():
+    """Ranking em memória, carregado na primeira chamada.
+
+    Depois de RANKING_RESSINCRONIZAR_SEGUNDOS a recarga roda em segundo plano
+    e as consultas seguem respondendo com os dados atuais.
+    """
+    if not placar.carregado:
+        with _placar_lock:
+            if not placar.carregado:
+                placar.ressincronizar(ler_clientes_ranking)
+    elif time.time() - placar.carregado_em > RANKING_RESSINCRONIZAR_SEGUNDOS:
+        ressincronizar_ranking_em_segundo_plano()
+    return placar
+
+def atualizar_ranking(cliente_id, pontos=None, nome=None):
+    """Ranking deste worker depois de uma escrita da rota.
+
+    Com o ouvinte conectado quem atualiza é o aviso da própria escrita, na
+    ordem dos commits: uma rota que termina atrasada não sobrescreve o saldo
+    mais novo que outro worker já avisou.
+    """
+    if not avisos_ativos():
+        placar.atualizar(cliente_id, pontos, nome)
+
+def remover_do_ranking(cliente_id):
+    if not avisos_ativos():
+        placar.remover(cliente_id)
+
+# Ouvinte de avisos deste processo (iniciado junto com o pool)
+ouvinte = None
+
+def avisos_ativos():
+    return ouvinte is not None and ouvinte.conectado
+
+def aplicar_aviso(aviso):
+    """Aviso de invalidação de qualquer worker (inclusive este), na ordem dos commits"""
+    for cliente_id, pontos, nome in aviso.get('clientes', ()):
+        placar.atualizar(cliente_id, pontos, nome)
+    for cliente_id in aviso.get('removidos', ()):
+        placar.remover(cliente_id)
+    versoes = aviso.get('versoes')
+    if versoes:
+        if 'configuracoes' in versoes:
+            cache_configuracoes.invalidar()
+        cache_versoes.invalidar()
+
+def ao_conectar_ouvinte():
+    # Avisos perdidos enquanto estava desconectado: descarta os caches e recarrega o ranking
+    cache_configuracoes.ttl = cache_versoes.ttl = INVALIDACAO_TTL_SEGURANCA
+    cache_configuracoes.invalidar()
+    cache_versoes.invalidar()
+    if placar.carregado:
+        ressincronizar_ranking_em_segundo_plano()
+    log.info('Ouvinte de invalidação conectado')
+
+def ao_desconectar_ouvinte():
+    # Sem avisos, o TTL curto volta a cobrir as escritas dos outros workers
+    cache_configuracoes.ttl = CONFIG_CACHE_TTL
+    cache_versoes.ttl = VERSOES_CACHE_TTL
+    cache_configuracoes.invalidar()
+    cache_versoes.invalidar()
+    log.warning('Ouvinte de invalidação desconectado; caches voltam ao TTL curto')
+
+def iniciar_ouvinte():
+    global ouvinte
+    ouvinte = OuvinteInvalidacao(
+        com_sslmode(INVALIDACAO_DATABASE_URL or DATABASE_URL),
+        aplicar_aviso,
+        ao_conectar=ao_conectar_ouvinte,
+        ao_desconectar=ao_desconectar_ouvinte,
+        espera_reconexao=INVALIDACAO_RECONEXAO_SEGUNDOS,
+    )
+    ouvinte.start()
+
+def variante_ranking(placar_atual):
+    # O placar é de cada worker e recebe os saldos pelos avisos, que podem
+    # chegar depois da versão de clientes: a ETag segue a versão do próprio
+    # placar (muda a cada alteração), com o id do processo
+    return f'-placar{INSTANCIA}.{placar_atual.versao}'
+
+def com_niveis(itens):
+    """Acrescenta o nível (pelos limiares em cache) às entradas do ranking"""
+    niveis = get_limiares().niveis([item['pontos_totais'] for item in itens])
+    for item, nivel in zip(itens, niveis):
+        item['nivel'] = nivel
+    return itens
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def verificar_prontidao(versao):
+    """SELECT 1 por uma conexão do pool; o resultado (sucesso ou falha) fica em cache_prontidao"""
+    inicio = time.perf_counter()
+    try:
+        pool = get_pool()
+        conn = pool.getconn(timeout=PRONTIDAO_TIMEOUT)
+        try:
+            # Sem transação aberta, a devolução ao pool não precisa de ROLLBACK
+            conn.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+        finally:
+            pool.putconn(conn)
+        estado = {'pronto': True}
+    except Exception as e:
+        log.warning('Banco indisponível para a sonda de prontidão', erro=str(e), tipo=type(e).__name__)
+        estado = {'pronto': False, 'erro': str(e), 'tipo_erro': type(e).__name__}
+    estado['verificado_em'] = datetime.now(timezone.utc)
+    estado['latencia_ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+    return estado
+
+cache_prontidao = CacheLocal(verificar_prontidao, PRONTIDAO_CACHE_SEGUNDOS)
+
+def resposta_sonda(corpo, status=200):
+    resposta = jsonify(corpo)
+    resposta.status_code = status
+    resposta.headers['Cache-Control'] = 'no-store'
+    return resposta
+
+@app.route('/api/health/live', methods=['GET'])
+def sonda_vivo():
+    """Liveness: o processo está de pé e atende (não consulta o banco)"""
+    return resposta_sonda({'status': 'ok'})
+
+@app.route('/api/health/ready', methods=['GET'])
+def sonda_pronto():
+    """Readiness: o banco respondeu na última verificação (no máximo uma a cada PRONTIDAO_CACHE_SEGUNDOS)"""
+    estado = cache_prontidao.obter()
+    return resposta_sonda({
+        'status': 'ok' if estado['pronto'] else 'error',
+        'database': 'connected' if estado['pronto'] else 'disconnected',
+        'ouvinte_invalidacao': avisos_ativos(),
+        **estado,
+    }, 200 if estado['pronto'] else 503)
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Endpoint de diagnóstico para verificar status da aplicação"""
-    try:
-        # Testar conexão com banco
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute('SELECT 1')
-        cursor.fetchone()
-        conn.close()
-        
-        return jsonify({
+    """Endpoint de diagnóstico para verificar status da aplicação (mesma verificação em cache de /api/health/ready)"""
+    estado = cache_prontidao.obter()
+    if estado['pronto']:
+        return resposta_sonda({
             'status': 'ok',
             'database': 'connected',
             'database_url_configured': bool(DATABASE_URL),
             'message': 'Aplicação funcionando corretamente'
         })
-    except Exception as e:
-        return jsonify({
-            'status': 'error',
-            'database': 'disconnected',
-            'database_url_configured': bool(DATABASE_URL),
-            'error': str(e),
-            'error_type': type(e).__name__
-        }), 500
+    return resposta_sonda({
+        'status': 'error',
+        'database': 'disconnected',
+        'database_url_configured': bool(DATABASE_URL),
+        'error': estado['erro'],
+        'error_type': estado['tipo_erro']
+    }, 500)
+
+def linhas_estimadas(cursor, tabelas=None):
+    """Linhas por tabela do schema public pelas estatísticas do planejador (pg_class.reltuples,
+    atualizado pelo ANALYZE; antes do primeiro, n_live_tup do pg_stat_user_tables), sem ler as tabelas"""
+    cursor.execute("""
+        SELECT c.relname AS tabela,
+               CASE WHEN c.reltuples >= 0 THEN c.reltuples::BIGINT ELSE COALESCE(s.n_live_tup, 0) END AS linhas,
+               s.n_dead_tup AS linhas_mortas,
+               GREATEST(s.last_analyze, s.last_autoanalyze) AS ultima_analise,
+               pg_total_relation_size(c.oid) AS bytes
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+        WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+          AND (%s::TEXT[] IS NULL OR c.relname = ANY(%s::TEXT[]))
+        ORDER BY c.relname
+    """, (tabelas, tabelas))
+    return {linha['tabela']: linha for linha in cursor.fetchall()}
+
+def exigir_admin_para_exato():
+    """Contagem exata (?exato=1) varre as tabelas: só para o admin logado"""
+    if request.args.get('exato') != '1':
+        return False, None
+    if not session.get('admin'):
+        return True, (jsonify({'error': 'Contagem exata só para o admin'}), 401)
+    return True, None
 
 @app.route('/api/debug/tables', methods=['GET'])
 def debug_tables():
-    """Endpoint para verificar status das tabelas"""
+    """Endpoint para verificar status das tabelas.
+
+    Por padrão as contagens são estimadas (linhas_estimadas, uma consulta ao
+    catálogo); ?exato=1 faz um COUNT(*) por tabela.
+    """
+    exato, negado = exigir_admin_para_exato()
+    if negado:
+        return negado
     try:
         conn = get_db()
         cursor = dict_cursor(conn)
-        
-        # Verificar quais tabelas existem
-        cursor.execute("""
-            SELECT table_name 
-            FROM information_schema.tables 
-            WHERE table_schema = 'public'
-            ORDER BY table_name
-        """)
-        tabelas = [row['table_name'] for row in cursor.fetchall()]
-        
-        # Contar registros em cada tabela
-        contagens = {}
-        for tabela in tabelas:
-            try:
-                cursor.execute(f'SELECT COUNT(*) as total FROM {tabela}')
-                contagens[tabela] = cursor.fetchone()['total']
-            except:
-                contagens[tabela] = 'erro'
-        
-        conn.close()
+        estimadas = linhas_estimadas(cursor)
+        tabelas = list(estimadas)
+        
+        if exato:
+            contagens = {}
+            for tabela in tabelas:
+                try:
+                    cursor.execute(psycopg2.sql.SQL('SELECT COUNT(*) as total FROM {}').format(
+                        psycopg2.sql.Identifier(tabela)))
+                    contagens[tabela] = cursor.fetchone()['total']
+                except Exception:
+                    conn.rollback()
+                    contagens[tabela] = 'erro'
+        else:
+            contagens = {tabela: linha['linhas'] for tabela, linha in estimadas.items()}
         
         return jsonify({
             'status': 'ok',
+            'contagem': 'exata' if exato else 'estimada',
             'tabelas_existentes': tabelas,
-            'contagem_registros': contagens
+            'contagem_registros': contagens,
+            'estatisticas': {tabela: {chave: valor for chave, valor in linha.items() if chave != 'tabela'}
+                             for tabela, linha in estimadas.items()}
         })
     except Exception as e:
         return jsonify({
@@ -282,13 +754,72 @@ def debug_tables():
             'error_type': type(e).__name__
         }), 500
 
+def estatisticas_estimadas(cursor):
+    """Os números de debug_estatisticas pelas estatísticas do planejador, sem ler as tabelas.
+
+    Clientes por nível saem das frequências dos valores mais comuns de
+    clientes.nivel (pg_stats); a soma dos pontos, da média estimada de
+    pontuacoes.pontos (valores mais comuns e o meio de cada faixa do
+    histograma) vezes as linhas. Com tabelas pequenas (até
+    CONTAGEM_EXATA_ATE) ou sem ANALYZE ainda, devolve None e quem chama conta.
+    """
+    linhas = linhas_estimadas(cursor, ['clientes', 'pontuacoes'])
+    total_clientes = linhas['clientes']['linhas']
+    cursor.execute("""
+        SELECT tablename AS tabela, null_frac, most_common_vals::TEXT::TEXT[] AS valores,
+               most_common_freqs AS frequencias, histogram_bounds::TEXT::TEXT[] AS limites
+        FROM pg_stats
+        WHERE schemaname = 'public'
+          AND ((tablename = 'clientes' AND attname = 'nivel') OR (tablename = 'pontuacoes' AND attname = 'pontos'))
+    """)
+    stats = {linha['tabela']: linha for linha in cursor.fetchall()}
+    if total_clientes <= CONTAGEM_EXATA_ATE or len(stats) < 2:
+        return None
+
+    niveis = stats['clientes']
+    frequencias = dict(zip(niveis['valores'] or [], niveis['frequencias'] or []))
+    # Nível fora da lista dos mais comuns divide o que sobrou com os outros ausentes
+    ausentes = [nivel for nivel in NIVEIS if nivel not in frequencias]
+    resto = max(0.0, 1.0 - (niveis['null_frac'] or 0.0) - sum(frequencias.values()))
+    resultados = {'total_clientes': total_clientes}
+    for nivel in NIVEIS:
+        fracao = frequencias.get(nivel, resto / len(ausentes) if ausentes else 0.0)
+        resultados[f'clientes_{nivel}'] = round(total_clientes * fracao)
+
+    pontos = stats['pontuacoes']
+    comuns = [(float(valor), freq) for valor, freq in zip(pontos['valores'] or [], pontos['frequencias'] or [])]
+    limites = [float(valor) for valor in pontos['limites'] or []]
+    fracao_comuns = sum(freq for _, freq in comuns)
+    soma_media = sum(valor * freq for valor, freq in comuns)
+    if len(limites) > 1:
+        # Faixas do histograma têm a mesma quantidade de linhas: média dos meios
+        meios = [(a + b) / 2 for a, b in zip(limites, limites[1:])]
+        soma_media += (1.0 - (pontos['null_frac'] or 0.0) - fracao_comuns) * sum(meios) / len(meios)
+    resultados['pontos_distribuidos'] = round(linhas['pontuacoes']['linhas'] * soma_media)
+    return resultados
+
 @app.route('/api/debug/estatisticas', methods=['GET'])
 def debug_estatisticas():
-    """Endpoint para testar query de estatísticas passo a passo"""
+    """Endpoint para testar query de estatísticas passo a passo.
+
+    Em bancos grandes os números são estimados (estatisticas_estimadas);
+    ?exato=1 roda as contagens de verdade.
+    """
+    exato, negado = exigir_admin_para_exato()
+    if negado:
+        return negado
     try:
         conn = get_db()
         cursor = dict_cursor(conn)
         
+        estimados = None if exato else estatisticas_estimadas(cursor)
+        if estimados is not None:
+            return jsonify({
+                'status': 'ok',
+                'contagem': 'estimada',
+                'resultados': estimados
+            })
+        
         resultados = {}
         
         # Teste 1: Contar total de clientes
@@ -327,10 +858,9 @@ def debug_estatisticas():
         except Exception as e:
             resultados['pontos_distribuidos'] = f'ERRO: {str(e)}'
         
-        conn.close()
-        
         return jsonify({
             'status': 'ok',
+            'contagem': 'exata',
             'resultados': resultados
         })
     except Exception as e:
@@ -340,18 +870,176 @@ def debug_estatisticas():
             'error_type': type(e).__name__
         }), 500
 
+@app.route('/api/debug/pool', methods=['GET'])
+def debug_pool():
+    """Estatísticas do pool de conexões (em uso, ociosas, espera, checkouts)"""
+    try:
+        return jsonify({
+            'status': 'ok',
+            'pool': get_pool().estatisticas()
+        })
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+            'error_type': type(e).__name__
+        }), 500
+
+def _lido_do_pool(campo, fator=1):
+    """Leitura de um campo de estatisticas() do pool para as métricas (nada antes de o pool existir)"""
+    def ler():
+        return {(): get_pool().estatisticas()[campo] * fator} if _pool is not None else {}
+    return ler
+
+metricas.Coleta('semaforo_pool_conexoes_em_uso', 'Conexões do pool emprestadas às requisições', 'gauge',
+                _lido_do_pool('em_uso'))
+metricas.Coleta('semaforo_pool_conexoes_ociosas', 'Conexões abertas esperando no pool', 'gauge',
+                _lido_do_pool('ociosas'))
+metricas.Coleta('semaforo_pool_conexoes_maximo', 'Limite de conexões do pool (DB_POOL_MAX)', 'gauge',
+                _lido_do_pool('maximo'))
+metricas.Coleta('semaforo_pool_checkouts_total', 'Conexões retiradas do pool', 'counter',
+                _lido_do_pool('checkouts'))
+metricas.Coleta('semaforo_pool_conexoes_abertas_total', 'Conexões novas abertas pelo pool', 'counter',
+                _lido_do_pool('conexoes_abertas'))
+metricas.Coleta('semaforo_pool_esgotamentos_total', 'Pedidos que desistiram após DB_POOL_TIMEOUT sem conexão livre',
+                'counter', _lido_do_pool('esgotamentos'))
+metricas.Coleta('semaforo_pool_espera_segundos_total', 'Tempo total esperando conexão livre no pool', 'counter',
+                _lido_do_pool('espera_total_ms', 0.001))
+metricas.Coleta('semaforo_invalidacao_conectado', 'Ouvinte de avisos de invalidação conectado (1) ou não (0)',
+                'gauge', lambda: {(): int(avisos_ativos())})
+
+@app.route('/metrics', methods=['GET'])
+def metricas_prometheus():
+    """Métricas deste processo no formato texto do Prometheus (metricas.py)"""
+    autorizado = session.get('admin') or (
+        bool(METRICAS_TOKEN) and request.headers.get('Authorization') == f'Bearer {METRICAS_TOKEN}')
+    if not autorizado:
+        return jsonify({'error': 'Não autorizado'}), 401
+    return Response(metricas.texto(), content_type=metricas.TIPO_CONTEUDO)
+
+def codificar_cursor(pontos, cliente_id):
+    return f'{pontos}.{cliente_id}'
+
+def decodificar_cursor(cursor):
+    pontos, cliente_id = cursor.split('.')
+    return int(pontos), int(cliente_id)
+
+def contar_clientes(cursor, where, params, exato=False):
+    """Total de clientes do filtro; por padrão estimado pelo planejador (sem varrer a tabela)"""
+    if not exato:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) SELECT 1 FROM clientes {where}', params)
+        plano = cursor.fetchone()['QUERY PLAN']
+        estimado = int(plano[0]['Plan']['Plan Rows'])
+        if estimado > CONTAGEM_EXATA_ATE:
+            return estimado, True
+    cursor.execute(f'SELECT COUNT(*) AS total FROM clientes {where}', params)
+    return cursor.fetchone()['total'], False
+
 @app.route('/api/clientes', methods=['GET'])
 def listar_clientes():
-    conn = get_db()
-    cursor = dict_cursor(conn)  # PostgreSQL com dict
-    cursor.execute('''
+    """Clientes por pontos (maior primeiro), paginados por cursor.
+
+    Parâmetros: limite, cursor (proximo_cursor da página anterior), nivel,
+    visita_de / visita_ate (AAAA-MM-DD, inclusivos) e total=exato para
+    contar em vez de estimar. O total só vem na primeira página.
+    Com limite=todos (exportação) vêm todos os clientes do filtro a partir
+    do cursor, em streaming e sem total.
+    """
+    try:
+        todos = request.args.get('limite') == 'todos'
+        limite = None if todos else min(max(int(request.args.get('limite', CLIENTES_POR_PAGINA)), 1),
+                                         CLIENTES_POR_PAGINA_MAX)
+        cursor_pagina = request.args.get('cursor')
+        nivel = request.args.get('nivel')
+        visita_de = request.args.get('visita_de')
+        visita_ate = request.args.get('visita_ate')
+
+        filtros = []
+        params = []
+        if nivel:
+            if nivel not in NIVEIS:
+                return jsonify({'error': 'Nível inválido'}), 400
+            filtros.append('nivel = %s')
+            params.append(nivel)
+        if visita_de:
+            filtros.append('ultima_visita >= %s')
+            params.append(datetime.strptime(visita_de, '%Y-%m-%d'))
+        if visita_ate:
+            filtros.append('ultima_visita < %s')
+            params.append(datetime.strptime(visita_ate, '%Y-%m-%d') + timedelta(days=1))
+        where_filtros = ('WHERE ' + ' AND '.join(filtros)) if filtros else ''
+
+        filtros_pagina = list(filtros)
+        params_pagina = list(params)
+        if cursor_pagina:
+            filtros_pagina.append('(pontos_totais, id) < (%s, %s)')
+            params_pagina.extend(decodificar_cursor(cursor_pagina))
+        where_pagina = ('WHERE ' + ' AND '.join(filtros_pagina)) if filtros_pagina else ''
+    except ValueError:
+        return jsonify({'error': 'Parâmetros inválidos'}), 400
+
+    sql = f'''
         SELECT id, nome, telefone, email, pontos_totais, nivel, 
                data_cadastro, ultima_visita
         FROM clientes
-        ORDER BY pontos_totais DESC
-    ''')
+        {where_pagina}
+        ORDER BY pontos_totais DESC, id DESC
+    '''
+    if todos:
+        return resposta_json_streaming(sql, params_pagina, objeto={'proximo_cursor': None}, chave='clientes')
+
+    conn = get_db()
+    cursor = dict_cursor(conn)  # PostgreSQL com dict
+    cursor.execute(sql + 'LIMIT %s', params_pagina + [limite + 1])
     clientes = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+
+    proximo_cursor = None
+    if len(clientes) > limite:
+        clientes = clientes[:limite]
+        ultimo = clientes[-1]
+        proximo_cursor = codificar_cursor(ultimo['pontos_totais'], ultimo['id'])
+
+    resultado = {'clientes': clientes, 'proximo_cursor': proximo_cursor}
+    if not cursor_pagina:
+        exato = request.args.get('total') == 'exato'
+        resultado['total'], resultado['total_estimado'] = contar_clientes(cursor, where_filtros, params, exato)
+    return jsonify(resultado)
+
+@app.route('/api/clientes/busca', methods=['GET'])
+def buscar_clientes():
+    """Clientes mais parecidos com `q` (parte do nome ou do telefone), do mais para o menos parecido"""
+    termo = request.args.get('q', '').strip()
+    try:
+        limite = min(max(int(request.args.get('limite', BUSCA_LIMITE_PADRAO)), 1), BUSCA_LIMITE_MAX)
+    except ValueError:
+        return jsonify({'error': 'Parâmetros inválidos'}), 400
+    if len(termo) < 2:
+        return jsonify([])
+
+    inicio = time.perf_counter()
+    conn = get_db()
+    cursor = dict_cursor(conn)  # PostgreSQL com dict
+    try:
+        cursor.execute('SET LOCAL statement_timeout = %s', (BUSCA_TIMEOUT_MS,))
+        cursor.execute('SELECT * FROM buscar_clientes(%s, %s)', (termo, limite))
+        clientes = [dict(row) for row in cursor.fetchall()]
+    except psycopg2.errors.QueryCanceled:
+        conn.rollback()
+        return jsonify({'error': 'Busca demorou demais, tente um termo maior'}), 503
+
+    restante_ms = BUSCA_TIMEOUT_MS - int((time.perf_counter() - inicio) * 1000)
+    if len(clientes) < limite and restante_ms > 0:
+        # Completa com nomes parecidos (erros de digitação) no tempo que sobrou;
+        # se estourar, fica só com o que a busca principal achou
+        try:
+            cursor.execute('SAVEPOINT busca_aproximada')
+            cursor.execute('SET LOCAL statement_timeout = %s', (restante_ms,))
+            cursor.execute('SELECT * FROM buscar_clientes_aproximado(%s, %s, %s)',
+                           (termo, limite - len(clientes), [c['id'] for c in clientes]))
+            clientes.extend(dict(row) for row in cursor.fetchall())
+        except psycopg2.errors.QueryCanceled:
+            cursor.execute('ROLLBACK TO SAVEPOINT busca_aproximada')
+    conn.rollback()  # encerra a transação só de leitura (e o SET LOCAL)
     return jsonify(clientes)
 
 @app.route('/api/clientes', methods=['POST'])
@@ -369,10 +1057,12 @@ def cadastrar_cliente():
     cursor.execute('''
         INSERT INTO clientes (nome, telefone, email)
         VALUES (%s, %s, %s)
+        RETURNING id
     ''', (nome, telefone, email))
+    cliente_id = cursor.fetchone()['id']
+    publicar_clientes(cursor, [cliente_id])
     conn.commit()
-    cliente_id = cursor.lastrowid
-    conn.close()
+    atualizar_ranking(cliente_id, 0, nome)
     
     return jsonify({'id': cliente_id, 'message': 'Cliente cadastrado com sucesso'}), 201
 
@@ -384,7 +1074,6 @@ def obter_cliente(cliente_id):
     cliente = cursor.fetchone()
     
     if not cliente:
-        conn.close()
         return jsonify({'error': 'Cliente não encontrado'}), 404
     
     cursor.execute('''
@@ -394,7 +1083,6 @@ def obter_cliente(cliente_id):
         LIMIT 20
     ''', (cliente_id,))
     historico = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     
     resultado = dict(cliente)
     resultado['historico'] = historico
@@ -419,12 +1107,13 @@ def atualizar_cliente(cliente_id):
             SET nome = %s, telefone = %s, email = %s
             WHERE id = %s
         ''', (nome, telefone, email, cliente_id))
+        publicar_clientes(cursor, [cliente_id])
         conn.commit()
-        conn.close()
+        atualizar_ranking(cliente_id, nome=nome)
         
         return jsonify({'message': 'Cliente atualizado com sucesso'})
     except Exception as e:
-        print(f"ERRO em /api/clientes/<id> PUT: {e}")
+        log.exception('Erro na requisição')
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/clientes/<int:cliente_id>', methods=['DELETE'])
@@ -433,8 +1122,9 @@ def deletar_cliente(cliente_id):
     cursor = dict_cursor(conn)  # PostgreSQL com dict
     cursor.execute('DELETE FROM pontuacoes WHERE cliente_id = %s', (cliente_id,))
     cursor.execute('DELETE FROM clientes WHERE id = %s', (cliente_id,))
+    publicar_clientes(cursor, [cliente_id])
     conn.commit()
-    conn.close()
+    remover_do_ranking(cliente_id)
     
     return jsonify({'message': 'Cliente deletado com sucesso'})
 
@@ -446,37 +1136,23 @@ def adicionar_pontos():
     tipo = data.get('tipo', 'consumo')
     descricao = data.get('descricao', '')
     
-    if not cliente_id or pontos <= 0:
+    # Só inteiros do JSON ("10", 1.5 e true não passam), como no lote e em app_async.py
+    if type(cliente_id) is not int or type(pontos) is not int or not cliente_id or pontos <= 0:
         return jsonify({'error': 'Dados inválidos'}), 400
     
-    conn = get_db()
-    cursor = dict_cursor(conn)  # PostgreSQL com dict
-    
-    cursor.execute('''
-        INSERT INTO pontuacoes (cliente_id, pontos, tipo, descricao, data_validade)
-        VALUES (%s, %s, %s, %s, NOW() + INTERVAL '90 days')
-    ''', (cliente_id, pontos, tipo, descricao))
-    
-    pontos_validos = calcular_pontos_validos(cliente_id)
-    pontos_bonus, dias_visitados = calcular_pontos_frequencia(cliente_id)
-    
-    if pontos_bonus > 0:
-        cursor.execute('''
-            INSERT INTO pontuacoes (cliente_id, pontos, tipo, descricao, data_validade)
-            VALUES (%s, %s, 'frequencia', %s, NOW() + INTERVAL '90 days')
-        ''', (cliente_id, pontos_bonus, f'Bônus de frequência: {dias_visitados} visitas em 30 dias'))
-        pontos_validos = calcular_pontos_validos(cliente_id)
+    try:
+        # Lançamento, bônus, saldo, nível e última visita em uma única chamada ao banco
+        resultado = executar_atomico(
+            'SELECT * FROM registrar_pontos(%s, %s, %s, %s)',
+            (cliente_id, pontos, tipo, descricao)
+        )[0]
+    except psycopg2.errors.ForeignKeyViolation:
+        return jsonify({'error': 'Cliente não encontrado'}), 404
     
-    cursor.execute('''
-        UPDATE clientes 
-        SET pontos_totais = %s,
-            nivel = %s,
-            ultima_visita = NOW()
-        WHERE id = %s
-    ''', (pontos_validos, calcular_nivel(pontos_validos), cliente_id))
-    
-    conn.commit()
-    conn.close()
+    atualizar_ranking(cliente_id, resultado['pontos_totais'])
+    metricas.PONTUACOES.incrementar('avulsa')
+    metricas.PONTOS.incrementar('avulsa', quantidade=pontos)
+    pontos_bonus = resultado['pontos_bonus']
     
     mensagem = 'Pontos adicionados com sucesso'
     if pontos_bonus > 0:
@@ -484,73 +1160,154 @@ def adicionar_pontos():
     
     return jsonify({
         'message': mensagem,
-        'pontos_totais': pontos_validos,
+        'pontos_totais': resultado['pontos_totais'],
         'pontos_bonus': pontos_bonus,
-        'nivel': calcular_nivel(pontos_validos)
+        'nivel': resultado['nivel']
+    })
+
+@app.route('/api/pontuacao/lote', methods=['POST'])
+def adicionar_pontos_lote():
+    """Lança vários pontos de uma vez (comanda inteira no fechamento).
+
+    Corpo: {"itens": [{"cliente_id", "pontos", "tipo", "descricao"}, ...]}.
+    Tudo vai em uma transação só, com SQL sobre o conjunto; cada item recebe
+    seu resultado (status ok, invalido ou cliente_nao_encontrado), na ordem
+    enviada. Itens com problema não impedem os demais.
+    """
+    data = request.json or {}
+    itens = data.get('itens')
+    if not isinstance(itens, list) or not itens:
+        return jsonify({'error': 'Informe a lista de itens'}), 400
+    if len(itens) > PONTUACAO_LOTE_MAX:
+        return jsonify({'error': f'Máximo de {PONTUACAO_LOTE_MAX} itens por lote'}), 400
+
+    inicio = time.perf_counter()
+    resultados = [{'indice': i, 'status': 'invalido'} for i in range(len(itens))]
+    validos = []
+    for i, item in enumerate(itens):
+        if not isinstance(item, dict):
+            continue
+        cliente_id = item.get('cliente_id')
+        pontos = item.get('pontos', 0)
+        resultados[i]['cliente_id'] = cliente_id
+        if type(cliente_id) is int and type(pontos) is int and pontos > 0:
+            validos.append((i, cliente_id, pontos, item.get('tipo') or 'consumo', item.get('descricao') or ''))
+
+    if validos:
+        posicoes, clientes, pontos, tipos, descricoes = (list(coluna) for coluna in zip(*validos))
+        linhas = executar_atomico(
+            'SELECT * FROM registrar_pontos_lote(%s::INTEGER[], %s::INTEGER[], %s::VARCHAR[], %s::TEXT[])',
+            (clientes, pontos, tipos, descricoes)
+        )
+        for linha in linhas:
+            n = linha['indice'] - 1
+            resultados[posicoes[n]].update(linha, indice=posicoes[n], pontos=pontos[n])
+            if linha['status'] == 'ok':
+                atualizar_ranking(linha['cliente_id'], linha['pontos_totais'])
+
+    duracao = time.perf_counter() - inicio
+    lancados = sum(1 for r in resultados if r['status'] == 'ok')
+    if lancados:
+        metricas.PONTUACOES.incrementar('lote', quantidade=lancados)
+        metricas.PONTOS.incrementar('lote', quantidade=sum(r['pontos'] for r in resultados if r['status'] == 'ok'))
+    return jsonify({
+        'resultados': resultados,
+        'lancados': lancados,
+        'falhas': len(resultados) - lancados,
+        'duracao_ms': round(duracao * 1000, 1),
+        'itens_por_segundo': round(len(itens) / duracao, 1) if duracao > 0 else None,
     })
 
 @app.route('/api/ranking', methods=['GET'])
 def ranking():
+    """Top N (?limite=, padrão 10) direto do ranking em memória"""
     try:
-        conn = get_db()
-        cursor = dict_cursor(conn)  # PostgreSQL com dict
-        cursor.execute('''
-            SELECT id, nome, pontos_totais, nivel
-            FROM clientes
-            ORDER BY pontos_totais DESC
-            LIMIT 10
-        ''')
-        ranking = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return jsonify(ranking)
+        limite = int(request.args.get('limite', 10))
+    except ValueError:
+        return jsonify({'error': 'limite inválido'}), 400
+    limite = max(1, min(limite, RANKING_LIMITE_MAX))
+    
+    try:
+        placar_atual = get_placar()
+        return resposta_condicional(
+            ['configuracoes'],
+            lambda: jsonify(com_niveis(placar_atual.top(limite))),
+            variante=variante_ranking(placar_atual),
+            com_last_modified=False
+        )
     except Exception as e:
-        print(f"ERRO em /api/ranking: {e}")
+        log.exception('Erro na requisição')
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/admin/ranking/ressincronizar', methods=['POST'])
+def ressincronizar_ranking_agora():
+    """Recarrega o ranking em memória deste worker a partir da tabela clientes"""
+    if not session.get('admin'):
+        return jsonify({'error': 'Não autorizado'}), 401
+    
+    inicio = time.perf_counter()
+    if not placar.ressincronizar(ler_clientes_ranking):
+        return jsonify({'error': 'Ressincronização já em andamento'}), 409
+    return jsonify({
+        'clientes': placar.total,
+        'duracao_ms': round((time.perf_counter() - inicio) * 1000, 1)
+    })
+
 @app.route('/api/estatisticas', methods=['GET'])
 def estatisticas():
     try:
-        conn = get_db()
-        cursor = dict_cursor(conn)  # PostgreSQL com dict
-        
-        cursor.execute('SELECT COUNT(*) as total FROM clientes')
-        total_clientes = cursor.fetchone()['total']
-        
-        cursor.execute("SELECT COUNT(*) as total FROM clientes WHERE nivel = 'verde'")
-        clientes_verde = cursor.fetchone()['total']
-        
-        cursor.execute("SELECT COUNT(*) as total FROM clientes WHERE nivel = 'amarelo'")
-        clientes_amarelo = cursor.fetchone()['total']
-        
-        cursor.execute("SELECT COUNT(*) as total FROM clientes WHERE nivel = 'vermelho'")
-        clientes_vermelho = cursor.fetchone()['total']
-        
-        cursor.execute('SELECT SUM(pontos) as total FROM pontuacoes')
-        result = cursor.fetchone()
-        pontos_distribuidos = result['total'] if result['total'] else 0
-        
-        conn.close()
-        
-        return jsonify({
-            'total_clientes': total_clientes,
-            'clientes_verde': clientes_verde,
-            'clientes_amarelo': clientes_amarelo,
-            'clientes_vermelho': clientes_vermelho,
-            'pontos_distribuidos': pontos_distribuidos
-        })
+        resumo, dados = cache_estatisticas.obter()
+        return resposta_condicional(['configuracoes'], lambda: jsonify(dados),
+                                    variante=f'-estatisticas{resumo}', com_last_modified=False)
     except Exception as e:
-        print(f"ERRO em /api/estatisticas: {e}")
+        log.exception('Erro na requisição')
         return jsonify({'error': str(e)}), 500
 
+def carregar_estatisticas(versao):
+    """(resumo do conteúdo para a ETag, contagens); igual em todos os workers se os dados forem iguais"""
+    conn = get_db()
+    cursor = dict_cursor(conn)  # PostgreSQL com dict
+    
+    cursor.execute('SELECT COUNT(*) as total FROM clientes')
+    total_clientes = cursor.fetchone()['total']
+    
+    cursor.execute("SELECT COUNT(*) as total FROM clientes WHERE nivel = 'verde'")
+    clientes_verde = cursor.fetchone()['total']
+    
+    cursor.execute("SELECT COUNT(*) as total FROM clientes WHERE nivel = 'amarelo'")
+    clientes_amarelo = cursor.fetchone()['total']
+    
+    cursor.execute("SELECT COUNT(*) as total FROM clientes WHERE nivel = 'vermelho'")
+    clientes_vermelho = cursor.fetchone()['total']
+    
+    cursor.execute('SELECT SUM(pontos) as total FROM pontuacoes')
+    result = cursor.fetchone()
+    pontos_distribuidos = result['total'] if result['total'] else 0
+    
+    dados = {
+        'total_clientes': total_clientes,
+        'clientes_verde': clientes_verde,
+        'clientes_amarelo': clientes_amarelo,
+        'clientes_vermelho': clientes_vermelho,
+        'pontos_distribuidos': pontos_distribuidos
+    }
+    resumo = hashlib.blake2b(repr(sorted(dados.items())).encode(), digest_size=8).hexdigest()
+    return resumo, dados
+
+cache_estatisticas = CacheLocal(carregar_estatisticas, ESTATISTICAS_CACHE_TTL)
+
 @app.route('/api/configuracoes', methods=['GET'])
 def obter_configuracoes():
-    try:
+    def gerar():
         config = get_configuracoes()
         if config:
             config.pop('senha_admin', None)
         return jsonify(config or {})
+    
+    try:
+        return resposta_condicional(['configuracoes'], gerar)
     except Exception as e:
-        print(f"ERRO em /api/configuracoes: {e}")
+        log.exception('Erro na requisição')
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/admin/login', methods=['POST'])
@@ -566,7 +1323,7 @@ def admin_login():
         
         return jsonify({'success': False, 'message': 'Senha incorreta'}), 401
     except Exception as e:
-        print(f"ERRO em /api/admin/login: {e}")
+        log.exception('Erro na requisição')
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/admin/logout', methods=['POST'])
@@ -585,28 +1342,49 @@ def atualizar_configuracoes():
     pontos_amarelo_min = data.get('pontos_amarelo_min', 200)
     pontos_verde_min = data.get('pontos_verde_min', 500)
     senha_admin = data.get('senha_admin')
+    # Dia de negócio dos check-ins (opcionais: sem eles ficam os atuais)
+    fuso = data.get('dia_negocio_fuso')
+    virada_hora = data.get('dia_negocio_virada_hora')
+    
+    if virada_hora is not None and (type(virada_hora) is not int or not 0 <= virada_hora <= 23):
+        return jsonify({'error': 'Hora de virada do dia deve ser de 0 a 23'}), 400
     
     conn = get_db()
     cursor = dict_cursor(conn)  # PostgreSQL com dict
     
+    if fuso is not None:
+        cursor.execute('SELECT EXISTS (SELECT 1 FROM pg_timezone_names WHERE name = %s) AS valido', (fuso,))
+        if not cursor.fetchone()['valido']:
+            return jsonify({'error': 'Fuso horário inválido'}), 400
+    
     if senha_admin:
         cursor.execute('''
             UPDATE configuracoes 
-            SET nome_bar = %s, pontos_vermelho_min = ?, 
-                pontos_amarelo_min = ?, pontos_verde_min = ?,
-                senha_admin = ?
+            SET nome_bar = %s, pontos_vermelho_min = %s, 
+                pontos_amarelo_min = %s, pontos_verde_min = %s,
+                senha_admin = %s
             WHERE id = 1
         ''', (nome_bar, pontos_vermelho_min, pontos_amarelo_min, pontos_verde_min, senha_admin))
     else:
         cursor.execute('''
             UPDATE configuracoes 
-            SET nome_bar = %s, pontos_vermelho_min = ?, 
-                pontos_amarelo_min = ?, pontos_verde_min = ?
+            SET nome_bar = %s, pontos_vermelho_min = %s, 
+                pontos_amarelo_min = %s, pontos_verde_min = %s
             WHERE id = 1
         ''', (nome_bar, pontos_vermelho_min, pontos_amarelo_min, pontos_verde_min))
     
+    if fuso is not None or virada_hora is not None:
+        cursor.execute('''
+            UPDATE configuracoes 
+            SET dia_negocio_fuso = COALESCE(%s, dia_negocio_fuso),
+                dia_negocio_virada_hora = COALESCE(%s, dia_negocio_virada_hora)
+            WHERE id = 1
+        ''', (fuso, virada_hora))
+    
+    incrementar_versoes(cursor, 'configuracoes')
     conn.commit()
-    conn.close()
+    cache_configuracoes.invalidar()
+    cache_versoes.invalidar()
     
     return jsonify({'message': 'Configurações atualizadas com sucesso'})
 
@@ -628,6 +1406,8 @@ def upload_logo():
         timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
         filename = f'logo_{timestamp}_{filename}'
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        # Criada aqui e não na partida (na Vercel o diretório do app é só leitura)
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
         file.save(filepath)
         
         logo_path = f'/static/uploads/{filename}'
@@ -635,13 +1415,110 @@ def upload_logo():
         conn = get_db()
         cursor = dict_cursor(conn)  # PostgreSQL com dict
         cursor.execute('UPDATE configuracoes SET logo_path = %s WHERE id = 1', (logo_path,))
+        incrementar_versoes(cursor, 'configuracoes')
         conn.commit()
-        conn.close()
+        cache_configuracoes.invalidar()
+        cache_versoes.invalidar()
         
         return jsonify({'success': True, 'logo_path': logo_path})
     
     return jsonify({'error': 'Tipo de arquivo não permitido'}), 400
 
+@app.route('/api/admin/saldos/verificar', methods=['GET', 'POST'])
+def verificar_saldos():
+    """Recalcula os saldos a partir do extrato e lista divergências (POST também corrige)"""
+    if not session.get('admin'):
+        return jsonify({'error': 'Não autorizado'}), 401
+    
+    corrigir = request.method == 'POST'
+    divergencias = executar_atomico('SELECT * FROM verificar_saldos(%s)', (corrigir,))
+    if corrigir and divergencias:
+        cache_estatisticas.invalidar()
+        if not avisos_ativos():
+            ressincronizar_ranking_em_segundo_plano()
+    
+    return jsonify({
+        'divergencias': [dict(row) for row in divergencias],
+        'total_divergencias': len(divergencias),
+        'corrigido': corrigir
+    })
+
+@app.route('/api/admin/visitas/reconstruir', methods=['POST'])
+def reconstruir_visitas():
+    """Refaz os mapas de visitas (bônus de frequência) a partir da tabela checkins"""
+    if not session.get('admin'):
+        return jsonify({'error': 'Não autorizado'}), 401
+    
+    clientes = executar_atomico('SELECT reconstruir_visitas() AS clientes')[0]['clientes']
+    return jsonify({'clientes': clientes})
+
+def autorizado_cron():
+    """Admin logado ou chamada do cron da Vercel (Authorization: Bearer CRON_SECRET)"""
+    if session.get('admin'):
+        return True
+    return bool(CRON_SECRET) and request.headers.get('Authorization') == f'Bearer {CRON_SECRET}'
+
+@app.route('/api/admin/expiracao/executar', methods=['GET', 'POST'])
+def executar_expiracao():
+    """Expira os saldos vencidos em lotes e registra a execução"""
+    if not autorizado_cron():
+        return jsonify({'error': 'Não autorizado'}), 401
+    
+    try:
+        tamanho_lote = int(request.args.get('tamanho_lote', EXPIRACAO_TAMANHO_LOTE))
+        resumo = executar_varredura(get_db(), tamanho_lote)
+        apos_expiracao(resumo)
+        return jsonify(resumo)
+    except Exception as e:
+        log.exception('Erro na requisição')
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/expiracao', methods=['GET'])
+def listar_execucoes_expiracao():
+    """Últimas execuções da varredura (linhas tocadas e duração)"""
+    if not session.get('admin'):
+        return jsonify({'error': 'Não autorizado'}), 401
+    
+    conn = get_db()
+    cursor = dict_cursor(conn)
+    cursor.execute('''
+        SELECT * FROM execucoes_expiracao
+        ORDER BY id DESC
+        LIMIT 20
+    ''')
+    return jsonify([dict(row) for row in cursor.fetchall()])
+
+@app.route('/api/admin/exportar/<tabela>', methods=['GET'])
+def exportar_tabela(tabela):
+    """Download de uma tabela inteira em CSV ou NDJSON (?formato=ndjson), em streaming e sem as senhas.
+
+    Sai comprimida conforme o Accept-Encoding, como as outras listas; com
+    ?gzip=1 o próprio arquivo vem em .gz (para quem baixa com curl/wget sem
+    descomprimir).
+    """
+    if not session.get('admin'):
+        return jsonify({'error': 'Não autorizado'}), 401
+    # Só esta rota usa: fica fora da partida fria
+    import exportacao
+    if tabela not in exportacao.TABELAS:
+        return jsonify({'error': 'Tabela não encontrada'}), 404
+    formato = request.args.get('formato', 'csv')
+    if formato not in exportacao.FORMATOS:
+        return jsonify({'error': 'Formato inválido (csv ou ndjson)'}), 400
+
+    colunas = exportacao.colunas_exportadas(get_db().cursor(), tabela)
+    pedacos = exportacao.pedacos_copy(get_pool(), exportacao.instrucao_copy(tabela, colunas, formato), formato)
+    tipo, extensao = exportacao.FORMATOS[formato]
+    nome = f"{tabela}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{extensao}"
+    if request.args.get('gzip') == '1':
+        resposta = Response(comprimir_pedacos(pedacos, 'gzip'), mimetype='application/gzip')
+        nome += '.gz'
+    else:
+        resposta = Response(pedacos, mimetype=tipo)
+    resposta.headers['Content-Disposition'] = f'attachment; filename="{nome}"'
+    resposta.headers['Cache-Control'] = 'no-store'
+    return resposta
+
 @app.route('/static/uploads/<filename>')
 def uploaded_file(filename):
     return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
@@ -657,7 +1534,7 @@ def cliente_login():
         telefone = data.get('telefone')
         senha = data.get('senha')
         
-        print(f"DEBUG: Tentativa de login - Telefone: {telefone}, Tem senha: {bool(senha)}")
+        log.debug('Tentativa de login', telefone=telefone, tem_senha=bool(senha))
         
         if not telefone:
             return jsonify({'error': 'Telefone é obrigatório'}), 400
@@ -671,10 +1548,9 @@ def cliente_login():
             cursor.execute('SELECT * FROM clientes WHERE telefone = %s', (telefone,))
         
         cliente = cursor.fetchone()
-        conn.close()
         
         if cliente:
-            print(f"DEBUG: Cliente encontrado - ID: {cliente['id']}, Nome: {cliente['nome']}")
+            log.debug('Cliente encontrado', cliente_id=cliente['id'])
             session['cliente_id'] = cliente['id']
             session['cliente_nome'] = cliente['nome']
             return jsonify({
@@ -689,10 +1565,10 @@ def cliente_login():
                 }
             })
         
-        print(f"DEBUG: Cliente não encontrado para telefone: {telefone}")
+        log.debug('Cliente não encontrado', telefone=telefone)
         return jsonify({'error': 'Cliente não encontrado ou senha incorreta'}), 401
     except Exception as e:
-        print(f"ERRO em /api/cliente/login: {e}")
+        log.exception('Erro na requisição')
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/cliente/logout', methods=['POST'])
@@ -709,40 +1585,25 @@ def cliente_perfil():
         
         cliente_id = session['cliente_id']
         
+        # Saldo e expirados vêm prontos da linha do cliente (mantidos incrementalmente)
+        pontos_validos = calcular_pontos_validos(cliente_id)
+        atualizar_ranking(cliente_id, pontos_validos)
+        
         conn = get_db()
         cursor = dict_cursor(conn)  # PostgreSQL com dict
         cursor.execute('SELECT * FROM clientes WHERE id = %s', (cliente_id,))
         cliente = cursor.fetchone()
         
         if not cliente:
-            conn.close()
             return jsonify({'error': 'Cliente não encontrado'}), 404
         
-        cursor.execute('''
-            SELECT * FROM pontuacoes 
-            WHERE cliente_id = %s 
-            ORDER BY data DESC
-        ''', (cliente_id,))
-        historico = [dict(row) for row in cursor.fetchall()]
-        
-        cursor.execute('''
-            SELECT SUM(pontos) as total
-            FROM pontuacoes
-            WHERE cliente_id = %s
-            AND data_validade IS NOT NULL
-            AND data_validade <= NOW()
-        ''', (cliente_id,))
-        resultado_expirados = cursor.fetchone()
-        pontos_expirados = resultado_expirados['total'] if resultado_expirados and resultado_expirados['total'] else 0
+        pontos_expirados = cliente['pontos_expirados'] or 0
         
         pontos_bonus, dias_visitados = calcular_pontos_frequencia(cliente_id)
         
-        conn.close()
-        
         config = get_configuracoes()
-        pontos_validos = calcular_pontos_validos(cliente_id)
         
-        return jsonify({
+        perfil = {
             'id': cliente['id'],
             'nome': cliente['nome'],
             'telefone': cliente['telefone'],
@@ -754,14 +1615,20 @@ def cliente_perfil():
             'nivel': calcular_nivel(pontos_validos),
             'data_cadastro': cliente['data_cadastro'],
             'ultima_visita': cliente['ultima_visita'],
-            'historico': historico,
             'config': {
                 'pontos_amarelo': config['pontos_amarelo_min'] if config else 200,
                 'pontos_verde': config['pontos_verde_min'] if config else 500
             }
-        })
+        }
+        
+        # O histórico completo não tem limite: vai em streaming como último campo
+        return resposta_json_streaming('''
+            SELECT * FROM pontuacoes 
+            WHERE cliente_id = %s 
+            ORDER BY data DESC
+        ''', (cliente_id,), objeto=perfil, chave='historico')
     except Exception as e:
-        print(f"ERRO em /api/cliente/perfil: {e}")
+        log.exception('Erro na requisição')
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/cliente/definir-senha', methods=['POST'])
@@ -771,7 +1638,7 @@ def cliente_definir_senha():
         telefone = data.get('telefone')
         senha = data.get('senha')
         
-        print(f"DEBUG: Definir senha - Telefone: {telefone}")
+        log.debug('Definir senha', telefone=telefone)
         
         if not telefone or not senha:
             return jsonify({'error': 'Telefone e senha são obrigatórios'}), 400
@@ -784,19 +1651,40 @@ def cliente_definir_senha():
         cursor.execute('UPDATE clientes SET senha = %s WHERE telefone = %s', (senha, telefone))
         
         if cursor.rowcount == 0:
-            conn.close()
-            print(f"DEBUG: Cliente não encontrado para telefone: {telefone}")
+            log.debug('Cliente não encontrado', telefone=telefone)
             return jsonify({'error': 'Cliente não encontrado'}), 404
         
         conn.commit()
-        conn.close()
         
-        print(f"DEBUG: Senha definida com sucesso para telefone: {telefone}")
+        log.debug('Senha definida', telefone=telefone)
         return jsonify({'success': True, 'message': 'Senha definida com sucesso'})
     except Exception as e:
-        print(f"ERRO em /api/cliente/definir-senha: {e}")
+        log.exception('Erro na requisição')
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/cliente/ranking', methods=['GET'])
+def cliente_ranking():
+    """Posição do cliente logado e os vizinhos (?raio= posições acima e abaixo)"""
+    if 'cliente_id' not in session:
+        return jsonify({'error': 'Não autenticado'}), 401
+    
+    try:
+        raio = max(0, min(int(request.args.get('raio', 2)), RANKING_RAIO_MAX))
+    except ValueError:
+        return jsonify({'error': 'raio inválido'}), 400
+    
+    placar_atual = get_placar()
+    posicao, vizinhos = placar_atual.vizinhos(session['cliente_id'], raio)
+    if posicao is None:
+        return jsonify({'error': 'Cliente não encontrado no ranking'}), 404
+    
+    return jsonify({
+        'posicao': posicao,
+        'total': placar_atual.total,
+        'pontos_totais': vizinhos[posicao - vizinhos[0]['posicao']]['pontos_totais'],
+        'vizinhos': com_niveis(vizinhos)
+    })
+
 @app.route('/api/cliente/checkin', methods=['POST'])
 def fazer_checkin():
     if 'cliente_id' not in session:
@@ -806,38 +1694,19 @@ def fazer_checkin():
     data = request.json
     localizacao = data.get('localizacao', '')
     
-    conn = get_db()
-    cursor = dict_cursor(conn)  # PostgreSQL com dict
-    
-    cursor.execute('''
-        SELECT COUNT(*) as count FROM checkins
-        WHERE cliente_id = %s
-        AND DATE(data_checkin) = CURRENT_DATE
-    ''', (cliente_id,))
+    # O índice único (cliente_id, dia_negocio) decide: sem corrida entre
+    # requisições simultâneas e a noite que passa da meia-noite conta uma vez só
+    resultado = executar_atomico(
+        'SELECT * FROM registrar_checkin(%s, %s)',
+        (cliente_id, localizacao)
+    )[0]
     
-    result = cursor.fetchone()
-    checkin_hoje = result['count'] if result else 0
-    
-    if checkin_hoje > 0:
-        conn.close()
+    if not resultado['novo']:
         return jsonify({'error': 'Você já fez check-in hoje!'}), 400
     
-    cursor.execute('''
-        INSERT INTO checkins (cliente_id, localizacao)
-        VALUES (%s, %s)
-    ''', (cliente_id, localizacao))
-    
-    cursor.execute('''
-        UPDATE clientes 
-        SET ultima_visita = NOW()
-        WHERE id = %s
-    ''', (cliente_id,))
-    
-    conn.commit()
-    
-    pontos_bonus, dias_visitados = calcular_pontos_frequencia(cliente_id)
-    
-    conn.close()
+    metricas.CHECKINS.incrementar()
+    pontos_bonus = resultado['pontos_bonus']
+    dias_visitados = resultado['dias_visitados']
     
     mensagem = 'Check-in realizado com sucesso!'
     if pontos_bonus > 0:
@@ -867,7 +1736,6 @@ def listar_checkins_cliente():
     ''', (cliente_id,))
     
     checkins = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     
     return jsonify(checkins)
 
@@ -881,26 +1749,29 @@ def pode_fazer_checkin():
         
         conn = get_db()
         cursor = dict_cursor(conn)  # PostgreSQL com dict
+        # Busca só no índice único (cliente_id, dia_negocio)
         cursor.execute('''
-            SELECT COUNT(*) as count FROM checkins
-            WHERE cliente_id = %s
-            AND DATE(data_checkin) = CURRENT_DATE
+            SELECT EXISTS (
+                SELECT 1 FROM checkins
+                WHERE cliente_id = %s
+                AND dia_negocio = dia_negocio()
+            ) AS ja_fez
         ''', (cliente_id,))
-        
-        result = cursor.fetchone()
-        checkin_hoje = result['count'] if result else 0
-        conn.close()
+        ja_fez_checkin = cursor.fetchone()['ja_fez']
         
         return jsonify({
-            'pode_checkin': checkin_hoje == 0,
-            'ja_fez_checkin': checkin_hoje > 0
+            'pode_checkin': not ja_fez_checkin,
+            'ja_fez_checkin': ja_fez_checkin
         })
     except Exception as e:
-        print(f"ERRO em /api/cliente/pode-checkin: {e}")
+        log.exception('Erro na requisição')
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/produtos', methods=['GET'])
 def listar_produtos():
+    return resposta_condicional(['produtos'], gerar_lista_produtos)
+
+def gerar_lista_produtos():
     conn = get_db()
     cursor = dict_cursor(conn)  # PostgreSQL com dict
     
@@ -912,7 +1783,6 @@ def listar_produtos():
         cursor.execute('SELECT * FROM produtos ORDER BY nome')
     
     produtos = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     return jsonify(produtos)
 
 @app.route('/api/produtos', methods=['POST'])
@@ -933,10 +1803,12 @@ def cadastrar_produto():
     cursor.execute('''
         INSERT INTO produtos (nome, descricao, pontos)
         VALUES (%s, %s, %s)
+        RETURNING id
     ''', (nome, descricao, pontos))
+    produto_id = cursor.fetchone()['id']
+    incrementar_versoes(cursor, 'produtos')
     conn.commit()
-    produto_id = cursor.lastrowid
-    conn.close()
+    cache_versoes.invalidar()
     
     return jsonify({'id': produto_id, 'message': 'Produto cadastrado com sucesso'}), 201
 
@@ -958,11 +1830,12 @@ def atualizar_produto(produto_id):
     cursor = dict_cursor(conn)  # PostgreSQL com dict
     cursor.execute('''
         UPDATE produtos 
-        SET nome = %s, descricao = ?, pontos = ?, ativo = ?
+        SET nome = %s, descricao = %s, pontos = %s, ativo = %s
         WHERE id = %s
     ''', (nome, descricao, pontos, ativo, produto_id))
+    incrementar_versoes(cursor, 'produtos')
     conn.commit()
-    conn.close()
+    cache_versoes.invalidar()
     
     return jsonify({'message': 'Produto atualizado com sucesso'})
 
@@ -974,8 +1847,9 @@ def deletar_produto(produto_id):
     conn = get_db()
     cursor = dict_cursor(conn)  # PostgreSQL com dict
     cursor.execute('DELETE FROM produtos WHERE id = %s', (produto_id,))
+    incrementar_versoes(cursor, 'produtos')
     conn.commit()
-    conn.close()
+    cache_versoes.invalidar()
     
     return jsonify({'message': 'Produto deletado com sucesso'})
 
@@ -989,7 +1863,8 @@ def solicitar_pontos():
     quantidade = data.get('quantidade', 1)
     observacao = data.get('observacao', '')
     
-    if not produto_id or quantidade <= 0:
+    # Só inteiros do JSON ("2", 1.5 e true não passam), como em app_async.py
+    if type(produto_id) is not int or type(quantidade) is not int or produto_id <= 0 or quantidade <= 0:
         return jsonify({'error': 'Dados inválidos'}), 400
     
     conn = get_db()
@@ -999,7 +1874,6 @@ def solicitar_pontos():
     produto = cursor.fetchone()
     
     if not produto:
-        conn.close()
         return jsonify({'error': 'Produto não encontrado ou inativo'}), 404
     
     pontos_total = produto['pontos'] * quantidade
@@ -1008,10 +1882,11 @@ def solicitar_pontos():
     cursor.execute('''
         INSERT INTO solicitacoes_pontos (cliente_id, produto_id, quantidade, pontos_total, observacao)
         VALUES (%s, %s, %s, %s, %s)
+        RETURNING id
     ''', (cliente_id, produto_id, quantidade, pontos_total, observacao))
+    solicitacao_id = cursor.fetchone()['id']
     conn.commit()
-    solicitacao_id = cursor.lastrowid
-    conn.close()
+    metricas.SOLICITACOES.incrementar('criada')
     
     return jsonify({
         'id': solicitacao_id,
@@ -1026,32 +1901,18 @@ def listar_solicitacoes():
     
     status = request.args.get('status', 'pendente')
     
-    conn = get_db()
-    cursor = dict_cursor(conn)  # PostgreSQL com dict
-    
-    if status == 'todas':
-        cursor.execute('''
-            SELECT s.*, c.nome as cliente_nome, c.telefone as cliente_telefone,
-                   p.nome as produto_nome, p.descricao as produto_descricao
-            FROM solicitacoes_pontos s
-            JOIN clientes c ON s.cliente_id = c.id
-            JOIN produtos p ON s.produto_id = p.id
-            ORDER BY s.data_solicitacao DESC
-        ''')
-    else:
-        cursor.execute('''
-            SELECT s.*, c.nome as cliente_nome, c.telefone as cliente_telefone,
-                   p.nome as produto_nome, p.descricao as produto_descricao
-            FROM solicitacoes_pontos s
-            JOIN clientes c ON s.cliente_id = c.id
-            JOIN produtos p ON s.produto_id = p.id
-            WHERE s.status = %s
-            ORDER BY s.data_solicitacao DESC
-        ''', (status,))
-    
-    solicitacoes = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return jsonify(solicitacoes)
+    # 'todas' traz o histórico inteiro: sai em streaming, sem montar a lista em memória
+    where = '' if status == 'todas' else 'WHERE s.status = %s'
+    params = () if status == 'todas' else (status,)
+    return resposta_json_streaming(f'''
+        SELECT s.*, c.nome as cliente_nome, c.telefone as cliente_telefone,
+               p.nome as produto_nome, p.descricao as produto_descricao
+        FROM solicitacoes_pontos s
+        JOIN clientes c ON s.cliente_id = c.id
+        JOIN produtos p ON s.produto_id = p.id
+        {where}
+        ORDER BY s.data_solicitacao DESC
+    ''', params)
 
 @app.route('/api/solicitacoes/cliente', methods=['GET'])
 def listar_solicitacoes_cliente():
@@ -1071,7 +1932,6 @@ def listar_solicitacoes_cliente():
     ''', (cliente_id,))
     
     solicitacoes = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     return jsonify(solicitacoes)
 
 @app.route('/api/solicitacoes/<int:solicitacao_id>/validar', methods=['POST'])
@@ -1083,64 +1943,93 @@ def validar_solicitacao(solicitacao_id):
         data = request.json
         aprovar = data.get('aprovar', False)
         
-        conn = get_db()
-        cursor = dict_cursor(conn)  # PostgreSQL com dict
-        
-        cursor.execute('SELECT * FROM solicitacoes_pontos WHERE id = %s', (solicitacao_id,))
-        solicitacao = cursor.fetchone()
+        # Bloqueio, mudança de status e lançamento dos pontos em uma única chamada ao banco
+        resultado = executar_atomico(
+            'SELECT * FROM validar_solicitacao_pontos(%s, %s)',
+            (solicitacao_id, bool(aprovar))
+        )[0]
+        novo_status = resultado['status']
+        if resultado['pontos_totais'] is not None:
+            atualizar_ranking(resultado['cliente_id'], resultado['pontos_totais'])
         
-        if not solicitacao:
-            conn.close()
+        if novo_status == 'nao_encontrada':
             return jsonify({'error': 'Solicitação não encontrada'}), 404
         
-        if solicitacao['status'] != 'pendente':
-            conn.close()
+        if novo_status == 'ja_processada':
             return jsonify({'error': 'Solicitação já foi processada'}), 400
         
-        novo_status = 'aprovada' if aprovar else 'rejeitada'
-        
-        cursor.execute('''
-            UPDATE solicitacoes_pontos 
-            SET status = %s, data_validacao = NOW(), validado_por = 'admin'
-            WHERE id = %s
-        ''', (novo_status, solicitacao_id))
+        metricas.SOLICITACOES.incrementar(novo_status)
+        return jsonify({
+            'message': f'Solicitação {novo_status} com sucesso!',
+            'status': novo_status
+        })
+    except Exception as e:
+        log.exception('Erro na requisição')
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/solicitacoes/validar-lote', methods=['POST'])
+def validar_solicitacoes_lote():
+    """Aprova/rejeita várias solicitações de uma vez.
+
+    Corpo: {"decisoes": [{"id": 1, "aprovar": true}, ...]}. Devolve um
+    resultado por id e as listas de ids por status; ja_processadas são as
+    que outra validação já concluiu e em_processamento as que estão sendo
+    validadas agora em outra tela (podem ser reenviadas).
+    """
+    try:
+        if not session.get('admin'):
+            return jsonify({'error': 'Não autorizado'}), 401
         
-        if aprovar:
-            cursor.execute('''
-                INSERT INTO pontuacoes (cliente_id, pontos, tipo, descricao, data_validade)
-                VALUES (%s, %s, 'produto', %s, NOW() + INTERVAL '90 days')
-            ''', (solicitacao['cliente_id'], solicitacao['pontos_total'], 
-                  f"Produto consumido (Solicitação #{solicitacao_id})"))
-            
-            pontos_validos = calcular_pontos_validos(solicitacao['cliente_id'])
-            pontos_bonus, dias_visitados = calcular_pontos_frequencia(solicitacao['cliente_id'])
-            
-            if pontos_bonus > 0:
-                cursor.execute('''
-                    INSERT INTO pontuacoes (cliente_id, pontos, tipo, descricao, data_validade)
-                    VALUES (%s, %s, 'frequencia', %s, NOW() + INTERVAL '90 days')
-                ''', (solicitacao['cliente_id'], pontos_bonus, f'Bônus de frequência: {dias_visitados} visitas em 30 dias'))
-                pontos_validos = calcular_pontos_validos(solicitacao['cliente_id'])
-            
-            cursor.execute('''
-                UPDATE clientes 
-                SET pontos_totais = %s,
-                    nivel = %s,
-                    ultima_visita = NOW()
-                WHERE id = %s
-            ''', (pontos_validos, calcular_nivel(pontos_validos), solicitacao['cliente_id']))
+        data = request.json or {}
+        decisoes = data.get('decisoes')
+        if not isinstance(decisoes, list) or not decisoes:
+            return jsonify({'error': 'Informe as decisões'}), 400
+        if len(decisoes) > SOLICITACOES_LOTE_MAX:
+            return jsonify({'error': f'Máximo de {SOLICITACOES_LOTE_MAX} solicitações por lote'}), 400
+        if not all(isinstance(d, dict) and type(d.get('id')) is int for d in decisoes):
+            return jsonify({'error': 'Cada decisão precisa de um id'}), 400
+        
+        # Travas, mudança de status e lançamento das aprovadas em uma única chamada ao banco
+        resultados = executar_atomico(
+            'SELECT * FROM validar_solicitacoes_lote(%s::INTEGER[], %s::BOOLEAN[])',
+            ([d['id'] for d in decisoes], [bool(d.get('aprovar', False)) for d in decisoes])
+        )
         
-        conn.commit()
-        conn.close()
+        por_status = {status: [] for status in
+                      ('aprovada', 'rejeitada', 'ja_processada', 'em_processamento', 'nao_encontrada')}
+        for resultado in resultados:
+            por_status[resultado['status']].append(resultado['solicitacao_id'])
+            if resultado['pontos_totais'] is not None:
+                atualizar_ranking(resultado['cliente_id'], resultado['pontos_totais'])
+        for status in ('aprovada', 'rejeitada'):
+            if por_status[status]:
+                metricas.SOLICITACOES.incrementar(status, quantidade=len(por_status[status]))
         
         return jsonify({
-            'message': f'Solicitação {novo_status} com sucesso!',
-            'status': novo_status
+            'resultados': resultados,
+            'aprovadas': por_status['aprovada'],
+            'rejeitadas': por_status['rejeitada'],
+            'ja_processadas': por_status['ja_processada'],
+            'em_processamento': por_status['em_processamento'],
+            'nao_encontradas': por_status['nao_encontrada']
         })
     except Exception as e:
-        print(f"ERRO em /api/solicitacoes/<id>/validar: {e}")
+        log.exception('Erro na requisição')
         return jsonify({'error': str(e)}), 500
 
+if EXPIRACAO_INTERVALO_SEGUNDOS > 0 and DATABASE_URL:
+    VarredorExpiracao(get_pool(), EXPIRACAO_INTERVALO_SEGUNDOS, EXPIRACAO_TAMANHO_LOTE,
+                      ao_concluir=apos_expiracao).start()
+
+@app.cli.command('init-db')
+def comando_init_db():
+    """Cria as tabelas e aplica sql/ (flask --app app init-db): fora da partida, uma vez por deploy"""
+    with app.app_context():
+        init_db()
+    print('Schema aplicado')
+
 if __name__ == '__main__':
-    init_db()
+    with app.app_context():
+        init_db()
+    ressincronizar_ranking()
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,553 @@
+"""
+Modo assíncrono (ASGI): as rotas mais chamadas em asyncpg, o resto pelo app Flask
+
+    uvicorn app_async:app --host 0.0.0.0 --port 5000 --workers 4
+
+Check-in, perfil do cliente, lançamento de pontos, ranking e solicitações
+respondem direto no laço de eventos: enquanto uma requisição espera o banco,
+o worker atende as outras, e as consultas independentes (as do perfil) vão
+em paralelo por conexões diferentes do pool asyncpg. Qualquer outra URL cai
+no app Flask (app.py) do mesmo processo, que continua igual e segue servindo
+sozinho no modo WSGI. Sessão (cookie assinado do Flask), caches, ranking em
+memória e avisos de invalidação são os do app Flask.
+"""
+
+import asyncio
+import contextlib
+import os
+import secrets
+import time
+
+import asyncpg
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.http import is_resource_modified, parse_accept_header, quote_etag
+
+import app as app_flask
+import instrumentacao
+import metricas
+import registro
+from serializacao import TIPOS_COMPRIMIVEIS, comprimir, compressor_incremental, escolher_codificacao
+from streaming_json import lista_json, lista_json_async
+
+log = registro.obter('app_async')
+
+# Pool asyncpg de cada worker (separado do pool do app Flask, que atende as demais rotas)
+ASYNC_DB_POOL_MIN = int(os.getenv('ASYNC_DB_POOL_MIN', '2'))
+ASYNC_DB_POOL_MAX = int(os.getenv('ASYNC_DB_POOL_MAX', '20'))
+# Consultas preparadas guardadas por conexão (poupa uma ida ao banco por
+# consulta); 0 se o pooler em modo transação não aceitar consultas preparadas
+ASYNC_DB_CACHE_CONSULTAS = int(os.getenv('ASYNC_DB_CACHE_CONSULTAS', '100'))
+
+_pool = None
+# Fila por ordem de chegada para as conexões (ver buscar())
+_fila = None
+
+
+async def buscar(sql, *args):
+    """Linhas de `sql`, com uma conexão do pool na vez desta requisição.
+
+    O pool do asyncpg entrega a conexão devolvida a quem pedir naquele
+    instante, na frente de quem já esperava: com centenas de requisições
+    disputando o pool, a maioria passa direto e algumas esperam segundos.
+    O semáforo (do tamanho do pool) atende por ordem de chegada.
+    """
+    pedido = time.perf_counter()
+    async with _fila:
+        inicio = time.perf_counter()
+        try:
+            return await _pool.fetch(sql, *args)
+        finally:
+            _medir(sql, pedido, inicio)
+
+
+async def buscar_linha(sql, *args):
+    pedido = time.perf_counter()
+    async with _fila:
+        inicio = time.perf_counter()
+        try:
+            return await _pool.fetchrow(sql, *args)
+        finally:
+            _medir(sql, pedido, inicio)
+
+
+def _medir(sql, pedido, inicio):
+    """Espera na fila e tempo da consulta na medição da requisição (instrumentacao.py)"""
+    medicao = instrumentacao.atual()
+    if medicao is not None:
+        medicao.espera_pool += inicio - pedido
+        medicao.registrar(sql, time.perf_counter() - inicio)
+
+
+def ler_sessao(request):
+    """Sessão do Flask (cookie assinado), só leitura"""
+    flask_app = app_flask.app
+    cookie = request.cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+    if not cookie:
+        return {}
+    serializador = flask_app.session_interface.get_signing_serializer(flask_app)
+    try:
+        return serializador.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return {}
+
+
+def resposta_json(obj, status=200, headers=None):
+    return Response(app_flask.app.json.dumps_bytes(obj), status_code=status,
+                    media_type='application/json', headers=headers)
+
+
+def erro(mensagem, status):
+    return resposta_json({'error': mensagem}, status)
+
+
+async def ler_json(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _no_contexto(funcao):
+    with app_flask.app.app_context():
+        return funcao()
+
+
+async def com_caches(funcao, *caches, placar=False):
+    """Chama `funcao`, que lê `caches` (CacheLocal do app Flask) e, com `placar`, o ranking.
+
+    Com tudo em memória roda direto; se algum precisa ir ao banco
+    (psycopg2, bloqueante), roda numa thread com contexto do app.
+    """
+    if all(cache.valido for cache in caches) and (not placar or app_flask.placar.carregado):
+        return funcao()
+    return await run_in_threadpool(_no_contexto, funcao)
+
+
+async def linhas_em_paginas(sql, *args, ordem, tamanho_lote=app_flask.STREAM_TAMANHO_LOTE):
+    """Lotes de linhas (dicts) de `sql`, página a página pela chave `ordem` (decrescente).
+
+    Cada página é uma consulta à parte, sem transação nem cursor no servidor,
+    e a conexão volta ao pool entre uma e outra: uma ida ao banco por lote,
+    e os históricos curtos (quase todos) cabem no primeiro. `sql` termina o
+    WHERE com `{pagina}` e não tem ORDER BY; `ordem` são as colunas da chave,
+    com o id por último para desempatar (ex.: ('data', 'id')).
+    """
+    colunas = ', '.join(ordem)
+    campos = [coluna.rsplit('.', 1)[-1] for coluna in ordem]
+    marcadores = ', '.join(f'${len(args) + i + 1}' for i in range(len(ordem)))
+    ordenacao = f" ORDER BY {', '.join(f'{coluna} DESC' for coluna in ordem)} LIMIT {tamanho_lote}"
+    primeira = sql.format(pagina='') + ordenacao
+    seguintes = sql.format(pagina=f'AND ({colunas}) < ({marcadores})') + ordenacao
+
+    linhas = await buscar(primeira, *args)
+    while linhas:
+        yield [dict(linha) for linha in linhas]
+        if len(linhas) < tamanho_lote:
+            break
+        ultima = linhas[-1]
+        linhas = await buscar(seguintes, *args, *(ultima[campo] for campo in campos))
+
+
+async def _com_primeiro(primeiro, lotes):
+    try:
+        yield primeiro
+        async for lote in lotes:
+            yield lote
+    finally:
+        await lotes.aclose()
+
+
+async def resposta_lista(lotes, primeiro, objeto=None, chave=None):
+    """Lista JSON dos lotes (`primeiro` já lido): pronta de uma vez quando coube
+    toda no primeiro lote, em streaming só quando há mais.
+
+    Com o laço de eventos cheio cada envio de pedaço espera a sua vez atrás
+    das outras requisições; as listas curtas (quase todas) saem num envio só.
+    """
+    dumps = app_flask.app.json.dumps
+    if primeiro is None or len(primeiro) < app_flask.STREAM_TAMANHO_LOTE:
+        await lotes.aclose()
+        corpo = ''.join(lista_json([primeiro] if primeiro else [], dumps, objeto, chave))
+        return Response(corpo, media_type='application/json')
+    return StreamingResponse(lista_json_async(_com_primeiro(primeiro, lotes), dumps, objeto, chave),
+                             media_type='application/json')
+
+
+# ----------------------------------------------------------------------
+# Rotas (mesmas entradas e saídas das rotas Flask de mesmo nome)
+
+async def fazer_checkin(request):
+    sessao = ler_sessao(request)
+    if 'cliente_id' not in sessao:
+        return erro('Não autenticado', 401)
+
+    data = await ler_json(request) or {}
+    resultado = await buscar_linha(
+        'SELECT * FROM registrar_checkin($1, $2)',
+        sessao['cliente_id'], data.get('localizacao', '')
+    )
+
+    if not resultado['novo']:
+        return erro('Você já fez check-in hoje!', 400)
+
+    metricas.CHECKINS.incrementar()
+    pontos_bonus = resultado['pontos_bonus']
+    mensagem = 'Check-in realizado com sucesso!'
+    if pontos_bonus > 0:
+        mensagem += f' Você tem {pontos_bonus} pontos de bônus disponíveis por frequência!'
+
+    return resposta_json({
+        'success': True,
+        'message': mensagem,
+        'dias_visitados': resultado['dias_visitados'],
+        'pontos_bonus_disponiveis': pontos_bonus
+    })
+
+
+async def cliente_perfil(request):
+    sessao = ler_sessao(request)
+    if 'cliente_id' not in sessao:
+        return erro('Não autenticado', 401)
+    cliente_id = sessao['cliente_id']
+
+    # Saldo, cadastro, frequência, configurações e o primeiro lote do
+    # histórico ao mesmo tempo; o resto do histórico vem em streaming
+    historico = linhas_em_paginas('''
+        SELECT * FROM pontuacoes
+        WHERE cliente_id = $1 {pagina}
+    ''', cliente_id, ordem=('data', 'id'))
+    resultados = await asyncio.gather(
+        buscar_linha('SELECT * FROM saldo_cliente($1)', cliente_id),
+        buscar_linha('SELECT * FROM clientes WHERE id = $1', cliente_id),
+        buscar_linha('SELECT * FROM frequencia_cliente($1, dia_negocio())', cliente_id),
+        com_caches(app_flask.get_configuracoes, app_flask.cache_configuracoes),
+        anext(historico, None),
+        return_exceptions=True,
+    )
+    falhas = [r for r in resultados if isinstance(r, Exception)]
+    saldo, cliente, frequencia, config, primeiro = resultados
+    if falhas or not cliente:
+        await historico.aclose()
+        if falhas:
+            log.error('Erro na requisição', exc_info=falhas[0])
+            return erro(str(falhas[0]), 500)
+        return erro('Cliente não encontrado', 404)
+
+    pontos_validos = saldo['pontos_totais']
+    app_flask.atualizar_ranking(cliente_id, pontos_validos)
+    limiares = await com_caches(app_flask.get_limiares, app_flask.cache_configuracoes)
+
+    perfil = {
+        'id': cliente['id'],
+        'nome': cliente['nome'],
+        'telefone': cliente['telefone'],
+        'email': cliente['email'],
+        'pontos_totais': pontos_validos,
+        'pontos_expirados': saldo['pontos_expirados'] or 0,
+        'pontos_bonus_disponiveis': frequencia['pontos_bonus'] or 0,
+        'dias_visitados_mes': frequencia['dias_visitados'] or 0,
+        'nivel': limiares.nivel(pontos_validos),
+        'data_cadastro': cliente['data_cadastro'],
+        'ultima_visita': cliente['ultima_visita'],
+        'config': {
+            'pontos_amarelo': config['pontos_amarelo_min'] if config else 200,
+            'pontos_verde': config['pontos_verde_min'] if config else 500
+        }
+    }
+    return await resposta_lista(historico, primeiro, objeto=perfil, chave='historico')
+
+
+async def adicionar_pontos(request):
+    data = await ler_json(request) or {}
+    cliente_id = data.get('cliente_id')
+    pontos = data.get('pontos', 0)
+    # Só inteiros do JSON, como na rota Flask: "10", 1.5 e true não passam
+    if type(cliente_id) is not int or type(pontos) is not int or not cliente_id or pontos <= 0:
+        return erro('Dados inválidos', 400)
+
+    try:
+        resultado = await buscar_linha(
+            'SELECT * FROM registrar_pontos($1, $2, $3, $4)',
+            cliente_id, pontos, data.get('tipo', 'consumo'), data.get('descricao', '')
+        )
+    except asyncpg.ForeignKeyViolationError:
+        return erro('Cliente não encontrado', 404)
+
+    app_flask.atualizar_ranking(cliente_id, resultado['pontos_totais'])
+    metricas.PONTUACOES.incrementar('avulsa')
+    metricas.PONTOS.incrementar('avulsa', quantidade=pontos)
+    pontos_bonus = resultado['pontos_bonus']
+
+    mensagem = 'Pontos adicionados com sucesso'
+    if pontos_bonus > 0:
+        mensagem += f' + {pontos_bonus} pts de bônus por frequência!'
+
+    return resposta_json({
+        'message': mensagem,
+        'pontos_totais': resultado['pontos_totais'],
+        'pontos_bonus': pontos_bonus,
+        'nivel': resultado['nivel']
+    })
+
+
+async def ranking(request):
+    try:
+        limite = int(request.query_params.get('limite', 10))
+    except ValueError:
+        return erro('limite inválido', 400)
+    limite = max(1, min(limite, app_flask.RANKING_LIMITE_MAX))
+
+    try:
+        def ler():
+            placar_atual = app_flask.get_placar()
+            versoes = app_flask.cache_versoes.obter()
+            etag = app_flask.etag_versoes(versoes, ['configuracoes'], app_flask.variante_ranking(placar_atual))
+            return etag, app_flask.com_niveis(placar_atual.top(limite))
+
+        etag, itens = await com_caches(ler, app_flask.cache_versoes, app_flask.cache_configuracoes, placar=True)
+    except Exception as e:
+        log.exception('Erro na requisição')
+        return erro(str(e), 500)
+
+    headers = {'ETag': quote_etag(etag), 'Cache-Control': app_flask.CACHE_CONTROL_PUBLICO}
+    if not is_resource_modified({'HTTP_IF_NONE_MATCH': request.headers.get('if-none-match')}, etag=etag):
+        return Response(status_code=304, headers=headers)
+    return resposta_json(itens, headers=headers)
+
+
+async def listar_solicitacoes(request):
+    if not ler_sessao(request).get('admin'):
+        return erro('Não autorizado', 401)
+
+    status = request.query_params.get('status', 'pendente')
+    where = 'WHERE TRUE' if status == 'todas' else 'WHERE s.status = $1'
+    args = () if status == 'todas' else (status,)
+    lotes = linhas_em_paginas(f'''
+        SELECT s.*, c.nome as cliente_nome, c.telefone as cliente_telefone,
+               p.nome as produto_nome, p.descricao as produto_descricao
+        FROM solicitacoes_pontos s
+        JOIN clientes c ON s.cliente_id = c.id
+        JOIN produtos p ON s.produto_id = p.id
+        {where} {{pagina}}
+    ''', *args, ordem=('s.data_solicitacao', 's.id'))
+    return await resposta_lista(lotes, await anext(lotes, None))
+
+
+async def solicitar_pontos(request):
+    sessao = ler_sessao(request)
+    if 'cliente_id' not in sessao:
+        return erro('Não autenticado', 401)
+
+    data = await ler_json(request) or {}
+    produto_id = data.get('produto_id')
+    quantidade = data.get('quantidade', 1)
+    # Só inteiros do JSON, como na rota Flask: "2", 1.5 e true não passam
+    if type(produto_id) is not int or type(quantidade) is not int or produto_id <= 0 or quantidade <= 0:
+        return erro('Dados inválidos', 400)
+
+    # Produto ativo e inserção em uma ida ao banco
+    solicitacao = await buscar_linha('''
+        INSERT INTO solicitacoes_pontos (cliente_id, produto_id, quantidade, pontos_total, observacao)
+        SELECT $1, p.id, $3, p.pontos * $3, $4
+        FROM produtos p
+        WHERE p.id = $2 AND p.ativo = 1
+        RETURNING id, pontos_total
+    ''', sessao['cliente_id'], produto_id, quantidade, data.get('observacao', ''))
+
+    if not solicitacao:
+        return erro('Produto não encontrado ou inativo', 404)
+
+    metricas.SOLICITACOES.incrementar('criada')
+
+    return resposta_json({
+        'id': solicitacao['id'],
+        'message': 'Solicitação enviada com sucesso! Aguarde a validação do administrador.',
+        'pontos_total': solicitacao['pontos_total']
+    }, 201)
+
+
+# ----------------------------------------------------------------------
+
+class CompressaoASGI:
+    """Brotli/gzip (serializacao.py) nas respostas das rotas assíncronas.
+
+    Mesmas regras do after_request do app Flask, cujas respostas já chegam
+    com Content-Encoding e passam direto.
+    """
+
+    def __init__(self, app, minimo_bytes):
+        self.app = app
+        self.minimo_bytes = minimo_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        codificacao = escolher_codificacao(parse_accept_header(Headers(scope=scope).get('accept-encoding')))
+        inicio = None
+        comprimir_pedaco = terminar = None
+
+        async def enviar(mensagem):
+            nonlocal inicio, comprimir_pedaco, terminar
+            if mensagem['type'] == 'http.response.start':
+                inicio = mensagem
+                return
+            if mensagem['type'] != 'http.response.body' or inicio is None:
+                await send(mensagem)
+                return
+
+            mensagem_inicio, inicio = inicio, None
+            headers = MutableHeaders(scope=mensagem_inicio)
+            tipo = headers.get('content-type', '').split(';')[0].strip()
+            if tipo in TIPOS_COMPRIMIVEIS and 'content-encoding' not in headers:
+                if 'accept-encoding' not in headers.get('vary', '').lower():
+                    headers.add_vary_header('Accept-Encoding')
+                corpo = mensagem.get('body', b'')
+                em_partes = mensagem.get('more_body', False)
+                # Sem Content-Length é streaming: comprime sempre, como no app Flask
+                tamanho = int(headers.get('content-length', self.minimo_bytes))
+                if codificacao and mensagem_inicio['status'] == 200 and tamanho >= self.minimo_bytes:
+                    headers['Content-Encoding'] = codificacao
+                    etag = headers.get('etag')
+                    if etag and not etag.startswith('W/'):
+                        headers['ETag'] = 'W/' + etag
+                    if em_partes:
+                        del headers['Content-Length']
+                        comprimir_pedaco, terminar = compressor_incremental(codificacao)
+                        mensagem = {**mensagem, 'body': comprimir_pedaco(corpo)}
+                    else:
+                        corpo = comprimir(corpo, codificacao)
+                        headers['Content-Length'] = str(len(corpo))
+                        mensagem = {**mensagem, 'body': corpo}
+            await send(mensagem_inicio)
+            await send(mensagem)
+            return
+
+        async def enviar_comprimido(mensagem):
+            if comprimir_pedaco is None or mensagem['type'] != 'http.response.body':
+                await enviar(mensagem)
+                return
+            corpo = comprimir_pedaco(mensagem.get('body', b''))
+            if not mensagem.get('more_body', False):
+                corpo += terminar()
+            await send({**mensagem, 'body': corpo})
+
+        await self.app(scope, receive, enviar_comprimido)
+
+
+class InstrumentacaoASGI:
+    """Id da requisição nos logs, Server-Timing, log de requisições lentas e
+    métricas (metricas.py) das rotas assíncronas.
+
+    O id (X-Request-ID recebido ou novo) também segue para o app Flask,
+    cujas respostas já chegam com X-Request-ID e Server-Timing (ele mede e
+    registra as suas, inclusive a latência por rota) e passam direto. As
+    requisições em andamento são contadas aqui, para as duas.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        id_requisicao = Headers(scope=scope).get('x-request-id', '')[:64]
+        if not id_requisicao:
+            id_requisicao = secrets.token_hex(8)
+            scope = {**scope, 'headers': [*scope['headers'], (b'x-request-id', id_requisicao.encode())]}
+        registro.iniciar_requisicao(id_requisicao, scope['path'])
+        medicao = instrumentacao.iniciar() if app_flask.INSTRUMENTACAO else None
+        status = None
+        inicio = time.perf_counter()
+        metricas.EM_ANDAMENTO.incrementar()
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem['type'] == 'http.response.start':
+                headers = MutableHeaders(scope=mensagem)
+                if 'x-request-id' not in headers:
+                    status = mensagem['status']
+                    headers['X-Request-ID'] = id_requisicao
+                    if medicao is not None:
+                        headers['Server-Timing'] = medicao.server_timing()
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        except Exception:
+            # Quem responde é o ServerErrorMiddleware do Starlette, por fora deste
+            if status is None:
+                status = 500
+            raise
+        finally:
+            metricas.EM_ANDAMENTO.decrementar()
+            if status is not None:
+                # O roteador do Starlette deixa a rota encontrada no scope
+                rota = getattr(scope.get('route'), 'path', 'sem_rota')
+                metricas.registrar_requisicao(rota, scope['method'], status, time.perf_counter() - inicio, medicao)
+            lenta_ms = app_flask.REQUISICAO_LENTA_MS
+            if medicao is not None:
+                if status is not None and lenta_ms > 0 and medicao.duracao() * 1000 >= lenta_ms:
+                    log.warning('Requisição lenta', metodo=scope['method'], caminho=scope['path'],
+                                status=status, **medicao.resumo())
+                instrumentacao.encerrar()
+            registro.encerrar_requisicao()
+
+
+def _lido_do_pool_async(ler):
+    return lambda: {(): ler(_pool)} if _pool is not None else {}
+
+
+metricas.Coleta('semaforo_pool_async_conexoes_em_uso', 'Conexões do pool asyncpg emprestadas às rotas assíncronas',
+                'gauge', _lido_do_pool_async(lambda pool: pool.get_size() - pool.get_idle_size()))
+metricas.Coleta('semaforo_pool_async_conexoes_ociosas', 'Conexões abertas esperando no pool asyncpg', 'gauge',
+                _lido_do_pool_async(lambda pool: pool.get_idle_size()))
+metricas.Coleta('semaforo_pool_async_conexoes_maximo', 'Limite de conexões do pool asyncpg (ASYNC_DB_POOL_MAX)',
+                'gauge', _lido_do_pool_async(lambda pool: pool.get_max_size()))
+
+
+async def _sem_reset(conn):
+    """As rotas não mudam o estado da sessão (SET, LISTEN, travas de sessão):
+    devolver a conexão ao pool dispensa o RESET ALL, que custaria uma ida ao banco"""
+
+
+@contextlib.asynccontextmanager
+async def ciclo_de_vida(app):
+    global _pool, _fila
+    _fila = asyncio.Semaphore(ASYNC_DB_POOL_MAX)
+    _pool = await asyncpg.create_pool(
+        app_flask.com_sslmode(app_flask.DATABASE_URL),
+        min_size=ASYNC_DB_POOL_MIN,
+        max_size=ASYNC_DB_POOL_MAX,
+        statement_cache_size=ASYNC_DB_CACHE_CONSULTAS,
+        reset=_sem_reset,
+    )
+    log.info('Pool asyncpg criado', minimo=ASYNC_DB_POOL_MIN, maximo=ASYNC_DB_POOL_MAX)
+    try:
+        yield
+    finally:
+        await _pool.close()
+
+
+app = Starlette(
+    routes=[
+        Route('/api/cliente/checkin', fazer_checkin, methods=['POST']),
+        Route('/api/cliente/perfil', cliente_perfil, methods=['GET']),
+        Route('/api/pontuacao', adicionar_pontos, methods=['POST']),
+        Route('/api/ranking', ranking, methods=['GET']),
+        Route('/api/solicitacoes', listar_solicitacoes, methods=['GET']),
+        Route('/api/solicitacoes', solicitar_pontos, methods=['POST']),
+        Mount('/', app=WSGIMiddleware(app_flask.app, workers=app_flask.DB_POOL_MAX)),
+    ],
+    lifespan=ciclo_de_vida,
+)
+app.add_middleware(CompressaoASGI, minimo_bytes=app_flask.COMPRESSAO_MINIMO_BYTES)
+app.add_middleware(InstrumentacaoASGI)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Teste de carga: modo WSGI (gunicorn + app.py) x modo ASGI (uvicorn + app_async.py) com clientes simultâneos.
+
+Sobe cada modo como servidor de verdade, um de cada vez e com o mesmo teto
+de conexões ao banco (`--conexoes`): gunicorn com 1 worker gthread
+(`--threads` threads, DB_POOL_MAX = conexões) e uvicorn com 1 worker
+(ASYNC_DB_POOL_MAX = conexões). `--usuarios` clientes HTTP simultâneos
+(padrão 500), cada um com seu cookie de sessão, disparam por `--duracao`
+segundos a mistura das rotas quentes:
+  - 35% GET /api/cliente/perfil        - 10% POST /api/cliente/checkin
+  - 25% GET /api/ranking               -  5% POST /api/solicitacoes
+  - 20% POST /api/pontuacao            -  5% GET /api/solicitacoes (admin)
+Mede vazão, latência (p50/p95/p99) e erros (5xx e conexões recusadas ou
+derrubadas) de cada modo. Com `--latencia-ms`, o banco fica atrás de
+benchmarks/proxy_latencia.py (rodando em outro processo), imitando a ida e
+volta até o Supabase, que é onde o modo assíncrono ganha: as requisições
+esperando o banco não prendem threads.
+
+Gerador de carga, servidor, proxy e banco dividem a mesma máquina: com
+poucos núcleos os números valem como comparação entre os modos, não como
+capacidade absoluta.
+
+Uso:
+    pip install -r requirements-async.txt
+    python benchmarks/bench_async_carga.py --usuarios 500 --duracao 30 --latencia-ms 5
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import time
+
+from carga_http import ERROS_CONEXAO, ConexaoHTTP, comando_servidor, esperar_servidor, porta_livre, rodar_proxy
+from comum import BENCH_DATABASE_URL, RAIZ, carregar_app, conectar, criar_clientes, limpar_tabelas, percentis
+
+SECRET_KEY = 'bench-async-carga'
+
+
+async def usuario(porta, cookie, cookie_admin, produto_id, clientes, rnd, fim, contagem, latencias):
+    conexao = ConexaoHTTP(porta)
+    while time.monotonic() < fim:
+        sorteio = rnd.random()
+        inicio = time.perf_counter()
+        try:
+            if sorteio < 0.35:
+                rota = 'perfil'
+                status, _ = await conexao.pedir('GET', '/api/cliente/perfil', cookie=cookie)
+            elif sorteio < 0.60:
+                rota = 'ranking'
+                status, _ = await conexao.pedir('GET', '/api/ranking')
+            elif sorteio < 0.80:
+                rota = 'pontuacao'
+                status, _ = await conexao.pedir('POST', '/api/pontuacao', {
+                    'cliente_id': rnd.choice(clientes), 'pontos': rnd.randint(5, 50), 'tipo': 'consumo',
+                })
+            elif sorteio < 0.90:
+                rota = 'checkin'
+                status, _ = await conexao.pedir('POST', '/api/cliente/checkin', {'localizacao': 'bar'}, cookie)
+            elif sorteio < 0.95:
+                rota = 'solicitar'
+                status, _ = await conexao.pedir('POST', '/api/solicitacoes', {'produto_id': produto_id}, cookie)
+            else:
+                rota = 'solicitacoes'
+                status, _ = await conexao.pedir('GET', '/api/solicitacoes', cookie=cookie_admin)
+            erro = status >= 500
+        except ERROS_CONEXAO:
+            erro = True
+        latencias.setdefault(rota, []).append((time.perf_counter() - inicio) * 1000)
+        contagem['erros' if erro else 'ok'] += 1
+    conexao.fechar()
+
+
+async def gerar_carga(porta, usuarios, duracao, aquecimento, clientes, produto_id, serializador):
+    cookie_admin = serializador.dumps({'admin': True})
+    cookies = [serializador.dumps({'cliente_id': clientes[i % len(clientes)]}) for i in range(usuarios)]
+
+    # Aquecimento: pools cheios, ranking carregado, caches preenchidos
+    fim = time.monotonic() + aquecimento
+    descarte = {'ok': 0, 'erros': 0}
+    await asyncio.gather(*(
+        usuario(porta, cookies[i], cookie_admin, produto_id, clientes, random.Random(-i), fim, descarte, {})
+        for i in range(usuarios)
+    ))
+
+    contagem = {'ok': 0, 'erros': 0}
+    latencias = {}
+    inicio = time.monotonic()
+    fim = inicio + duracao
+    await asyncio.gather(*(
+        usuario(porta, cookies[i], cookie_admin, produto_id, clientes, random.Random(i), fim, contagem, latencias)
+        for i in range(usuarios)
+    ))
+    decorrido = time.monotonic() - inicio
+
+    todas = [ms for valores in latencias.values() for ms in valores]
+    return {
+        'requisicoes': contagem['ok'] + contagem['erros'],
+        'erros': contagem['erros'],
+        'req_por_segundo': round((contagem['ok'] + contagem['erros']) / decorrido, 1),
+        'latencia_ms': percentis(todas),
+        'por_rota_ms': {rota: percentis(valores) for rota, valores in sorted(latencias.items())},
+    }
+
+
+def medir_modo(modo, dsn, args, clientes, produto_id, serializador):
+    porta = porta_livre()
+    ambiente = dict(
+        os.environ,
+        POSTGRES_URL=dsn,
+        SECRET_KEY=SECRET_KEY,
+        DB_POOL_MIN='1',
+        DB_POOL_MAX=str(args.conexoes),
+        DB_POOL_TIMEOUT='60',
+        ASYNC_DB_POOL_MIN='1',
+        ASYNC_DB_POOL_MAX=str(args.conexoes),
+        EXPIRACAO_INTERVALO_SEGUNDOS='0',
+    )
+    processo = subprocess.Popen(comando_servidor(modo, porta, args.threads), cwd=RAIZ, env=ambiente)
+    try:
+        asyncio.run(esperar_servidor(porta, processo))
+        resultado = asyncio.run(gerar_carga(porta, args.usuarios, args.duracao, args.aquecimento,
+                                            clientes, produto_id, serializador))
+    finally:
+        processo.terminate()
+        processo.wait(30)
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--usuarios', type=int, default=500, help='clientes HTTP simultâneos')
+    parser.add_argument('--duracao', type=float, default=30, help='segundos medidos por modo')
+    parser.add_argument('--aquecimento', type=float, default=5)
+    parser.add_argument('--conexoes', type=int, default=20, help='teto de conexões ao banco nos dois modos')
+    parser.add_argument('--threads', type=int, default=32, help='threads do gunicorn (modo WSGI)')
+    parser.add_argument('--clientes', type=int, default=2000)
+    parser.add_argument('--latencia-ms', type=float, default=0, help='atraso por sentido até o banco')
+    parser.add_argument('--modos', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+    args = parser.parse_args()
+
+    os.environ['SECRET_KEY'] = SECRET_KEY
+    app_module = carregar_app()
+    serializador = app_module.app.session_interface.get_signing_serializer(app_module.app)
+    conn = conectar()
+    limpar_tabelas(conn)
+    clientes = criar_clientes(conn, args.clientes)
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO produtos (nome, pontos, ativo) VALUES ('Chopp', 10, 1) RETURNING id")
+    produto_id = cursor.fetchone()[0]
+    conn.commit()
+
+    dsn, proxy, canal = BENCH_DATABASE_URL, None, None
+    if args.latencia_ms > 0:
+        canal, deles = multiprocessing.Pipe()
+        proxy = multiprocessing.Process(target=rodar_proxy, args=(deles, BENCH_DATABASE_URL, args.latencia_ms),
+                                        daemon=True)
+        proxy.start()
+        dsn = canal.recv()
+
+    resultados = {}
+    try:
+        for modo in args.modos:
+            # Mesmo ponto de partida: sem check-ins do dia nem solicitações do modo anterior
+            cursor.execute('TRUNCATE checkins, solicitacoes_pontos')
+            cursor.execute('SELECT reconstruir_visitas()')
+            conn.commit()
+            resultados[modo] = medir_modo(modo, dsn, args, clientes, produto_id, serializador)
+    finally:
+        if proxy is not None:
+            canal.send('fim')
+            proxy.join(5)
+        conn.close()
+
+    saida = {
+        'usuarios': args.usuarios,
+        'duracao_s': args.duracao,
+        'conexoes_ao_banco': args.conexoes,
+        'threads_wsgi': args.threads,
+        'latencia_banco_ms': args.latencia_ms,
+        'nucleos': os.cpu_count(),
+        'modos': resultados,
+    }
+    if set(resultados) == {'wsgi', 'asgi'}:
+        wsgi, asgi = resultados['wsgi'], resultados['asgi']
+        saida['asgi_sobre_wsgi'] = {
+            'vazao': round(asgi['req_por_segundo'] / wsgi['req_por_segundo'], 2),
+            'p50': round(wsgi['latencia_ms']['p50'] / asgi['latencia_ms']['p50'], 2),
+            'p99': round(wsgi['latencia_ms']['p99'] / asgi['latencia_ms']['p99'], 2),
+        }
+    print(json.dumps(saida, indent=2))
+
+
+if __name__ == '__main__':
+    main()
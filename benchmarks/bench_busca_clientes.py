@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latência de /api/clientes/busca repetindo o que o atendente digita, tecla a tecla.
+
+Gera `--clientes` clientes com nomes e telefones brasileiros realistas
+(telefones em formatos variados, nomes com acento) e reproduz `--sequencias`
+digitações: cada sequência escolhe um cliente e manda uma requisição por
+tecla para o nome (às vezes com um erro de digitação) ou para os últimos
+dígitos / o começo do telefone. Mede a latência por requisição e, ao fim de
+cada sequência, se a busca acertou: para nomes, se veio alguém cujo nome
+começa com o que se queria digitar (há muitos homônimos); para telefones,
+se o próprio cliente veio entre os resultados.
+
+Uso:
+    python benchmarks/bench_busca_clientes.py --clientes 1000000 --sequencias 300
+"""
+
+import argparse
+import json
+import random
+import time
+import unicodedata
+
+import psycopg2.extras
+
+from comum import carregar_app, conectar, limpar_tabelas, percentis
+
+PRIMEIROS = [
+    'Ana', 'João', 'Maria', 'José', 'Antônio', 'Francisco', 'Carlos', 'Paulo', 'Pedro', 'Lucas',
+    'Luiz', 'Marcos', 'Luís', 'Gabriel', 'Rafael', 'Daniel', 'Marcelo', 'Bruno', 'Eduardo', 'Felipe',
+    'Raimundo', 'Rodrigo', 'Manoel', 'Mateus', 'André', 'Fernando', 'Fábio', 'Leonardo', 'Gustavo', 'Guilherme',
+    'Juliana', 'Márcia', 'Fernanda', 'Patrícia', 'Aline', 'Adriana', 'Sandra', 'Camila', 'Amanda', 'Bruna',
+    'Jéssica', 'Letícia', 'Júlia', 'Luciana', 'Vanessa', 'Mariana', 'Gabriela', 'Vera', 'Vitória', 'Larissa',
+    'Cláudia', 'Beatriz', 'Luana', 'Rita', 'Sônia', 'Renata', 'Eliane', 'Josefa', 'Simone', 'Natália',
+]
+SOBRENOMES = [
+    'Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima', 'Gomes',
+    'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes', 'Soares', 'Fernandes', 'Vieira', 'Barbosa',
+    'Rocha', 'Dias', 'Nascimento', 'Andrade', 'Moreira', 'Nunes', 'Marques', 'Machado', 'Mendes', 'Freitas',
+    'Cardoso', 'Ramos', 'Gonçalves', 'Santana', 'Teixeira', 'Araújo', 'Pinto', 'Correia', 'Moura', 'Cavalcanti',
+    'Monteiro', 'Moraes', 'Batista', 'Campos', 'Farias', 'Nogueira', 'Cunha', 'Castro', 'Reis', 'Brito',
+]
+FORMATOS_TELEFONE = ['({ddd}) 9{a}-{b}', '{ddd}9{a}{b}', '{ddd} 9{a} {b}', '+55 {ddd} 9{a}-{b}']
+
+
+def gerar_clientes(rnd, quantidade):
+    for _ in range(quantidade):
+        nome = f'{rnd.choice(PRIMEIROS)} {rnd.choice(SOBRENOMES)} {rnd.choice(SOBRENOMES)}'
+        telefone = rnd.choice(FORMATOS_TELEFONE).format(
+            ddd=rnd.choice(['11', '21', '31', '41', '51', '61', '71', '81']),
+            a=f'{rnd.randrange(10000):04d}',
+            b=f'{rnd.randrange(10000):04d}',
+        )
+        yield nome, telefone
+
+
+def popular_clientes(conn, quantidade, semente):
+    rnd = random.Random(semente)
+    cursor = conn.cursor()
+    # O dicionário dos erros de digitação fica com as palavras deste teste, não
+    # com as que outros benchmarks deixaram ('Cliente 123'); o trigger o refaz
+    cursor.execute('TRUNCATE palavras_nomes')
+    psycopg2.extras.execute_values(
+        cursor,
+        'INSERT INTO clientes (nome, telefone) VALUES %s',
+        gerar_clientes(rnd, quantidade),
+        page_size=5000,
+    )
+    cursor.execute('UPDATE clientes SET pontos_totais = (random() * 1000)::int')
+    conn.commit()
+    cursor.execute('ANALYZE clientes')
+    conn.commit()
+
+
+def sem_acento(texto):
+    return ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn')
+
+
+def com_erro(rnd, texto):
+    """Troca duas letras vizinhas (erro de digitação comum)"""
+    if len(texto) < 4:
+        return texto
+    i = rnd.randrange(1, len(texto) - 2)
+    return texto[:i] + texto[i + 1] + texto[i] + texto[i + 2:]
+
+
+def sequencias_digitacao(rnd, clientes, quantidade):
+    """Lista de (tipo, cliente_id, esperado, [termos digitados tecla a tecla])"""
+    sequencias = []
+    for _ in range(quantidade):
+        cliente_id, nome, telefone = rnd.choice(clientes)
+        digitos = ''.join(c for c in telefone if c.isdigit())
+        sorteio = rnd.random()
+        if sorteio < 0.5:
+            # Primeiro nome e começo do sobrenome, às vezes sem acento, às vezes com erro
+            alvo = nome if rnd.random() < 0.5 else sem_acento(nome)
+            alvo = alvo[:len(alvo.split()[0]) + 4].lower()
+            esperado = sem_acento(alvo)
+            if rnd.random() < 0.2:
+                alvo = com_erro(rnd, alvo)
+            tipo = 'nome'
+        elif sorteio < 0.8:
+            alvo = digitos[-rnd.choice([4, 5, 6]):]
+            esperado, tipo = None, 'telefone'
+        else:
+            alvo = digitos[:rnd.choice([6, 8, 10])]
+            esperado, tipo = None, 'telefone'
+        sequencias.append((tipo, cliente_id, esperado, [alvo[:i] for i in range(1, len(alvo) + 1)]))
+    return sequencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clientes', type=int, default=1000000)
+    parser.add_argument('--sequencias', type=int, default=300)
+    parser.add_argument('--limite', type=int, default=10)
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--reusar', action='store_true', help='não recria os clientes')
+    args = parser.parse_args()
+
+    app_module = carregar_app()
+    client = app_module.app.test_client()
+    conn = conectar()
+    if not args.reusar:
+        limpar_tabelas(conn)
+        popular_clientes(conn, args.clientes, args.semente)
+
+    cursor = conn.cursor()
+    cursor.execute('SELECT id, nome, telefone FROM clientes ORDER BY random() LIMIT 5000')
+    amostra = cursor.fetchall()
+    cursor.execute('SELECT COUNT(*) FROM clientes')
+    total_clientes = cursor.fetchone()[0]
+    conn.commit()
+    conn.close()
+
+    rnd = random.Random(args.semente)
+    por_tipo = {'nome': [], 'telefone': []}
+    acertos = {'nome': 0, 'telefone': 0}
+    sequencias = {'nome': 0, 'telefone': 0}
+    inicio = time.perf_counter()
+    for tipo, cliente_id, esperado, teclas in sequencias_digitacao(rnd, amostra, args.sequencias):
+        sequencias[tipo] += 1
+        resultados = []
+        for termo in teclas:
+            t0 = time.perf_counter()
+            resp = client.get('/api/clientes/busca', query_string={'q': termo, 'limite': args.limite})
+            por_tipo[tipo].append((time.perf_counter() - t0) * 1000)
+            assert resp.status_code == 200, resp.get_data(as_text=True)
+            resultados = resp.get_json()
+        if tipo == 'nome':
+            acertou = any(sem_acento(c['nome']).lower().startswith(esperado) for c in resultados)
+        else:
+            acertou = any(c['id'] == cliente_id for c in resultados)
+        acertos[tipo] += acertou
+    duracao = time.perf_counter() - inicio
+
+    todas = por_tipo['nome'] + por_tipo['telefone']
+    print(json.dumps({
+        'clientes': total_clientes,
+        'requisicoes': len(todas),
+        'req_por_segundo': round(len(todas) / duracao, 1),
+        'latencia_ms': percentis(todas),
+        'latencia_nome_ms': percentis(por_tipo['nome']),
+        'latencia_telefone_ms': percentis(por_tipo['telefone']),
+        # Telefone pelos 4 últimos dígitos: ~100 clientes por final em 1M, nem sempre no top N
+        'acertos': {tipo: f'{acertos[tipo]}/{sequencias[tipo]}' for tipo in acertos},
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark: tamanho e latência de /api/clientes com a tabela inteira (antes) e paginada por cursor (depois).
+
+Para cada tamanho em `--tamanhos`, recria a tabela clientes com saldos,
+níveis e última visita aleatórios e mede:
+  - lista_completa: a consulta antiga (todos os clientes) serializada em JSON;
+  - primeira_pagina / pagina_do_meio: páginas por cursor (a do meio começa
+    no cliente da posição N/2, o pior caso para OFFSET);
+  - filtro_nivel / filtro_visita: primeira página com filtros;
+  - total_exato: a mesma primeira página pedindo COUNT(*) em vez da estimativa.
+
+Uso:
+    python benchmarks/bench_clientes_paginacao.py --tamanhos 10000,100000,1000000
+"""
+
+import argparse
+import json
+import time
+from datetime import date, timedelta
+
+from comum import carregar_app, conectar, limpar_tabelas, percentis
+
+
+def popular_clientes(conn, quantidade):
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO clientes (nome, telefone, email, pontos_totais, nivel, ultima_visita)
+        SELECT 'Cliente ' || i, '1199' || lpad(i::text, 7, '0'), 'cliente' || i || '@exemplo.com',
+               pontos,
+               CASE WHEN pontos >= 500 THEN 'verde' WHEN pontos >= 200 THEN 'amarelo' ELSE 'vermelho' END,
+               NOW() - random() * interval '180 days'
+        FROM (SELECT i, (random() * 1000)::int AS pontos FROM generate_series(1, %s) AS i) g
+    ''', (quantidade,))
+    conn.commit()
+    cursor.execute('ANALYZE clientes')
+    conn.commit()
+
+
+def medir(client, url, repeticoes):
+    latencias = []
+    tamanho = 0
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resp = client.get(url)
+        dados = resp.get_data()
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        assert resp.status_code == 200, dados[:200]
+        tamanho = len(dados)
+    return {'bytes': tamanho, 'latencia_ms': percentis(latencias)}
+
+
+def medir_lista_completa(app_module, conn, repeticoes):
+    """A consulta e a serialização do /api/clientes original"""
+    latencias = []
+    tamanho = 0
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        cursor = app_module.dict_cursor(conn)
+        cursor.execute('''
+            SELECT id, nome, telefone, email, pontos_totais, nivel,
+                   data_cadastro, ultima_visita
+            FROM clientes
+            ORDER BY pontos_totais DESC
+        ''')
+        clientes = [dict(row) for row in cursor.fetchall()]
+        dados = app_module.app.json.dumps(clientes).encode()
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        tamanho = len(dados)
+        conn.commit()
+    return {'bytes': tamanho, 'latencia_ms': percentis(latencias)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tamanhos', default='10000,100000,1000000')
+    parser.add_argument('--repeticoes', type=int, default=50, help='requisições por cenário paginado')
+    parser.add_argument('--repeticoes-completa', type=int, default=3, help='execuções da lista completa')
+    args = parser.parse_args()
+
+    app_module = carregar_app()
+    client = app_module.app.test_client()
+    conn = conectar()
+
+    resultados = []
+    for tamanho in [int(t) for t in args.tamanhos.split(',')]:
+        limpar_tabelas(conn)
+        popular_clientes(conn, tamanho)
+
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT pontos_totais, id FROM clientes
+            ORDER BY pontos_totais DESC, id DESC
+            OFFSET %s LIMIT 1
+        ''', (tamanho // 2,))
+        meio = app_module.codificar_cursor(*cursor.fetchone())
+        conn.commit()
+        visita_de = (date.today() - timedelta(days=30)).isoformat()
+
+        resultados.append({
+            'clientes': tamanho,
+            'lista_completa': medir_lista_completa(app_module, conn, args.repeticoes_completa),
+            'primeira_pagina': medir(client, '/api/clientes', args.repeticoes),
+            'pagina_do_meio': medir(client, f'/api/clientes?cursor={meio}', args.repeticoes),
+            'filtro_nivel': medir(client, '/api/clientes?nivel=amarelo', args.repeticoes),
+            'filtro_visita': medir(client, f'/api/clientes?visita_de={visita_de}', args.repeticoes),
+            'total_exato': medir(client, '/api/clientes?total=exato', args.repeticoes),
+        })
+
+    conn.close()
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark: custo da varredura de expiração conforme pontuacoes cresce.
+
+Gera `--clientes` clientes com `--lotes` lançamentos cada; uma fração deles
+(`--vencidos`) recebe um lote que vence em 1 segundo. Depois mede a busca
+dos candidatos (deve usar idx_clientes_proxima_expiracao) e a varredura.
+
+Uso:
+    python benchmarks/bench_expiracao.py --clientes 100000 --lotes 20 --vencidos 0.05
+"""
+
+import argparse
+import json
+import time
+
+from comum import carregar_app, conectar, limpar_tabelas, criar_clientes
+from expiracao import executar_varredura
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clientes', type=int, default=100000)
+    parser.add_argument('--lotes', type=int, default=20, help='lançamentos por cliente')
+    parser.add_argument('--vencidos', type=float, default=0.05, help='fração de clientes com lote vencendo')
+    parser.add_argument('--tamanho-lote', type=int, default=500)
+    parser.add_argument('--verificar', action='store_true', help='confere os saldos com o extrato no final')
+    args = parser.parse_args()
+
+    carregar_app()
+    conn = conectar()
+    limpar_tabelas(conn)
+    criar_clientes(conn, args.clientes)
+    cursor = conn.cursor()
+
+    inicio = time.perf_counter()
+    cursor.execute('''
+        INSERT INTO pontuacoes (cliente_id, pontos, tipo, data, data_validade)
+        SELECT c.id, 10, 'consumo', NOW() - (l || ' days')::interval,
+               NOW() + ((90 - l) || ' days')::interval
+        FROM clientes c, generate_series(1, %s) AS l
+    ''', (args.lotes,))
+    cursor.execute('''
+        INSERT INTO pontuacoes (cliente_id, pontos, tipo, data_validade)
+        SELECT id, 5, 'consumo', NOW() + interval '1 second'
+        FROM clientes
+        WHERE random() < %s
+    ''', (args.vencidos,))
+    conn.commit()
+    cursor.execute('ANALYZE clientes')
+    cursor.execute('ANALYZE pontuacoes')
+    conn.commit()
+    carga_s = time.perf_counter() - inicio
+    time.sleep(1.5)
+
+    cursor.execute('SELECT COUNT(*) FROM pontuacoes')
+    total_lotes = cursor.fetchone()[0]
+    cursor.execute('''
+        EXPLAIN SELECT id FROM clientes
+        WHERE proxima_expiracao <= NOW()
+        ORDER BY proxima_expiracao
+        LIMIT %s
+    ''', (args.tamanho_lote,))
+    plano = [linha[0] for linha in cursor.fetchall()]
+    conn.commit()
+
+    resumo = executar_varredura(conn, args.tamanho_lote)
+    segunda = executar_varredura(conn, args.tamanho_lote)
+
+    resultado = {
+        'clientes': args.clientes,
+        'linhas_pontuacoes': total_lotes,
+        'carga_s': round(carga_s, 2),
+        'plano_candidatos': plano,
+        'varredura': resumo,
+        'varredura_sem_pendencias': segunda,
+    }
+    if args.verificar:
+        cursor.execute('SELECT COUNT(*) FROM verificar_saldos()')
+        resultado['divergencias'] = cursor.fetchone()[0]
+        conn.commit()
+
+    conn.close()
+    print(json.dumps(resultado, indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main()
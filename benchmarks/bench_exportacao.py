@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Benchmark: exportação de uma tabela pontuacoes de milhões de linhas (exportacao.py), tempo e memória (RSS).
+
+Cria `--clientes` clientes e `--linhas` pontuações (algumas descrições com
+tab, quebra de linha, barra invertida, aspas e acentos) e, para cada modo,
+sobe um processo novo (o pico de RSS de um não contamina o outro):
+  - fetchall: o export_to_csv.py antigo, tabela inteira em memória e csv.writer (num .csv.gz);
+  - copy_csv / copy_ndjson: exportacao.exportar_tabela, COPY TO STDOUT direto para o .gz;
+  - http_csv / http_ndjson: GET /api/admin/exportar/pontuacoes?gzip=1 pelo test_client, consumido em streaming;
+  - tabelas_1 / tabelas_3: todas as tabelas (exportar_tabelas) com 1 e 3 em paralelo.
+Confere os arquivos (linhas, JSON válido, descrições especiais idênticas) e
+mostra linhas/s, bytes e o pico de RSS de cada modo. Usa o banco local dos benchmarks.
+
+Uso:
+    python benchmarks/bench_exportacao.py --linhas 3000000
+"""
+
+import argparse
+import csv
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_streaming_memoria import AmostradorRSS, rss_mb
+from comum import BENCH_DATABASE_URL, carregar_app, conectar, criar_clientes, limpar_tabelas
+
+ESPECIAIS = ['tab\tno meio', 'quebra\nde linha', 'barra \\ invertida \\N', 'aspas "duplas", vírgula', 'pão ♥ 🍺']
+
+
+def popular(conn, clientes, linhas):
+    ids = criar_clientes(conn, clientes)
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO pontuacoes (cliente_id, pontos, tipo, descricao, data, data_validade)
+        SELECT %s + (i %% %s), 1 + (i %% 50), 'consumo',
+               CASE WHEN i <= %s THEN (%s::TEXT[])[i] ELSE 'Comanda #' || i END,
+               NOW() - (i %% 200000) * interval '1 minute', NOW() + interval '90 days'
+        FROM generate_series(1, %s) AS i
+    ''', (ids[0], clientes, len(ESPECIAIS), ESPECIAIS, linhas))
+    conn.commit()
+    cursor.execute('ANALYZE pontuacoes')
+    conn.commit()
+
+
+def exportar_fetchall(diretorio):
+    """O export_to_csv.py antigo, trocando o SQLite pelo PostgreSQL"""
+    conn = conectar()
+    cursor = conn.cursor()
+    colunas = ['id', 'cliente_id', 'pontos', 'tipo', 'descricao', 'data', 'data_validade']
+    cursor.execute(f'SELECT {", ".join(colunas)} FROM pontuacoes')
+    dados = cursor.fetchall()
+    caminho = os.path.join(diretorio, 'pontuacoes.csv.gz')
+    with gzip.open(caminho, 'wt', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(colunas)
+        writer.writerows(dados)
+    conn.close()
+    return {'linhas': len(dados), 'bytes': os.path.getsize(caminho), 'arquivo': caminho}
+
+
+def exportar_copy(diretorio, formato):
+    import exportacao
+    conn = conectar()
+    conn.set_session(readonly=True)
+    resultado = exportacao.exportar_tabela(conn, 'pontuacoes', formato, diretorio)
+    conn.close()
+    return resultado
+
+
+def exportar_http(app_module, diretorio, formato):
+    client = app_module.app.test_client()
+    with client.session_transaction() as sessao:
+        sessao['admin'] = True
+    resp = client.get(f'/api/admin/exportar/pontuacoes?formato={formato}&gzip=1', buffered=False)
+    assert resp.status_code == 200, resp.status_code
+    caminho = os.path.join(diretorio, f'pontuacoes.{formato}.gz')
+    with open(caminho, 'wb') as f:
+        for pedaco in resp.response:
+            f.write(pedaco)
+    resp.close()
+
+    # Só o começo de clientes: o cabeçalho não pode ter senha, e largar o
+    # download no meio tem que devolver o pool como estava
+    clientes = client.get('/api/admin/exportar/clientes', buffered=False)
+    cabecalho = next(iter(clientes.response)).split(b'\n', 1)[0].decode()
+    clientes.close()
+    pool = app_module.get_pool()
+    time.sleep(0.3)
+    return {'bytes': os.path.getsize(caminho), 'arquivo': caminho,
+            'content_disposition': resp.headers['Content-Disposition'],
+            'senha_no_cabecalho_clientes': 'senha' in cabecalho,
+            'pool_em_uso_depois': pool.estatisticas()['em_uso']}
+
+
+def conferir(caminho, formato):
+    """Linhas de dados, colunas presentes e as descrições especiais lidas de volta"""
+    especiais = set()
+    linhas = 0
+    colunas = None
+    with gzip.open(caminho, 'rt', newline='', encoding='utf-8') as f:
+        if formato == 'csv':
+            leitor = csv.reader(f)
+            colunas = next(leitor)
+            for linha in leitor:
+                linhas += 1
+                if linha[colunas.index('descricao')] in ESPECIAIS:
+                    especiais.add(linha[colunas.index('descricao')])
+        else:
+            for texto in f:
+                linhas += 1
+                if '#' in texto and linhas > 1000:
+                    continue  # as comuns: só as 1000 primeiras passam pelo json.loads
+                objeto = json.loads(texto)
+                colunas = colunas or list(objeto)
+                if objeto['descricao'] in ESPECIAIS:
+                    especiais.add(objeto['descricao'])
+    return {'linhas': linhas, 'colunas': colunas, 'especiais_identicas': len(especiais) == len(ESPECIAIS)}
+
+
+def filho(modo):
+    app_module = carregar_app() if modo.startswith('http') else None
+    diretorio = tempfile.mkdtemp(prefix='bench_exportacao_')
+    rss_antes = rss_mb()
+    amostrador = AmostradorRSS()
+    amostrador.start()
+    inicio = time.perf_counter()
+    if modo == 'fetchall':
+        resultado = exportar_fetchall(diretorio)
+    elif modo.startswith('copy_'):
+        resultado = exportar_copy(diretorio, modo.split('_')[1])
+    elif modo.startswith('http_'):
+        resultado = exportar_http(app_module, diretorio, modo.split('_')[1])
+    else:
+        import exportacao
+        resultado = exportacao.exportar_tabelas(BENCH_DATABASE_URL, exportacao.TABELAS, 'csv', diretorio,
+                                                paralelo=int(modo.split('_')[1]))
+        resultado = {'linhas': sum(r['linhas'] for r in resultado.values()),
+                     'bytes': sum(r['bytes'] for r in resultado.values())}
+    duracao = time.perf_counter() - inicio
+    amostrador.parar()
+
+    if 'arquivo' in resultado:
+        formato = 'csv' if modo == 'fetchall' else modo.split('_')[1]
+        resultado['conferencia'] = conferir(resultado.pop('arquivo'), formato)
+        resultado.setdefault('linhas', resultado['conferencia']['linhas'])
+    print(json.dumps({
+        'modo': modo,
+        **resultado,
+        'segundos': round(duracao, 2),
+        'linhas_por_segundo': round(resultado['linhas'] / duracao),
+        'rss_antes_mb': round(rss_antes, 1),
+        'rss_pico_mb': round(max(amostrador.amostras), 1),
+    }, default=str))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clientes', type=int, default=10000)
+    parser.add_argument('--linhas', type=int, default=3000000)
+    parser.add_argument('--modos', default='fetchall,copy_csv,copy_ndjson,http_csv,http_ndjson,tabelas_1,tabelas_3')
+    parser.add_argument('--reusar', action='store_true', help='não recria os dados')
+    parser.add_argument('--filho', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho:
+        filho(args.filho)
+        return
+
+    carregar_app()
+    if not args.reusar:
+        conn = conectar()
+        limpar_tabelas(conn)
+        popular(conn, args.clientes, args.linhas)
+        conn.close()
+
+    resultados = []
+    for modo in args.modos.split(','):
+        saida = subprocess.run([sys.executable, os.path.abspath(__file__), '--filho', modo],
+                               capture_output=True, text=True, check=True).stdout
+        resultados.append(json.loads(saida.strip().splitlines()[-1]))
+    print(json.dumps({'linhas': args.linhas, 'resultados': resultados}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark: GET condicional (ETag / 304) de configurações, produtos, ranking e estatísticas.
+
+Com `--clientes` clientes (saldos sorteados, extrato em pontuacoes) e alguns
+produtos, mede para cada endpoint `--repeticoes` vezes:
+  - completo: GET sem validador (o que toda página fazia);
+  - revalidacao: GET com If-None-Match da resposta anterior (304);
+com latência, bytes do corpo e quantas vezes uma conexão foi tirada do pool
+(0 no 304: responde só com as versões em cache). Depois lança pontos,
+cadastra um produto e muda as configurações e confere que a revalidação
+seguinte devolve 200 com o conteúdo novo.
+
+Uso:
+    python benchmarks/bench_get_condicional.py --clientes 100000 --repeticoes 300
+"""
+
+import argparse
+import json
+import time
+
+from comum import carregar_app, conectar, criar_clientes, limpar_tabelas, percentis
+
+ENDPOINTS = ['/api/configuracoes', '/api/produtos?ativos=true', '/api/ranking', '/api/estatisticas']
+
+
+def popular(conn, clientes):
+    criar_clientes(conn, clientes)
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO pontuacoes (cliente_id, pontos, tipo, descricao, data_validade)
+        SELECT id, 1 + (random() * 400)::int, 'consumo', 'Carga', NOW() + INTERVAL '90 days'
+        FROM clientes
+    ''')
+    cursor.execute('''
+        INSERT INTO produtos (nome, descricao, pontos)
+        SELECT 'Produto ' || i, 'Descrição ' || i, 5 * i FROM generate_series(1, 40) AS i
+    ''')
+    conn.commit()
+    cursor.execute('ANALYZE')
+    conn.commit()
+
+
+class ContadorConexoes:
+    """Conta as conexões retiradas do pool pelo app"""
+
+    def __init__(self, pool):
+        self.total = 0
+        self._getconn = pool.getconn
+        pool.getconn = self.getconn
+
+    def getconn(self, *args, **kwargs):
+        self.total += 1
+        return self._getconn(*args, **kwargs)
+
+
+def medir(client, contador, url, repeticoes, etag=None):
+    headers = {'If-None-Match': etag} if etag else {}
+    latencias = []
+    bytes_corpo = 0
+    status = set()
+    conexoes_antes = contador.total
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resp = client.get(url, headers=headers)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        bytes_corpo += len(resp.data)
+        status.add(resp.status_code)
+    return {
+        'status': sorted(status),
+        'bytes_por_resposta': bytes_corpo // repeticoes,
+        'conexoes_por_resposta': round((contador.total - conexoes_antes) / repeticoes, 3),
+        'ms': percentis(latencias),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clientes', type=int, default=100000)
+    parser.add_argument('--repeticoes', type=int, default=300)
+    args = parser.parse_args()
+
+    app_module = carregar_app()
+    conn = conectar()
+    limpar_tabelas(conn)
+    popular(conn, args.clientes)
+    conn.close()
+
+    contador = ContadorConexoes(app_module.get_pool())
+    admin = app_module.app.test_client()
+    with admin.session_transaction() as sessao:
+        sessao['admin'] = True
+
+    resultados = {}
+    etags = {}
+    for url in ENDPOINTS:
+        etags[url] = admin.get(url).headers['ETag']
+        resultados[url] = {
+            'completo': medir(admin, contador, url, args.repeticoes),
+            'revalidacao': medir(admin, contador, url, args.repeticoes, etags[url]),
+        }
+
+    # Escritas: a próxima revalidação tem que trazer o conteúdo novo (as
+    # estatísticas, depois de ESTATISTICAS_CACHE_TTL: lançar pontos não gera versão)
+    pontos_antes = admin.get('/api/estatisticas').get_json()['pontos_distribuidos']
+    admin.post('/api/pontuacao', json={'cliente_id': 1, 'pontos': 100000})
+    admin.post('/api/produtos', json={'nome': 'Produto novo', 'pontos': 7})
+    config = admin.get('/api/configuracoes').get_json()
+    admin.put('/api/admin/configuracoes', json={**config, 'nome_bar': config['nome_bar'] + ' (editado)'})
+
+    time.sleep(app_module.ESTATISTICAS_CACHE_TTL)
+    depois = {url: admin.get(url, headers={'If-None-Match': etags[url]}) for url in ENDPOINTS}
+    conferencia = {
+        'ranking_com_lancamento': depois['/api/ranking'].status_code == 200
+        and depois['/api/ranking'].get_json()[0]['id'] == 1,
+        'estatisticas_novas': depois['/api/estatisticas'].status_code == 200
+        and depois['/api/estatisticas'].get_json()['pontos_distribuidos'] == pontos_antes + 100000,
+        'produto_novo': depois['/api/produtos?ativos=true'].status_code == 200
+        and any(p['nome'] == 'Produto novo' for p in depois['/api/produtos?ativos=true'].get_json()),
+        'configuracoes_novas': depois['/api/configuracoes'].status_code == 200
+        and depois['/api/configuracoes'].get_json()['nome_bar'].endswith('(editado)'),
+    }
+    admin.put('/api/admin/configuracoes', json=config)
+
+    print(json.dumps({'clientes': args.clientes, 'endpoints': resultados, 'conferencia': conferencia}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark: custo da instrumentação por requisição (instrumentacao.py) por consulta e por requisição.
+
+  - por consulta: `--consultas` SELECT 1 numa conexão psycopg2 comum, numa
+    ConexaoMedida sem medição ativa (threads de fundo) e numa com medição;
+  - por requisição: `--requisicoes` GET /api/configuracoes (resposta do
+    cache, sem banco: sobra só o custo fixo) e GET /api/cliente/perfil pelo
+    test_client, com INSTRUMENTACAO desligada e ligada.
+Mostra a mediana de `--repeticoes` rodadas em microssegundos. Usa o banco
+local dos benchmarks; cria um cliente de teste.
+
+Uso:
+    python benchmarks/bench_instrumentacao.py --consultas 5000 --requisicoes 2000
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+import psycopg2
+
+from comum import BENCH_DATABASE_URL, carregar_app, conectar, criar_clientes, limpar_tabelas
+import instrumentacao
+
+
+def mediana_us(funcao, quantidade, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        for _ in range(quantidade):
+            funcao()
+        tempos.append((time.perf_counter() - inicio) * 1e6 / quantidade)
+    return round(statistics.median(tempos), 2)
+
+
+def por_consulta(quantidade, repeticoes):
+    resultado = {}
+    for nome, fabrica, medir in [('psycopg2', None, False), ('medida_sem_requisicao', instrumentacao.ConexaoMedida, False),
+                                 ('medida_em_requisicao', instrumentacao.ConexaoMedida, True)]:
+        conn = psycopg2.connect(BENCH_DATABASE_URL, connection_factory=fabrica)
+        conn.autocommit = True
+        cursor = conn.cursor()
+
+        def consulta():
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+
+        if medir:
+            instrumentacao.iniciar()
+        resultado[nome] = mediana_us(consulta, quantidade, repeticoes)
+        instrumentacao.encerrar()
+        conn.close()
+    resultado['custo_us'] = round(resultado['medida_em_requisicao'] - resultado['psycopg2'], 2)
+    return resultado
+
+
+def por_requisicao(app_module, cliente_id, quantidade, repeticoes):
+    client = app_module.app.test_client()
+    with client.session_transaction() as sessao:
+        sessao['cliente_id'] = cliente_id
+    resultado = {}
+    for rota in ['/api/configuracoes', '/api/cliente/perfil']:
+        def pedir():
+            resposta = client.get(rota)
+            resposta.close()
+
+        pedir()
+        # Alterna desligada/ligada a cada rodada: a máquina varia mais que o custo medido
+        tempos = {'desligada': [], 'ligada': []}
+        for _ in range(repeticoes):
+            for nome, ligada in (('desligada', False), ('ligada', True)):
+                app_module.INSTRUMENTACAO = ligada
+                tempos[nome].append(mediana_us(pedir, quantidade, 1))
+        medidas = {nome: round(statistics.median(valores), 2) for nome, valores in tempos.items()}
+        medidas['custo_us'] = round(medidas['ligada'] - medidas['desligada'], 2)
+        resultado[rota] = medidas
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--consultas', type=int, default=5000)
+    parser.add_argument('--requisicoes', type=int, default=2000)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    app_module = carregar_app()
+    # O log de lentas fica de fora: aqui só interessa o custo de medir
+    app_module.REQUISICAO_LENTA_MS = 0
+    conn = conectar()
+    limpar_tabelas(conn)
+    cliente_id = criar_clientes(conn, 1)[0]
+    conn.close()
+
+    print(json.dumps({
+        'por_consulta_us': por_consulta(args.consultas, args.repeticoes),
+        'por_requisicao_us': por_requisicao(app_module, cliente_id, args.requisicoes, args.repeticoes),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark: custo das métricas (metricas.py) no caminho da requisição e na coleta.
+
+Mede em microssegundos (mediana de `--repeticoes` rodadas):
+  - registrar_requisicao: o que cada requisição soma ao terminar (histograma
+    de latência e contadores do banco por rota);
+  - observar_consulta: o que cada ida ao banco soma (histograma de consultas);
+  - incrementar: um contador do negócio;
+  - o mesmo registrar_requisicao com `--threads` threads ao mesmo tempo (sem
+    trava: cada thread escreve na sua fatia);
+  - a coleta (GET /metrics sem o HTTP) com `--rotas` rotas × 5 status.
+Não usa o banco.
+
+Uso:
+    python benchmarks/bench_metricas.py --chamadas 100000 --threads 8
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+
+import comum  # noqa: F401 (põe a raiz do projeto no sys.path)
+import instrumentacao
+import metricas
+
+
+def mediana_us(funcao, quantidade, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        for _ in range(quantidade):
+            funcao()
+        tempos.append((time.perf_counter() - inicio) * 1e6 / quantidade)
+    return round(statistics.median(tempos), 3)
+
+
+def em_threads(funcao, quantidade, threads, repeticoes):
+    """Microssegundos por chamada, somando as chamadas de todas as threads"""
+    tempos = []
+    for _ in range(repeticoes):
+        grupo = [threading.Thread(target=lambda: [funcao() for _ in range(quantidade)]) for _ in range(threads)]
+        inicio = time.perf_counter()
+        for thread in grupo:
+            thread.start()
+        for thread in grupo:
+            thread.join()
+        tempos.append((time.perf_counter() - inicio) * 1e6 / (quantidade * threads))
+    return round(statistics.median(tempos), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--chamadas', type=int, default=100000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--rotas', type=int, default=60)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    medicao = instrumentacao.Medicao()
+    medicao.registrar('SELECT 1', 0.0012)
+
+    def requisicao():
+        metricas.registrar_requisicao('/api/cliente/perfil', 'GET', 200, 0.0123, medicao)
+
+    def consulta():
+        metricas.CONSULTAS.observar(0.0007)
+
+    def negocio():
+        metricas.CHECKINS.incrementar()
+
+    resultado = {
+        'registrar_requisicao_us': mediana_us(requisicao, args.chamadas, args.repeticoes),
+        'observar_consulta_us': mediana_us(consulta, args.chamadas, args.repeticoes),
+        'incrementar_us': mediana_us(negocio, args.chamadas, args.repeticoes),
+        f'registrar_requisicao_{args.threads}_threads_us': em_threads(
+            requisicao, args.chamadas // args.threads, args.threads, args.repeticoes),
+    }
+
+    for i in range(args.rotas):
+        for status in (200, 201, 304, 400, 500):
+            metricas.registrar_requisicao(f'/api/rota{i}', 'GET', status, 0.01, medicao)
+    texto = metricas.texto()
+    resultado['coleta'] = {
+        'series': args.rotas * 5,
+        'bytes': len(texto),
+        'ms': round(mediana_us(metricas.texto, 1, args.repeticoes * 4) / 1000, 2),
+    }
+    print(json.dumps(resultado, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark: partida fria do app como função serverless (api/index.py), do processo novo à primeira resposta.
+
+Simula o cliente que lê o QR code na porta numa instância recém-criada: um
+processo Python novo importa o app e atende, pelo WSGI, GET /cliente (a
+página), GET /api/cliente/perfil (primeira ida ao banco) e de novo o perfil
+(invocação quente, mesma instância). O banco fica atrás de um proxy com
+`--atraso-ms` em cada sentido, como o Supabase visto da Vercel (abrir uma
+conexão custa várias idas e voltas). Compara:
+  - servidor: SERVERLESS=0 (o comportamento de antes na Vercel: .env, log em
+    fila com thread de saída, ouvinte de avisos, conexão aberta só na
+    primeira consulta);
+  - serverless: SERVERLESS=1 via api/index.py (conexão aberta em segundo
+    plano durante a importação, sem ouvinte, log direto).
+Mostra a mediana de `--repeticoes` processos por modo (alternados) em ms:
+interpretador até o import, import do app, cada requisição, do processo
+novo até a resposta do perfil, e as conexões que a instância abriu. Usa o
+banco local dos benchmarks; cria um cliente de teste.
+
+Uso:
+    python benchmarks/bench_partida_fria.py --repeticoes 10 --atraso-ms 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import psycopg2.extensions
+
+from comum import BENCH_DATABASE_URL, RAIZ, carregar_app, conectar, criar_clientes, limpar_tabelas
+from proxy_latencia import ProxyLatencia
+
+
+def filho(modo, cliente_id, lancado_em):
+    inicio = time.time()
+    marcas = {'interpretador_ms': (inicio - lancado_em) * 1000}
+    antes = time.perf_counter()
+    if modo == 'serverless':
+        sys.path.insert(0, os.path.join(RAIZ, 'api'))
+        from index import app
+    else:
+        from app import app
+    marcas['import_ms'] = (time.perf_counter() - antes) * 1000
+
+    client = app.test_client()
+    with client.session_transaction() as sessao:
+        sessao['cliente_id'] = cliente_id
+    for nome, rota in (('pagina_ms', '/cliente'), ('primeira_consulta_ms', '/api/cliente/perfil'),
+                       ('quente_ms', '/api/cliente/perfil')):
+        antes = time.perf_counter()
+        resposta = client.get(rota)
+        assert resposta.status_code == 200, (rota, resposta.status_code)
+        marcas[nome] = (time.perf_counter() - antes) * 1000
+        if nome == 'primeira_consulta_ms':
+            marcas['processo_ate_perfil_ms'] = (time.time() - lancado_em) * 1000
+
+    import app as app_module
+    marcas['conexoes_abertas'] = app_module.get_pool().estatisticas()['conexoes_abertas'] + (
+        1 if app_module.ouvinte is not None else 0)
+    print(json.dumps(marcas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeticoes', type=int, default=10)
+    parser.add_argument('--atraso-ms', type=float, default=10.0)
+    parser.add_argument('--modos', default='servidor,serverless')
+    parser.add_argument('--filho', help=argparse.SUPPRESS)
+    parser.add_argument('--cliente-id', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--lancado-em', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho:
+        filho(args.filho, args.cliente_id, args.lancado_em)
+        return
+
+    carregar_app()
+    conn = conectar()
+    limpar_tabelas(conn)
+    cliente_id = criar_clientes(conn, 1)[0]
+    conn.close()
+
+    proxy = ProxyLatencia(BENCH_DATABASE_URL, args.atraso_ms)
+    # Em URL, como POSTGRES_URL (o app só acrescenta o sslmode em URLs)
+    params = psycopg2.extensions.parse_dsn(proxy.dsn)
+    url = f"postgresql://{params['user']}@127.0.0.1:{proxy.porta}/{params['dbname']}?sslmode=disable"
+    ambiente = dict(os.environ, POSTGRES_URL=url, SECRET_KEY='bench-partida-fria', LOG_NIVEL='WARNING')
+    ambiente.pop('VERCEL', None)
+    modos = args.modos.split(',')
+    medidas = {modo: [] for modo in modos}
+    for _ in range(args.repeticoes):
+        for modo in modos:
+            ambiente['SERVERLESS'] = '1' if modo == 'serverless' else '0'
+            saida = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--filho', modo, '--cliente-id', str(cliente_id),
+                 '--lancado-em', repr(time.time())],
+                capture_output=True, text=True, check=True, env=ambiente, cwd=RAIZ,
+            ).stdout
+            medidas[modo].append(json.loads(saida.strip().splitlines()[-1]))
+
+    resultado = {}
+    for modo, execucoes in medidas.items():
+        resultado[modo] = {chave: round(statistics.median(e[chave] for e in execucoes), 1) for chave in execucoes[0]}
+    print(json.dumps({'atraso_ms': args.atraso_ms, 'repeticoes': args.repeticoes, 'mediana': resultado}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
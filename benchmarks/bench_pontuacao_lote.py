@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark: fechamento da noite com `--itens` lançamentos, um POST por cliente (antes) e um POST em lote (depois).
+
+Para cada modo recria os mesmos clientes e check-ins (parte deles com dias
+suficientes para bônus de frequência) e lança os mesmos itens, alguns
+repetidos para o mesmo cliente:
+  - individual: um POST /api/pontuacao por item;
+  - lote: um único POST /api/pontuacao/lote, depois `--repeticoes` lotes
+    extras para a distribuição de latência.
+Confere que os dois modos chegam aos mesmos saldos, níveis e extratos e que
+verificar_saldos() não acha divergência.
+
+Uso:
+    python benchmarks/bench_pontuacao_lote.py --itens 1000 --clientes 400
+"""
+
+import argparse
+import json
+import random
+import time
+
+from comum import carregar_app, conectar, criar_clientes, limpar_tabelas, percentis
+
+
+def preparar(conn, clientes, semente):
+    """Clientes e check-ins determinísticos; retorna os ids"""
+    ids = criar_clientes(conn, clientes)
+    rnd = random.Random(semente)
+    cursor = conn.cursor()
+    for cliente_id in ids:
+        dias = rnd.choice([0, 0, 3, 6, 12, 17, 22])
+        if dias:
+            cursor.execute('''
+                INSERT INTO checkins (cliente_id, data_checkin)
+                SELECT %s, NOW() - d * interval '1 day' FROM generate_series(1, %s) AS d
+            ''', (cliente_id, dias))
+    conn.commit()
+    return ids
+
+
+def gerar_itens(ids, quantidade, semente):
+    rnd = random.Random(semente)
+    frequentes = rnd.sample(ids, max(1, len(ids) // 10))
+    return [
+        {
+            'cliente_id': rnd.choice(frequentes if rnd.random() < 0.3 else ids),
+            'pontos': rnd.randint(1, 120),
+            'tipo': 'consumo',
+            'descricao': f'Comanda {i}',
+        }
+        for i in range(quantidade)
+    ]
+
+
+def estado(conn):
+    cursor = conn.cursor()
+    cursor.execute('SELECT id, pontos_totais, nivel FROM clientes ORDER BY id')
+    saldos = cursor.fetchall()
+    cursor.execute('''
+        SELECT cliente_id, tipo, pontos, descricao FROM pontuacoes
+        ORDER BY cliente_id, tipo, pontos, descricao
+    ''')
+    extrato = cursor.fetchall()
+    cursor.execute('SELECT COUNT(*) FROM verificar_saldos()')
+    divergentes = cursor.fetchone()[0]
+    conn.commit()
+    return saldos, extrato, divergentes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--itens', type=int, default=1000)
+    parser.add_argument('--clientes', type=int, default=400)
+    parser.add_argument('--repeticoes', type=int, default=10, help='lotes extras para a latência')
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    app_module = carregar_app()
+    client = app_module.app.test_client()
+    conn = conectar()
+
+    # Antes: um POST por item
+    limpar_tabelas(conn)
+    ids = preparar(conn, args.clientes, args.semente)
+    itens = gerar_itens(ids, args.itens, args.semente)
+    inicio = time.perf_counter()
+    for item in itens:
+        resp = client.post('/api/pontuacao', json=item)
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+    individual_s = time.perf_counter() - inicio
+    estado_individual = estado(conn)
+
+    # Depois: um POST com todos os itens
+    limpar_tabelas(conn)
+    ids = preparar(conn, args.clientes, args.semente)
+    inicio = time.perf_counter()
+    resp = client.post('/api/pontuacao/lote', json={'itens': itens})
+    lote_s = time.perf_counter() - inicio
+    corpo = resp.get_json()
+    assert resp.status_code == 200 and corpo['lancados'] == len(itens), corpo
+    estado_lote = estado(conn)
+
+    latencias = []
+    for _ in range(args.repeticoes):
+        inicio = time.perf_counter()
+        resp = client.post('/api/pontuacao/lote', json={'itens': itens})
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        assert resp.status_code == 200
+
+    conn.close()
+    print(json.dumps({
+        'itens': len(itens),
+        'clientes': args.clientes,
+        'individual': {'segundos': round(individual_s, 3), 'itens_por_segundo': round(len(itens) / individual_s, 1)},
+        'lote': {
+            'segundos': round(lote_s, 3),
+            'itens_por_segundo': round(len(itens) / lote_s, 1),
+            'reportado_pelo_servidor': {k: corpo[k] for k in ('duracao_ms', 'itens_por_segundo')},
+            'latencia_ms': percentis(latencias),
+        },
+        'mesmos_saldos': estado_individual[0] == estado_lote[0],
+        'mesmo_extrato': estado_individual[1] == estado_lote[1],
+        'divergencias_saldo': {'individual': estado_individual[2], 'lote': estado_lote[2]},
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latência por lançamento de pontos com atraso de rede artificial.
+
+Compara o fluxo antigo (INSERT, SUM, COUNT DISTINCT, INSERT/SUM do bônus,
+SELECT configuracoes, UPDATE, COMMIT — uma ida e volta cada) com a chamada
+única a registrar_pontos() em autocommit.
+
+Uso:
+    python benchmarks/bench_pontuacao_rtt.py --atraso-ms 10 --iteracoes 100
+"""
+
+import argparse
+import json
+import random
+import time
+
+import psycopg2
+import psycopg2.extras
+
+from comum import BENCH_DATABASE_URL, carregar_app, conectar, limpar_tabelas, criar_clientes, percentis
+from proxy_latencia import ProxyLatencia
+
+
+def fluxo_antigo(conn, cliente_id, pontos):
+    """Reproduz a sequência de instruções de adicionar_pontos() antes das funções no banco"""
+    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cursor.execute('''
+        INSERT INTO pontuacoes (cliente_id, pontos, tipo, descricao, data_validade)
+        VALUES (%s, %s, 'consumo', '', NOW() + INTERVAL '90 days')
+    ''', (cliente_id, pontos))
+
+    def saldo():
+        cursor.execute('''
+            SELECT SUM(pontos) as total FROM pontuacoes
+            WHERE cliente_id = %s AND (data_validade IS NULL OR data_validade > NOW())
+        ''', (cliente_id,))
+        return cursor.fetchone()['total'] or 0
+
+    def nivel(total):
+        cursor.execute('SELECT * FROM configuracoes LIMIT 1')
+        config = cursor.fetchone()
+        if total >= config['pontos_verde_min']:
+            return 'verde'
+        if total >= config['pontos_amarelo_min']:
+            return 'amarelo'
+        return 'vermelho'
+
+    pontos_validos = saldo()
+    cursor.execute('''
+        SELECT COUNT(DISTINCT DATE(data_checkin)) as dias_visitados FROM checkins
+        WHERE cliente_id = %s AND data_checkin >= NOW() - INTERVAL '30 days'
+    ''', (cliente_id,))
+    dias = cursor.fetchone()['dias_visitados'] or 0
+    bonus = 100 if dias >= 20 else 75 if dias >= 15 else 50 if dias >= 10 else 25 if dias >= 5 else 0
+    if bonus > 0:
+        cursor.execute('''
+            INSERT INTO pontuacoes (cliente_id, pontos, tipo, descricao, data_validade)
+            VALUES (%s, %s, 'frequencia', 'bônus', NOW() + INTERVAL '90 days')
+        ''', (cliente_id, bonus))
+        pontos_validos = saldo()
+    cursor.execute('''
+        UPDATE clientes SET pontos_totais = %s, nivel = %s, ultima_visita = NOW() WHERE id = %s
+    ''', (pontos_validos, nivel(pontos_validos), cliente_id))
+    conn.commit()
+    return pontos_validos, bonus, nivel(pontos_validos)
+
+
+def fluxo_funcao(conn, cliente_id, pontos):
+    """Chamada única à função registrar_pontos() em autocommit"""
+    conn.autocommit = True
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM registrar_pontos(%s, %s, %s, %s)',
+                       (cliente_id, pontos, 'consumo', ''))
+        return cursor.fetchone()
+    finally:
+        conn.autocommit = False
+
+
+def medir(nome, fluxo, proxy, cliente_ids, iteracoes):
+    conn = psycopg2.connect(proxy.dsn)
+    rnd = random.Random(42)
+    fluxo(conn, cliente_ids[0], 1)  # aquecimento
+    proxy.zerar_contador()
+    latencias = []
+    for _ in range(iteracoes):
+        inicio = time.perf_counter()
+        fluxo(conn, rnd.choice(cliente_ids), rnd.randint(5, 50))
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    mensagens = proxy.mensagens_cliente
+    conn.close()
+    return {
+        'fluxo': nome,
+        'latencia_ms': percentis(latencias),
+        'idas_e_voltas_por_lancamento': round(mensagens / iteracoes, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--atraso-ms', type=float, default=10.0, help='atraso em cada sentido')
+    parser.add_argument('--iteracoes', type=int, default=100)
+    parser.add_argument('--clientes', type=int, default=50)
+    args = parser.parse_args()
+
+    carregar_app()
+    conn = conectar()
+    limpar_tabelas(conn)
+    cliente_ids = criar_clientes(conn, args.clientes)
+    # Metade dos clientes com visitas suficientes para receber bônus de frequência
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO checkins (cliente_id, data_checkin)
+        SELECT c.id, NOW() - (d || ' days')::interval
+        FROM clientes c, generate_series(0, 11) AS d
+        WHERE c.id % 2 = 0
+    ''')
+    conn.commit()
+    conn.close()
+
+    proxy = ProxyLatencia(BENCH_DATABASE_URL, args.atraso_ms)
+    antigo = medir('antigo', fluxo_antigo, proxy, cliente_ids, args.iteracoes)
+    novo = medir('registrar_pontos', fluxo_funcao, proxy, cliente_ids, args.iteracoes)
+
+    print(json.dumps({
+        'rtt_ms': args.atraso_ms * 2,
+        'resultados': [antigo, novo],
+        'ganho_p50': round(antigo['latencia_ms']['p50'] / novo['latencia_ms']['p50'], 2),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark: requisições por segundo com conexão nova por helper (antes)
+e com o pool de conexões por requisição (depois), contra um PostgreSQL local.
+
+Uso:
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/bench?sslmode=disable \\
+        python benchmarks/bench_pool.py --threads 8 --requisicoes 200
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+
+import psycopg2
+
+from comum import BENCH_DATABASE_URL, carregar_app, conectar, limpar_tabelas, criar_clientes, percentis
+
+
+def executar_cenario(app_module, cliente_ids, threads, requisicoes):
+    """Dispara a mistura de endpoints em paralelo e mede throughput e latência"""
+    latencias = []
+    lock = threading.Lock()
+
+    def trabalhador(semente):
+        rnd = random.Random(semente)
+        client = app_module.app.test_client()
+        locais = []
+        for _ in range(requisicoes):
+            inicio = time.perf_counter()
+            sorteio = rnd.random()
+            if sorteio < 0.5:
+                resp = client.post('/api/pontuacao', json={
+                    'cliente_id': rnd.choice(cliente_ids),
+                    'pontos': rnd.randint(5, 50),
+                    'tipo': 'consumo',
+                })
+            elif sorteio < 0.75:
+                resp = client.get('/api/ranking')
+            elif sorteio < 0.9:
+                resp = client.get('/api/estatisticas')
+            else:
+                resp = client.get('/api/configuracoes')
+            assert resp.status_code < 500, resp.get_data(as_text=True)
+            locais.append((time.perf_counter() - inicio) * 1000)
+        with lock:
+            latencias.extend(locais)
+
+    inicio = time.perf_counter()
+    workers = [threading.Thread(target=trabalhador, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    duracao = time.perf_counter() - inicio
+
+    return {
+        'requisicoes': len(latencias),
+        'duracao_s': round(duracao, 3),
+        'req_por_segundo': round(len(latencias) / duracao, 1),
+        'latencia_ms': percentis(latencias),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requisicoes', type=int, default=200, help='requisições por thread')
+    parser.add_argument('--clientes', type=int, default=200)
+    args = parser.parse_args()
+
+    app_module = carregar_app()
+    conn = conectar()
+    limpar_tabelas(conn)
+    cliente_ids = criar_clientes(conn, args.clientes)
+    conn.close()
+
+    get_db_original = app_module.get_db
+
+    # Antes: cada chamada a get_db() abria uma conexão nova (como no código original)
+    app_module.get_db = lambda: psycopg2.connect(BENCH_DATABASE_URL)
+    antes = executar_cenario(app_module, cliente_ids, args.threads, args.requisicoes)
+
+    # Depois: uma conexão do pool por requisição
+    app_module.get_db = get_db_original
+    depois = executar_cenario(app_module, cliente_ids, args.threads, args.requisicoes)
+
+    print(json.dumps({
+        'threads': args.threads,
+        'sem_pool': antes,
+        'com_pool': depois,
+        'ganho': round(depois['req_por_segundo'] / antes['req_por_segundo'], 2),
+        'pool': app_module.get_pool().estatisticas(),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
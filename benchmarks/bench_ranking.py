@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ranking em memória (ranking_memoria.Placar) com `--clientes` clientes e carga mista de leitura/escrita.
+
+Popula clientes com saldos concentrados em poucos pontos (muitos empates),
+carrega o ranking pelo mesmo caminho do app (ressincronização a partir da
+tabela clientes) e mede:
+  - a carga: duração e memória (RSS) acrescentada ao processo;
+  - `--operacoes` operações sorteadas, com `--escritas` de fração de saldos
+    alterados e o resto dividido entre top 10, posição e vizinhos (raio 2),
+    com latência por tipo em microssegundos;
+  - as mesmas leituras feitas em SQL (top 10 pelo índice e posição por
+    COUNT), para comparação.
+Confere o top 1000 e posições sorteadas contra a tabela depois da carga e
+contra uma ordenação completa em Python depois da carga mista.
+
+Uso:
+    python benchmarks/bench_ranking.py --clientes 1000000 --operacoes 200000
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from bisect import bisect_left
+
+from comum import carregar_app, conectar, criar_clientes, limpar_tabelas, percentis
+
+PAGINA = os.sysconf('SC_PAGE_SIZE')
+
+TOP_SQL = 'SELECT id FROM clientes ORDER BY pontos_totais DESC, id LIMIT 10'
+POSICAO_SQL = '''
+    SELECT COUNT(*) + 1 FROM clientes
+    WHERE pontos_totais > %s OR (pontos_totais = %s AND id < %s)
+'''
+
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * PAGINA / (1024 * 1024)
+
+
+def popular_saldos(conn):
+    """Saldos de 0 a ~3000, a maioria perto de zero"""
+    cursor = conn.cursor()
+    cursor.execute('UPDATE clientes SET pontos_totais = floor(power(random(), 3) * 3000)::int')
+    conn.commit()
+    cursor.execute('ANALYZE clientes')
+    conn.commit()
+
+
+def conferir_com_banco(conn, placar, amostra):
+    cursor = conn.cursor()
+    cursor.execute('SELECT id FROM clientes ORDER BY pontos_totais DESC, id LIMIT 1000')
+    top_ok = [row[0] for row in cursor.fetchall()] == [e['id'] for e in placar.top(1000)]
+    divergentes = 0
+    for cliente_id in amostra:
+        cursor.execute('SELECT pontos_totais FROM clientes WHERE id = %s', (cliente_id,))
+        pontos = cursor.fetchone()[0]
+        cursor.execute(POSICAO_SQL, (pontos, pontos, cliente_id))
+        divergentes += cursor.fetchone()[0] != placar.posicao(cliente_id)
+    conn.rollback()
+    return top_ok, divergentes
+
+
+def carga_mista(placar, ids, operacoes, fracao_escritas, rnd):
+    """Operações sorteadas; retorna latências (µs) por tipo e os saldos finais"""
+    saldos = dict(placar._pontos)
+    latencias = {'escrita': [], 'top10': [], 'posicao': [], 'vizinhos': []}
+    inicio_total = time.perf_counter()
+    for _ in range(operacoes):
+        cliente_id = rnd.choice(ids)
+        sorteio = rnd.random()
+        if sorteio < fracao_escritas:
+            tipo = 'escrita'
+            pontos = saldos[cliente_id] + rnd.randint(1, 120)
+            saldos[cliente_id] = pontos
+            inicio = time.perf_counter()
+            placar.atualizar(cliente_id, pontos)
+        else:
+            tipo = ('top10', 'posicao', 'vizinhos')[int((sorteio - fracao_escritas) / (1 - fracao_escritas) * 3)]
+            inicio = time.perf_counter()
+            if tipo == 'top10':
+                placar.top(10)
+            elif tipo == 'posicao':
+                placar.posicao(cliente_id)
+            else:
+                placar.vizinhos(cliente_id, 2)
+        latencias[tipo].append((time.perf_counter() - inicio) * 1_000_000)
+    duracao = time.perf_counter() - inicio_total
+    return latencias, saldos, duracao
+
+
+def conferir_com_ordenacao(placar, saldos, amostra):
+    ordem = sorted((-pontos, cliente_id) for cliente_id, pontos in saldos.items())
+    top_ok = [cliente_id for _, cliente_id in ordem[:1000]] == [e['id'] for e in placar.top(1000)]
+    divergentes = sum(
+        bisect_left(ordem, (-saldos[cliente_id], cliente_id)) + 1 != placar.posicao(cliente_id)
+        for cliente_id in amostra
+    )
+    return top_ok, divergentes
+
+
+def medir_sql(conn, amostra):
+    cursor = conn.cursor()
+    top, posicao = [], []
+    for cliente_id in amostra:
+        inicio = time.perf_counter()
+        cursor.execute(TOP_SQL)
+        cursor.fetchall()
+        top.append((time.perf_counter() - inicio) * 1_000_000)
+
+        cursor.execute('SELECT pontos_totais FROM clientes WHERE id = %s', (cliente_id,))
+        pontos = cursor.fetchone()[0]
+        inicio = time.perf_counter()
+        cursor.execute(POSICAO_SQL, (pontos, pontos, cliente_id))
+        cursor.fetchone()
+        posicao.append((time.perf_counter() - inicio) * 1_000_000)
+    conn.rollback()
+    return {'top10_us': percentis(top), 'posicao_us': percentis(posicao)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clientes', type=int, default=1000000)
+    parser.add_argument('--operacoes', type=int, default=200000)
+    parser.add_argument('--escritas', type=float, default=0.1)
+    parser.add_argument('--amostras-sql', type=int, default=100)
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    app_module = carregar_app()
+    conn = conectar()
+    rnd = random.Random(args.semente)
+
+    limpar_tabelas(conn)
+    ids = criar_clientes(conn, args.clientes)
+    popular_saldos(conn)
+    amostra = rnd.sample(ids, min(len(ids), args.amostras_sql))
+
+    placar = app_module.placar
+    rss_antes = rss_mb()
+    inicio = time.perf_counter()
+    placar.ressincronizar(app_module.ler_clientes_ranking)
+    carga_s = time.perf_counter() - inicio
+    memoria_mb = rss_mb() - rss_antes
+
+    top_banco_ok, divergentes_banco = conferir_com_banco(conn, placar, amostra)
+    sql = medir_sql(conn, amostra)
+
+    latencias, saldos, duracao = carga_mista(placar, ids, args.operacoes, args.escritas, rnd)
+    top_final_ok, divergentes_final = conferir_com_ordenacao(placar, saldos, rnd.sample(ids, min(len(ids), 10000)))
+    conn.close()
+
+    print(json.dumps({
+        'clientes': placar.total,
+        'carga_s': round(carga_s, 2),
+        'memoria_mb': round(memoria_mb, 1),
+        'carga_mista': {
+            'operacoes': args.operacoes,
+            'fracao_escritas': args.escritas,
+            'operacoes_por_segundo': round(args.operacoes / duracao),
+            **{f'{tipo}_us': percentis(valores) for tipo, valores in latencias.items()},
+        },
+        'sql': sql,
+        'conferencia': {
+            'top1000_igual_ao_banco': top_banco_ok,
+            'posicoes_divergentes_do_banco': divergentes_banco,
+            'top1000_igual_a_ordenacao': top_final_ok,
+            'posicoes_divergentes_da_ordenacao': divergentes_final,
+        },
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark: custo, na thread da requisição, de print() versus o log em fila (registro.py).
+
+Mede em microssegundos por chamada (mediana de `--repeticoes` rodadas de
+`--chamadas`):
+  - print: a linha de DEBUG antiga, escrita direto no stdout;
+  - log_info: log.info com campos, que só entra na fila (a escrita fica com a
+    thread de saída);
+  - log_debug_desligado: log.debug com LOG_NIVEL=INFO, que não monta nada.
+A saída do print e dos logs vai para /dev/null, para medir só o custo de quem chama.
+
+Uso:
+    python benchmarks/bench_registro.py --chamadas 20000
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+import comum  # noqa: F401 (põe a raiz do projeto no sys.path)
+import registro
+
+
+def mediana_us(funcao, quantidade, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        for _ in range(quantidade):
+            funcao()
+        tempos.append((time.perf_counter() - inicio) * 1e6 / quantidade)
+    return round(statistics.median(tempos), 3)
+
+
+def esperar_fila():
+    # A thread de saída disputa a CPU com a medição seguinte se ainda estiver escrevendo
+    while not registro._fila.empty():
+        time.sleep(0.01)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--chamadas', type=int, default=20000)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    nulo = open(os.devnull, 'w')
+    stdout = sys.stdout
+    sys.stdout = nulo  # o StreamHandler da thread de saída pega o stdout ao configurar
+    registro.configurar()
+    sys.stdout = stdout
+    logging.getLogger(registro.RAIZ).setLevel(logging.INFO)
+    log = registro.obter('bench')
+    registro.iniciar_requisicao('bench', '/api/cliente/login')
+
+    telefone, senha = '11999990000', 'x'
+
+    def com_print():
+        print(f"DEBUG - Tentativa de login: telefone={telefone}, senha={'***' if senha else 'vazia'}")
+
+    def log_info():
+        log.info('Tentativa de login', telefone=telefone, tem_senha=bool(senha))
+
+    def log_debug():
+        log.debug('Tentativa de login', telefone=telefone, tem_senha=bool(senha))
+
+    with contextlib.redirect_stdout(nulo):
+        resultado = {
+            'print_us': mediana_us(com_print, args.chamadas, args.repeticoes),
+            'log_debug_desligado_us': mediana_us(log_debug, args.chamadas, args.repeticoes),
+        }
+        tempos = []
+        for _ in range(args.repeticoes):
+            tempos.append(mediana_us(log_info, args.chamadas, 1))
+            esperar_fila()
+        resultado['log_info_us'] = round(statistics.median(tempos), 3)
+    print(json.dumps(resultado, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark: serialização JSON (provedor padrão do Flask x serializacao.ProvedorJSON) e compressão gzip/brotli.
+
+Lê do PostgreSQL local `--linhas` (padrão 1000, 10000 e 100000) linhas no
+formato de /api/clientes (RealDictRow com datas sem fuso) e mede, com a
+mediana de `--repeticoes` execuções:
+  - serialização: a resposta inteira (jsonify) com o provedor padrão do
+    Flask, que era o do app, e com o ProvedorJSON (orjson);
+  - compressão do corpo gerado: gzip e brotli em alguns níveis, com tempo e
+    tamanho final (o app usa serializacao.NIVEL_GZIP e QUALIDADE_BROTLI).
+Não mexe nas tabelas do app.
+
+Uso:
+    python benchmarks/bench_serializacao.py --linhas 1000 10000 100000
+"""
+
+import argparse
+import json
+import statistics
+import time
+import zlib
+
+import brotli
+import psycopg2.extras
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from comum import conectar
+from serializacao import NIVEL_GZIP, QUALIDADE_BROTLI, ProvedorJSON
+
+LINHAS_SQL = '''
+    SELECT i AS id,
+           'Cliente ' || i || ' da Silva' AS nome,
+           '1199' || lpad(i::text, 7, '0') AS telefone,
+           'cliente' || i || '@exemplo.com' AS email,
+           (random() * 3000)::int AS pontos_totais,
+           LOCALTIMESTAMP - (random() * INTERVAL '700 days') AS data_cadastro,
+           LOCALTIMESTAMP - (random() * INTERVAL '60 days') AS ultima_visita,
+           (ARRAY['vermelho', 'amarelo', 'verde'])[1 + mod(i, 3)] AS nivel
+    FROM generate_series(1, %s) AS i
+'''
+
+NIVEIS_GZIP = sorted({1, NIVEL_GZIP, 6, 9})
+QUALIDADES_BROTLI = sorted({1, QUALIDADE_BROTLI, 4, 11})
+
+
+def mediana_ms(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return round(statistics.median(tempos), 3)
+
+
+def gzip(dados, nivel):
+    compressor = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+    return compressor.compress(dados) + compressor.flush()
+
+
+def medir(linhas, repeticoes):
+    app = Flask('bench')
+    padrao = DefaultJSONProvider(app)
+    rapido = ProvedorJSON(app)
+
+    with app.app_context():
+        corpo = rapido.response(linhas).get_data()
+        serializacao = {
+            'flask_padrao_ms': mediana_ms(lambda: padrao.response(linhas).get_data(), repeticoes),
+            'orjson_ms': mediana_ms(lambda: rapido.response(linhas).get_data(), repeticoes),
+            'bytes_flask_padrao': len(padrao.response(linhas).get_data()),
+            'bytes_orjson': len(corpo),
+        }
+    serializacao['aceleracao'] = round(serializacao['flask_padrao_ms'] / serializacao['orjson_ms'], 1)
+
+    compressao = {}
+    for nivel in NIVEIS_GZIP:
+        compressao[f'gzip_{nivel}'] = {
+            'ms': mediana_ms(lambda: gzip(corpo, nivel), repeticoes),
+            'bytes': len(gzip(corpo, nivel)),
+        }
+    for qualidade in QUALIDADES_BROTLI:
+        # Qualidade 11 é lenta demais para repetir muito com 100k linhas
+        vezes = repeticoes if qualidade < 10 else max(1, repeticoes // 5)
+        compressao[f'br_{qualidade}'] = {
+            'ms': mediana_ms(lambda: brotli.compress(corpo, quality=qualidade), vezes),
+            'bytes': len(brotli.compress(corpo, quality=qualidade)),
+        }
+    for resultado in compressao.values():
+        resultado['taxa'] = round(len(corpo) / resultado['bytes'], 1)
+
+    return {'linhas': len(linhas), 'serializacao': serializacao, 'compressao': compressao}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--linhas', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeticoes', type=int, default=10)
+    args = parser.parse_args()
+
+    conn = conectar()
+    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    resultados = []
+    for quantidade in args.linhas:
+        cursor.execute(LINHAS_SQL, (quantidade,))
+        resultados.append(medir(cursor.fetchall(), args.repeticoes))
+    conn.close()
+
+    print(json.dumps({
+        'app': {'nivel_gzip': NIVEL_GZIP, 'qualidade_brotli': QUALIDADE_BROTLI},
+        'resultados': resultados,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
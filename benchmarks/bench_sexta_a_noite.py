@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Teste de carga: uma sexta à noite na API inteira, com latência p50/p95/p99 e vazão por rota em JSON.
+
+Carrega a massa de benchmarks/dados_sinteticos.py (`--clientes`,
+`--semente`; com `--sem-gerar` usa a que já está no banco), sobe o app como
+servidor de verdade (`--modo wsgi` com gunicorn ou `asgi` com uvicorn, como
+benchmarks/bench_async_carga.py) e repete a noite em `--duracao` segundos:
+  - `--usuarios` celulares de clientes, cada ação com um cliente sorteado
+    (os mais frequentes aparecem mais, distribuição de Zipf; o check-in é de
+    quem vai chegando, um por cliente), em três fases:
+      chegada  (30% do tempo): check-in 35%, perfil 30%, ranking 20%, pedido 15%
+      pico     (50%):          pedido 30%, ranking 30%, perfil 30%, check-in 10%
+      saideira (20%):          perfil 40%, ranking 40%, pedido 15%, check-in 5%
+    (pedido = POST /api/solicitacoes; com `--pausa-ms`, cada celular espera
+    em média esse tempo entre uma ação e outra);
+  - `--admins` telas do balcão: listam as solicitações pendentes e validam
+    cada uma (90% aprovadas), cada tela a sua parte da fila, esperando
+    `--pausa-admin-ms` quando não há nada para ela.
+Erros são respostas 5xx e conexões recusadas ou derrubadas; os 4xx
+(check-in repetido, se a noite der a volta nos clientes) entram na
+contagem de status.
+
+A saída (stdout e `--saida`) é JSON com o cenário, o commit, a massa de
+dados e, por rota e no total, requisições, erros, req/s e latência em ms,
+para comparar execuções ao longo do tempo.
+
+Uso:
+    pip install -r requirements-async.txt
+    python benchmarks/bench_sexta_a_noite.py --clientes 100000 --usuarios 200 --duracao 60 --saida sexta.json
+"""
+
+import argparse
+import asyncio
+import bisect
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import time
+from datetime import datetime, timezone
+
+from carga_http import ERROS_CONEXAO, ConexaoHTTP, comando_servidor, esperar_servidor, porta_livre, rodar_proxy
+from comum import BENCH_DATABASE_URL, RAIZ, carregar_app, conectar, percentis
+from dados_sinteticos import gerar
+
+SECRET_KEY = 'bench-sexta-a-noite'
+
+# (nome, fração do tempo, pesos das ações dos clientes)
+FASES = [
+    ('chegada', 0.3, {'checkin': 35, 'perfil': 30, 'ranking': 20, 'solicitar': 15}),
+    ('pico', 0.5, {'solicitar': 30, 'ranking': 30, 'perfil': 30, 'checkin': 10}),
+    ('saideira', 0.2, {'perfil': 40, 'ranking': 40, 'solicitar': 15, 'checkin': 5}),
+]
+
+
+class Medicoes:
+    def __init__(self):
+        self.latencias = {}
+        self.status = {}
+        self.erros = {}
+        self.por_fase = {}
+
+    def registrar(self, rota, fase, inicio, status):
+        self.latencias.setdefault(rota, []).append((time.perf_counter() - inicio) * 1000)
+        contagem = self.status.setdefault(rota, {})
+        chave = str(status) if status is not None else 'falha'
+        contagem[chave] = contagem.get(chave, 0) + 1
+        if status is None or status >= 500:
+            self.erros[rota] = self.erros.get(rota, 0) + 1
+        if fase is not None:
+            self.por_fase[fase] = self.por_fase.get(fase, 0) + 1
+
+    def resumo(self, decorrido, duracao_fases):
+        rotas = {}
+        for rota, valores in sorted(self.latencias.items()):
+            rotas[rota] = {
+                'requisicoes': len(valores),
+                'erros': self.erros.get(rota, 0),
+                'req_por_segundo': round(len(valores) / decorrido, 1),
+                'status': dict(sorted(self.status[rota].items())),
+                'latencia_ms': percentis(valores),
+            }
+        total = sum(len(valores) for valores in self.latencias.values())
+        return {
+            'total': {
+                'requisicoes': total,
+                'erros': sum(self.erros.values()),
+                'req_por_segundo': round(total / decorrido, 1),
+                'latencia_ms': percentis([ms for valores in self.latencias.values() for ms in valores]),
+            },
+            'rotas': rotas,
+            'fases_req_por_segundo': {
+                fase: round(self.por_fase.get(fase, 0) / segundos, 1) for fase, segundos in duracao_fases.items()
+            },
+        }
+
+
+class Sorteio:
+    """Clientes por Zipf (s = 1) sobre uma permutação fixa dos ids e ações pelos pesos da fase.
+
+    As chegadas (check-ins) seguem a mesma ordem, cada cliente uma vez.
+    """
+
+    def __init__(self, ids, semente):
+        self.ids = list(ids)
+        random.Random(semente).shuffle(self.ids)
+        self.acumulado = list(itertools.accumulate(1 / posicao for posicao in range(1, len(self.ids) + 1)))
+        self.chegadas = itertools.cycle(self.ids)
+
+    def cliente(self, rnd):
+        return self.ids[bisect.bisect(self.acumulado, rnd.random() * self.acumulado[-1])]
+
+    def chegada(self):
+        return next(self.chegadas)
+
+    @staticmethod
+    def acao(rnd, pesos):
+        return rnd.choices(list(pesos), weights=list(pesos.values()))[0]
+
+
+def fase_atual(inicio, duracao):
+    decorrido = (time.monotonic() - inicio) / duracao
+    limite = 0.0
+    for nome, fracao, pesos in FASES:
+        limite += fracao
+        if decorrido < limite:
+            return nome, pesos
+    return FASES[-1][0], FASES[-1][2]
+
+
+async def celular(porta, sorteio, cookies, produtos, rnd, inicio, duracao, pausa_ms, medicoes):
+    conexao = ConexaoHTTP(porta)
+    while time.monotonic() < inicio + duracao:
+        fase, pesos = fase_atual(inicio, duracao)
+        acao = Sorteio.acao(rnd, pesos)
+        cookie = cookies(sorteio.chegada() if acao == 'checkin' else sorteio.cliente(rnd))
+        momento = time.perf_counter()
+        status = None
+        try:
+            if acao == 'checkin':
+                status, _ = await conexao.pedir('POST', '/api/cliente/checkin', {'localizacao': 'bar'}, cookie)
+            elif acao == 'perfil':
+                status, _ = await conexao.pedir('GET', '/api/cliente/perfil', cookie=cookie)
+            elif acao == 'ranking':
+                status, _ = await conexao.pedir('GET', '/api/ranking')
+            else:
+                produto_id = rnd.choice(produtos)
+                status, _ = await conexao.pedir('POST', '/api/solicitacoes', {'produto_id': produto_id}, cookie)
+        except ERROS_CONEXAO:
+            pass
+        if medicoes is not None:
+            medicoes.registrar(acao, fase, momento, status)
+        if pausa_ms:
+            await asyncio.sleep(rnd.expovariate(1000 / pausa_ms))
+    conexao.fechar()
+
+
+async def balcao(porta, cookie_admin, tela, telas, rnd, inicio, duracao, pausa_ms, medicoes):
+    conexao = ConexaoHTTP(porta)
+    registrar = medicoes.registrar if medicoes is not None else (lambda *args: None)
+    while time.monotonic() < inicio + duracao:
+        momento = time.perf_counter()
+        status, pendentes = None, []
+        try:
+            status, corpo = await conexao.pedir('GET', '/api/solicitacoes?status=pendente', cookie=cookie_admin)
+            if status == 200:
+                pendentes = [p for p in json.loads(corpo) if p['id'] % telas == tela]
+        except ERROS_CONEXAO:
+            pass
+        registrar('pendentes', None, momento, status)
+
+        for solicitacao in pendentes:
+            if time.monotonic() >= inicio + duracao:
+                break
+            momento = time.perf_counter()
+            status = None
+            try:
+                status, _ = await conexao.pedir('POST', f'/api/solicitacoes/{solicitacao["id"]}/validar',
+                                                {'aprovar': rnd.random() < 0.9}, cookie_admin)
+            except ERROS_CONEXAO:
+                pass
+            registrar('validar', None, momento, status)
+        if not pendentes:
+            await asyncio.sleep(pausa_ms / 1000)
+    conexao.fechar()
+
+
+async def noite(porta, args, sorteio, produtos, serializador):
+    cache_cookies = {}
+
+    def cookies(cliente_id):
+        if cliente_id not in cache_cookies:
+            cache_cookies[cliente_id] = serializador.dumps({'cliente_id': cliente_id})
+        return cache_cookies[cliente_id]
+
+    cookie_admin = serializador.dumps({'admin': True})
+
+    def participantes(inicio, duracao, medicoes, deslocamento):
+        return [
+            *(celular(porta, sorteio, cookies, produtos, random.Random(args.semente + deslocamento + i),
+                      inicio, duracao, args.pausa_ms, medicoes) for i in range(args.usuarios)),
+            *(balcao(porta, cookie_admin, i, args.admins, random.Random(-args.semente - deslocamento - i),
+                     inicio, duracao, args.pausa_admin_ms, medicoes) for i in range(args.admins)),
+        ]
+
+    # Aquecimento: pools cheios, ranking carregado, caches preenchidos
+    await asyncio.gather(*participantes(time.monotonic(), args.aquecimento, None, 10 ** 6))
+
+    medicoes = Medicoes()
+    inicio = time.monotonic()
+    await asyncio.gather(*participantes(inicio, args.duracao, medicoes, 0))
+    decorrido = time.monotonic() - inicio
+    return medicoes.resumo(decorrido, {nome: args.duracao * fracao for nome, fracao, _ in FASES})
+
+
+def commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clientes', type=int, default=10000, help='escala da massa (1000 a 1000000)')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--sem-gerar', action='store_true', help='usa os dados que já estão no banco')
+    parser.add_argument('--modo', choices=['wsgi', 'asgi'], default='wsgi')
+    parser.add_argument('--usuarios', type=int, default=200, help='celulares de clientes simultâneos')
+    parser.add_argument('--admins', type=int, default=2, help='telas do balcão validando pedidos')
+    parser.add_argument('--duracao', type=float, default=60, help='segundos medidos (a noite inteira)')
+    parser.add_argument('--aquecimento', type=float, default=5)
+    parser.add_argument('--pausa-ms', type=float, default=0, help='espera média entre ações de um celular')
+    parser.add_argument('--pausa-admin-ms', type=float, default=500, help='espera do balcão com a fila vazia')
+    parser.add_argument('--conexoes', type=int, default=20, help='teto de conexões do app ao banco')
+    parser.add_argument('--threads', type=int, default=32, help='threads do gunicorn (modo wsgi)')
+    parser.add_argument('--latencia-ms', type=float, default=0, help='atraso por sentido até o banco')
+    parser.add_argument('--saida', help='arquivo JSON com o resultado')
+    args = parser.parse_args()
+
+    os.environ['SECRET_KEY'] = SECRET_KEY
+    app_module = carregar_app()
+    serializador = app_module.app.session_interface.get_signing_serializer(app_module.app)
+    conn = conectar()
+    massa = None if args.sem_gerar else gerar(conn, args.clientes, args.semente)
+    cursor = conn.cursor()
+    if args.sem_gerar:
+        # A noite recomeça: sem os check-ins de hoje nem a fila de uma execução anterior
+        cursor.execute('DELETE FROM checkins WHERE dia_negocio = dia_negocio() RETURNING cliente_id')
+        cursor.execute('SELECT reconstruir_visitas(%s)', (sorted({linha[0] for linha in cursor.fetchall()}),))
+        cursor.execute("UPDATE solicitacoes_pontos SET status = 'rejeitada' WHERE status = 'pendente'")
+    cursor.execute('SELECT id FROM clientes ORDER BY id')
+    clientes = [linha[0] for linha in cursor.fetchall()]
+    cursor.execute('SELECT id FROM produtos WHERE ativo = 1 ORDER BY id')
+    produtos = [linha[0] for linha in cursor.fetchall()]
+    conn.commit()
+    conn.close()
+    if not clientes or not produtos:
+        raise SystemExit('banco sem clientes ou produtos: rode sem --sem-gerar')
+
+    dsn, proxy, canal = BENCH_DATABASE_URL, None, None
+    if args.latencia_ms > 0:
+        canal, deles = multiprocessing.Pipe()
+        proxy = multiprocessing.Process(target=rodar_proxy, args=(deles, BENCH_DATABASE_URL, args.latencia_ms),
+                                        daemon=True)
+        proxy.start()
+        dsn = canal.recv()
+
+    porta = porta_livre()
+    ambiente = dict(
+        os.environ,
+        POSTGRES_URL=dsn,
+        DB_POOL_MIN='1',
+        DB_POOL_MAX=str(args.conexoes),
+        DB_POOL_TIMEOUT='60',
+        ASYNC_DB_POOL_MIN='1',
+        ASYNC_DB_POOL_MAX=str(args.conexoes),
+        EXPIRACAO_INTERVALO_SEGUNDOS='0',
+    )
+    processo = subprocess.Popen(comando_servidor(args.modo, porta, args.threads), cwd=RAIZ, env=ambiente)
+    try:
+        asyncio.run(esperar_servidor(porta, processo))
+        resultado = asyncio.run(noite(porta, args, Sorteio(clientes, args.semente), produtos, serializador))
+    finally:
+        processo.terminate()
+        processo.wait(30)
+        if proxy is not None:
+            canal.send('fim')
+            proxy.join(5)
+
+    saida = {
+        'cenario': 'sexta_a_noite',
+        'executado_em': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit_atual(),
+        'modo': args.modo,
+        'massa': massa or {'clientes': len(clientes), 'reaproveitada': True},
+        'usuarios': args.usuarios,
+        'admins': args.admins,
+        'duracao_s': args.duracao,
+        'pausa_ms': args.pausa_ms,
+        'conexoes_ao_banco': args.conexoes,
+        'threads_wsgi': args.threads if args.modo == 'wsgi' else None,
+        'latencia_banco_ms': args.latencia_ms,
+        'nucleos': os.cpu_count(),
+        **resultado,
+    }
+    texto = json.dumps(saida, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+    print(texto)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark: esvaziar uma fila de `--solicitacoes` pendentes, uma validação por vez (antes) e em lote (depois).
+
+Para cada modo recria os mesmos clientes e a mesma fila (uma em cada
+`--rejeitar-a-cada` é rejeitada, o resto aprovado) e mede o tempo até a fila
+ficar vazia:
+  - individual: um POST /api/solicitacoes/<id>/validar por solicitação,
+    como a tela do admin fazia;
+  - lote: um POST /api/solicitacoes/validar-lote com todas as decisões.
+Confere que os dois modos chegam aos mesmos saldos e status e que reenviar
+o lote devolve todos os ids como ja_processadas.
+
+Uso:
+    python benchmarks/bench_solicitacoes_lote.py --solicitacoes 200 --clientes 80
+"""
+
+import argparse
+import json
+import random
+import time
+
+from comum import carregar_app, conectar, criar_clientes, limpar_tabelas
+
+
+def preparar(conn, clientes, solicitacoes, semente):
+    """Clientes, um produto e a fila de pendentes; retorna os ids da fila"""
+    ids_clientes = criar_clientes(conn, clientes)
+    rnd = random.Random(semente)
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO produtos (nome, descricao, pontos) VALUES ('Chopp', '500ml', 15) RETURNING id")
+    produto_id = cursor.fetchone()[0]
+    ids = []
+    for _ in range(solicitacoes):
+        quantidade = rnd.randint(1, 4)
+        cursor.execute('''
+            INSERT INTO solicitacoes_pontos (cliente_id, produto_id, quantidade, pontos_total)
+            VALUES (%s, %s, %s, %s) RETURNING id
+        ''', (rnd.choice(ids_clientes), produto_id, quantidade, 15 * quantidade))
+        ids.append(cursor.fetchone()[0])
+    conn.commit()
+    return ids
+
+
+def estado(conn):
+    cursor = conn.cursor()
+    cursor.execute('SELECT id, pontos_totais, nivel FROM clientes ORDER BY id')
+    saldos = cursor.fetchall()
+    cursor.execute('SELECT id, status FROM solicitacoes_pontos ORDER BY id')
+    status = cursor.fetchall()
+    conn.commit()
+    return saldos, status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--solicitacoes', type=int, default=200)
+    parser.add_argument('--clientes', type=int, default=80)
+    parser.add_argument('--rejeitar-a-cada', type=int, default=10)
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    app_module = carregar_app()
+    client = app_module.app.test_client()
+    with client.session_transaction() as sessao:
+        sessao['admin'] = True
+    conn = conectar()
+
+    limpar_tabelas(conn)
+    ids = preparar(conn, args.clientes, args.solicitacoes, args.semente)
+    decisoes = [{'id': i, 'aprovar': n % args.rejeitar_a_cada != 0} for n, i in enumerate(ids, 1)]
+    inicio = time.perf_counter()
+    for decisao in decisoes:
+        resp = client.post(f"/api/solicitacoes/{decisao['id']}/validar", json={'aprovar': decisao['aprovar']})
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+    individual_s = time.perf_counter() - inicio
+    estado_individual = estado(conn)
+
+    limpar_tabelas(conn)
+    preparar(conn, args.clientes, args.solicitacoes, args.semente)
+    inicio = time.perf_counter()
+    resp = client.post('/api/solicitacoes/validar-lote', json={'decisoes': decisoes})
+    lote_s = time.perf_counter() - inicio
+    corpo = resp.get_json()
+    assert resp.status_code == 200, corpo
+    estado_lote = estado(conn)
+
+    reenvio = client.post('/api/solicitacoes/validar-lote', json={'decisoes': decisoes}).get_json()
+    conn.close()
+
+    print(json.dumps({
+        'solicitacoes': len(ids),
+        'individual': {'segundos': round(individual_s, 3), 'por_segundo': round(len(ids) / individual_s, 1)},
+        'lote': {
+            'segundos': round(lote_s, 3),
+            'por_segundo': round(len(ids) / lote_s, 1),
+            'aprovadas': len(corpo['aprovadas']),
+            'rejeitadas': len(corpo['rejeitadas']),
+        },
+        'mesmos_saldos': estado_individual[0] == estado_lote[0],
+        'mesmos_status': estado_individual[1] == estado_lote[1],
+        'reenvio_ja_processadas': len(reenvio['ja_processadas']),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
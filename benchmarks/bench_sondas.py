@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark: custo das sondas de saúde e das rotas de debug para o banco e para o app.
+
+Carrega a massa de benchmarks/dados_sinteticos.py (`--clientes`; com
+`--sem-gerar` usa a que já está no banco) e chama cada rota `--chamadas`
+vezes pelo test_client, como um balanceador faria. Por rota: mediana e p99
+em ms e idas ao banco por chamada (do Server-Timing). Entram:
+  - /api/health/live (sem banco);
+  - /api/health/ready com o cache de PRONTIDAO_CACHE_SEGUNDOS e sem cache
+    (uma verificação por chamada, como era o /api/health);
+  - /api/debug/tables e /api/debug/estatisticas estimadas e com ?exato=1
+    (COUNT(*) de verdade; essas com `--chamadas-exatas`).
+
+Uso:
+    python benchmarks/bench_sondas.py --clientes 100000 --chamadas 2000
+"""
+
+import argparse
+import json
+import re
+import statistics
+import time
+
+from comum import carregar_app, conectar, percentis
+from dados_sinteticos import gerar
+
+CONSULTAS = re.compile(r'desc="(\d+) consultas"')
+
+
+def medir(client, rota, chamadas):
+    tempos = []
+    consultas = 0
+    for _ in range(chamadas):
+        inicio = time.perf_counter()
+        resposta = client.get(rota)
+        resposta.get_data()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        if resposta.status_code >= 400:
+            raise SystemExit(f'{rota}: HTTP {resposta.status_code} {resposta.get_data(as_text=True)[:200]}')
+        encontrado = CONSULTAS.search(resposta.headers.get('Server-Timing', ''))
+        consultas += int(encontrado.group(1)) if encontrado else 0
+        resposta.close()
+    resumo = percentis(tempos)
+    return {
+        'mediana_ms': round(statistics.median(tempos), 3),
+        'p99_ms': resumo['p99'],
+        'consultas_por_chamada': round(consultas / chamadas, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clientes', type=int, default=100000)
+    parser.add_argument('--sem-gerar', action='store_true', help='usa os dados que já estão no banco')
+    parser.add_argument('--chamadas', type=int, default=2000)
+    parser.add_argument('--chamadas-exatas', type=int, default=20)
+    args = parser.parse_args()
+
+    app_module = carregar_app()
+    app_module.REQUISICAO_LENTA_MS = 0
+    if not args.sem_gerar:
+        conn = conectar()
+        gerar(conn, args.clientes)
+        conn.close()
+
+    client = app_module.app.test_client()
+    with client.session_transaction() as sessao:
+        sessao['admin'] = True
+
+    resultado = {'live': medir(client, '/api/health/live', args.chamadas)}
+    resultado['ready_em_cache'] = medir(client, '/api/health/ready', args.chamadas)
+    ttl = app_module.cache_prontidao.ttl
+    app_module.cache_prontidao.ttl = 0
+    app_module.cache_prontidao.invalidar()
+    resultado['ready_sem_cache'] = medir(client, '/api/health/ready', args.chamadas)
+    app_module.cache_prontidao.ttl = ttl
+    for rota in ('/api/debug/tables', '/api/debug/estatisticas'):
+        nome = rota.rsplit('/', 1)[-1]
+        resultado[f'{nome}_estimada'] = medir(client, rota, args.chamadas_exatas * 5)
+        resultado[f'{nome}_exata'] = medir(client, f'{rota}?exato=1', args.chamadas_exatas)
+    print(json.dumps({'clientes': args.clientes, 'rotas': resultado}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
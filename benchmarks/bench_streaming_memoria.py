@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memória (RSS) do processo ao exportar um extrato de 1 milhão de linhas, em lista e em streaming.
+
+Cria um cliente com `--linhas` pontuações e, para cada modo, sobe um processo
+novo (para o pico de RSS de um não contaminar o outro) que baixa o perfil
+completo do cliente (/api/cliente/perfil, com o histórico inteiro):
+  - lista: o caminho antigo, fetchall + dicts + jsonify do histórico inteiro;
+  - streaming: a rota atual, que lê do cursor nomeado em lotes de
+    STREAM_TAMANHO_LOTE e escreve o JSON à medida que o cliente consome.
+Uma thread amostra o RSS (/proc/self/statm, Linux) durante a exportação; a
+saída traz o RSS antes, o pico e 10 amostras espaçadas no tempo (a curva do
+streaming deve ficar plana).
+
+Uso:
+    python benchmarks/bench_streaming_memoria.py --linhas 1000000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from comum import carregar_app, conectar, criar_clientes, limpar_tabelas
+
+PAGINA = os.sysconf('SC_PAGE_SIZE')
+
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * PAGINA / (1024 * 1024)
+
+
+class AmostradorRSS(threading.Thread):
+    def __init__(self, intervalo=0.02):
+        super().__init__(daemon=True)
+        self.intervalo = intervalo
+        self.amostras = []
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.is_set():
+            self.amostras.append(rss_mb())
+            time.sleep(self.intervalo)
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+        self.amostras.append(rss_mb())
+
+
+def popular_extrato(conn, linhas):
+    cursor = conn.cursor()
+    cliente_id = criar_clientes(conn, 1)[0]
+    cursor.execute('''
+        INSERT INTO pontuacoes (cliente_id, pontos, tipo, descricao, data, data_validade)
+        SELECT %s, 1 + (i %% 50), 'compra', 'Compra no balcão #' || i,
+               NOW() - i * interval '1 minute', NOW() + interval '180 days'
+        FROM generate_series(1, %s) AS i
+    ''', (cliente_id, linhas))
+    conn.commit()
+    cursor.execute('ANALYZE pontuacoes')
+    conn.commit()
+    return cliente_id
+
+
+def exportar_lista(app_module, cliente_id):
+    """O /api/cliente/perfil original: histórico inteiro em memória antes de serializar"""
+    with app_module.app.test_request_context():
+        cursor = app_module.dict_cursor(app_module.get_db())
+        cursor.execute('SELECT * FROM clientes WHERE id = %s', (cliente_id,))
+        perfil = dict(cursor.fetchone())
+        cursor.execute('''
+            SELECT * FROM pontuacoes
+            WHERE cliente_id = %s
+            ORDER BY data DESC
+        ''', (cliente_id,))
+        perfil['historico'] = [dict(row) for row in cursor.fetchall()]
+        return len(app_module.jsonify(perfil).get_data())
+
+
+def exportar_streaming(app_module, cliente_id):
+    client = app_module.app.test_client()
+    with client.session_transaction() as sessao:
+        sessao['cliente_id'] = cliente_id
+    resp = client.get('/api/cliente/perfil', buffered=False)
+    assert resp.status_code == 200, resp.get_data(as_text=True)[:200]
+    total = 0
+    for pedaco in resp.response:
+        total += len(pedaco)
+    resp.close()
+    return total
+
+
+def filho(modo, cliente_id):
+    app_module = carregar_app()
+    rss_antes = rss_mb()
+    amostrador = AmostradorRSS()
+    amostrador.start()
+    inicio = time.perf_counter()
+    exportar = exportar_streaming if modo == 'streaming' else exportar_lista
+    tamanho = exportar(app_module, cliente_id)
+    duracao = time.perf_counter() - inicio
+    amostrador.parar()
+
+    amostras = amostrador.amostras
+    passo = max(1, len(amostras) // 10)
+    print(json.dumps({
+        'modo': modo,
+        'bytes': tamanho,
+        'segundos': round(duracao, 2),
+        'rss_antes_mb': round(rss_antes, 1),
+        'rss_pico_mb': round(max(amostras), 1),
+        'rss_amostras_mb': [round(a, 1) for a in amostras[::passo]][:10] + [round(amostras[-1], 1)],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--linhas', type=int, default=1000000)
+    parser.add_argument('--modos', default='streaming,lista')
+    parser.add_argument('--reusar', action='store_true', help='não recria o extrato')
+    parser.add_argument('--filho', help=argparse.SUPPRESS)
+    parser.add_argument('--cliente-id', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho:
+        filho(args.filho, args.cliente_id)
+        return
+
+    carregar_app()
+    conn = conectar()
+    if args.reusar:
+        cursor = conn.cursor()
+        cursor.execute('SELECT cliente_id FROM pontuacoes GROUP BY cliente_id ORDER BY COUNT(*) DESC LIMIT 1')
+        cliente_id = cursor.fetchone()[0]
+        conn.commit()
+    else:
+        limpar_tabelas(conn)
+        cliente_id = popular_extrato(conn, args.linhas)
+    conn.close()
+
+    resultados = []
+    for modo in args.modos.split(','):
+        saida = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--filho', modo, '--cliente-id', str(cliente_id)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        resultados.append(json.loads(saida.strip().splitlines()[-1]))
+    print(json.dumps({'linhas': args.linhas, 'resultados': resultados}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
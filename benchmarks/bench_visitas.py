@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark: custo de calcular o bônus de frequência conforme o histórico de check-ins cresce.
+
+Para cada tamanho em `--tamanhos`, recria `--clientes` clientes com check-ins
+espalhados pelo último ano (um por dia no máximo; os clientes "frequentes"
+vêm quase todo dia) e mede, para clientes sorteados:
+  - contagem: o COUNT(DISTINCT DATE(data_checkin)) dos últimos 30 dias na
+    tabela checkins (o cálculo antigo), com os índices por cliente e sem
+    eles (como a tabela era antes);
+  - mapa: frequencia_cliente(), popcount no mapa de visitas da linha do cliente.
+Também confere que o mapa mantido pelo trigger e o refeito por
+reconstruir_visitas() batem com a contagem de dias de negócio na tabela
+para todos os clientes.
+
+Uso:
+    python benchmarks/bench_visitas.py --tamanhos 10000,100000,1000000
+"""
+
+import argparse
+import json
+import random
+import time
+
+from comum import carregar_app, conectar, criar_clientes, limpar_tabelas, percentis
+
+CONTAGEM = '''
+    SELECT COUNT(DISTINCT DATE(data_checkin)) FROM checkins
+    WHERE cliente_id = %s AND data_checkin >= CURRENT_DATE - 29
+'''
+
+
+def popular_checkins(conn, clientes, quantidade):
+    """~quantidade check-ins em 365 dias; 10% dos clientes concentram metade deles"""
+    cursor = conn.cursor()
+    frequentes = max(1, clientes // 10)
+    cursor.execute('''
+        INSERT INTO checkins (cliente_id, data_checkin)
+        SELECT DISTINCT ON (cliente_id, dia) cliente_id, dia + interval '20 hours'
+        FROM (
+            SELECT CASE WHEN i %% 2 = 0 THEN 1 + (random() * (%s - 1))::int
+                        ELSE 1 + (random() * (%s - 1))::int END AS cliente_id,
+                   CURRENT_DATE - (random() * 364)::int AS dia
+            FROM generate_series(1, %s) AS i
+        ) g
+    ''', (frequentes, clientes, quantidade))
+    total = cursor.rowcount
+    conn.commit()
+    cursor.execute('ANALYZE checkins')
+    conn.commit()
+    return total
+
+
+def medir(conn, sql, ids, sem_indice=False):
+    cursor = conn.cursor()
+    if sem_indice:
+        # Só dentro desta transação, desfeito no rollback
+        cursor.execute('DROP INDEX idx_checkins_cliente_data, idx_checkins_cliente_dia_negocio')
+    latencias = []
+    for cliente_id in ids:
+        inicio = time.perf_counter()
+        cursor.execute(sql, (cliente_id,))
+        cursor.fetchone()
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    conn.rollback()
+    return percentis(latencias)
+
+
+def divergencias(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT COUNT(*) FROM clientes c
+        LEFT JOIN (
+            SELECT cliente_id, COUNT(DISTINCT dia_negocio) AS dias FROM checkins
+            WHERE dia_negocio > dia_negocio() - 30 AND dia_negocio <= dia_negocio()
+            GROUP BY cliente_id
+        ) t ON t.cliente_id = c.id
+        WHERE COALESCE(t.dias, 0) <> (SELECT dias_visitados FROM frequencia_cliente(c.id, dia_negocio()))
+    ''')
+    total = cursor.fetchone()[0]
+    conn.commit()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tamanhos', default='10000,100000,1000000')
+    parser.add_argument('--clientes', type=int, default=2000)
+    parser.add_argument('--amostras', type=int, default=300)
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    carregar_app()
+    conn = conectar()
+    rnd = random.Random(args.semente)
+
+    resultados = []
+    for tamanho in [int(t) for t in args.tamanhos.split(',')]:
+        limpar_tabelas(conn)
+        ids = criar_clientes(conn, args.clientes)
+        checkins = popular_checkins(conn, args.clientes, tamanho)
+        amostra = [rnd.choice(ids[:max(1, args.clientes // 10)]) if rnd.random() < 0.5 else rnd.choice(ids)
+                   for _ in range(args.amostras)]
+
+        divergentes_trigger = divergencias(conn)
+        cursor = conn.cursor()
+        cursor.execute('SELECT reconstruir_visitas()')
+        conn.commit()
+
+        resultados.append({
+            'checkins': checkins,
+            'contagem_sem_indice_ms': medir(conn, CONTAGEM, amostra[:50], sem_indice=True),
+            'contagem_ms': medir(conn, CONTAGEM, amostra),
+            'mapa_ms': medir(conn, 'SELECT * FROM frequencia_cliente(%s, dia_negocio())', amostra),
+            'divergencias_trigger': divergentes_trigger,
+            'divergencias_reconstrucao': divergencias(conn),
+        })
+
+    conn.close()
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Utilidades dos testes de carga HTTP: servidor de verdade (gunicorn/uvicorn), proxy de latência e cliente leve
+"""
+
+import asyncio
+import json
+import socket
+import sys
+import time
+
+import psycopg2.extensions
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def rodar_proxy(canal, dsn, atraso_ms):
+    """Alvo de multiprocessing.Process: proxy_latencia em outro processo, URL devolvida pelo canal"""
+    from proxy_latencia import ProxyLatencia
+    proxy = ProxyLatencia(dsn, atraso_ms)
+    # Em URL, como POSTGRES_URL (o app só acrescenta o sslmode em URLs)
+    params = psycopg2.extensions.parse_dsn(proxy.dsn)
+    canal.send(f"postgresql://{params['user']}@127.0.0.1:{proxy.porta}/{params['dbname']}?sslmode=disable")
+    canal.recv()
+
+
+def comando_servidor(modo, porta, threads):
+    """WSGI: gunicorn com 1 worker gthread; ASGI: uvicorn com 1 worker (app_async.py)"""
+    if modo == 'wsgi':
+        return [sys.executable, '-m', 'gunicorn', 'app:app', '-w', '1', '-k', 'gthread',
+                '--threads', str(threads), '-b', f'127.0.0.1:{porta}',
+                '--backlog', '2048', '--timeout', '120', '--log-level', 'warning']
+    return [sys.executable, '-m', 'uvicorn', 'app_async:app', '--workers', '1',
+            '--host', '127.0.0.1', '--port', str(porta), '--backlog', '2048',
+            '--no-access-log', '--log-level', 'warning']
+
+
+class ConexaoHTTP:
+    """Cliente HTTP/1.1 mínimo (keep-alive, Content-Length ou chunked), uma conexão por usuário.
+
+    Bem mais barato em CPU que um cliente completo: com o gerador de carga
+    na mesma máquina, sobra processador para o servidor medido.
+    """
+
+    def __init__(self, porta):
+        self.porta = porta
+        self.leitor = self.escritor = None
+
+    async def pedir(self, metodo, caminho, corpo=None, cookie=None):
+        """(status, corpo em bytes) da resposta"""
+        if self.escritor is None:
+            self.leitor, self.escritor = await asyncio.open_connection('127.0.0.1', self.porta)
+        dados = json.dumps(corpo).encode() if corpo is not None else b''
+        cabecalhos = f'{metodo} {caminho} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Length: {len(dados)}\r\n'
+        if corpo is not None:
+            cabecalhos += 'Content-Type: application/json\r\n'
+        if cookie:
+            cabecalhos += f'Cookie: session={cookie}\r\n'
+        try:
+            self.escritor.write(cabecalhos.encode() + b'\r\n' + dados)
+            status_linha = await self.leitor.readline()
+            if not status_linha:
+                raise ConnectionError('conexão fechada pelo servidor')
+            status = int(status_linha.split()[1])
+            tamanho, chunked, fechar = 0, False, False
+            while (linha := await self.leitor.readline()) not in (b'\r\n', b''):
+                nome, _, valor = linha.decode('latin-1').partition(':')
+                nome, valor = nome.strip().lower(), valor.strip().lower()
+                if nome == 'content-length':
+                    tamanho = int(valor)
+                elif nome == 'transfer-encoding':
+                    chunked = 'chunked' in valor
+                elif nome == 'connection':
+                    fechar = valor == 'close'
+            resposta = b''
+            if chunked:
+                pedacos = []
+                while (pedaco := int((await self.leitor.readline()).split(b';')[0], 16)):
+                    pedacos.append((await self.leitor.readexactly(pedaco + 2))[:-2])
+                await self.leitor.readline()
+                resposta = b''.join(pedacos)
+            elif tamanho:
+                resposta = await self.leitor.readexactly(tamanho)
+        except Exception:
+            self.fechar()
+            raise
+        if fechar:
+            self.fechar()
+        return status, resposta
+
+    def fechar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+        self.leitor = self.escritor = None
+
+
+# Falhas de rede e respostas truncadas contam como erro na medição
+ERROS_CONEXAO = (OSError, asyncio.IncompleteReadError, ValueError, IndexError)
+
+
+async def esperar_servidor(porta, processo, limite_s=60):
+    fim = time.monotonic() + limite_s
+    while time.monotonic() < fim:
+        if processo.poll() is not None:
+            raise RuntimeError('servidor terminou ao subir')
+        conexao = ConexaoHTTP(porta)
+        try:
+            if (await conexao.pedir('GET', '/api/configuracoes'))[0] == 200:
+                return
+        except OSError:
+            pass
+        finally:
+            conexao.fechar()
+        await asyncio.sleep(0.2)
+    raise RuntimeError('servidor não respondeu')
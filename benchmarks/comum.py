@@ -0,0 +1,74 @@
+"""
+Utilidades compartilhadas pelos benchmarks: banco local, carga do app e medições
+"""
+
+import os
+import sys
+import statistics
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Os benchmarks rodam contra um PostgreSQL LOCAL (nunca contra o Supabase de produção)
+BENCH_DATABASE_URL = os.getenv(
+    'BENCH_DATABASE_URL',
+    'postgresql://postgres@localhost:5432/postgres?sslmode=disable'
+)
+
+TABELAS_DADOS = ['solicitacoes_pontos', 'checkins', 'pontuacoes', 'produtos', 'clientes']
+
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+
+def carregar_app():
+    """Importa app.py apontando para o banco de benchmark e garante o schema"""
+    os.environ['POSTGRES_URL'] = BENCH_DATABASE_URL
+    import app as app_module
+    with app_module.app.app_context():
+        app_module.init_db()
+    return app_module
+
+
+def conectar():
+    import psycopg2
+    return psycopg2.connect(BENCH_DATABASE_URL)
+
+
+def limpar_tabelas(conn):
+    """Esvazia as tabelas de dados (configuracoes é preservada)"""
+    cursor = conn.cursor()
+    cursor.execute(f"TRUNCATE {', '.join(TABELAS_DADOS)} RESTART IDENTITY CASCADE")
+    conn.commit()
+
+
+def criar_clientes(conn, quantidade):
+    """Insere `quantidade` clientes sintéticos e retorna seus ids"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO clientes (nome, telefone, email)
+        SELECT 'Cliente ' || i, '1199' || lpad(i::text, 7, '0'), 'cliente' || i || '@exemplo.com'
+        FROM generate_series(1, %s) AS i
+        RETURNING id
+    ''', (quantidade,))
+    ids = [row[0] for row in cursor.fetchall()]
+    conn.commit()
+    return ids
+
+
+def percentis(amostras_ms):
+    """Resumo de latência (ms) de uma lista de amostras"""
+    if not amostras_ms:
+        return {'n': 0}
+    ordenadas = sorted(amostras_ms)
+
+    def p(q):
+        return ordenadas[min(len(ordenadas) - 1, int(round(q * (len(ordenadas) - 1))))]
+
+    return {
+        'n': len(ordenadas),
+        'media': round(statistics.fmean(ordenadas), 3),
+        'p50': round(p(0.50), 3),
+        'p95': round(p(0.95), 3),
+        'p99': round(p(0.99), 3),
+        'max': round(ordenadas[-1], 3),
+    }
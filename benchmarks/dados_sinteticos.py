@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Massa de dados sintética e determinística (clientes, produtos, check-ins, pontuações e solicitações) carregada com COPY.
+
+A mesma `--semente` e o mesmo `--clientes` geram sempre os mesmos dados,
+com as datas contadas a partir do dia de negócio em que a carga roda (os
+check-ins dos últimos 30 dias precisam ser recentes para o bônus de
+frequência valer). Escalas de 1 mil a 1 milhão de clientes:
+  - clientes com nomes e telefones brasileiros, cadastro nos últimos 2 anos;
+  - perfis de frequência: 60% ocasionais (até 2 noites em `--dias` dias),
+    30% regulares (3 a 10) e 10% assíduos (12 a 40);
+  - por noite: um check-in, uma comanda (pontuação 'consumo', validade de
+    90 dias, então parte do histórico já venceu) e, às vezes, solicitações
+    de produto, quase todas aprovadas (com o lançamento 'produto') e algumas
+    rejeitadas. Nenhuma noite é a de hoje e nenhuma solicitação fica
+    pendente: a noite simulada pelo teste de carga começa limpa.
+
+As tabelas de dados são esvaziadas e recarregadas em blocos de
+`--tamanho-bloco` clientes, um COPY por tabela por bloco, com os triggers
+desligados (session_replication_role = replica, precisa de superusuário,
+como no PostgreSQL local dos benchmarks). Depois saldos, mapas de visitas,
+dicionário de palavras e sequências são refeitos de uma vez só, pelas
+mesmas funções que o app usa para corrigi-los.
+
+Uso:
+    python benchmarks/dados_sinteticos.py --clientes 100000 --semente 42
+"""
+
+import argparse
+import csv
+import io
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from comum import carregar_app, conectar, limpar_tabelas
+
+NOMES = [
+    'Ana', 'Bruno', 'Camila', 'Daniel', 'Eduarda', 'Felipe', 'Gabriela', 'Gustavo', 'Helena', 'Igor',
+    'Isabela', 'João', 'Júlia', 'Lucas', 'Larissa', 'Marcos', 'Mariana', 'Mateus', 'Natália', 'Otávio',
+    'Paula', 'Pedro', 'Rafael', 'Renata', 'Rodrigo', 'Sabrina', 'Thiago', 'Valéria', 'Vinícius', 'Yasmin',
+]
+SOBRENOMES = [
+    'Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima', 'Gomes',
+    'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Araújo', 'Melo', 'Barbosa', 'Cardoso', 'Rocha', 'Dias',
+    'Nascimento', 'Andrade', 'Moreira', 'Nunes', 'Marques', 'Machado', 'Mendes', 'Freitas', 'Conceição', 'Simões',
+]
+PRODUTOS = [
+    ('Chopp Pilsen 300ml', 10), ('Chopp Pilsen 500ml', 15), ('Chopp IPA 300ml', 14), ('Chopp IPA 500ml', 20),
+    ('Chopp Weiss 500ml', 18), ('Chopp APA 500ml', 19), ('Chopp Stout 300ml', 16), ('Caipirinha', 22),
+    ('Gin Tônica', 28), ('Drink da Casa', 30), ('Porção de Fritas', 25), ('Porção de Calabresa', 32),
+    ('Bolinho de Bacalhau', 35), ('Hambúrguer Artesanal', 40), ('Tábua de Frios', 55), ('Refrigerante', 6),
+    ('Água com Gás', 5), ('Torre de Chopp 2,5L', 80), ('Sobremesa do Dia', 18), ('Camiseta do Bar', 60),
+]
+LOCAIS = ['bar', 'balcão', 'mesa', 'área externa']
+
+# Perfis de frequência: (fração dos clientes, mínimo e máximo de noites no período)
+PERFIS = [(0.60, 0, 2), (0.30, 3, 10), (0.10, 12, 40)]
+
+VALIDADE_DIAS = 90
+TABELAS_COPY = {
+    'clientes': '(id, nome, telefone, email, data_cadastro, ultima_visita)',
+    'produtos': '(id, nome, descricao, pontos, ativo, data_cadastro)',
+    'checkins': '(id, cliente_id, data_checkin, localizacao, dia_negocio)',
+    'pontuacoes': '(id, cliente_id, pontos, tipo, descricao, data, data_validade)',
+    'solicitacoes_pontos': '(id, cliente_id, produto_id, quantidade, pontos_total, status, observacao, '
+                           'data_solicitacao, data_validacao, validado_por)',
+}
+
+
+class Relogio:
+    """Converte 'noite d dias atrás, m minutos depois das 19h no bar' para o TIMESTAMP do banco.
+
+    Os TIMESTAMP do app são gravados com NOW() na hora local da sessão; o dia
+    de negócio vem do fuso e da virada configurados (sql/09_checkin_dia_negocio.sql).
+    """
+
+    def __init__(self, hoje, fuso_bar, fuso_banco):
+        self.hoje = hoje
+        self.fuso_bar = ZoneInfo(fuso_bar)
+        self.fuso_banco = ZoneInfo(fuso_banco)
+
+    def dia(self, dias_atras):
+        return self.hoje - timedelta(days=dias_atras)
+
+    def momento(self, dias_atras, minutos):
+        inicio = datetime.combine(self.dia(dias_atras), datetime.min.time(), self.fuso_bar) + timedelta(hours=19)
+        return (inicio + timedelta(minutes=minutos)).astimezone(self.fuso_banco).replace(tzinfo=None)
+
+
+def ts(momento):
+    return momento.isoformat(sep=' ', timespec='seconds')
+
+
+def gerar_bloco(rnd, relogio, primeiro_id, quantidade, dias, produtos, ids):
+    """Linhas CSV de um bloco de clientes; `ids` guarda o último id de cada tabela"""
+    saida = {tabela: io.StringIO() for tabela in ('clientes', 'checkins', 'pontuacoes', 'solicitacoes_pontos')}
+    clientes, checkins = saida['clientes'], saida['checkins']
+    pontuacoes, solicitacoes = saida['pontuacoes'], saida['solicitacoes_pontos']
+    agora = relogio.momento(0, 0)
+
+    for cliente_id in range(primeiro_id, primeiro_id + quantidade):
+        nome = f'{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)} {rnd.choice(SOBRENOMES)}'
+        cadastro_dias = rnd.randint(1, 730)
+        sorteio, acumulado = rnd.random(), 0.0
+        for fracao, minimo, maximo in PERFIS:
+            acumulado += fracao
+            if sorteio < acumulado:
+                break
+        noites = sorted(rnd.sample(range(1, min(dias, cadastro_dias) + 1),
+                                   min(rnd.randint(minimo, maximo), min(dias, cadastro_dias))), reverse=True)
+
+        ultima = ''
+        for noite in noites:
+            chegada = rnd.randint(0, 360)
+            momento = relogio.momento(noite, chegada)
+            ids['checkins'] += 1
+            checkins.write(f'{ids["checkins"]},{cliente_id},{ts(momento)},{rnd.choice(LOCAIS)},{relogio.dia(noite)}\n')
+
+            saida_bar = relogio.momento(noite, chegada + rnd.randint(30, 240))
+            ultima = ts(saida_bar)
+            ids['pontuacoes'] += 1
+            pontuacoes.write(f'{ids["pontuacoes"]},{cliente_id},{rnd.randint(10, 150)},consumo,'
+                             f'Comanda {ids["checkins"]},{ultima},{ts(saida_bar + timedelta(days=VALIDADE_DIAS))}\n')
+
+            while rnd.random() < 0.35:
+                produto_id, pontos = rnd.choice(produtos)
+                quantidade_produto = 1 if rnd.random() < 0.8 else 2
+                pedido = relogio.momento(noite, chegada + rnd.randint(5, 200))
+                validacao = pedido + timedelta(minutes=rnd.randint(1, 20))
+                ids['solicitacoes_pontos'] += 1
+                aprovada = rnd.random() < 0.9
+                solicitacoes.write(
+                    f'{ids["solicitacoes_pontos"]},{cliente_id},{produto_id},{quantidade_produto},'
+                    f'{pontos * quantidade_produto},{"aprovada" if aprovada else "rejeitada"},,'
+                    f'{ts(pedido)},{ts(validacao)},admin\n'
+                )
+                if aprovada:
+                    ids['pontuacoes'] += 1
+                    pontuacoes.write(
+                        f'{ids["pontuacoes"]},{cliente_id},{pontos * quantidade_produto},produto,'
+                        f'Produto consumido (Solicitação #{ids["solicitacoes_pontos"]}),'
+                        f'{ts(validacao)},{ts(validacao + timedelta(days=VALIDADE_DIAS))}\n'
+                    )
+
+        cadastro = ts(agora - timedelta(days=cadastro_dias, minutes=rnd.randint(0, 1439)))
+        clientes.write(f'{cliente_id},{nome},{11900000000 + cliente_id},cliente{cliente_id}@exemplo.com,'
+                       f'{cadastro},{ultima}\n')
+
+    return saida
+
+
+def copiar(cursor, tabela, dados):
+    dados.seek(0)
+    cursor.copy_expert(f'COPY {tabela} {TABELAS_COPY[tabela]} FROM STDIN WITH (FORMAT csv)', dados)
+
+
+def gerar(conn, clientes, semente=42, dias=120, tamanho_bloco=20000):
+    """Recarrega as tabelas de dados; retorna as linhas por tabela e os tempos"""
+    rnd = random.Random(semente)
+    cursor = conn.cursor()
+    inicio = time.perf_counter()
+
+    limpar_tabelas(conn)
+    cursor.execute('''
+        SELECT dia_negocio(), current_setting('TimeZone'),
+               COALESCE((SELECT dia_negocio_fuso FROM configuracoes ORDER BY id LIMIT 1), 'America/Sao_Paulo')
+    ''')
+    hoje, fuso_banco, fuso_bar = cursor.fetchone()
+    relogio = Relogio(hoje, fuso_bar, fuso_banco)
+
+    cursor.execute('SET session_replication_role = replica')
+
+    produtos = []
+    dados = io.StringIO()
+    escritor = csv.writer(dados)
+    for produto_id, (nome, pontos) in enumerate(PRODUTOS, start=1):
+        escritor.writerow([produto_id, nome, f'{nome} ({pontos} pontos)', pontos, 1, ts(relogio.momento(800, 0))])
+        produtos.append((produto_id, pontos))
+    copiar(cursor, 'produtos', dados)
+
+    ids = {'checkins': 0, 'pontuacoes': 0, 'solicitacoes_pontos': 0}
+    for primeiro_id in range(1, clientes + 1, tamanho_bloco):
+        quantidade = min(tamanho_bloco, clientes - primeiro_id + 1)
+        bloco = gerar_bloco(rnd, relogio, primeiro_id, quantidade, dias, produtos, ids)
+        for tabela in ('clientes', 'checkins', 'pontuacoes', 'solicitacoes_pontos'):
+            copiar(cursor, tabela, bloco[tabela])
+        conn.commit()
+    carga_s = time.perf_counter() - inicio
+
+    # Estado derivado que os triggers manteriam
+    cursor.execute('SET session_replication_role = DEFAULT')
+    cursor.execute('SELECT recalcular_saldos()')
+    cursor.execute('SELECT reconstruir_visitas()')
+    cursor.execute('''
+        INSERT INTO palavras_nomes (palavra)
+        SELECT DISTINCT p.palavra FROM clientes c, unnest(string_to_array(c.nome_busca, ' ')) AS p(palavra)
+        WHERE p.palavra <> ''
+        ON CONFLICT DO NOTHING
+    ''')
+    linhas = {'clientes': clientes, 'produtos': len(PRODUTOS), **ids}
+    for tabela, ultimo in linhas.items():
+        cursor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), %s)", (tabela, max(ultimo, 1)))
+    cursor.execute("SELECT incrementar_versoes(ARRAY['clientes', 'produtos'])")
+    conn.commit()
+
+    conn.autocommit = True
+    cursor.execute(f'ANALYZE {", ".join(linhas)}')
+    conn.autocommit = False
+
+    return {
+        'clientes': clientes,
+        'semente': semente,
+        'dias': dias,
+        'linhas': linhas,
+        'carga_s': round(carga_s, 1),
+        'total_s': round(time.perf_counter() - inicio, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clientes', type=int, default=10000, help='de 1000 a 1000000')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--dias', type=int, default=120, help='período do histórico')
+    parser.add_argument('--tamanho-bloco', type=int, default=20000, help='clientes por COPY')
+    args = parser.parse_args()
+
+    carregar_app()
+    conn = conectar()
+    resumo = gerar(conn, args.clientes, args.semente, args.dias, args.tamanho_bloco)
+    conn.close()
+    resumo['gerado_em'] = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    print(json.dumps(resumo, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Proxy TCP que adiciona atraso de rede artificial entre o app e um PostgreSQL local.
+
+Cada bloco de dados é repassado após `atraso_ms` em cada sentido, então uma ida e
+volta custa ~2 × atraso_ms, como em um link WAN até o Supabase. O proxy também
+conta as mensagens enviadas pelo cliente (≈ idas e voltas).
+"""
+
+import socket
+import threading
+import time
+
+import psycopg2.extensions
+
+
+class ProxyLatencia:
+    def __init__(self, dsn_destino, atraso_ms):
+        params = psycopg2.extensions.parse_dsn(dsn_destino)
+        host = params.get('host') or 'localhost'
+        porta = int(params.get('port') or 5432)
+        if host.startswith('/'):
+            self._destino = (socket.AF_UNIX, f'{host}/.s.PGSQL.{porta}')
+        else:
+            self._destino = (socket.AF_INET, (host, porta))
+        self._params = params
+        self.atraso = atraso_ms / 1000.0
+        self.mensagens_cliente = 0
+        self._lock = threading.Lock()
+
+        self._servidor = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._servidor.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._servidor.bind(('127.0.0.1', 0))
+        self._servidor.listen(128)
+        self.porta = self._servidor.getsockname()[1]
+        threading.Thread(target=self._aceitar, daemon=True).start()
+
+    @property
+    def dsn(self):
+        """DSN equivalente ao de destino, mas passando pelo proxy (sem SSL)"""
+        params = dict(self._params, host='127.0.0.1', port=str(self.porta), sslmode='disable')
+        return psycopg2.extensions.make_dsn(**params)
+
+    def _aceitar(self):
+        while True:
+            cliente, _ = self._servidor.accept()
+            familia, endereco = self._destino
+            upstream = socket.socket(familia, socket.SOCK_STREAM)
+            upstream.connect(endereco)
+            for s in (cliente, upstream):
+                if s.family == socket.AF_INET:
+                    s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._repassar, args=(cliente, upstream, True), daemon=True).start()
+            threading.Thread(target=self._repassar, args=(upstream, cliente, False), daemon=True).start()
+
+    def _repassar(self, origem, destino, do_cliente):
+        try:
+            while True:
+                dados = origem.recv(65536)
+                if not dados:
+                    break
+                if do_cliente:
+                    with self._lock:
+                        self.mensagens_cliente += 1
+                time.sleep(self.atraso)
+                destino.sendall(dados)
+        except OSError:
+            pass
+        finally:
+            # shutdown() antes do close(): acorda o recv() da outra thread e
+            # manda o FIN na hora (asyncpg espera o fim da conexão ao fechar)
+            for s in (origem, destino):
+                try:
+                    s.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                try:
+                    s.close()
+                except OSError:
+                    pass
+
+    def zerar_contador(self):
+        with self._lock:
+            self.mensagens_cliente = 0
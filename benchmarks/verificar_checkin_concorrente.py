@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Verificação: check-ins simultâneos do mesmo cliente geram um único registro por dia de negócio.
+
+Dispara `--requisicoes` POST /api/cliente/checkin ao mesmo tempo (threads
+liberadas juntas por uma barreira, cada uma com sua sessão e conexão) para o
+mesmo cliente, `--rodadas` vezes com clientes novos, e confere:
+  - exatamente uma resposta 200 por rodada (as demais 400 "já fez check-in");
+  - exatamente uma linha em checkins por cliente;
+  - o mapa de visitas contou um dia;
+  - /api/cliente/pode-checkin passa a responder false;
+e ainda que 23h e 2h da mesma noite caem no mesmo dia de negócio (virada às
+6h) e que a consulta do pode-checkin é respondida só pelo índice único.
+
+Uso:
+    python benchmarks/verificar_checkin_concorrente.py --requisicoes 50 --rodadas 20
+"""
+
+import argparse
+import json
+import sys
+import threading
+
+from comum import carregar_app, conectar, criar_clientes, limpar_tabelas
+
+
+def rodada(app_module, cliente_id, requisicoes):
+    clientes = []
+    for _ in range(requisicoes):
+        client = app_module.app.test_client()
+        with client.session_transaction() as sessao:
+            sessao['cliente_id'] = cliente_id
+        clientes.append(client)
+
+    barreira = threading.Barrier(requisicoes)
+    status = []
+    trava = threading.Lock()
+
+    def disparar(client):
+        barreira.wait()
+        resp = client.post('/api/cliente/checkin', json={'localizacao': 'Mesa 5'})
+        with trava:
+            status.append(resp.status_code)
+
+    threads = [threading.Thread(target=disparar, args=(c,)) for c in clientes]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    pode = clientes[0].get('/api/cliente/pode-checkin').get_json()
+    return status, pode
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requisicoes', type=int, default=50)
+    parser.add_argument('--rodadas', type=int, default=20)
+    args = parser.parse_args()
+
+    app_module = carregar_app()
+    conn = conectar()
+    limpar_tabelas(conn)
+    ids = criar_clientes(conn, args.rodadas)
+    cursor = conn.cursor()
+
+    falhas = []
+    respostas = {'200': 0, '400': 0, 'outras': 0}
+    for cliente_id in ids:
+        status, pode = rodada(app_module, cliente_id, args.requisicoes)
+        respostas['200'] += status.count(200)
+        respostas['400'] += status.count(400)
+        respostas['outras'] += len(status) - status.count(200) - status.count(400)
+
+        cursor.execute('SELECT COUNT(*) FROM checkins WHERE cliente_id = %s', (cliente_id,))
+        linhas = cursor.fetchone()[0]
+        cursor.execute('SELECT dias_visitados FROM frequencia_cliente(%s, dia_negocio())', (cliente_id,))
+        dias = cursor.fetchone()[0]
+        conn.commit()
+        if status.count(200) != 1 or linhas != 1 or dias != 1 or pode['pode_checkin']:
+            falhas.append({'cliente_id': cliente_id, 'status_200': status.count(200),
+                           'linhas': linhas, 'dias_visitados': dias, 'pode_checkin': pode['pode_checkin']})
+
+    # Mesma noite dos dois lados da meia-noite (horário de Brasília, virada às 6h)
+    cursor.execute('''
+        SELECT dia_negocio('2026-03-06 23:00-03'), dia_negocio('2026-03-07 02:00-03'),
+               dia_negocio('2026-03-07 07:00-03')
+    ''')
+    antes_meia_noite, depois_meia_noite, dia_seguinte = cursor.fetchone()
+    mesma_noite = antes_meia_noite == depois_meia_noite != dia_seguinte
+
+    # VACUUM não roda em transação; atualiza o mapa de visibilidade para o Index Only Scan
+    conn.commit()
+    conn.autocommit = True
+    cursor.execute('VACUUM ANALYZE checkins')
+    # Com poucas linhas o planejador prefere varrer a tabela; aqui só importa
+    # que a consulta consegue responder pelo índice único
+    cursor.execute('SET enable_seqscan = off')
+    cursor.execute('''
+        EXPLAIN SELECT EXISTS (
+            SELECT 1 FROM checkins WHERE cliente_id = %s AND dia_negocio = dia_negocio()
+        )
+    ''', (ids[0],))
+    plano = '\n'.join(row[0] for row in cursor.fetchall())
+    conn.close()
+
+    resultado = {
+        'rodadas': len(ids),
+        'requisicoes_por_rodada': args.requisicoes,
+        'respostas': respostas,
+        'falhas': falhas,
+        'mesma_noite_antes_e_depois_da_meia_noite': mesma_noite,
+        'pode_checkin_index_only': 'Index Only Scan' in plano,
+    }
+    print(json.dumps(resultado, indent=2))
+    if falhas or not mesma_noite or not resultado['pode_checkin_index_only']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Verificação: avisos de invalidação (LISTEN/NOTIFY) chegando a todos os workers dentro de um prazo.
+
+Sobe `--workers` processos, cada um com o app importado do zero (pool,
+ouvinte de avisos e ranking próprios), como os workers do gunicorn. Um
+processo escritor (este) faz, por `--rodadas`:
+  - configuracoes: muda o nome do bar (PUT /api/admin/configuracoes);
+  - produtos: cadastra um produto (POST /api/produtos);
+  - ranking: lança pontos que põem outro cliente em primeiro (POST /api/pontuacao);
+enquanto cada worker revalida o endpoint correspondente com If-None-Match
+a cada milissegundo. Mede o atraso entre o início da escrita e o momento em
+que cada worker devolve o conteúdo novo (inclui a própria escrita, medida
+à parte); todos têm que ficar abaixo de `--limite-ms`.
+
+Depois derruba a conexão de LISTEN de todos (pg_terminate_backend) e
+confere o plano B: com o ouvinte caído, configurações chegam pelo TTL curto
+(CONFIG_CACHE_TTL / VERSOES_CACHE_TTL = `--ttl`) e o ranking pela
+ressincronização feita na reconexão (INVALIDACAO_RECONEXAO_SEGUNDOS =
+`--reconexao`); depois da reconexão os avisos voltam a valer.
+
+Uso:
+    python benchmarks/verificar_invalidacao_workers.py --workers 4 --rodadas 20
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+from comum import BENCH_DATABASE_URL, carregar_app, conectar, criar_clientes, limpar_tabelas, percentis
+
+URLS = {
+    'configuracoes': '/api/configuracoes',
+    'produtos': '/api/produtos?ativos=true',
+    'ranking': '/api/ranking?limite=1',
+}
+
+
+def novo(tipo, dados, valor):
+    if tipo == 'configuracoes':
+        return dados['nome_bar'] == valor
+    if tipo == 'produtos':
+        return any(p['nome'] == valor for p in dados)
+    return bool(dados) and dados[0]['id'] == valor
+
+
+def esperar(condicao, limite_s):
+    fim = time.monotonic() + limite_s
+    while not condicao():
+        if time.monotonic() > fim:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def worker(canal, ambiente):
+    os.environ.update(ambiente)
+    os.environ['POSTGRES_URL'] = BENCH_DATABASE_URL
+    import app as app_module
+
+    client = app_module.app.test_client()
+    for url in URLS.values():
+        client.get(url)
+    esperar(app_module.avisos_ativos, 10)
+    canal.send(os.getpid())
+
+    while True:
+        comando = canal.recv()
+        if comando[0] == 'fim':
+            break
+        if comando[0] == 'estado':
+            canal.send({
+                'conectado': app_module.avisos_ativos(),
+                'avisos_recebidos': app_module.ouvinte.avisos_recebidos,
+            })
+            continue
+
+        _, tipo, valor, limite_s = comando
+        resposta = client.get(URLS[tipo])
+        etag = resposta.headers.get('ETag')
+        assert not novo(tipo, resposta.get_json(), valor)
+        canal.send('observando')
+
+        visto_em = None
+        fim = time.monotonic() + limite_s
+        while time.monotonic() < fim:
+            resposta = client.get(URLS[tipo], headers={'If-None-Match': etag} if etag else {})
+            if resposta.status_code == 200:
+                etag = resposta.headers.get('ETag')
+                if novo(tipo, resposta.get_json(), valor):
+                    visto_em = time.time()
+                    break
+            time.sleep(0.001)
+        canal.send(visto_em)
+
+
+class Escritor:
+    def __init__(self, app_module, clientes):
+        self.admin = app_module.app.test_client()
+        with self.admin.session_transaction() as sessao:
+            sessao['admin'] = True
+        self.config_original = self.admin.get('/api/configuracoes').get_json()
+        self.clientes = clientes
+        self.pontos = 0
+
+    def escrever(self, tipo, rodada):
+        """Faz a escrita e devolve o valor que os workers devem enxergar"""
+        if tipo == 'configuracoes':
+            valor = f"{self.config_original['nome_bar']} #{rodada}"
+            resposta = self.admin.put('/api/admin/configuracoes', json={**self.config_original, 'nome_bar': valor})
+        elif tipo == 'produtos':
+            valor = f'Produto aviso {rodada}'
+            resposta = self.admin.post('/api/produtos', json={'nome': valor, 'pontos': 5})
+        else:
+            valor = self.clientes[rodada % len(self.clientes)]
+            self.pontos += 1000
+            resposta = self.admin.post('/api/pontuacao', json={'cliente_id': valor, 'pontos': self.pontos})
+        assert resposta.status_code in (200, 201), resposta.get_data(as_text=True)
+        return valor
+
+    def restaurar(self):
+        self.admin.put('/api/admin/configuracoes', json=self.config_original)
+
+
+def receber(canal, limite_s=30):
+    """Resposta do worker (erro em vez de esperar para sempre se ele morreu)"""
+    if not canal.poll(limite_s):
+        raise RuntimeError('worker não respondeu')
+    return canal.recv()
+
+
+def propagar(canais, escritor, tipo, rodada, limite_s, escritas_ms=None):
+    """Atraso (ms) até cada worker ver a escrita; None em quem não viu no prazo"""
+    valor = {'configuracoes': f"{escritor.config_original['nome_bar']} #{rodada}",
+             'produtos': f'Produto aviso {rodada}',
+             'ranking': escritor.clientes[rodada % len(escritor.clientes)]}[tipo]
+    for canal in canais:
+        canal.send(('esperar', tipo, valor, limite_s))
+    for canal in canais:
+        assert receber(canal) == 'observando'
+    inicio = time.time()
+    assert escritor.escrever(tipo, rodada) == valor
+    if escritas_ms is not None:
+        escritas_ms.append((time.time() - inicio) * 1000)
+    vistos = [receber(canal, limite_s + 30) for canal in canais]
+    return [None if visto is None else round((visto - inicio) * 1000, 2) for visto in vistos]
+
+
+def estados(canais):
+    for canal in canais:
+        canal.send(('estado',))
+    return [receber(canal) for canal in canais]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rodadas', type=int, default=20)
+    parser.add_argument('--clientes', type=int, default=1000)
+    parser.add_argument('--limite-ms', type=float, default=250)
+    parser.add_argument('--ttl', type=float, default=1)
+    parser.add_argument('--reconexao', type=float, default=4)
+    args = parser.parse_args()
+
+    # Escritor e workers com o mesmo TTL curto, só usado com o ouvinte caído
+    ambiente = {
+        'CONFIG_CACHE_TTL': str(args.ttl),
+        'VERSOES_CACHE_TTL': str(args.ttl),
+        'INVALIDACAO_RECONEXAO_SEGUNDOS': str(args.reconexao),
+        'EXPIRACAO_INTERVALO_SEGUNDOS': '0',
+    }
+    os.environ.update(ambiente)
+    app_module = carregar_app()
+    conn = conectar()
+    limpar_tabelas(conn)
+    clientes = criar_clientes(conn, args.clientes)
+    conn.close()
+
+    contexto = multiprocessing.get_context('spawn')
+    canais, processos = [], []
+    for _ in range(args.workers):
+        nosso, deles = contexto.Pipe()
+        processo = contexto.Process(target=worker, args=(deles, ambiente), daemon=True)
+        processo.start()
+        canais.append(nosso)
+        processos.append(processo)
+    for canal in canais:
+        receber(canal, 60)
+
+    escritor = Escritor(app_module, clientes)
+    esperar(app_module.avisos_ativos, 10)
+    conectados_no_inicio = all(e['conectado'] for e in estados(canais))
+
+    # Com os avisos
+    atrasos = {tipo: [] for tipo in URLS}
+    escritas = {tipo: [] for tipo in URLS}
+    nao_vistos = 0
+    rodada = 0
+    for _ in range(args.rodadas):
+        for tipo in URLS:
+            rodada += 1
+            resultado = propagar(canais, escritor, tipo, rodada, args.limite_ms / 1000 * 4, escritas[tipo])
+            nao_vistos += resultado.count(None)
+            atrasos[tipo].extend(a for a in resultado if a is not None)
+    avisos = {tipo: percentis(valores) for tipo, valores in atrasos.items()}
+    pior_ms = max(max(valores) for valores in atrasos.values())
+
+    # Plano B: ouvinte caído em todos os processos
+    conn = conectar()
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE application_name = 'semaforo-invalidacao'"
+    )
+    derrubados = cursor.rowcount
+    conn.close()
+    esperar(lambda: not any(e['conectado'] for e in estados(canais)), 5)
+    desconectados = not any(e['conectado'] for e in estados(canais))
+
+    rodada += 1
+    config_ttl = propagar(canais, escritor, 'configuracoes', rodada, args.ttl + args.reconexao + 5)
+    rodada += 1
+    ranking_reconexao = propagar(canais, escritor, 'ranking', rodada, args.reconexao + 10)
+
+    esperar(lambda: all(e['conectado'] for e in estados(canais)), args.reconexao + 5)
+    reconectados = all(e['conectado'] for e in estados(canais))
+    rodada += 1
+    config_reconectado = propagar(canais, escritor, 'configuracoes', rodada, args.limite_ms / 1000 * 4)
+
+    escritor.restaurar()
+    for canal in canais:
+        canal.send(('fim',))
+    for processo in processos:
+        processo.join(5)
+
+    def dentro(valores, limite_ms):
+        return all(v is not None and v <= limite_ms for v in valores)
+
+    print(json.dumps({
+        'workers': args.workers,
+        'escritas_por_tipo': args.rodadas,
+        'limite_ms': args.limite_ms,
+        'com_avisos_ms': avisos,
+        'duracao_da_escrita_ms': {tipo: percentis(valores) for tipo, valores in escritas.items()},
+        'plano_b': {
+            'ouvintes_derrubados': derrubados,
+            'configuracoes_pelo_ttl_ms': config_ttl,
+            'ranking_pela_reconexao_ms': ranking_reconexao,
+            'configuracoes_apos_reconectar_ms': config_reconectado,
+        },
+        'conferencia': {
+            'ouvintes_conectados_no_inicio': conectados_no_inicio,
+            'todos_os_workers_viram_todas_as_escritas': nao_vistos == 0,
+            'pior_atraso_dentro_do_limite': nao_vistos == 0 and pior_ms <= args.limite_ms,
+            'ouvintes_desconectados': desconectados,
+            'configuracoes_dentro_do_ttl': dentro(config_ttl, (args.ttl + 0.5) * 1000),
+            'ranking_dentro_da_reconexao': dentro(ranking_reconexao, (args.reconexao + 3) * 1000),
+            'ouvintes_reconectados': reconectados,
+            'avisos_de_volta_apos_reconectar': dentro(config_reconectado, args.limite_ms),
+        },
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Verificação: migração SQLite → PostgreSQL (migrate_data_to_supabase.py) interrompida no meio e retomada.
+
+  1. gera um SQLite no formato antigo do app com cerca de 1 milhão de linhas
+     (`--clientes` clientes, ~16 pontuações, ~3 check-ins e ~0,2 solicitação
+     por cliente), com o que aparece num banco real: clientes apagados que
+     deixaram pontuações e check-ins órfãos, check-ins repetidos na mesma
+     noite e descrições com tab, quebra de linha, barra invertida, aspas e
+     acentos;
+  2. esvazia as tabelas de dados do banco local e roda a migração num
+     subprocesso, que é morto (SIGKILL) depois de `--interromper-em`
+     segundos; roda de novo até o fim;
+  3. confere: linhas por tabela (sem órfãos; check-ins repetidos na mesma
+     noite preservados, só o primeiro de cada noite com dia_negocio, como
+     sql/09_checkin_dia_negocio.sql faz com o histórico), soma e
+     impressão digital (SUM(cliente_id * pontos)) do extrato, nenhum saldo
+     divergente, sequências depois do maior id e as descrições especiais
+     idênticas às do SQLite.
+Mostra as linhas/s de cada execução. Usa o banco local dos benchmarks.
+
+Uso:
+    python benchmarks/verificar_migracao.py --clientes 50000 --interromper-em 10
+"""
+
+import argparse
+import json
+import os
+import random
+import signal
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from comum import BENCH_DATABASE_URL, RAIZ, TABELAS_DADOS, carregar_app, conectar
+
+ESPECIAIS = [
+    'tab\tno meio',
+    'quebra\nde linha',
+    'retorno\r\nwindows',
+    'barra \\ invertida e \\N literal',
+    'aspas "duplas" e \'simples\'',
+    'acentuação: pão, açaí, coração ♥ 🍺',
+    '',
+]
+
+ESQUEMA_LEGADO = '''
+    CREATE TABLE clientes (id INTEGER PRIMARY KEY AUTOINCREMENT, nome TEXT NOT NULL, telefone TEXT, email TEXT,
+                           senha TEXT, data_cadastro TIMESTAMP, pontos_totais INTEGER DEFAULT 0,
+                           nivel TEXT DEFAULT 'vermelho', ultima_visita TIMESTAMP);
+    CREATE TABLE pontuacoes (id INTEGER PRIMARY KEY AUTOINCREMENT, cliente_id INTEGER NOT NULL, pontos INTEGER NOT NULL,
+                             tipo TEXT NOT NULL, descricao TEXT, data TIMESTAMP, data_validade TIMESTAMP);
+    CREATE TABLE configuracoes (id INTEGER PRIMARY KEY AUTOINCREMENT, nome_bar TEXT, logo_path TEXT,
+                                pontos_vermelho_min INTEGER, pontos_amarelo_min INTEGER, pontos_verde_min INTEGER,
+                                senha_admin TEXT);
+    CREATE TABLE produtos (id INTEGER PRIMARY KEY AUTOINCREMENT, nome TEXT NOT NULL, descricao TEXT,
+                           pontos INTEGER NOT NULL, ativo INTEGER DEFAULT 1, data_cadastro TIMESTAMP);
+    CREATE TABLE checkins (id INTEGER PRIMARY KEY AUTOINCREMENT, cliente_id INTEGER NOT NULL,
+                           data_checkin TIMESTAMP, localizacao TEXT);
+    CREATE TABLE solicitacoes_pontos (id INTEGER PRIMARY KEY AUTOINCREMENT, cliente_id INTEGER NOT NULL,
+                                      produto_id INTEGER NOT NULL, quantidade INTEGER DEFAULT 1,
+                                      pontos_total INTEGER NOT NULL, status TEXT DEFAULT 'pendente', observacao TEXT,
+                                      data_solicitacao TIMESTAMP, data_validacao TIMESTAMP, validado_por TEXT);
+'''
+
+
+def gerar_sqlite(caminho, clientes, semente):
+    """SQLite legado com ~20 linhas por cliente; devolve os ids das pontuações com descrição especial"""
+    if os.path.exists(caminho):
+        os.remove(caminho)
+    aleatorio = random.Random(semente)
+    conn = sqlite3.connect(caminho)
+    conn.executescript(ESQUEMA_LEGADO)
+    hoje = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    conn.execute("INSERT INTO configuracoes VALUES (1, 'Bar Legado', NULL, 0, 200, 500, 'admin123')")
+    conn.executemany('INSERT INTO produtos (nome, descricao, pontos, ativo, data_cadastro) VALUES (?, ?, ?, ?, ?)', [
+        (f'Produto {i}', ESPECIAIS[i % len(ESPECIAIS)], 10 * (i + 1), i % 5 != 0, str(hoje - timedelta(days=400)))
+        for i in range(15)
+    ])
+
+    def linhas_clientes():
+        for i in range(1, clientes + 1):
+            nome = f'Cliente {i}' if i % 1000 else f'Cliente\t{i} "legado"'
+            email = None if i % 7 == 0 else f'cliente{i}@exemplo.com'
+            # Saldo antigo de propósito errado: o destino recalcula pelo extrato
+            yield (nome, f'1199{i:07d}', email, 'hash', str(hoje - timedelta(days=aleatorio.randint(1, 700))),
+                   999999, 'verde', None)
+
+    conn.executemany('INSERT INTO clientes (nome, telefone, email, senha, data_cadastro, pontos_totais, nivel, '
+                     'ultima_visita) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', linhas_clientes())
+
+    def linhas_pontuacoes():
+        for cliente_id in range(1, clientes + 1):
+            for _ in range(aleatorio.randint(8, 24)):
+                data = hoje - timedelta(days=aleatorio.randint(0, 200), minutes=aleatorio.randint(0, 1439))
+                yield (cliente_id, aleatorio.randint(1, 60), 'consumo', 'Comanda', str(data), str(data + timedelta(days=90)))
+
+    conn.executemany('INSERT INTO pontuacoes (cliente_id, pontos, tipo, descricao, data, data_validade) '
+                     'VALUES (?, ?, ?, ?, ?, ?)', linhas_pontuacoes())
+    conn.execute('UPDATE pontuacoes SET descricao = NULL WHERE id % 97 = 0')
+    total_pontuacoes = conn.execute('SELECT MAX(id) FROM pontuacoes').fetchone()[0]
+    especiais = {}
+    for texto in ESPECIAIS * 20:
+        id_pontuacao = aleatorio.randint(1, total_pontuacoes)
+        especiais[id_pontuacao] = texto
+        conn.execute('UPDATE pontuacoes SET descricao = ? WHERE id = ?', (texto, id_pontuacao))
+
+    def linhas_checkins():
+        for cliente_id in range(1, clientes + 1):
+            for dias in aleatorio.sample(range(0, 60), aleatorio.randint(1, 5)):
+                # Entre 18h e 23h UTC: a noite do check-in é a própria data
+                data = hoje - timedelta(days=dias) + timedelta(hours=aleatorio.randint(18, 22),
+                                                               minutes=aleatorio.randint(0, 54))
+                yield (cliente_id, str(data), 'balcão')
+                if aleatorio.random() < 0.007:
+                    # Check-in repetido na mesma noite (o banco antigo não impedia)
+                    yield (cliente_id, str(data + timedelta(minutes=5)), 'balcão')
+
+    conn.executemany('INSERT INTO checkins (cliente_id, data_checkin, localizacao) VALUES (?, ?, ?)', linhas_checkins())
+
+    def linhas_solicitacoes():
+        for cliente_id in range(1, clientes + 1):
+            if aleatorio.random() < 0.2:
+                produto = aleatorio.randint(1, 15)
+                quantidade = aleatorio.randint(1, 3)
+                status = aleatorio.choice(['aprovada', 'aprovada', 'rejeitada', 'pendente'])
+                data = hoje - timedelta(days=aleatorio.randint(0, 60))
+                yield (cliente_id, produto, quantidade, 10 * produto * quantidade, status,
+                       aleatorio.choice([None, 'obs\tcom tab', 'ok']), str(data),
+                       None if status == 'pendente' else str(data + timedelta(hours=1)),
+                       None if status == 'pendente' else 'admin')
+
+    conn.executemany('INSERT INTO solicitacoes_pontos (cliente_id, produto_id, quantidade, pontos_total, status, '
+                     'observacao, data_solicitacao, data_validacao, validado_por) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                     linhas_solicitacoes())
+
+    # Clientes apagados sem cascata: o histórico deles fica órfão no SQLite
+    apagados = aleatorio.sample(range(1, clientes + 1), max(1, clientes // 100))
+    conn.executemany('DELETE FROM clientes WHERE id = ?', [(i,) for i in apagados])
+    conn.commit()
+    especiais = {i: t for i, t in especiais.items()
+                 if conn.execute('SELECT 1 FROM pontuacoes p JOIN clientes c ON c.id = p.cliente_id '
+                                 'WHERE p.id = ?', (i,)).fetchone()}
+    conn.close()
+    return especiais
+
+
+def esperado(caminho):
+    """Contagens e impressões digitais do que deve chegar ao destino (sem órfãos)"""
+    conn = sqlite3.connect(caminho)
+    valido = 'cliente_id IN (SELECT id FROM clientes)'
+    resultado = {
+        'clientes': conn.execute('SELECT COUNT(*) FROM clientes').fetchone()[0],
+        'produtos': conn.execute('SELECT COUNT(*) FROM produtos').fetchone()[0],
+        'pontuacoes': conn.execute(f'SELECT COUNT(*) FROM pontuacoes WHERE {valido}').fetchone()[0],
+        'checkins': conn.execute(f'SELECT COUNT(*) FROM checkins WHERE {valido}').fetchone()[0],
+        'checkins_com_dia': conn.execute(f'SELECT COUNT(*) FROM (SELECT DISTINCT cliente_id, date(data_checkin) '
+                                         f'FROM checkins WHERE {valido})').fetchone()[0],
+        'solicitacoes_pontos': conn.execute(f'SELECT COUNT(*) FROM solicitacoes_pontos WHERE {valido}').fetchone()[0],
+        'soma_pontos': conn.execute(f'SELECT SUM(pontos) FROM pontuacoes WHERE {valido}').fetchone()[0],
+        'digital_pontos': conn.execute(f'SELECT SUM(cliente_id * pontos) FROM pontuacoes WHERE {valido}').fetchone()[0],
+        'linhas_sqlite': sum(conn.execute(f'SELECT COUNT(*) FROM {t}').fetchone()[0]
+                             for t in ('clientes', 'produtos', 'pontuacoes', 'checkins', 'solicitacoes_pontos')),
+    }
+    conn.close()
+    return resultado
+
+
+def migrar(caminho, argumentos, interromper_em=None):
+    """Roda a migração num subprocesso; com `interromper_em`, mata-o (SIGKILL) depois desse tempo"""
+    comando = [sys.executable, os.path.join(RAIZ, 'migrate_data_to_supabase.py'), '--sqlite', caminho,
+               '--destino', BENCH_DATABASE_URL, *argumentos]
+    inicio = time.perf_counter()
+    processo = subprocess.Popen(comando, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    try:
+        saida, _ = processo.communicate(timeout=interromper_em)
+    except subprocess.TimeoutExpired:
+        processo.send_signal(signal.SIGKILL)
+        saida, _ = processo.communicate()
+    return processo.returncode, saida, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clientes', type=int, default=50000)
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--sqlite', default='/tmp/semaforo_legado.db')
+    parser.add_argument('--interromper-em', type=float, default=10.0)
+    parser.add_argument('--paralelo', type=int, default=4)
+    parser.add_argument('--faixas', type=int, default=4)
+    parser.add_argument('--lote', type=int, default=20000)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    especiais = gerar_sqlite(args.sqlite, args.clientes, args.semente)
+    alvo = esperado(args.sqlite)
+    print(f"SQLite gerado: {alvo['linhas_sqlite']} linhas em {time.perf_counter() - inicio:.1f}s", file=sys.stderr)
+
+    carregar_app()
+    conn = conectar()
+    cursor = conn.cursor()
+    cursor.execute(f"TRUNCATE {', '.join(TABELAS_DADOS)} RESTART IDENTITY CASCADE")
+    cursor.execute('DROP TABLE IF EXISTS migracao_progresso')
+    conn.commit()
+
+    opcoes = ['--paralelo', str(args.paralelo), '--faixas', str(args.faixas), '--lote', str(args.lote)]
+    codigo, saida, segundos = migrar(args.sqlite, opcoes, args.interromper_em)
+    cursor.execute('SELECT tabela, faixa, concluida, lidas FROM migracao_progresso ORDER BY 1, 2')
+    ponto_de_parada = cursor.fetchall()
+    conn.commit()
+    interrompida = {
+        'codigo_saida': codigo,
+        'segundos': round(segundos, 1),
+        'linhas_gravadas': sum(linha[3] for linha in ponto_de_parada),
+        'faixas_concluidas': sum(1 for linha in ponto_de_parada if linha[2]),
+        'faixas': len(ponto_de_parada),
+    }
+
+    arquivo_resumo = args.sqlite + '.resumo.json'
+    codigo, saida, segundos = migrar(args.sqlite, opcoes + ['--saida', arquivo_resumo])
+    if codigo != 0 or not os.path.exists(arquivo_resumo):
+        print(saida)
+        raise SystemExit('a migração retomada falhou')
+    with open(arquivo_resumo, encoding='utf-8') as f:
+        resumo = json.load(f)
+    os.remove(arquivo_resumo)
+
+    obtido = {}
+    for tabela in ('clientes', 'produtos', 'pontuacoes', 'checkins', 'solicitacoes_pontos'):
+        cursor.execute(f'SELECT COUNT(*) FROM {tabela}')
+        obtido[tabela] = cursor.fetchone()[0]
+    cursor.execute('SELECT COUNT(*) FROM checkins WHERE dia_negocio IS NOT NULL')
+    obtido['checkins_com_dia'] = cursor.fetchone()[0]
+    # O dia ficou com o primeiro check-in (data_checkin, id) de cada noite, a regra de sql/09
+    cursor.execute('''
+        SELECT COUNT(*) FROM (
+            SELECT dia_negocio, dia_negocio(data_checkin::TIMESTAMPTZ) AS dia,
+                   ROW_NUMBER() OVER (PARTITION BY cliente_id, dia_negocio(data_checkin::TIMESTAMPTZ)
+                                      ORDER BY data_checkin, id) AS ordem
+            FROM checkins
+        ) c
+        WHERE dia_negocio IS DISTINCT FROM CASE WHEN ordem = 1 THEN dia END
+    ''')
+    dias_fora_da_regra = cursor.fetchone()[0]
+    cursor.execute('SELECT SUM(pontos), SUM(cliente_id::BIGINT * pontos) FROM pontuacoes')
+    obtido['soma_pontos'], obtido['digital_pontos'] = cursor.fetchone()
+    cursor.execute('SELECT COUNT(*) FROM verificar_saldos()')
+    saldos_divergentes = cursor.fetchone()[0]
+
+    sequencias = {}
+    for tabela in ('clientes', 'produtos', 'pontuacoes', 'checkins', 'solicitacoes_pontos'):
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", (tabela,))
+        cursor.execute(f'SELECT last_value FROM {cursor.fetchone()[0]}')
+        ultimo = cursor.fetchone()[0]
+        cursor.execute(f'SELECT COALESCE(MAX(id), 0) FROM {tabela}')
+        sequencias[tabela] = ultimo >= cursor.fetchone()[0]
+
+    cursor.execute('SELECT id, descricao FROM pontuacoes WHERE id = ANY(%s)', (list(especiais),))
+    descricoes_erradas = [i for i, descricao in cursor.fetchall() if descricao != especiais[i]]
+    conn.close()
+
+    verificacoes = {
+        'contagens': all(obtido[t] == alvo[t] for t in obtido),
+        'extrato_identico': obtido['soma_pontos'] == alvo['soma_pontos']
+                            and obtido['digital_pontos'] == alvo['digital_pontos'],
+        'dias_fora_da_regra': dias_fora_da_regra,
+        'saldos_divergentes': saldos_divergentes,
+        'sequencias_ok': all(sequencias.values()),
+        'descricoes_especiais_identicas': not descricoes_erradas and len(especiais) > 0,
+        'interrompida_no_meio': 0 < interrompida['linhas_gravadas'] < alvo['linhas_sqlite'],
+    }
+    print(json.dumps({
+        'esperado': alvo,
+        'obtido': obtido,
+        'interrompida': interrompida,
+        'retomada': {'segundos': round(segundos, 1), 'tabelas': resumo['tabelas'], 'acumulado': resumo['acumulado']},
+        'verificacoes': verificacoes,
+    }, indent=2, default=str))
+    ok = (verificacoes['contagens'] and verificacoes['extrato_identico'] and not saldos_divergentes
+          and not dias_fora_da_regra
+          and verificacoes['sequencias_ok'] and verificacoes['descricoes_especiais_identicas']
+          and verificacoes['interrompida_no_meio'])
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
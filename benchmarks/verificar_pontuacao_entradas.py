@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Verificação: POST /api/pontuacao e POST /api/solicitacoes validam a entrada
+igual no modo WSGI (app.py) e no assíncrono (app_async.py).
+
+Manda os mesmos corpos para as duas entradas e confere que só inteiros do
+JSON passam: "10" (texto), 1.5, 10.0, true, null, zero e negativos voltam
+400 "Dados inválidos" nas duas, sem gravar nada; um pedido válido passa nas
+duas (200 no lançamento, 201 na solicitação) e um cliente ou produto
+inexistente volta 404. As solicitações vão com o cookie de sessão do
+cliente. Usa o banco local dos benchmarks; precisa de
+requirements-async.txt instalado.
+
+Uso:
+    python benchmarks/verificar_pontuacao_entradas.py
+"""
+
+import json
+import sys
+
+from comum import carregar_app, conectar, criar_clientes, limpar_tabelas
+
+
+def casos(cliente_id):
+    """(descrição, corpo, status esperado)"""
+    return [
+        ('pontos como texto', {'cliente_id': cliente_id, 'pontos': '10'}, 400),
+        ('pontos fracionários', {'cliente_id': cliente_id, 'pontos': 1.5}, 400),
+        ('pontos 10.0', {'cliente_id': cliente_id, 'pontos': 10.0}, 400),
+        ('pontos booleanos', {'cliente_id': cliente_id, 'pontos': True}, 400),
+        ('pontos nulos', {'cliente_id': cliente_id, 'pontos': None}, 400),
+        ('pontos zero', {'cliente_id': cliente_id, 'pontos': 0}, 400),
+        ('pontos negativos', {'cliente_id': cliente_id, 'pontos': -5}, 400),
+        ('cliente como texto', {'cliente_id': str(cliente_id), 'pontos': 10}, 400),
+        ('cliente fracionário', {'cliente_id': cliente_id + 0.5, 'pontos': 10}, 400),
+        ('cliente booleano', {'cliente_id': True, 'pontos': 10}, 400),
+        ('sem cliente', {'pontos': 10}, 400),
+        ('válido', {'cliente_id': cliente_id, 'pontos': 10}, 200),
+        ('cliente inexistente', {'cliente_id': 2_000_000_000, 'pontos': 10}, 404),
+    ]
+
+
+def casos_solicitacao(produto_id):
+    """(descrição, corpo, status esperado)"""
+    return [
+        ('quantidade como texto', {'produto_id': produto_id, 'quantidade': '2'}, 400),
+        ('quantidade fracionária', {'produto_id': produto_id, 'quantidade': 1.5}, 400),
+        ('quantidade booleana', {'produto_id': produto_id, 'quantidade': True}, 400),
+        ('quantidade nula', {'produto_id': produto_id, 'quantidade': None}, 400),
+        ('quantidade zero', {'produto_id': produto_id, 'quantidade': 0}, 400),
+        ('quantidade negativa', {'produto_id': produto_id, 'quantidade': -1}, 400),
+        ('produto como texto', {'produto_id': str(produto_id), 'quantidade': 2}, 400),
+        ('produto fracionário', {'produto_id': produto_id + 0.5, 'quantidade': 2}, 400),
+        ('produto booleano', {'produto_id': True, 'quantidade': 2}, 400),
+        ('sem produto', {'quantidade': 2}, 400),
+        ('válida', {'produto_id': produto_id, 'quantidade': 2}, 201),
+        ('produto inexistente', {'produto_id': 2_000_000_000, 'quantidade': 2}, 404),
+    ]
+
+
+def main():
+    app_module = carregar_app()
+    from starlette.testclient import TestClient
+    import app_async
+
+    conn = conectar()
+    limpar_tabelas(conn)
+    cliente_id = criar_clientes(conn, 1)[0]
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO produtos (nome, pontos, ativo) VALUES ('Produto verificação', 15, 1) RETURNING id")
+    produto_id = cursor.fetchone()[0]
+    conn.commit()
+
+    flask_client = app_module.app.test_client()
+    with flask_client.session_transaction() as sessao:
+        sessao['cliente_id'] = cliente_id
+    cookie = flask_client.get_cookie(app_module.app.config['SESSION_COOKIE_NAME']).value
+
+    pedidos = [('/api/pontuacao', caso) for caso in casos(cliente_id)]
+    pedidos += [('/api/solicitacoes', caso) for caso in casos_solicitacao(produto_id)]
+    falhas = []
+    with TestClient(app_async.app, cookies={app_module.app.config['SESSION_COOKIE_NAME']: cookie}) as asgi_client:
+        for rota, (descricao, corpo, esperado) in pedidos:
+            status = {
+                'wsgi': flask_client.post(rota, json=corpo).status_code,
+                'asgi': asgi_client.post(rota, json=corpo).status_code,
+            }
+            if set(status.values()) != {esperado}:
+                falhas.append({'rota': rota, 'caso': descricao, 'esperado': esperado, **status})
+
+    # Dois lançamentos válidos (um por entrada); os inválidos não lançaram nada
+    cursor.execute('SELECT COUNT(*), COALESCE(SUM(pontos), 0) FROM pontuacoes WHERE cliente_id = %s', (cliente_id,))
+    lancamentos, pontos = cursor.fetchone()
+    # Idem para as solicitações: duas de 2 x 15 pontos
+    cursor.execute('SELECT COUNT(*), COALESCE(SUM(pontos_total), 0) FROM solicitacoes_pontos WHERE cliente_id = %s',
+                   (cliente_id,))
+    solicitacoes, pontos_solicitados = cursor.fetchone()
+    conn.close()
+
+    resultado = {
+        'casos': len(pedidos),
+        'falhas': falhas,
+        'lancamentos': lancamentos,
+        'pontos_lancados': pontos,
+        'solicitacoes': solicitacoes,
+        'pontos_solicitados': pontos_solicitados,
+        'ok': (not falhas and lancamentos == 2 and pontos == 20
+               and solicitacoes == 2 and pontos_solicitados == 60),
+    }
+    print(json.dumps(resultado, indent=2))
+    sys.exit(0 if resultado['ok'] else 1)
+
+
+if __name__ == '__main__':
+    main()
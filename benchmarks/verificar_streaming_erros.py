@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Verificação: respostas em streaming (resposta_json_streaming em app.py) só começam depois do primeiro lote.
+
+Confere, no app Flask, que:
+  - uma lista de vários lotes (STREAM_TAMANHO_LOTE=2) sai inteira, com 200;
+  - um erro na consulta volta 500 em JSON, e não um corpo cortado com 200;
+  - com o pool esgotado, GET /api/solicitacoes?status=todas volta 503 em JSON;
+  - depois dos erros as conexões voltaram ao pool (a lista sai de novo).
+Usa o banco local dos benchmarks.
+
+Uso:
+    python benchmarks/verificar_streaming_erros.py
+"""
+
+import json
+import os
+import sys
+
+os.environ['STREAM_TAMANHO_LOTE'] = '2'
+os.environ['DB_POOL_TIMEOUT'] = '0.5'
+
+from comum import carregar_app, conectar, criar_clientes, limpar_tabelas
+
+SOLICITACOES = 5
+
+
+def main():
+    app_module = carregar_app()
+    from pool_conexoes import PoolEsgotado
+
+    conn = conectar()
+    limpar_tabelas(conn)
+    cliente_id = criar_clientes(conn, 1)[0]
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO produtos (nome, pontos, ativo) VALUES ('Produto verificação', 10, 1) RETURNING id")
+    produto_id = cursor.fetchone()[0]
+    cursor.executemany('''
+        INSERT INTO solicitacoes_pontos (cliente_id, produto_id, quantidade, pontos_total)
+        VALUES (%s, %s, 1, 10)
+    ''', [(cliente_id, produto_id)] * SOLICITACOES)
+    conn.commit()
+    conn.close()
+
+    admin = app_module.app.test_client()
+    with admin.session_transaction() as sessao:
+        sessao['admin'] = True
+
+    def listar():
+        resposta = admin.get('/api/solicitacoes?status=todas')
+        return resposta.status_code, resposta.get_json(silent=True)
+
+    resultado = {}
+    status, corpo = listar()
+    resultado['lista'] = {'status': status, 'itens': len(corpo) if isinstance(corpo, list) else None}
+
+    with app_module.app.test_request_context():
+        resposta = app_module.resposta_json_streaming('SELECT * FROM tabela_que_nao_existe')
+        if isinstance(resposta, tuple):
+            resposta, status = resposta
+        else:
+            status = resposta.status_code
+        resultado['erro_consulta'] = {'status': status, 'json': resposta.get_json(silent=True) is not None}
+
+    pool = app_module.get_pool()
+    presas = []
+    try:
+        while True:
+            presas.append(pool.getconn(timeout=0.1))
+    except PoolEsgotado:
+        pass
+    try:
+        status, corpo = listar()
+        resultado['pool_esgotado'] = {'status': status, 'json': isinstance(corpo, dict) and 'error' in corpo}
+    finally:
+        for c in presas:
+            pool.putconn(c)
+
+    status, corpo = listar()
+    resultado['lista_depois'] = {'status': status, 'itens': len(corpo) if isinstance(corpo, list) else None}
+
+    resultado['ok'] = (
+        resultado['lista'] == {'status': 200, 'itens': SOLICITACOES}
+        and resultado['erro_consulta'] == {'status': 500, 'json': True}
+        and resultado['pool_esgotado'] == {'status': 503, 'json': True}
+        and resultado['lista_depois'] == {'status': 200, 'itens': SOLICITACOES}
+    )
+    print(json.dumps(resultado, indent=2))
+    sys.exit(0 if resultado['ok'] else 1)
+
+
+if __name__ == '__main__':
+    main()
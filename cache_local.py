@@ -0,0 +1,57 @@
+"""
+Cache em memória do processo com TTL e invalidação explícita
+"""
+
+import threading
+import time
+
+
+class CacheLocal:
+    """Guarda o resultado de `carregar()` por até `ttl` segundos.
+
+    invalidar() força a recarga na próxima leitura; o TTL cobre os outros
+    workers, que não ficam sabendo da escrita feita neste processo. Cada
+    recarga incrementa `versao`.
+
+    `carregar()` roda fora do lock: as threads que esperassem por ele estariam
+    segurando a conexão do pool que a recarga precisa e, com o pool cheio,
+    ninguém andaria. Threads que chegam juntas carregam cada uma a sua; só
+    é guardado o resultado mais novo e, se houve invalidar() no meio, nenhum.
+    """
+
+    def __init__(self, carregar, ttl):
+        self._carregar = carregar
+        self.ttl = ttl
+        self.versao = 0
+        self._valor = None
+        self._versao_guardada = 0
+        self._geracao = 0
+        self._expira_em = 0.0
+        self._lock = threading.Lock()
+
+    def obter(self):
+        if time.monotonic() < self._expira_em:
+            return self._valor
+        with self._lock:
+            # Outra thread pode ter recarregado enquanto esperávamos o lock
+            if time.monotonic() < self._expira_em:
+                return self._valor
+            self.versao += 1
+            versao, geracao = self.versao, self._geracao
+        valor = self._carregar(versao)
+        with self._lock:
+            if geracao == self._geracao and versao > self._versao_guardada:
+                self._valor = valor
+                self._versao_guardada = versao
+                self._expira_em = time.monotonic() + self.ttl
+        return valor
+
+    @property
+    def valido(self):
+        """True se obter() responde agora, sem chamar `carregar()`"""
+        return time.monotonic() < self._expira_em
+
+    def invalidar(self):
+        with self._lock:
+            self._expira_em = 0.0
+            self._geracao += 1
@@ -0,0 +1,140 @@
+"""
+Varredura de pontos expirados: atualiza saldo e nível de quem teve lotes vencidos
+"""
+
+import threading
+import time
+
+import registro
+
+log = registro.obter('expiracao')
+
+# Chave do advisory lock que serializa quem tenta começar uma varredura. É de
+# transação: atrás do pooler em modo transação (porta 6543 do Supabase) cada
+# transação pode cair num backend diferente, e um lock de sessão liberado por
+# outro backend ficaria preso no original
+CHAVE_LOCK_VARREDURA = 7_300_404
+
+# Prazo da concessão de quem está varrendo (execucoes_expiracao.concessao_ate),
+# renovado a cada lote: se o processo morrer no meio, a próxima varredura
+# começa depois que ele vencer
+CONCESSAO_SEGUNDOS = 120
+
+
+def _obter_concessao(cursor, tamanho_lote):
+    """Registra a execução se nenhuma outra estiver com a concessão em dia; retorna o id ou None"""
+    cursor.execute('SELECT pg_try_advisory_xact_lock(%s)', (CHAVE_LOCK_VARREDURA,))
+    if not cursor.fetchone()[0]:
+        return None
+    cursor.execute('''
+        UPDATE execucoes_expiracao SET erro = 'interrompida (concessão vencida)'
+        WHERE finalizado_em IS NULL AND concessao_ate <= NOW() AND erro IS NULL
+    ''')
+    cursor.execute('''
+        SELECT 1 FROM execucoes_expiracao
+        WHERE finalizado_em IS NULL AND concessao_ate > NOW()
+    ''')
+    if cursor.fetchone():
+        return None
+    cursor.execute('''
+        INSERT INTO execucoes_expiracao (tamanho_lote, concessao_ate)
+        VALUES (%s, NOW() + make_interval(secs => %s)) RETURNING id
+    ''', (tamanho_lote, CONCESSAO_SEGUNDOS))
+    return cursor.fetchone()[0]
+
+
+def executar_varredura(conn, tamanho_lote=500, max_lotes=None):
+    """Expira, em lotes de `tamanho_lote` clientes, todos os saldos vencidos.
+
+    Cada lote é uma transação curta (expirar_saldos_lote em sql/03_expiracao.sql)
+    que também renova a concessão da execução em execucoes_expiracao. Retorna o
+    resumo; se outra varredura já estiver rodando, retorna {'executada': False}.
+    """
+    cursor = conn.cursor()
+    try:
+        execucao_id = _obter_concessao(cursor, tamanho_lote)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if execucao_id is None:
+        return {'executada': False, 'motivo': 'varredura já em andamento'}
+
+    inicio = time.perf_counter()
+    resumo = {
+        'executada': True,
+        'tamanho_lote': tamanho_lote,
+        'lotes': 0,
+        'clientes_atualizados': 0,
+        'pontos_expirados': 0,
+        'execucao_id': execucao_id,
+    }
+    erro = None
+    try:
+        while max_lotes is None or resumo['lotes'] < max_lotes:
+            cursor.execute('SELECT * FROM expirar_saldos_lote(%s)', (tamanho_lote,))
+            linhas = cursor.fetchall()
+            cursor.execute('''
+                UPDATE execucoes_expiracao SET concessao_ate = NOW() + make_interval(secs => %s)
+                WHERE id = %s
+            ''', (CONCESSAO_SEGUNDOS, execucao_id))
+            conn.commit()
+            if not linhas:
+                break
+            resumo['lotes'] += 1
+            resumo['clientes_atualizados'] += len(linhas)
+            resumo['pontos_expirados'] += sum(linha[3] for linha in linhas)
+            if len(linhas) < tamanho_lote:
+                break
+    except Exception as e:
+        conn.rollback()
+        erro = f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        resumo['duracao_ms'] = round((time.perf_counter() - inicio) * 1000, 3)
+        try:
+            cursor.execute('''
+                UPDATE execucoes_expiracao
+                SET finalizado_em = NOW(), concessao_ate = NULL, lotes = %s, clientes_atualizados = %s,
+                    pontos_expirados = %s, duracao_ms = %s, erro = %s
+                WHERE id = %s
+            ''', (resumo['lotes'], resumo['clientes_atualizados'], resumo['pontos_expirados'],
+                  resumo['duracao_ms'], erro, execucao_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+
+    return resumo
+
+
+class VarredorExpiracao(threading.Thread):
+    """Thread que roda executar_varredura() a cada `intervalo` segundos.
+
+    Para servidores de longa duração; na Vercel a varredura é disparada pelo
+    cron em /api/admin/expiracao/executar.
+    """
+
+    def __init__(self, pool, intervalo, tamanho_lote=500, ao_concluir=None):
+        super().__init__(name='varredor-expiracao', daemon=True)
+        self.pool = pool
+        self.intervalo = intervalo
+        self.tamanho_lote = tamanho_lote
+        self.ao_concluir = ao_concluir
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            conn = None
+            try:
+                conn = self.pool.getconn()
+                resumo = executar_varredura(conn, self.tamanho_lote)
+                if self.ao_concluir:
+                    self.ao_concluir(resumo)
+            except Exception:
+                log.exception('Erro na varredura de expiração')
+            finally:
+                if conn is not None:
+                    self.pool.putconn(conn)
+
+    def parar(self):
+        self._parar.set()
@@ -1,119 +1,72 @@
 #!/usr/bin/env python3
 """
-Script para exportar dados do SQLite para CSV
-Depois você pode importar via Supabase Dashboard
+Script para exportar os dados do PostgreSQL (Supabase) para CSV ou NDJSON comprimidos
+Serve de backup e para importar em outro banco ou planilha
+
+Cada tabela sai por COPY TO STDOUT direto para um .csv.gz (ou .ndjson.gz),
+sem carregar a tabela na memória; as tabelas vão em paralelo e todas do
+mesmo instante do banco (ver exportacao.py).
+
+Uso:
+    python export_to_csv.py --formato csv --paralelo 3 --saida export_csv
 """
 
-import sqlite3
-import csv
+import argparse
 import os
-from datetime import datetime
+import time
 
-SQLITE_DB = "semaforo.db"
-OUTPUT_DIR = "export_csv"
+from dotenv import load_dotenv
 
-def criar_diretorio():
-    """Cria diretório para os arquivos CSV"""
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
-    print(f"📁 Diretório criado: {OUTPUT_DIR}/")
+from exportacao import FORMATOS, TABELAS, exportar_tabelas
+
+load_dotenv()
+
+OUTPUT_DIR = "export_csv"
 
-def exportar_tabela(conn, tabela, colunas):
-    """Exporta uma tabela para CSV"""
-    try:
-        cursor = conn.cursor()
-        cursor.execute(f'SELECT {", ".join(colunas)} FROM {tabela}')
-        dados = cursor.fetchall()
-        
-        if not dados:
-            print(f"⚠️  Tabela '{tabela}' está vazia")
-            return 0
-        
-        arquivo = f"{OUTPUT_DIR}/{tabela}.csv"
-        with open(arquivo, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(colunas)  # Cabeçalho
-            writer.writerows(dados)
-        
-        print(f"✅ {tabela}.csv - {len(dados)} registros exportados")
-        return len(dados)
-    except Exception as e:
-        print(f"❌ Erro ao exportar '{tabela}': {e}")
-        return 0
 
 def main():
+    parser = argparse.ArgumentParser(description='Exporta as tabelas do PostgreSQL em CSV ou NDJSON (gzip)')
+    parser.add_argument('--destino', help='URL do PostgreSQL (padrão: POSTGRES_URL ou DATABASE_URL)')
+    parser.add_argument('--formato', choices=sorted(FORMATOS), default='csv')
+    parser.add_argument('--saida', default=OUTPUT_DIR, help='diretório dos arquivos')
+    parser.add_argument('--paralelo', type=int, default=3, help='tabelas exportadas ao mesmo tempo')
+    parser.add_argument('--tabelas', nargs='+', choices=TABELAS, default=list(TABELAS))
+    parser.add_argument('--com-senhas', action='store_true',
+                        help='inclui as colunas de senha (backup completo; guarde os arquivos com cuidado)')
+    args = parser.parse_args()
+
+    dsn = args.destino or os.getenv('POSTGRES_URL', os.getenv('DATABASE_URL', ''))
+    if not dsn:
+        print("❌ Configure POSTGRES_URL ou DATABASE_URL (ou use --destino)")
+        return
+
     print("=" * 60)
-    print("📤 EXPORTAÇÃO DE DADOS PARA CSV")
+    print(f"📤 EXPORTAÇÃO DE DADOS PARA {args.formato.upper()} (gzip)")
     print("=" * 60)
-    
-    # Conectar ao SQLite
+
+    inicio = time.perf_counter()
     try:
-        conn = sqlite3.connect(SQLITE_DB)
-        print(f"✅ Conectado ao {SQLITE_DB}\n")
+        resultados = exportar_tabelas(dsn, args.tabelas, args.formato, args.saida, args.paralelo, args.com_senhas)
     except Exception as e:
-        print(f"❌ Erro ao conectar: {e}")
+        print(f"❌ Erro na exportação: {e}")
         return
-    
-    # Criar diretório
-    criar_diretorio()
-    
-    print("\n📊 Exportando tabelas...\n")
-    
+    duracao = time.perf_counter() - inicio
+
+    print("\n📊 Tabelas exportadas:\n")
     total = 0
-    
-    # Exportar configurações
-    total += exportar_tabela(conn, 'configuracoes', [
-        'id', 'nome_bar', 'logo_path', 'pontos_vermelho_min',
-        'pontos_amarelo_min', 'pontos_verde_min', 'senha_admin'
-    ])
-    
-    # Exportar clientes
-    total += exportar_tabela(conn, 'clientes', [
-        'id', 'nome', 'telefone', 'email', 'senha', 'data_cadastro',
-        'pontos_totais', 'nivel', 'ultima_visita'
-    ])
-    
-    # Exportar pontuações
-    total += exportar_tabela(conn, 'pontuacoes', [
-        'id', 'cliente_id', 'pontos', 'tipo', 'descricao',
-        'data', 'data_validade'
-    ])
-    
-    # Exportar produtos (se existir)
-    try:
-        total += exportar_tabela(conn, 'produtos', [
-            'id', 'nome', 'descricao', 'pontos', 'ativo', 'data_cadastro'
-        ])
-    except:
-        pass
-    
-    # Exportar checkins (se existir)
-    try:
-        total += exportar_tabela(conn, 'checkins', [
-            'id', 'cliente_id', 'data_checkin', 'localizacao'
-        ])
-    except:
-        pass
-    
-    conn.close()
-    
+    for tabela, resultado in resultados.items():
+        total += resultado['linhas']
+        print(f"✅ {os.path.basename(resultado['arquivo'])} - {resultado['linhas']} registros, "
+              f"{resultado['bytes'] / 1024 / 1024:.1f} MB em {resultado['segundos']:.1f}s")
+
     print("\n" + "=" * 60)
-    print(f"✅ EXPORTAÇÃO CONCLUÍDA!")
+    print("✅ EXPORTAÇÃO CONCLUÍDA!")
     print("=" * 60)
-    print(f"\n📊 Total de registros exportados: {total}")
-    print(f"📁 Arquivos salvos em: {OUTPUT_DIR}/")
-    
-    print("\n📋 PRÓXIMOS PASSOS:")
-    print("1. Acesse: https://supabase.com/dashboard")
-    print("2. Selecione seu projeto")
-    print("3. Vá em 'Table Editor'")
-    print("4. Clique em 'Import data' ou 'Insert' → 'Import CSV'")
-    print("5. Faça upload dos arquivos CSV na ordem:")
-    print("   - configuracoes.csv (primeiro)")
-    print("   - clientes.csv")
-    print("   - pontuacoes.csv")
-    print("   - produtos.csv (se existir)")
-    print("   - checkins.csv (se existir)")
+    print(f"\n📊 Total de registros exportados: {total} em {duracao:.1f}s ({total / duracao:,.0f} linhas/s)")
+    print(f"📁 Arquivos salvos em: {args.saida}/")
+    if not args.com_senhas:
+        print("🔒 Colunas de senha ficaram de fora (use --com-senhas para um backup completo)")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,209 @@
+"""
+Exportação das tabelas do PostgreSQL em CSV ou NDJSON (um objeto JSON por
+linha) com COPY TO STDOUT: o banco formata as linhas e elas saem em pedaços,
+então a memória fica limitada ao tamanho do pedaço e não ao da tabela.
+
+Dois usos: arquivos .csv.gz/.ndjson.gz com várias tabelas em paralelo, todas
+lidas do mesmo instante do banco (export_to_csv.py), e o download do admin
+em streaming (GET /api/admin/exportar/<tabela>).
+"""
+
+import gzip
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+import psycopg2.extensions
+
+import registro
+from serializacao import NIVEL_GZIP
+
+log = registro.obter('exportacao')
+
+# Na ordem em que um import precisa delas (chaves estrangeiras)
+TABELAS = ('configuracoes', 'clientes', 'produtos', 'pontuacoes', 'checkins', 'solicitacoes_pontos')
+
+FORMATOS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+# Bytes juntados antes de entregar um pedaço (o COPY manda uma linha por vez)
+TAMANHO_PEDACO = 64 * 1024
+# Pedaços prontos esperando o cliente no download: acima disso o COPY espera
+PEDACOS_NA_FILA = 8
+
+_FIM = object()
+
+
+class ExportacaoCancelada(Exception):
+    """O cliente do download foi embora: interrompe o COPY"""
+
+
+def sensivel(coluna):
+    """Senhas (hash dos clientes, senha do admin) nunca saem na exportação do admin"""
+    return 'senha' in coluna
+
+
+def colunas_exportadas(cursor, tabela, com_senhas=False):
+    """Colunas da tabela na ordem do banco, sem as geradas (voltam sozinhas num import)"""
+    cursor.execute('''
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s AND is_generated = 'NEVER'
+        ORDER BY ordinal_position
+    ''', (tabela,))
+    colunas = [linha[0] for linha in cursor.fetchall()]
+    return [c for c in colunas if com_senhas or not sensivel(c)]
+
+
+def instrucao_copy(tabela, colunas, formato):
+    """COPY ... TO STDOUT da tabela no formato pedido (nomes já validados por colunas_exportadas)"""
+    lista = ', '.join(f'"{c}"' for c in colunas)
+    if formato == 'csv':
+        return f'COPY {tabela} ({lista}) TO STDOUT WITH (FORMAT csv, HEADER)'
+    # row_to_json nunca gera tab nem quebra de linha (escapa como \t e \n); o
+    # formato texto do COPY só dobra as barras invertidas, desfeito em _Acumulador
+    return f'COPY (SELECT row_to_json(linha) FROM (SELECT {lista} FROM {tabela}) linha) TO STDOUT'
+
+
+class _Acumulador:
+    """Arquivo de escrita para o copy_expert: junta as linhas em pedaços de
+    `tamanho` bytes e os passa para `entregar`"""
+
+    def __init__(self, entregar, formato, tamanho=TAMANHO_PEDACO):
+        self._entregar = entregar
+        self._ndjson = formato == 'ndjson'
+        self._tamanho = tamanho
+        self._partes = []
+        self._acumulado = 0
+        self.bytes = 0
+
+    def write(self, dados):
+        # Cada chamada é uma linha inteira (uma mensagem do COPY): a barra
+        # dobrada nunca fica partida entre duas chamadas
+        if self._ndjson:
+            dados = dados.replace(b'\\\\', b'\\')
+        self._partes.append(dados)
+        self._acumulado += len(dados)
+        if self._acumulado >= self._tamanho:
+            self.esvaziar()
+
+    def esvaziar(self):
+        if self._partes:
+            pedaco = b''.join(self._partes)
+            self._partes = []
+            self._acumulado = 0
+            self.bytes += len(pedaco)
+            self._entregar(pedaco)
+
+
+def pedacos_copy(pool, sql, formato, tamanho_pedaco=TAMANHO_PEDACO, pedacos_na_fila=PEDACOS_NA_FILA):
+    """Gera os bytes do COPY `sql` em pedaços, para uma resposta em streaming.
+
+    O copy_expert do psycopg2 escreve num arquivo até acabar; aqui ele roda
+    numa thread à parte com uma conexão própria do pool, e uma fila de
+    `pedacos_na_fila` pedaços limita a memória quando o cliente lê devagar.
+    Fechar o gerador (cliente desconectou) interrompe o COPY; a conexão, que
+    fica no meio do COPY, é descartada em vez de voltar ao pool.
+    """
+    fila = queue.Queue(maxsize=pedacos_na_fila)
+    cancelado = threading.Event()
+
+    def colocar(item):
+        while True:
+            if cancelado.is_set():
+                raise ExportacaoCancelada()
+            try:
+                fila.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def produzir(conn):
+        descartar = True
+        try:
+            saida = _Acumulador(colocar, formato, tamanho_pedaco)
+            with conn.cursor() as cursor:
+                cursor.copy_expert(sql, saida)
+            saida.esvaziar()
+            conn.rollback()
+            descartar = False
+            colocar(_FIM)
+        except ExportacaoCancelada:
+            log.info('Exportação interrompida pelo cliente')
+        except Exception as e:
+            log.exception('Erro na exportação')
+            try:
+                colocar(e)
+            except ExportacaoCancelada:
+                pass
+        finally:
+            pool.putconn(conn, descartar=descartar)
+
+    conn = pool.getconn()
+    threading.Thread(target=produzir, args=(conn,), name='exportacao', daemon=True).start()
+    try:
+        while True:
+            item = fila.get()
+            if item is _FIM:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelado.set()
+
+
+def exportar_tabela(conn, tabela, formato, diretorio, com_senhas=False):
+    """Grava `tabela` em `diretorio`/<tabela>.<formato>.gz; devolve linhas, bytes e segundos"""
+    inicio = time.perf_counter()
+    cursor = conn.cursor()
+    sql = instrucao_copy(tabela, colunas_exportadas(cursor, tabela, com_senhas), formato)
+    caminho = os.path.join(diretorio, f'{tabela}.{FORMATOS[formato][1]}.gz')
+    with gzip.open(caminho, 'wb', compresslevel=NIVEL_GZIP) as arquivo:
+        saida = _Acumulador(arquivo.write, formato)
+        cursor.copy_expert(sql, saida)
+        saida.esvaziar()
+    return {
+        'arquivo': caminho,
+        'linhas': cursor.rowcount,
+        'bytes_sem_compressao': saida.bytes,
+        'bytes': os.path.getsize(caminho),
+        'segundos': round(time.perf_counter() - inicio, 2),
+    }
+
+
+def exportar_tabelas(dsn, tabelas, formato, diretorio, paralelo=3, com_senhas=False):
+    """Exporta `tabelas`, até `paralelo` ao mesmo tempo, cada uma numa conexão.
+
+    Todas leem o mesmo instante do banco (snapshot exportado por uma
+    transação REPEATABLE READ que fica aberta até o fim, como o pg_dump faz):
+    um lançamento feito no meio não aparece em pontuacoes sem aparecer no
+    saldo de clientes.
+    """
+    os.makedirs(diretorio, exist_ok=True)
+    coordenador = psycopg2.connect(dsn)
+    coordenador.set_session(isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ, readonly=True)
+    try:
+        cursor = coordenador.cursor()
+        cursor.execute('SELECT pg_export_snapshot()')
+        snapshot = cursor.fetchone()[0]
+
+        def exportar(tabela):
+            conn = psycopg2.connect(dsn)
+            try:
+                conn.set_session(isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ,
+                                 readonly=True)
+                conn.cursor().execute('SET TRANSACTION SNAPSHOT %s', (snapshot,))
+                return exportar_tabela(conn, tabela, formato, diretorio, com_senhas)
+            finally:
+                conn.close()
+
+        with ThreadPoolExecutor(max_workers=paralelo) as executor:
+            resultados = dict(zip(tabelas, executor.map(exportar, tabelas)))
+    finally:
+        coordenador.close()
+    return resultados
@@ -0,0 +1,227 @@
+"""
+Instrumentação por requisição: consultas, conexões e tempo gasto no banco,
+para o cabeçalho Server-Timing e o log de requisições lentas
+"""
+
+import contextvars
+import time
+
+import psycopg2.extensions
+import psycopg2.sql
+
+import metricas
+
+# Instruções distintas guardadas por requisição para o log de lentas (as
+# repetidas somam na mesma entrada; as que passarem disso só contam)
+INSTRUCOES_MAX = 50
+# Tamanho máximo de cada instrução no log
+INSTRUCAO_TAMANHO_LOG = 300
+
+
+class Medicao:
+    """Contadores de uma requisição; quem mede é ConexaoMedida (psycopg2) ou o app assíncrono.
+
+    - consultas: idas ao banco (execute, fetch de cursor nomeado, commit, rollback)
+    - tempo_banco: soma dos tempos dessas idas (com consultas em paralelo,
+      pode passar da duração da requisição)
+    - conexoes: conexões distintas usadas; abertas: conexões novas criadas
+    - espera_pool: tempo esperando uma conexão livre no pool
+    """
+
+    __slots__ = ('inicio', 'consultas', 'tempo_banco', 'conexoes', 'abertas', 'tempo_conexao',
+                 'espera_pool', 'instrucoes')
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tempo_banco = 0.0
+        self.conexoes = set()
+        self.abertas = 0
+        self.tempo_conexao = 0.0
+        self.espera_pool = 0.0
+        self.instrucoes = {}  # sql -> [vezes, segundos]
+
+    def registrar(self, sql, segundos, conexao=None):
+        self.consultas += 1
+        self.tempo_banco += segundos
+        metricas.CONSULTAS.observar(segundos)
+        if conexao is not None:
+            self.conexoes.add(id(conexao))
+        entrada = self.instrucoes.get(sql)
+        if entrada is not None:
+            entrada[0] += 1
+            entrada[1] += segundos
+        elif len(self.instrucoes) < INSTRUCOES_MAX:
+            self.instrucoes[sql] = [1, segundos]
+
+    def duracao(self):
+        return time.perf_counter() - self.inicio
+
+    def server_timing(self):
+        """Valor do cabeçalho Server-Timing (durações em ms)"""
+        partes = [f'db;dur={self.tempo_banco * 1000:.2f};desc="{self.consultas} consultas"']
+        if self.espera_pool >= 0.0001:
+            partes.append(f'pool;dur={self.espera_pool * 1000:.2f}')
+        if self.abertas:
+            partes.append(f'conexao;dur={self.tempo_conexao * 1000:.2f};desc="{self.abertas} novas"')
+        partes.append(f'total;dur={self.duracao() * 1000:.2f}')
+        return ', '.join(partes)
+
+    def resumo(self):
+        """Campos do log de requisição lenta, com as instruções e o tempo de cada uma"""
+        instrucoes = []
+        listadas = 0
+        for sql, (vezes, segundos) in self.instrucoes.items():
+            if isinstance(sql, bytes):
+                sql = sql.decode('utf-8', 'replace')
+            texto = ' '.join(str(sql).split())
+            if len(texto) > INSTRUCAO_TAMANHO_LOG:
+                texto = texto[:INSTRUCAO_TAMANHO_LOG] + '…'
+            instrucoes.append({'sql': texto, 'vezes': vezes, 'ms': round(segundos * 1000, 2)})
+            listadas += vezes
+        return {
+            'duracao_ms': round(self.duracao() * 1000, 1),
+            'banco_ms': round(self.tempo_banco * 1000, 1),
+            'consultas': self.consultas,
+            'conexoes': len(self.conexoes),
+            'conexoes_novas': self.abertas,
+            'pool_ms': round(self.espera_pool * 1000, 1),
+            'instrucoes': instrucoes,
+            'nao_listadas': self.consultas - listadas,
+        }
+
+
+_atual = contextvars.ContextVar('medicao', default=None)
+
+
+def iniciar():
+    """Começa a medir a requisição do contexto atual (thread ou tarefa)"""
+    medicao = Medicao()
+    _atual.set(medicao)
+    return medicao
+
+
+def encerrar():
+    _atual.set(None)
+
+
+def atual():
+    return _atual.get()
+
+
+def registrar_espera_pool(segundos):
+    medicao = _atual.get()
+    if medicao is not None:
+        medicao.espera_pool += segundos
+
+
+def _chave(query, conexao):
+    """SQL montado com psycopg2.sql (Composed) não serve de chave: vira o texto"""
+    return query.as_string(conexao) if isinstance(query, psycopg2.sql.Composable) else query
+
+
+class _CursorMedido:
+    """Mistura que mede cada ida ao banco de um cursor psycopg2 (ver _cursor_medido)"""
+
+    def execute(self, query, vars=None):
+        medicao = _atual.get()
+        if medicao is None:
+            return super().execute(query, vars)
+        inicio = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            medicao.registrar(_chave(query, self.connection), time.perf_counter() - inicio, self.connection)
+
+    def executemany(self, query, vars_list):
+        medicao = _atual.get()
+        if medicao is None:
+            return super().executemany(query, vars_list)
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            medicao.registrar(_chave(query, self.connection), time.perf_counter() - inicio, self.connection)
+
+    def copy_expert(self, sql, file, size=8192):
+        medicao = _atual.get()
+        if medicao is None:
+            return super().copy_expert(sql, file, size)
+        inicio = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            medicao.registrar(_chave(sql, self.connection), time.perf_counter() - inicio, self.connection)
+
+    # Em cursor nomeado (streaming) cada fetch é uma ida ao banco
+    def fetchmany(self, size=None):
+        medicao = _atual.get()
+        if medicao is None or not self.name:
+            return super().fetchmany(size) if size is not None else super().fetchmany()
+        inicio = time.perf_counter()
+        try:
+            return super().fetchmany(size) if size is not None else super().fetchmany()
+        finally:
+            medicao.registrar(f'FETCH FROM {self.name}', time.perf_counter() - inicio, self.connection)
+
+    def fetchall(self):
+        medicao = _atual.get()
+        if medicao is None or not self.name:
+            return super().fetchall()
+        inicio = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            medicao.registrar(f'FETCH ALL FROM {self.name}', time.perf_counter() - inicio, self.connection)
+
+
+_classes_cursor = {}
+
+
+def _cursor_medido(fabrica):
+    classe = _classes_cursor.get(fabrica)
+    if classe is None:
+        classe = _classes_cursor[fabrica] = type(f'{fabrica.__name__}Medido', (_CursorMedido, fabrica), {})
+    return classe
+
+
+class ConexaoMedida(psycopg2.extensions.connection):
+    """Conexão psycopg2 que mede abertura, cursores, commit e rollback na requisição em curso.
+
+    Use como connection_factory; sem medição ativa (threads de fundo) o
+    custo é uma leitura de ContextVar por chamada.
+    """
+
+    def __init__(self, *args, **kwargs):
+        inicio = time.perf_counter()
+        super().__init__(*args, **kwargs)
+        medicao = _atual.get()
+        if medicao is not None:
+            medicao.abertas += 1
+            medicao.tempo_conexao += time.perf_counter() - inicio
+
+    def cursor(self, *args, **kwargs):
+        fabrica = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = _cursor_medido(fabrica)
+        return super().cursor(*args, **kwargs)
+
+    # Sem transação aberta o psycopg2 não manda nada ao banco
+    def commit(self):
+        medicao = _atual.get()
+        if medicao is None or self.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return super().commit()
+        inicio = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            medicao.registrar('COMMIT', time.perf_counter() - inicio, self)
+
+    def rollback(self):
+        medicao = _atual.get()
+        if medicao is None or self.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return super().rollback()
+        inicio = time.perf_counter()
+        try:
+            return super().rollback()
+        finally:
+            medicao.registrar('ROLLBACK', time.perf_counter() - inicio, self)
@@ -0,0 +1,95 @@
+"""
+Avisos de invalidação entre workers: LISTEN em uma conexão dedicada, NOTIFY nas escritas
+"""
+
+import json
+import select
+import threading
+
+import psycopg2
+
+import registro
+
+log = registro.obter('invalidacao')
+
+# Canal dos avisos (ver sql/11_avisos_invalidacao.sql)
+CANAL = 'semaforo_invalidacao'
+
+
+class OuvinteInvalidacao(threading.Thread):
+    """Thread que escuta o canal de avisos e repassa cada um para `aplicar(aviso)`.
+
+    Usa uma conexão própria, fora do pool (LISTEN precisa de conexão direta ou
+    pooler em modo sessão). Os avisos chegam no commit de quem escreveu, na
+    ordem dos commits, inclusive os deste worker. Sem tráfego, manda um
+    SELECT 1 a cada `intervalo` segundos para perceber conexão caída; ao cair,
+    chama `ao_desconectar()` e tenta de novo a cada `espera_reconexao`
+    segundos. `ao_conectar()` roda a cada (re)conexão, já escutando: avisos
+    perdidos no meio tempo devem ser compensados ali.
+    """
+
+    def __init__(self, dsn, aplicar, ao_conectar=None, ao_desconectar=None,
+                 intervalo=10, espera_reconexao=5):
+        super().__init__(name='ouvinte-invalidacao', daemon=True)
+        self.dsn = dsn
+        self.aplicar = aplicar
+        self.ao_conectar = ao_conectar
+        self.ao_desconectar = ao_desconectar
+        self.intervalo = intervalo
+        self.espera_reconexao = espera_reconexao
+        self.conectado = False
+        self.avisos_recebidos = 0
+        self._parar = threading.Event()
+        self._conn = None
+
+    def run(self):
+        while not self._parar.is_set():
+            try:
+                self._escutar()
+            except Exception as e:
+                if not self._parar.is_set():
+                    log.error('Erro no ouvinte de invalidação', erro=str(e), tipo=type(e).__name__)
+            finally:
+                self._fechar()
+            self._parar.wait(self.espera_reconexao)
+
+    def _escutar(self):
+        self._conn = psycopg2.connect(self.dsn, application_name='semaforo-invalidacao')
+        self._conn.autocommit = True
+        cursor = self._conn.cursor()
+        cursor.execute(f'LISTEN {CANAL}')
+        self.conectado = True
+        if self.ao_conectar:
+            self.ao_conectar()
+
+        while not self._parar.is_set():
+            if select.select([self._conn], [], [], self.intervalo) == ([], [], []):
+                cursor.execute('SELECT 1')
+            self._conn.poll()
+            while self._conn.notifies:
+                notificacao = self._conn.notifies.pop(0)
+                self.avisos_recebidos += 1
+                try:
+                    self.aplicar(json.loads(notificacao.payload))
+                except Exception:
+                    log.exception('Erro ao aplicar aviso de invalidação')
+
+    def _fechar(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+        if self.conectado:
+            self.conectado = False
+            if self.ao_desconectar:
+                self.ao_desconectar()
+
+    def parar(self):
+        self._parar.set()
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
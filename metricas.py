@@ -0,0 +1,216 @@
+"""
+Métricas do processo no formato texto do Prometheus (GET /metrics): latência
+por rota e status, requisições em andamento, idas ao banco, pool de conexões
+e contadores do negócio
+
+Cada thread soma numa fatia só sua, sem trava no caminho da requisição; a
+coleta junta as fatias. Os números são do processo: com vários workers atrás
+do mesmo endereço, cada coleta responde por um deles.
+"""
+
+import bisect
+import threading
+
+# Limites (segundos) dos baldes dos histogramas
+BALDES_REQUISICAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BALDES_CONSULTA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+TIPO_CONTEUDO = 'text/plain; version=0.0.4; charset=utf-8'
+
+_trava = threading.Lock()
+_local = threading.local()
+_fatias = []        # (thread, fatia) de cada thread que já mediu algo
+_encerradas = {}    # soma das fatias das threads que já terminaram
+_metricas = []      # na ordem de saída
+
+
+def _fatia():
+    """{(métrica, valores dos rótulos): valor} da thread atual (só ela escreve)"""
+    try:
+        return _local.fatia
+    except AttributeError:
+        fatia = _local.fatia = {}
+        with _trava:
+            _fatias.append((threading.current_thread(), fatia))
+        return fatia
+
+
+def _acumular(destino, origem):
+    for chave, valor in origem.items():
+        atual = destino.get(chave)
+        if isinstance(valor, list):
+            if atual is None:
+                destino[chave] = valor[:]
+            else:
+                for i, parcela in enumerate(valor):
+                    atual[i] += parcela
+        else:
+            destino[chave] = (atual or 0) + valor
+
+
+def _juntar():
+    """Soma das fatias de todas as threads, inclusive as que já terminaram"""
+    total = {}
+    with _trava:
+        vivas = []
+        for thread, fatia in _fatias:
+            if thread.is_alive():
+                vivas.append((thread, fatia))
+            else:
+                # Ninguém mais escreve nela: entra de vez na soma das encerradas
+                _acumular(_encerradas, fatia)
+        _fatias[:] = vivas
+        _acumular(total, _encerradas)
+    for _, fatia in vivas:
+        # copy() é atômico; a dona da fatia pode estar escrevendo agora
+        _acumular(total, fatia.copy())
+    return total
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos(nomes, valores, extra=''):
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _numero(valor):
+    return str(valor) if isinstance(valor, int) else repr(float(valor))
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        _metricas.append(self)
+
+    def _cabecalho(self):
+        return [f'# HELP {self.nome} {self.ajuda}', f'# TYPE {self.nome} {self.tipo}']
+
+    def exposicao(self, series):
+        """Linhas da métrica a partir de {valores dos rótulos: valor}"""
+        if not series and not self.rotulos:
+            series = {(): 0}
+        linhas = self._cabecalho()
+        for valores in sorted(series):
+            linhas.append(f'{self.nome}{_rotulos(self.rotulos, valores)} {_numero(series[valores])}')
+        return linhas
+
+
+class Contador(_Metrica):
+    """Só cresce: contador.incrementar('avulsa', quantidade=3)"""
+
+    tipo = 'counter'
+
+    def incrementar(self, *valores, quantidade=1):
+        fatia = _fatia()
+        chave = (self, valores)
+        fatia[chave] = fatia.get(chave, 0) + quantidade
+
+
+class Medidor(Contador):
+    """Sobe e desce (requisições em andamento)"""
+
+    tipo = 'gauge'
+
+    def decrementar(self, *valores, quantidade=1):
+        self.incrementar(*valores, quantidade=-quantidade)
+
+
+class Histograma(_Metrica):
+    """Contagem por balde e soma das observações: histograma.observar(0.012, '/api/ranking', 'GET', 200)"""
+
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, rotulos=(), baldes=BALDES_REQUISICAO):
+        super().__init__(nome, ajuda, rotulos)
+        self.baldes = tuple(baldes)
+
+    def observar(self, valor, *valores):
+        fatia = _fatia()
+        chave = (self, valores)
+        contagens = fatia.get(chave)
+        if contagens is None:
+            # Um contador por balde, o do +Inf e a soma no fim
+            contagens = fatia[chave] = [0] * (len(self.baldes) + 1) + [0.0]
+        contagens[bisect.bisect_left(self.baldes, valor)] += 1
+        contagens[-1] += valor
+
+    def exposicao(self, series):
+        linhas = self._cabecalho()
+        limites = [_numero(limite) for limite in self.baldes] + ['+Inf']
+        for valores in sorted(series):
+            contagens = series[valores]
+            acumulado = 0
+            for limite, quantidade in zip(limites, contagens):
+                acumulado += quantidade
+                le = f'le="{limite}"'
+                linhas.append(f'{self.nome}_bucket{_rotulos(self.rotulos, valores, le)} {acumulado}')
+            rotulos = _rotulos(self.rotulos, valores)
+            linhas.append(f'{self.nome}_sum{rotulos} {_numero(contagens[-1])}')
+            linhas.append(f'{self.nome}_count{rotulos} {acumulado}')
+        return linhas
+
+
+class Coleta(_Metrica):
+    """Lida na hora da coleta: `ler()` devolve {valores dos rótulos: valor}
+    (ex.: estado do pool, que já tem os seus contadores)"""
+
+    def __init__(self, nome, ajuda, tipo, ler, rotulos=()):
+        super().__init__(nome, ajuda, rotulos)
+        self.tipo = tipo
+        self._ler = ler
+
+    def exposicao(self, series):
+        series = self._ler()
+        if not series:
+            return []
+        return super().exposicao(series)
+
+
+def texto():
+    """Todas as métricas no formato de exposição do Prometheus"""
+    por_metrica = {}
+    for (metrica, valores), valor in _juntar().items():
+        por_metrica.setdefault(metrica, {})[valores] = valor
+    linhas = []
+    for metrica in _metricas:
+        linhas.extend(metrica.exposicao(por_metrica.get(metrica, {})))
+    return '\n'.join(linhas) + '\n'
+
+
+# ----------------------------------------------------------------------
+# Métricas do app (Flask e modo assíncrono)
+
+REQUISICOES = Histograma(
+    'semaforo_http_requisicao_segundos', 'Duração das requisições HTTP até o fim da resposta',
+    ('rota', 'metodo', 'status'))
+EM_ANDAMENTO = Medidor('semaforo_http_requisicoes_em_andamento', 'Requisições HTTP sendo atendidas')
+CONSULTAS = Histograma(
+    'semaforo_banco_consulta_segundos', 'Duração de cada ida ao banco feita por uma requisição',
+    baldes=BALDES_CONSULTA)
+CONSULTAS_POR_ROTA = Contador('semaforo_banco_consultas_total', 'Idas ao banco por rota', ('rota',))
+TEMPO_BANCO_POR_ROTA = Contador('semaforo_banco_segundos_total', 'Tempo no banco por rota', ('rota',))
+
+CHECKINS = Contador('semaforo_checkins_total', 'Check-ins registrados')
+PONTUACOES = Contador(
+    'semaforo_pontuacoes_total', 'Lançamentos de pontos (avulsa: /api/pontuacao, lote: /api/pontuacao/lote)',
+    ('origem',))
+PONTOS = Contador('semaforo_pontos_lancados_total', 'Pontos lançados, sem o bônus de frequência', ('origem',))
+SOLICITACOES = Contador(
+    'semaforo_solicitacoes_total', 'Solicitações de pontos criadas, aprovadas e rejeitadas', ('resultado',))
+
+
+def registrar_requisicao(rota, metodo, status, segundos, medicao=None):
+    """Fim de uma requisição: latência e, com a medição (instrumentacao.py), o banco por rota"""
+    REQUISICOES.observar(segundos, rota, metodo, status)
+    if medicao is not None and medicao.consultas:
+        CONSULTAS_POR_ROTA.incrementar(rota, quantidade=medicao.consultas)
+        TEMPO_BANCO_POR_ROTA.incrementar(rota, quantidade=medicao.tempo_banco)
@@ -1,12 +1,32 @@
 #!/usr/bin/env python3
 """
 Script para migrar dados do SQLite local para Supabase PostgreSQL
+
+As linhas saem do SQLite em lotes (na ordem do id) e entram no PostgreSQL
+por COPY FROM STDIN. Cada lote é gravado junto com o ponto de parada da
+sua faixa (tabela migracao_progresso), na mesma transação: se a migração
+cair, rodar de novo continua de onde parou, sem repetir nem perder linhas.
+Tabelas que não dependem uma da outra, e faixas de ids da mesma tabela, vão
+em paralelo. Os ids do SQLite são mantidos; no fim as sequências são
+ajustadas e saldos e visitas conferidos a partir do extrato.
+
+Uso:
+    python migrate_data_to_supabase.py --sqlite semaforo.db --paralelo 4 --faixas 4
+    (destino: --destino, MIGRACAO_DATABASE_URL ou as credenciais abaixo)
 """
 
+import argparse
+import json
+import os
 import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from datetime import datetime
+
 import psycopg2
+import psycopg2.errors
 import psycopg2.extras
-from datetime import datetime
 
 # Configuração - EDITE AQUI COM SUAS CREDENCIAIS
 SUPABASE_HOST = "db.mofyddgzvhwxaorhpzuq.supabase.co"
@@ -16,10 +36,40 @@ SUPABASE_PASSWORD = "$$J25021989j@@"
 SUPABASE_PORT = "5432"
 SQLITE_DB = "semaforo.db"
 
-def conectar_sqlite():
+SQL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql')
+
+# Ordem de carga: uma etapa só começa quando a anterior termina (chaves
+# estrangeiras); as tabelas de uma etapa e as faixas de cada tabela vão em paralelo
+ETAPAS = (
+    ('clientes', 'produtos'),
+    ('pontuacoes', 'checkins', 'solicitacoes_pontos'),
+)
+
+# Linhas órfãs (cliente ou produto que não existe mais no SQLite) ficam de fora
+FILTROS = {
+    'pontuacoes': 'cliente_id IN (SELECT id FROM clientes)',
+    'checkins': 'cliente_id IN (SELECT id FROM clientes)',
+    'solicitacoes_pontos': 'cliente_id IN (SELECT id FROM clientes) AND produto_id IN (SELECT id FROM produtos)',
+}
+
+# Colunas que o banco calcula a partir do extrato (triggers de sql/02_saldos.sql):
+# copiá-las somaria o saldo duas vezes
+COLUNAS_DERIVADAS = {
+    'clientes': {'pontos_totais', 'nivel', 'pontos_expirados', 'proxima_expiracao'},
+}
+
+# Escape do formato texto do COPY
+ESCAPES_COPY = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+# Tentativas por lote quando o banco derruba a transação (deadlock entre
+# faixas, conexão caída); o ponto de parada só anda com o lote gravado
+TENTATIVAS_LOTE = 5
+
+
+def conectar_sqlite(caminho=SQLITE_DB):
     """Conecta ao banco SQLite local"""
     try:
-        conn = sqlite3.connect(SQLITE_DB)
+        conn = sqlite3.connect(caminho)
         conn.row_factory = sqlite3.Row
         print("✅ Conectado ao SQLite local")
         return conn
@@ -27,17 +77,26 @@ def conectar_sqlite():
         print(f"❌ Erro ao conectar SQLite: {e}")
         return None
 
-def conectar_supabase():
+
+def dsn_destino(destino=None):
+    """URL do PostgreSQL de destino: argumento, MIGRACAO_DATABASE_URL ou as credenciais do topo"""
+    destino = destino or os.getenv('MIGRACAO_DATABASE_URL')
+    if destino:
+        return destino
+    return psycopg2.extensions.make_dsn(
+        host=SUPABASE_HOST,
+        dbname=SUPABASE_DATABASE,
+        user=SUPABASE_USER,
+        password=SUPABASE_PASSWORD,
+        port=SUPABASE_PORT,
+        sslmode='require'
+    )
+
+
+def conectar_supabase(dsn):
     """Conecta ao Supabase PostgreSQL"""
     try:
-        conn = psycopg2.connect(
-            host=SUPABASE_HOST,
-            database=SUPABASE_DATABASE,
-            user=SUPABASE_USER,
-            password=SUPABASE_PASSWORD,
-            port=SUPABASE_PORT,
-            sslmode='require'
-        )
+        conn = psycopg2.connect(dsn)
         print("✅ Conectado ao Supabase PostgreSQL")
         return conn
     except Exception as e:
@@ -45,12 +104,13 @@ def conectar_supabase():
         print("Verifique se as credenciais estão corretas e se o banco está ativo")
         return None
 
+
 def criar_tabelas_supabase(pg_conn):
-    """Cria as tabelas no Supabase se não existirem"""
+    """Cria as tabelas no Supabase se não existirem, com as funções, índices e triggers de sql/"""
     cursor = pg_conn.cursor()
-    
+
     print("\n📋 Criando estrutura de tabelas no Supabase...")
-    
+
     # Tabela clientes
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS clientes (
@@ -59,13 +119,14 @@ def criar_tabelas_supabase(pg_conn):
             telefone VARCHAR(20),
             email VARCHAR(255),
             senha VARCHAR(255),
+            avatar_url TEXT,
             data_cadastro TIMESTAMP DEFAULT NOW(),
             pontos_totais INTEGER DEFAULT 0,
             nivel VARCHAR(20) DEFAULT 'vermelho',
             ultima_visita TIMESTAMP
         )
     ''')
-    
+
     # Tabela pontuacoes
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS pontuacoes (
@@ -79,7 +140,7 @@ def criar_tabelas_supabase(pg_conn):
             FOREIGN KEY (cliente_id) REFERENCES clientes (id) ON DELETE CASCADE
         )
     ''')
-    
+
     # Tabela configuracoes
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS configuracoes (
@@ -92,7 +153,7 @@ def criar_tabelas_supabase(pg_conn):
             senha_admin VARCHAR(255) DEFAULT 'admin123'
         )
     ''')
-    
+
     # Tabela produtos
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS produtos (
@@ -104,7 +165,7 @@ def criar_tabelas_supabase(pg_conn):
             data_cadastro TIMESTAMP DEFAULT NOW()
         )
     ''')
-    
+
     # Tabela solicitacoes_pontos
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS solicitacoes_pontos (
@@ -122,7 +183,7 @@ def criar_tabelas_supabase(pg_conn):
             FOREIGN KEY (produto_id) REFERENCES produtos (id) ON DELETE CASCADE
         )
     ''')
-    
+
     # Tabela checkins
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS checkins (
@@ -133,30 +194,54 @@ def criar_tabelas_supabase(pg_conn):
             FOREIGN KEY (cliente_id) REFERENCES clientes (id) ON DELETE CASCADE
         )
     ''')
-    
+
+    # Funções, índices e triggers do app (os mesmos que init_db() aplica)
+    for nome in sorted(os.listdir(SQL_DIR)):
+        if nome.endswith('.sql'):
+            with open(os.path.join(SQL_DIR, nome), encoding='utf-8') as f:
+                cursor.execute(f.read())
+
+    # Ponto de parada de cada faixa de ids de cada tabela
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS migracao_progresso (
+            tabela TEXT NOT NULL,
+            faixa INTEGER NOT NULL,
+            id_inicio BIGINT NOT NULL,
+            id_fim BIGINT,
+            ultimo_id BIGINT NOT NULL,
+            lidas BIGINT NOT NULL DEFAULT 0,
+            inseridas BIGINT NOT NULL DEFAULT 0,
+            segundos DOUBLE PRECISION NOT NULL DEFAULT 0,
+            concluida BOOLEAN NOT NULL DEFAULT FALSE,
+            atualizado_em TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (tabela, faixa)
+        )
+    ''')
+
     pg_conn.commit()
     print("✅ Estrutura de tabelas criada com sucesso")
 
+
 def migrar_configuracoes(sqlite_conn, pg_conn):
     """Migra configurações"""
     print("\n🔧 Migrando configurações...")
-    
+
     sqlite_cursor = sqlite_conn.cursor()
     pg_cursor = pg_conn.cursor()
-    
+
     # Buscar configurações do SQLite
     sqlite_cursor.execute('SELECT * FROM configuracoes LIMIT 1')
     config = sqlite_cursor.fetchone()
-    
+
     if config:
         # Verificar se já existe configuração no Supabase
         pg_cursor.execute('SELECT COUNT(*) FROM configuracoes')
         count = pg_cursor.fetchone()[0]
-        
+
         if count == 0:
             pg_cursor.execute('''
-                INSERT INTO configuracoes 
-                (nome_bar, logo_path, pontos_vermelho_min, pontos_amarelo_min, 
+                INSERT INTO configuracoes
+                (nome_bar, logo_path, pontos_vermelho_min, pontos_amarelo_min,
                  pontos_verde_min, senha_admin)
                 VALUES (%s, %s, %s, %s, %s, %s)
             ''', (config['nome_bar'], config['logo_path'], config['pontos_vermelho_min'],
@@ -168,185 +253,329 @@ def migrar_configuracoes(sqlite_conn, pg_conn):
     else:
         print("⚠️  Nenhuma configuração encontrada no SQLite")
 
-def migrar_clientes(sqlite_conn, pg_conn):
-    """Migra clientes"""
-    print("\n👥 Migrando clientes...")
-    
-    sqlite_cursor = sqlite_conn.cursor()
-    pg_cursor = pg_conn.cursor()
-    
-    # Buscar todos os clientes do SQLite
-    sqlite_cursor.execute('SELECT * FROM clientes ORDER BY id')
-    clientes = sqlite_cursor.fetchall()
-    
-    if not clientes:
-        print("⚠️  Nenhum cliente encontrado no SQLite")
-        return {}
-    
-    # Mapear IDs antigos para novos
-    id_map = {}
-    
-    for cliente in clientes:
-        # Inserir no Supabase
-        pg_cursor.execute('''
-            INSERT INTO clientes 
-            (nome, telefone, email, senha, data_cadastro, pontos_totais, nivel, ultima_visita)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-        ''', (cliente['nome'], cliente['telefone'], cliente['email'], cliente['senha'],
-              cliente['data_cadastro'], cliente['pontos_totais'], cliente['nivel'], 
-              cliente['ultima_visita']))
-        
-        novo_id = pg_cursor.fetchone()[0]
-        id_map[cliente['id']] = novo_id
-    
-    pg_conn.commit()
-    print(f"✅ {len(clientes)} clientes migrados")
-    return id_map
 
-def migrar_pontuacoes(sqlite_conn, pg_conn, cliente_id_map):
-    """Migra pontuações"""
-    print("\n🎯 Migrando pontuações...")
-    
-    sqlite_cursor = sqlite_conn.cursor()
-    pg_cursor = pg_conn.cursor()
-    
-    # Buscar todas as pontuações do SQLite
-    sqlite_cursor.execute('SELECT * FROM pontuacoes ORDER BY id')
-    pontuacoes = sqlite_cursor.fetchall()
-    
-    if not pontuacoes:
-        print("⚠️  Nenhuma pontuação encontrada no SQLite")
-        return
-    
-    migradas = 0
-    for pont in pontuacoes:
-        # Mapear ID do cliente antigo para novo
-        novo_cliente_id = cliente_id_map.get(pont['cliente_id'])
-        
-        if novo_cliente_id:
-            pg_cursor.execute('''
-                INSERT INTO pontuacoes 
-                (cliente_id, pontos, tipo, descricao, data, data_validade)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            ''', (novo_cliente_id, pont['pontos'], pont['tipo'], pont['descricao'],
-                  pont['data'], pont['data_validade']))
-            migradas += 1
-    
+def tabelas_sqlite(sqlite_conn):
+    return {linha[0] for linha in sqlite_conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def colunas_migradas(sqlite_conn, pg_conn, tabela):
+    """Colunas presentes nos dois bancos, menos as calculadas pelo destino (id primeiro)"""
+    no_sqlite = [linha[1] for linha in sqlite_conn.execute(f'PRAGMA table_info({tabela})')]
+    cursor = pg_conn.cursor()
+    cursor.execute('''
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s AND is_generated = 'NEVER'
+    ''', (tabela,))
+    no_destino = {linha[0] for linha in cursor.fetchall()}
+    derivadas = COLUNAS_DERIVADAS.get(tabela, set())
+    colunas = [c for c in no_sqlite if c in no_destino and c not in derivadas]
+    return ['id'] + [c for c in colunas if c != 'id']
+
+
+def preparar_faixas(sqlite_conn, pg_conn, tabela, faixas):
+    """Divide os ids da tabela em `faixas` intervalos na primeira execução; nas
+    seguintes, devolve os que já estão em migracao_progresso (com o ponto de parada)"""
+    cursor = pg_conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cursor.execute('SELECT * FROM migracao_progresso WHERE tabela = %s ORDER BY faixa', (tabela,))
+    existentes = cursor.fetchall()
+    if existentes:
+        return existentes
+
+    cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {tabela}) AS tem')
+    if cursor.fetchone()['tem']:
+        raise RuntimeError(f'{tabela} já tem dados no destino e não há migração dela em andamento; '
+                           'migre para um banco vazio')
+
+    menor, maior = sqlite_conn.execute(f'SELECT MIN(id), MAX(id) FROM {tabela}').fetchone()
+    if menor is None:
+        menor = maior = 0
+    passo = max(1, (maior - menor + faixas) // faixas)
+    inicio = menor - 1
+    for faixa in range(faixas):
+        # A última faixa fica aberta: rodar de novo traz o que entrou no SQLite depois
+        fim = None if faixa == faixas - 1 else min(inicio + passo, maior)
+        cursor.execute('''
+            INSERT INTO migracao_progresso (tabela, faixa, id_inicio, id_fim, ultimo_id)
+            VALUES (%s, %s, %s, %s, %s)
+        ''', (tabela, faixa, inicio, fim, inicio))
+        if fim is not None and fim >= maior:
+            break
+        inicio = fim
     pg_conn.commit()
-    print(f"✅ {migradas} pontuações migradas")
+    cursor.execute('SELECT * FROM migracao_progresso WHERE tabela = %s ORDER BY faixa', (tabela,))
+    return cursor.fetchall()
 
-def migrar_produtos(sqlite_conn, pg_conn):
-    """Migra produtos"""
-    print("\n📦 Migrando produtos...")
-    
-    sqlite_cursor = sqlite_conn.cursor()
-    pg_cursor = pg_conn.cursor()
-    
-    try:
-        sqlite_cursor.execute('SELECT * FROM produtos ORDER BY id')
-        produtos = sqlite_cursor.fetchall()
-        
-        if not produtos:
-            print("⚠️  Nenhum produto encontrado no SQLite")
-            return {}
-        
-        id_map = {}
-        for prod in produtos:
-            pg_cursor.execute('''
-                INSERT INTO produtos 
-                (nome, descricao, pontos, ativo, data_cadastro)
-                VALUES (%s, %s, %s, %s, %s)
-                RETURNING id
-            ''', (prod['nome'], prod['descricao'], prod['pontos'], 
-                  prod['ativo'], prod['data_cadastro']))
-            
-            novo_id = pg_cursor.fetchone()[0]
-            id_map[prod['id']] = novo_id
-        
-        pg_conn.commit()
-        print(f"✅ {len(produtos)} produtos migrados")
-        return id_map
-    except Exception as e:
-        print(f"⚠️  Tabela produtos não existe ou está vazia: {e}")
-        return {}
 
-def migrar_checkins(sqlite_conn, pg_conn, cliente_id_map):
-    """Migra checkins"""
-    print("\n📍 Migrando checkins...")
-    
-    sqlite_cursor = sqlite_conn.cursor()
-    pg_cursor = pg_conn.cursor()
-    
+def texto_copy(linhas):
+    """Lote no formato texto do COPY (tab entre colunas, \\N para NULL)"""
+    saida = []
+    for linha in linhas:
+        saida.append('\t'.join('\\N' if valor is None else str(valor).translate(ESCAPES_COPY) for valor in linha))
+    saida.append('')
+    return '\n'.join(saida)
+
+
+class Progresso:
+    """Linhas lidas e gravadas por tabela, somadas pelas threads das faixas"""
+
+    def __init__(self):
+        self.trava = threading.Lock()
+        self.tabelas = {}
+        self.inicio = time.perf_counter()
+
+    def comecar(self, tabela):
+        with self.trava:
+            self.tabelas[tabela] = {'lidas': 0, 'inseridas': 0, 'inicio': time.perf_counter(), 'fim': None}
+
+    def somar(self, tabela, lidas, inseridas):
+        with self.trava:
+            atual = self.tabelas[tabela]
+            atual['lidas'] += lidas
+            atual['inseridas'] += inseridas
+            atual['fim'] = time.perf_counter()
+
+    def linha(self):
+        with self.trava:
+            lidas = sum(t['lidas'] for t in self.tabelas.values())
+        decorrido = time.perf_counter() - self.inicio
+        return f"   ⏱️  {lidas} linhas em {decorrido:.0f}s ({lidas / decorrido if decorrido else 0:,.0f} linhas/s)"
+
+
+def migrar_faixa(sqlite_caminho, dsn, tabela, colunas, faixa, tamanho_lote, progresso):
+    """Copia uma faixa de ids de `tabela`, um lote (e um ponto de parada) por transação"""
+    sqlite_conn = sqlite3.connect(sqlite_caminho)
+    pg_conn = psycopg2.connect(dsn)
+    lista = ', '.join(colunas)
+    filtro = FILTROS.get(tabela)
+    consulta = (
+        f'SELECT {lista} FROM {tabela} WHERE id > ?'
+        + ('' if faixa['id_fim'] is None else ' AND id <= ?')
+        + (f' AND {filtro}' if filtro else '')
+        + ' ORDER BY id LIMIT ?'
+    )
+    ultimo_id = faixa['ultimo_id']
     try:
-        sqlite_cursor.execute('SELECT * FROM checkins ORDER BY id')
-        checkins = sqlite_cursor.fetchall()
-        
-        if not checkins:
-            print("⚠️  Nenhum checkin encontrado no SQLite")
-            return
-        
-        migrados = 0
-        for checkin in checkins:
-            novo_cliente_id = cliente_id_map.get(checkin['cliente_id'])
-            
-            if novo_cliente_id:
-                pg_cursor.execute('''
-                    INSERT INTO checkins 
-                    (cliente_id, data_checkin, localizacao)
-                    VALUES (%s, %s, %s)
-                ''', (novo_cliente_id, checkin['data_checkin'], checkin['localizacao']))
-                migrados += 1
-        
+        while True:
+            parametros = (ultimo_id,) + (() if faixa['id_fim'] is None else (faixa['id_fim'],)) + (tamanho_lote,)
+            linhas = sqlite_conn.execute(consulta, parametros).fetchall()
+            if not linhas:
+                break
+            dados = texto_copy(linhas)
+            inicio = time.perf_counter()
+            for tentativa in range(1, TENTATIVAS_LOTE + 1):
+                try:
+                    cursor = pg_conn.cursor()
+                    if tabela == 'checkins':
+                        # Sem dia de negócio por enquanto, para os repetidos
+                        # na mesma noite não baterem no índice único; o dia
+                        # vem em finalizar(), pela mesma regra de sql/09
+                        cursor.execute("SET LOCAL migracao.checkins_sem_dia = 'on'")
+                    # Tabela de passagem da transação: ids que já estiverem no
+                    # destino (lote repetido depois de uma queda) ficam de fora
+                    cursor.execute(f'''
+                        CREATE TEMP TABLE migracao_lote ON COMMIT DROP AS
+                        SELECT {lista} FROM {tabela} WITH NO DATA
+                    ''')
+                    cursor.copy_expert(f'COPY migracao_lote ({lista}) FROM STDIN', _Leitor(dados))
+                    cursor.execute(f'''
+                        INSERT INTO {tabela} ({lista})
+                        SELECT {lista} FROM migracao_lote ORDER BY id
+                        ON CONFLICT (id) DO NOTHING
+                    ''')
+                    inseridas = cursor.rowcount
+                    cursor.execute('''
+                        UPDATE migracao_progresso
+                        SET ultimo_id = %s, lidas = lidas + %s, inseridas = inseridas + %s,
+                            segundos = segundos + %s, atualizado_em = NOW()
+                        WHERE tabela = %s AND faixa = %s
+                    ''', (linhas[-1][0], len(linhas), inseridas, time.perf_counter() - inicio,
+                          tabela, faixa['faixa']))
+                    pg_conn.commit()
+                    break
+                except (psycopg2.errors.DeadlockDetected, psycopg2.errors.SerializationFailure,
+                        psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                    if tentativa == TENTATIVAS_LOTE:
+                        raise
+                    print(f"   ⚠️  {tabela}[{faixa['faixa']}]: {type(e).__name__}, tentando o lote de novo")
+                    if pg_conn.closed:
+                        pg_conn = psycopg2.connect(dsn)
+                    else:
+                        pg_conn.rollback()
+                    time.sleep(0.2 * tentativa)
+            ultimo_id = linhas[-1][0]
+            progresso.somar(tabela, len(linhas), inseridas)
+            if len(linhas) < tamanho_lote:
+                break
+
+        cursor = pg_conn.cursor()
+        cursor.execute('UPDATE migracao_progresso SET concluida = TRUE WHERE tabela = %s AND faixa = %s',
+                       (tabela, faixa['faixa']))
         pg_conn.commit()
-        print(f"✅ {migrados} checkins migrados")
-    except Exception as e:
-        print(f"⚠️  Tabela checkins não existe ou está vazia: {e}")
+    finally:
+        sqlite_conn.close()
+        pg_conn.close()
+
+
+class _Leitor:
+    """Arquivo de leitura sobre o texto do lote, em bytes, para o copy_expert"""
+
+    def __init__(self, texto):
+        self._dados = texto.encode('utf-8')
+        self._posicao = 0
+
+    def read(self, tamanho=-1):
+        if tamanho < 0:
+            tamanho = len(self._dados) - self._posicao
+        pedaco = self._dados[self._posicao:self._posicao + tamanho]
+        self._posicao += len(pedaco)
+        return pedaco
+
+    readline = read
+
+
+def migrar_tabelas(sqlite_caminho, sqlite_conn, pg_conn, dsn, paralelo, faixas, tamanho_lote, progresso):
+    """Etapa por etapa, todas as faixas das tabelas da etapa ao mesmo tempo (até `paralelo`)"""
+    existentes = tabelas_sqlite(sqlite_conn)
+    with ThreadPoolExecutor(max_workers=paralelo) as executor:
+        for etapa in ETAPAS:
+            tarefas = []
+            for tabela in etapa:
+                if tabela not in existentes:
+                    print(f"⚠️  Tabela {tabela} não existe no SQLite, pulando...")
+                    continue
+                colunas = colunas_migradas(sqlite_conn, pg_conn, tabela)
+                progresso.comecar(tabela)
+                for faixa in preparar_faixas(sqlite_conn, pg_conn, tabela, faixas):
+                    tarefas.append(executor.submit(migrar_faixa, sqlite_caminho, dsn, tabela, colunas,
+                                                   faixa, tamanho_lote, progresso))
+            print(f"\n📦 Etapa {', '.join(etapa)}: {len(tarefas)} faixas")
+            pendentes = set(tarefas)
+            while pendentes:
+                concluidas, pendentes = wait(pendentes, timeout=5, return_when=FIRST_EXCEPTION)
+                for tarefa in concluidas:
+                    # Uma faixa que falhou interrompe: o que foi gravado fica para a próxima execução
+                    tarefa.result()
+                if pendentes:
+                    print(progresso.linha())
+
+
+def finalizar(pg_conn, tabelas):
+    """Sequências depois do maior id migrado; dia de negócio dos check-ins; saldos e visitas conferidos pelo extrato"""
+    cursor = pg_conn.cursor()
+    print("\n🔢 Ajustando sequências...")
+    for tabela in tabelas:
+        cursor.execute(f'''
+            SELECT setval(pg_get_serial_sequence(%s, 'id'), GREATEST((SELECT MAX(id) FROM {tabela}), 1))
+        ''', (tabela,))
+
+    # Os triggers mantêm saldo e visitas a cada lote; com faixas em paralelo
+    # e lotes fora de ordem, a conferência final garante o estado exato
+    cursor.execute('SELECT COUNT(*) FROM verificar_saldos(TRUE)')
+    corrigidos = cursor.fetchone()[0]
+    # Check-ins chegam sem dia: o primeiro de cada noite fica com ele, os
+    # repetidos com NULL, como no histórico convertido por sql/09
+    cursor.execute('SELECT preencher_dia_negocio()')
+    cursor.execute('SELECT reconstruir_visitas()')
+    cursor.execute("SELECT incrementar_versoes(ARRAY['produtos', 'configuracoes'])")
+    pg_conn.commit()
+    print(f"✅ Saldos conferidos ({corrigidos} corrigidos) e visitas reconstruídas")
+
+    pg_conn.autocommit = True
+    cursor.execute(f'ANALYZE {", ".join(tabelas)}')
+    pg_conn.autocommit = False
+
+
+def resumo_migracao(pg_conn):
+    """Linhas por tabela gravadas em migracao_progresso (somando todas as execuções)"""
+    cursor = pg_conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cursor.execute('''
+        SELECT tabela, SUM(lidas)::BIGINT AS lidas, SUM(inseridas)::BIGINT AS inseridas,
+               SUM(segundos) AS segundos_banco, bool_and(concluida) AS concluida
+        FROM migracao_progresso
+        GROUP BY tabela
+        ORDER BY tabela
+    ''')
+    return {linha.pop('tabela'): linha for linha in cursor.fetchall()}
+
 
 def verificar_migracao(pg_conn):
     """Verifica os dados migrados"""
     print("\n📊 Verificando dados migrados...")
-    
+
     cursor = pg_conn.cursor()
-    
+
     # Contar registros em cada tabela
-    tabelas = ['clientes', 'pontuacoes', 'configuracoes', 'produtos', 'checkins']
-    
+    tabelas = ['clientes', 'pontuacoes', 'configuracoes', 'produtos', 'checkins', 'solicitacoes_pontos']
+
     for tabela in tabelas:
         cursor.execute(f'SELECT COUNT(*) FROM {tabela}')
         count = cursor.fetchone()[0]
         print(f"  - {tabela}: {count} registros")
 
+
 def main():
     """Função principal"""
+    parser = argparse.ArgumentParser(description='Migra os dados do SQLite para o PostgreSQL (Supabase)')
+    parser.add_argument('--sqlite', default=SQLITE_DB, help='arquivo SQLite de origem')
+    parser.add_argument('--destino', help='URL do PostgreSQL (padrão: MIGRACAO_DATABASE_URL ou as credenciais do script)')
+    parser.add_argument('--paralelo', type=int, default=4, help='faixas copiadas ao mesmo tempo')
+    parser.add_argument('--faixas', type=int, default=4, help='faixas de ids por tabela (só na primeira execução)')
+    parser.add_argument('--lote', type=int, default=20000, help='linhas por COPY (e por ponto de parada)')
+    parser.add_argument('--recomecar', action='store_true',
+                        help='esquece os pontos de parada (o destino precisa estar vazio)')
+    parser.add_argument('--saida', help='grava o resumo (linhas e linhas/s por tabela) em JSON')
+    args = parser.parse_args()
+
     print("=" * 60)
     print("🔄 MIGRAÇÃO DE DADOS: SQLite → Supabase PostgreSQL")
     print("=" * 60)
-    
+
     # Conectar aos bancos
-    sqlite_conn = conectar_sqlite()
+    sqlite_conn = conectar_sqlite(args.sqlite)
     if not sqlite_conn:
         return
-    
-    pg_conn = conectar_supabase()
+
+    dsn = dsn_destino(args.destino)
+    pg_conn = conectar_supabase(dsn)
     if not pg_conn:
         sqlite_conn.close()
         return
-    
+
+    inicio = time.perf_counter()
+    progresso = Progresso()
     try:
         # Criar estrutura de tabelas
         criar_tabelas_supabase(pg_conn)
-        
+        if args.recomecar:
+            pg_conn.cursor().execute('TRUNCATE migracao_progresso')
+            pg_conn.commit()
+
         # Migrar dados na ordem correta (respeitando foreign keys)
         migrar_configuracoes(sqlite_conn, pg_conn)
-        cliente_id_map = migrar_clientes(sqlite_conn, pg_conn)
-        migrar_pontuacoes(sqlite_conn, pg_conn, cliente_id_map)
-        produto_id_map = migrar_produtos(sqlite_conn, pg_conn)
-        migrar_checkins(sqlite_conn, pg_conn, cliente_id_map)
-        
+        migrar_tabelas(args.sqlite, sqlite_conn, pg_conn, dsn, args.paralelo, args.faixas, args.lote, progresso)
+        finalizar(pg_conn, [tabela for etapa in ETAPAS for tabela in etapa])
+
         # Verificar migração
         verificar_migracao(pg_conn)
-        
+
+        duracao = time.perf_counter() - inicio
+        resumo = {'duracao_s': round(duracao, 1), 'tabelas': {}}
+        print("\n⏱️  Nesta execução:")
+        for tabela, dados in progresso.tabelas.items():
+            segundos = (dados['fim'] or dados['inicio']) - dados['inicio']
+            taxa = dados['lidas'] / segundos if segundos > 0 else None
+            resumo['tabelas'][tabela] = {**{k: dados[k] for k in ('lidas', 'inseridas')},
+                                         'segundos': round(segundos, 1),
+                                         'linhas_por_segundo': round(taxa) if taxa else None}
+            print(f"  - {tabela}: {dados['lidas']} lidas, {dados['inseridas']} gravadas em {segundos:.1f}s"
+                  + (f" ({taxa:,.0f} linhas/s)" if taxa else ''))
+        total = sum(dados['lidas'] for dados in progresso.tabelas.values())
+        print(f"  Total: {total} linhas em {duracao:.1f}s ({total / duracao:,.0f} linhas/s)")
+        resumo['acumulado'] = resumo_migracao(pg_conn)
+        if args.saida:
+            with open(args.saida, 'w', encoding='utf-8') as f:
+                json.dump(resumo, f, indent=2, default=str)
+
         print("\n" + "=" * 60)
         print("✅ MIGRAÇÃO CONCLUÍDA COM SUCESSO!")
         print("=" * 60)
@@ -354,14 +583,15 @@ def main():
         print("1. Acesse o Supabase Dashboard → Table Editor")
         print("2. Verifique se os dados estão corretos")
         print("3. Faça deploy na Vercel com as variáveis de ambiente configuradas")
-        
+
     except Exception as e:
         print(f"\n❌ Erro durante a migração: {e}")
+        print("   O que já foi gravado fica registrado: rode de novo para continuar.")
         pg_conn.rollback()
     finally:
         sqlite_conn.close()
         pg_conn.close()
-        print("\n🔌 Conexões fechadas")
+        print(f"\n🔌 Conexões fechadas ({datetime.now():%H:%M:%S})")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,43 @@
+"""
+Limiares dos níveis do semáforo: objeto imutável e versionado, cálculo só em memória
+"""
+
+from bisect import bisect_right
+from dataclasses import dataclass
+
+NIVEIS = ('vermelho', 'amarelo', 'verde')
+
+
+@dataclass(frozen=True)
+class Limiares:
+    versao: int = 0
+    vermelho: int = 0
+    amarelo: int = 200
+    verde: int = 500
+
+    @classmethod
+    def de_configuracoes(cls, config, versao):
+        """Monta os limiares a partir da linha de configuracoes (ou dos padrões)"""
+        if not config:
+            return cls(versao=versao)
+        return cls(
+            versao=versao,
+            vermelho=config['pontos_vermelho_min'],
+            amarelo=config['pontos_amarelo_min'],
+            verde=config['pontos_verde_min'],
+        )
+
+    @property
+    def cortes(self):
+        # Verde tem prioridade, como no cálculo original: se amarelo > verde,
+        # a faixa amarela simplesmente fica vazia
+        return (min(self.amarelo, self.verde), self.verde)
+
+    def nivel(self, pontos):
+        """Nível para um saldo"""
+        return NIVEIS[bisect_right(self.cortes, pontos)]
+
+    def niveis(self, saldos):
+        """Níveis para uma sequência de saldos, de uma vez"""
+        cortes = self.cortes
+        return [NIVEIS[bisect_right(cortes, pontos)] for pontos in saldos]
@@ -0,0 +1,251 @@
+"""
+Pool de conexões PostgreSQL com health check no checkout e estatísticas de uso
+"""
+
+import threading
+import time
+from collections import deque
+
+import psycopg2
+import psycopg2.extensions
+
+
+class PoolEsgotado(Exception):
+    """Nenhuma conexão ficou livre dentro do tempo de espera configurado"""
+
+
+class ConexaoAntecipada(threading.Thread):
+    """Abre uma conexão numa thread à parte, para o pool adotar quando for criado.
+
+    A abertura (TCP, SSL e autenticação: várias idas e voltas até o banco)
+    corre enquanto o processo ainda está importando e montando o app.
+    """
+
+    def __init__(self, dsn, **connect_kwargs):
+        super().__init__(name='conexao-antecipada', daemon=True)
+        self._dsn = dsn
+        self._connect_kwargs = connect_kwargs
+        self.conexao = None
+        self.erro = None
+
+    def run(self):
+        try:
+            self.conexao = psycopg2.connect(self._dsn, **self._connect_kwargs)
+        except Exception as e:
+            self.erro = e
+
+    def obter(self, timeout=None):
+        """A conexão aberta (esperando a thread até `timeout`), ou None se falhou ou demorou"""
+        self.join(timeout)
+        return None if self.is_alive() else self.conexao
+
+
+class PoolConexoes:
+    """Pool thread-safe de conexões psycopg2.
+
+    - minimo: conexões mantidas abertas mesmo quando ociosas
+    - maximo: limite de conexões abertas ao mesmo tempo (em uso + ociosas)
+    - timeout: segundos que um checkout espera por uma conexão livre
+    - verificar_apos: conexões ociosas há mais tempo que isso recebem um
+      SELECT 1 antes de serem entregues (0 verifica sempre)
+    - ocioso_max: conexões acima do mínimo ociosas há mais tempo que isso
+      são fechadas na devolução
+    """
+
+    def __init__(self, dsn, minimo=1, maximo=10, timeout=10.0,
+                 verificar_apos=30.0, ocioso_max=300.0, **connect_kwargs):
+        if minimo < 0 or maximo < 1 or minimo > maximo:
+            raise ValueError('Tamanho de pool inválido: exige 0 <= minimo <= maximo e maximo >= 1')
+
+        self.dsn = dsn
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout = timeout
+        self.verificar_apos = verificar_apos
+        self.ocioso_max = ocioso_max
+        self._connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._ociosas = deque()  # (conexão, momento da devolução)
+        self._total = 0
+        self._em_uso = 0
+        self._fechado = False
+
+        self._checkouts = 0
+        self._conexoes_abertas = 0
+        self._conexoes_descartadas = 0
+        self._falhas_health_check = 0
+        self._esgotamentos = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+
+    def _conectar(self):
+        conn = psycopg2.connect(self.dsn, **self._connect_kwargs)
+        with self._cond:
+            self._conexoes_abertas += 1
+        return conn
+
+    def _fechar_conexao(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _saudavel(self, conn, ociosa_desde):
+        """Valida uma conexão ociosa antes de entregá-la"""
+        if conn.closed:
+            return False
+        if time.monotonic() - ociosa_desde < self.verificar_apos:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def aquecer(self):
+        """Abre conexões até atingir o mínimo configurado"""
+        with self._cond:
+            faltam = self.minimo - self._total
+            self._total += max(faltam, 0)
+        novas = []
+        try:
+            for _ in range(max(faltam, 0)):
+                novas.append(self._conectar())
+        finally:
+            with self._cond:
+                self._total -= max(faltam, 0) - len(novas)
+                agora = time.monotonic()
+                self._ociosas.extend((conn, agora) for conn in novas)
+                self._cond.notify_all()
+
+    def adotar(self, conn):
+        """Põe no pool, como ociosa, uma conexão aberta por fora (ConexaoAntecipada)"""
+        with self._cond:
+            if not self._fechado and self._total < self.maximo:
+                self._total += 1
+                self._conexoes_abertas += 1
+                self._ociosas.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+        self._fechar_conexao(conn)
+
+    def getconn(self, timeout=None):
+        """Retira uma conexão do pool, esperando até `timeout` segundos (padrão: o do pool)"""
+        timeout = self.timeout if timeout is None else timeout
+        inicio = time.perf_counter()
+        prazo = inicio + timeout
+
+        with self._cond:
+            while True:
+                if self._fechado:
+                    raise PoolEsgotado('Pool de conexões já foi fechado')
+                if self._ociosas:
+                    # LIFO: reaproveita a conexão mais "quente"
+                    conn, ociosa_desde = self._ociosas.pop()
+                    break
+                if self._total < self.maximo:
+                    conn, ociosa_desde = None, None
+                    self._total += 1
+                    break
+                restante = prazo - time.perf_counter()
+                if restante <= 0:
+                    self._esgotamentos += 1
+                    raise PoolEsgotado(
+                        f'Nenhuma conexão livre após {timeout}s '
+                        f'({self._em_uso} em uso, máximo {self.maximo})'
+                    )
+                self._cond.wait(restante)
+            self._em_uso += 1
+
+        try:
+            if conn is not None and not self._saudavel(conn, ociosa_desde):
+                with self._cond:
+                    self._falhas_health_check += 1
+                    self._conexoes_descartadas += 1
+                self._fechar_conexao(conn)
+                conn = None
+            if conn is None:
+                conn = self._conectar()
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._em_uso -= 1
+                self._cond.notify()
+            raise
+
+        espera = time.perf_counter() - inicio
+        with self._cond:
+            self._checkouts += 1
+            self._espera_total += espera
+            if espera > self._espera_max:
+                self._espera_max = espera
+        return conn
+
+    def putconn(self, conn, descartar=False):
+        """Devolve uma conexão ao pool, desfazendo qualquer transação aberta"""
+        if not descartar and not conn.closed:
+            try:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except Exception:
+                descartar = True
+
+        descartar = descartar or bool(conn.closed)
+        para_fechar = []
+        with self._cond:
+            self._em_uso -= 1
+            if descartar or self._fechado:
+                self._total -= 1
+                self._conexoes_descartadas += 1
+                para_fechar.append(conn)
+            else:
+                agora = time.monotonic()
+                self._ociosas.append((conn, agora))
+                # Fecha as ociosas mais antigas que excedem o mínimo
+                while (self._ociosas and self._total > self.minimo
+                       and agora - self._ociosas[0][1] > self.ocioso_max):
+                    antiga, _ = self._ociosas.popleft()
+                    self._total -= 1
+                    para_fechar.append(antiga)
+            self._cond.notify()
+
+        for antiga in para_fechar:
+            self._fechar_conexao(antiga)
+
+    def fechar(self):
+        """Fecha as conexões ociosas e recusa novos checkouts"""
+        with self._cond:
+            self._fechado = True
+            ociosas = [conn for conn, _ in self._ociosas]
+            self._ociosas.clear()
+            self._total -= len(ociosas)
+            self._cond.notify_all()
+        for conn in ociosas:
+            self._fechar_conexao(conn)
+
+    def estatisticas(self):
+        """Retorna um retrato do uso do pool para dimensionamento"""
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                'minimo': self.minimo,
+                'maximo': self.maximo,
+                'total': self._total,
+                'em_uso': self._em_uso,
+                'ociosas': len(self._ociosas),
+                'checkouts': checkouts,
+                'conexoes_abertas': self._conexoes_abertas,
+                'conexoes_descartadas': self._conexoes_descartadas,
+                'falhas_health_check': self._falhas_health_check,
+                'esgotamentos': self._esgotamentos,
+                'espera_total_ms': round(self._espera_total * 1000, 3),
+                'espera_media_ms': round(self._espera_total * 1000 / checkouts, 3) if checkouts else 0.0,
+                'espera_max_ms': round(self._espera_max * 1000, 3),
+            }
@@ -0,0 +1,261 @@
+"""
+Ranking de clientes em memória: top N, posição de um cliente e vizinhos sem ir ao banco
+"""
+
+import threading
+import time
+from bisect import bisect_left, insort
+
+# Chaves de até 2 * CARGA por bloco (ver Placar)
+CARGA = 1000
+
+
+def _chave(cliente_id, pontos):
+    # Um único int ordena por pontos decrescente e, no empate, por id crescente
+    return (-pontos << 32) | cliente_id
+
+
+def _decodificar(chave):
+    return chave & 0xFFFFFFFF, -(chave >> 32)
+
+
+class Placar:
+    """Clientes ordenados por pontos (maior primeiro; no empate, quem se cadastrou antes).
+
+    É uma lista ordenada dividida em blocos de até 2 * `carga` chaves, com uma
+    árvore de Fenwick sobre os tamanhos dos blocos: inserir, remover e achar a
+    posição custam uma busca binária nos blocos, uma no bloco e O(log blocos)
+    na árvore. Em Python isso é mais rápido e ocupa menos memória que uma
+    árvore ou skip list com um objeto por cliente, porque as buscas e os
+    deslocamentos dentro do bloco rodam em C (bisect e list).
+
+    Guarda só o que o ranking mostra (id, nome, pontos). As escritas chegam
+    por atualizar()/remover() (avisos entre workers ou a própria rota) e
+    ressincronizar() recarrega tudo; `versao` muda a cada alteração. Todos os
+    métodos são seguros entre threads.
+    """
+
+    def __init__(self, carga=CARGA):
+        self._carga = carga
+        self._lock = threading.Lock()
+        self._blocos = []     # listas ordenadas de chaves
+        self._maximos = []    # maior chave de cada bloco
+        self._arvore = [0]    # Fenwick (base 1) com o tamanho de cada bloco
+        self._pontos = {}     # cliente_id -> pontos
+        self._nomes = {}      # cliente_id -> nome
+        # Escritas feitas durante uma ressincronização, reaplicadas no final
+        self._pendentes = None
+        self.carregado = False
+        self.carregado_em = None
+        self.versao = 0
+
+    # ------------------------------------------------------------------
+    # Estrutura (chamados com o lock)
+
+    def _reindexar(self):
+        blocos = self._blocos
+        self._maximos = [bloco[-1] for bloco in blocos]
+        arvore = [0] + [len(bloco) for bloco in blocos]
+        n = len(blocos)
+        for i in range(1, n + 1):
+            j = i + (i & -i)
+            if j <= n:
+                arvore[j] += arvore[i]
+        self._arvore = arvore
+
+    def _somar(self, bloco, delta):
+        arvore = self._arvore
+        i = bloco + 1
+        while i < len(arvore):
+            arvore[i] += delta
+            i += i & -i
+
+    def _antes_do_bloco(self, bloco):
+        """Quantidade de chaves nos blocos anteriores a `bloco`"""
+        arvore = self._arvore
+        total = 0
+        while bloco > 0:
+            total += arvore[bloco]
+            bloco -= bloco & -bloco
+        return total
+
+    def _localizar(self, indice):
+        """(bloco, posição no bloco) da chave na posição global `indice` (base 0)"""
+        arvore = self._arvore
+        n = len(arvore) - 1
+        pos = 0
+        passo = 1 << (n.bit_length() - 1) if n else 0
+        while passo:
+            prox = pos + passo
+            if prox <= n and arvore[prox] <= indice:
+                indice -= arvore[prox]
+                pos = prox
+            passo >>= 1
+        return pos, indice
+
+    def _inserir(self, chave):
+        blocos = self._blocos
+        if not blocos:
+            self._blocos = [[chave]]
+            self._reindexar()
+            return
+        i = min(bisect_left(self._maximos, chave), len(blocos) - 1)
+        bloco = blocos[i]
+        insort(bloco, chave)
+        self._maximos[i] = bloco[-1]
+        if len(bloco) > 2 * self._carga:
+            blocos[i:i + 1] = [bloco[:self._carga], bloco[self._carga:]]
+            self._reindexar()
+        else:
+            self._somar(i, 1)
+
+    def _remover(self, chave):
+        i = bisect_left(self._maximos, chave)
+        bloco = self._blocos[i]
+        del bloco[bisect_left(bloco, chave)]
+        blocos = self._blocos
+        if len(bloco) < self._carga // 2 and len(blocos) > 1:
+            # Junta o bloco que ficou pequeno com o vizinho (e redivide se passar do limite)
+            j = i - 1 if i > 0 else i
+            juntos = blocos[j] + blocos[j + 1]
+            meio = len(juntos) // 2
+            blocos[j:j + 2] = [juntos] if len(juntos) <= 2 * self._carga else [juntos[:meio], juntos[meio:]]
+            self._reindexar()
+        elif not bloco:
+            del blocos[i]
+            self._reindexar()
+        else:
+            self._maximos[i] = bloco[-1]
+            self._somar(i, -1)
+
+    def _indice(self, chave):
+        i = bisect_left(self._maximos, chave)
+        return self._antes_do_bloco(i) + bisect_left(self._blocos[i], chave)
+
+    def _fatia(self, inicio, quantidade):
+        """Até `quantidade` entradas a partir da posição `inicio` (base 0)"""
+        if inicio >= len(self._pontos) or quantidade <= 0:
+            return []
+        bloco, pos = self._localizar(inicio)
+        itens = []
+        while bloco < len(self._blocos) and len(itens) < quantidade:
+            for chave in self._blocos[bloco][pos:pos + quantidade - len(itens)]:
+                cliente_id, pontos = _decodificar(chave)
+                itens.append({
+                    'posicao': inicio + len(itens) + 1,
+                    'id': cliente_id,
+                    'nome': self._nomes.get(cliente_id),
+                    'pontos_totais': pontos,
+                })
+            bloco, pos = bloco + 1, 0
+        return itens
+
+    def _atualizar(self, cliente_id, pontos, nome):
+        if self._pendentes is not None:
+            self._pendentes.append((self._atualizar, (cliente_id, pontos, nome)))
+        if nome is not None and self._nomes.get(cliente_id) != nome:
+            self._nomes[cliente_id] = nome
+            self.versao += 1
+        if pontos is None:
+            return
+        anterior = self._pontos.get(cliente_id)
+        if anterior == pontos:
+            return
+        if anterior is not None:
+            self._remover(_chave(cliente_id, anterior))
+        self._inserir(_chave(cliente_id, pontos))
+        self._pontos[cliente_id] = pontos
+        self.versao += 1
+
+    def _descartar(self, cliente_id):
+        if self._pendentes is not None:
+            self._pendentes.append((self._descartar, (cliente_id,)))
+        anterior = self._pontos.pop(cliente_id, None)
+        self._nomes.pop(cliente_id, None)
+        if anterior is not None:
+            self._remover(_chave(cliente_id, anterior))
+            self.versao += 1
+
+    # ------------------------------------------------------------------
+    # Escritas
+
+    def atualizar(self, cliente_id, pontos=None, nome=None):
+        """Novo saldo e/ou nome de um cliente (cliente novo entra no ranking)"""
+        with self._lock:
+            if self.carregado or self._pendentes is not None:
+                self._atualizar(cliente_id, pontos, nome)
+
+    def remover(self, cliente_id):
+        with self._lock:
+            if self.carregado or self._pendentes is not None:
+                self._descartar(cliente_id)
+
+    def ressincronizar(self, ler_clientes):
+        """Recarrega tudo de `ler_clientes()`, um iterável de (id, nome, pontos).
+
+        As consultas seguem respondendo com os dados anteriores enquanto a
+        leitura roda; escritas feitas nesse meio tempo são reaplicadas por cima
+        do resultado. Retorna False se outra ressincronização já está em
+        andamento (sem esperar por ela).
+        """
+        with self._lock:
+            if self._pendentes is not None:
+                return False
+            self._pendentes = []
+        try:
+            nomes = {}
+            pontos = {}
+            for cliente_id, nome, saldo in ler_clientes():
+                nomes[cliente_id] = nome
+                pontos[cliente_id] = saldo or 0
+            chaves = sorted(_chave(cliente_id, saldo) for cliente_id, saldo in pontos.items())
+            blocos = [chaves[i:i + self._carga] for i in range(0, len(chaves), self._carga)]
+        except BaseException:
+            with self._lock:
+                self._pendentes = None
+            raise
+
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, None
+            self._blocos, self._pontos, self._nomes = blocos, pontos, nomes
+            self._reindexar()
+            for metodo, argumentos in pendentes:
+                metodo(*argumentos)
+            self.carregado = True
+            self.carregado_em = time.time()
+            self.versao += 1
+        return True
+
+    # ------------------------------------------------------------------
+    # Consultas
+
+    @property
+    def ressincronizando(self):
+        return self._pendentes is not None
+
+    @property
+    def total(self):
+        return len(self._pontos)
+
+    def top(self, quantidade=10):
+        """Os `quantidade` primeiros, com posição (a partir de 1)"""
+        with self._lock:
+            return self._fatia(0, quantidade)
+
+    def posicao(self, cliente_id):
+        """Posição do cliente (a partir de 1) ou None se ele não está no ranking"""
+        with self._lock:
+            pontos = self._pontos.get(cliente_id)
+            if pontos is None:
+                return None
+            return self._indice(_chave(cliente_id, pontos)) + 1
+
+    def vizinhos(self, cliente_id, raio=2):
+        """(posição, entradas de posição - raio até posição + raio) ou (None, [])"""
+        with self._lock:
+            pontos = self._pontos.get(cliente_id)
+            if pontos is None:
+                return None, []
+            indice = self._indice(_chave(cliente_id, pontos))
+            inicio = max(0, indice - raio)
+            return indice + 1, self._fatia(inicio, indice + raio + 1 - inicio)
@@ -0,0 +1,172 @@
+"""
+Logs estruturados (chave=valor ou JSON) sem bloquear a requisição: os
+registros vão para uma fila em memória e uma thread à parte os escreve
+"""
+
+import atexit
+import contextvars
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+
+import orjson
+
+# Lidos em configurar(), depois que o app carregou o .env:
+# LOG_NIVEL: nível mínimo (DEBUG, INFO, WARNING, ERROR); abaixo dele a chamada
+# de log só compara o nível, sem montar mensagem nem campos
+# LOG_FORMATO: 'texto' (chave=valor, uma linha por registro) ou 'json' (um objeto por linha)
+LOG_FORMATO = 'texto'
+
+RAIZ = 'semaforo'
+
+# (id da requisição, rota) da requisição em curso na thread/tarefa
+_requisicao = contextvars.ContextVar('registro_requisicao', default=None)
+
+
+def iniciar_requisicao(id_requisicao, rota):
+    _requisicao.set((id_requisicao, rota))
+
+
+def encerrar_requisicao():
+    _requisicao.set(None)
+
+
+class Registro(logging.LoggerAdapter):
+    """Logger com campos nomeados: log.info('Check-in registrado', cliente_id=3)"""
+
+    _ARGUMENTOS_LOGGING = ('exc_info', 'stack_info', 'stacklevel', 'extra')
+
+    def process(self, msg, kwargs):
+        campos = {chave: kwargs.pop(chave) for chave in list(kwargs) if chave not in self._ARGUMENTOS_LOGGING}
+        kwargs['extra'] = {**kwargs.get('extra', {}), 'campos': campos}
+        return msg, kwargs
+
+    # Atalho para o caso comum em produção (DEBUG desligado): uma comparação e volta
+    def debug(self, msg, *args, **kwargs):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.log(logging.DEBUG, msg, *args, **kwargs)
+
+
+def obter(nome):
+    """Logger do módulo `nome` (ex.: obter('app') → semaforo.app)"""
+    return Registro(logging.getLogger(f'{RAIZ}.{nome}'), {})
+
+
+class HandlerFila(logging.handlers.QueueHandler):
+    """Põe o registro na fila com a requisição atual; formatação e escrita ficam com a thread de saída.
+
+    Só a mensagem é montada aqui (os argumentos podem mudar depois) e, se
+    houver, o traceback (as exceções são raras e o objeto não deve
+    atravessar a fila).
+    """
+
+    def prepare(self, record):
+        return _preparar(record)
+
+
+class HandlerDireto(logging.StreamHandler):
+    """Escreve o registro na hora, na própria thread (modo serverless: a
+    instância congela depois da resposta e a thread de saída junto, com o
+    que estivesse na fila)"""
+
+    def emit(self, record):
+        super().emit(_preparar(record))
+
+
+def _preparar(record):
+    requisicao = _requisicao.get()
+    record.id_requisicao, record.rota = requisicao if requisicao else (None, None)
+    record.msg = record.getMessage()
+    record.args = None
+    if record.exc_info:
+        record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+    return record
+
+
+def _campos(record):
+    dados = {
+        'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+        'nivel': record.levelname,
+        'origem': record.name.removeprefix(f'{RAIZ}.'),
+    }
+    if getattr(record, 'id_requisicao', None):
+        dados['req'] = record.id_requisicao
+        dados['rota'] = record.rota
+    dados['msg'] = record.msg
+    dados.update(getattr(record, 'campos', None) or {})
+    if record.exc_text:
+        dados['erro'] = record.exc_text
+    return dados
+
+
+class FormatoChaveValor(logging.Formatter):
+    """ts=... nivel=INFO origem=app req=... rota=... msg="..." campo=valor"""
+
+    @staticmethod
+    def _valor(valor):
+        if isinstance(valor, (dict, list, tuple)):
+            valor = orjson.dumps(valor, default=str).decode()
+        texto = str(valor)
+        if not texto or any(c in texto for c in ' "=\n\t'):
+            texto = orjson.dumps(texto).decode()
+        return texto
+
+    def format(self, record):
+        return ' '.join(f'{chave}={self._valor(valor)}' for chave, valor in _campos(record).items())
+
+
+class FormatoJSON(logging.Formatter):
+    def format(self, record):
+        return orjson.dumps(_campos(record), default=str).decode()
+
+
+_fila = queue.SimpleQueue()
+_saida = None
+_configurado = False
+_trava = threading.Lock()
+
+
+def _formato():
+    return FormatoJSON() if LOG_FORMATO == 'json' else FormatoChaveValor()
+
+
+def _iniciar_saida():
+    global _saida
+    escritor = logging.StreamHandler(sys.stdout)
+    escritor.setFormatter(_formato())
+    _saida = logging.handlers.QueueListener(_fila, escritor)
+    _saida.start()
+
+
+def configurar(sincrono=False):
+    """Liga o logger `semaforo` à fila e sobe a thread de saída (uma vez por processo).
+
+    Com `sincrono`, cada registro é escrito na hora, sem fila nem thread.
+    """
+    global _configurado, LOG_FORMATO
+    with _trava:
+        if _configurado:
+            return
+        LOG_FORMATO = os.getenv('LOG_FORMATO', 'texto').lower()
+        raiz = logging.getLogger(RAIZ)
+        raiz.setLevel(os.getenv('LOG_NIVEL', 'INFO').upper())
+        # Sem repetir no logger raiz (gunicorn, Flask)
+        raiz.propagate = False
+        if sincrono:
+            escritor = HandlerDireto(sys.stdout)
+            escritor.setFormatter(_formato())
+            raiz.addHandler(escritor)
+            _configurado = True
+            return
+        raiz.addHandler(HandlerFila(_fila))
+        _iniciar_saida()
+        # A thread de saída não sobrevive a um fork (gunicorn --preload): o filho sobe a sua
+        os.register_at_fork(after_in_child=_iniciar_saida)
+        # Escreve o que ainda estiver na fila ao encerrar o processo
+        atexit.register(lambda: _saida.stop())
+        _configurado = True
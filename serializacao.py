@@ -0,0 +1,131 @@
+"""
+Serialização JSON rápida (orjson) e compressão gzip/brotli das respostas
+"""
+
+import zlib
+
+import brotli
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+# Tipos que valem a pena comprimir (imagens e fontes já vêm comprimidas)
+TIPOS_COMPRIMIVEIS = {
+    'application/json', 'application/x-ndjson', 'application/javascript',
+    'text/html', 'text/css', 'text/csv', 'text/plain', 'text/javascript',
+    'image/svg+xml',
+}
+
+# Níveis para conteúdo dinâmico (ver benchmarks/bench_serializacao.py): o
+# brotli 1 comprime as listas tanto quanto o gzip 6 em menos de um quarto do
+# tempo; o gzip 5 fica com a taxa do 6 gastando um pouco menos
+NIVEL_GZIP = 5
+QUALIDADE_BROTLI = 1
+
+
+class ProvedorJSON(DefaultJSONProvider):
+    """JSON do app (jsonify, request.json, app.json.dumps) com orjson.
+
+    Entrega o mesmo que o provedor padrão do Flask (chaves ordenadas, Decimal
+    como texto, compacto fora do modo debug), exceto as datas: saem em ISO
+    8601, com as sem fuso tratadas como UTC ("2024-05-10T22:15:00Z"), em vez
+    de data HTTP. As telas leem as duas formas com new Date().
+    """
+
+    OPCOES = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+
+    def _opcoes(self):
+        compacto = self.compact if self.compact is not None else not self._app.debug
+        return self.OPCOES if compacto else self.OPCOES | orjson.OPT_INDENT_2
+
+    def dumps_bytes(self, obj):
+        return orjson.dumps(obj, default=self.default, option=self._opcoes())
+
+    def dumps(self, obj, **kwargs):
+        # Argumentos do json da biblioteca padrão (separators, indent...) não se aplicam
+        return self.dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype=self.mimetype)
+
+
+def escolher_codificacao(aceitas):
+    """'br', 'gzip' ou None pelo Accept-Encoding (no empate, brotli)"""
+    melhor, qualidade = None, 0
+    for codificacao in ('br', 'gzip'):
+        if aceitas[codificacao] > qualidade:
+            melhor, qualidade = codificacao, aceitas[codificacao]
+    return melhor
+
+
+def comprimir(dados, codificacao):
+    if codificacao == 'br':
+        return brotli.compress(dados, quality=QUALIDADE_BROTLI)
+    compressor = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 31)  # 31 = formato gzip
+    return compressor.compress(dados) + compressor.flush()
+
+
+def compressor_incremental(codificacao):
+    """(comprimir_pedaco, terminar) para um corpo em streaming.
+
+    Cada pedaço sai com o compressor esvaziado, para o cliente continuar
+    recebendo os lotes à medida que saem.
+    """
+    if codificacao == 'br':
+        compressor = brotli.Compressor(quality=QUALIDADE_BROTLI)
+        return (lambda pedaco: compressor.process(pedaco) + compressor.flush()), compressor.finish
+    compressor = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 31)
+    return (lambda pedaco: compressor.compress(pedaco) + compressor.flush(zlib.Z_SYNC_FLUSH)), compressor.flush
+
+
+def comprimir_pedacos(pedacos, codificacao):
+    """Corpo em streaming (str ou bytes) comprimido pedaço a pedaço; fecha `pedacos` no fim"""
+    comprimir_pedaco, terminar = compressor_incremental(codificacao)
+    try:
+        for pedaco in pedacos:
+            if isinstance(pedaco, str):
+                pedaco = pedaco.encode()
+            saida = comprimir_pedaco(pedaco)
+            if saida:
+                yield saida
+        yield terminar()
+    finally:
+        if hasattr(pedacos, 'close'):
+            pedacos.close()
+
+
+def comprimir_resposta(resposta, aceitas, minimo_bytes):
+    """Comprime `resposta` (after_request) se o cliente aceita e compensa.
+
+    Respostas prontas só a partir de `minimo_bytes`; em streaming sempre
+    (são as listas grandes). Arquivos enviados direto (send_file) ficam como
+    estão. A ETag passa a fraca: o corpo comprimido não é byte a byte o
+    mesmo, mas a revalidação (If-None-Match) continua dando 304.
+    """
+    if resposta.mimetype not in TIPOS_COMPRIMIVEIS:
+        return resposta
+    resposta.vary.add('Accept-Encoding')
+    if (resposta.status_code != 200 or resposta.direct_passthrough
+            or 'Content-Encoding' in resposta.headers):
+        return resposta
+    codificacao = escolher_codificacao(aceitas)
+    if codificacao is None:
+        return resposta
+
+    if resposta.is_streamed:
+        resposta.response = comprimir_pedacos(resposta.response, codificacao)
+        resposta.headers.pop('Content-Length', None)
+    else:
+        dados = resposta.get_data()
+        if len(dados) < minimo_bytes:
+            return resposta
+        resposta.set_data(comprimir(dados, codificacao))
+
+    resposta.headers['Content-Encoding'] = codificacao
+    etag, fraca = resposta.get_etag()
+    if etag and not fraca:
+        resposta.set_etag(etag, weak=True)
+    return resposta
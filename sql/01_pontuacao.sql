@@ -0,0 +1,136 @@
+-- ============================================
+-- FUNÇÕES DE PONTUAÇÃO (lançamento e aprovação em uma única chamada)
+-- ============================================
+-- Execute este script no SQL Editor do Supabase Dashboard
+-- https://supabase.com/dashboard → Seu Projeto → SQL Editor
+-- (init_db() também aplica este arquivo; ele pode ser executado várias vezes)
+
+-- Bônus de frequência por dias distintos com check-in nos últimos 30 dias
+CREATE OR REPLACE FUNCTION bonus_frequencia(p_dias INTEGER)
+RETURNS INTEGER
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE
+        WHEN p_dias >= 20 THEN 100
+        WHEN p_dias >= 15 THEN 75
+        WHEN p_dias >= 10 THEN 50
+        WHEN p_dias >= 5 THEN 25
+        ELSE 0
+    END
+$$;
+
+-- Nível do semáforo para um saldo, conforme a tabela configuracoes
+CREATE OR REPLACE FUNCTION nivel_para_pontos(p_pontos INTEGER)
+RETURNS VARCHAR
+LANGUAGE sql STABLE AS $$
+    SELECT CASE
+        WHEN p_pontos >= COALESCE(c.pontos_verde_min, 500) THEN 'verde'
+        WHEN p_pontos >= COALESCE(c.pontos_amarelo_min, 200) THEN 'amarelo'
+        ELSE 'vermelho'
+    END
+    FROM (SELECT 1) AS um
+    LEFT JOIN (SELECT * FROM configuracoes ORDER BY id LIMIT 1) AS c ON TRUE
+$$;
+
+-- Lançamento completo: pontos, bônus de frequência, saldo válido, nível e última visita
+CREATE OR REPLACE FUNCTION registrar_pontos(
+    p_cliente_id INTEGER,
+    p_pontos INTEGER,
+    p_tipo VARCHAR,
+    p_descricao TEXT
+)
+RETURNS TABLE (pontos_totais INTEGER, pontos_bonus INTEGER, dias_visitados INTEGER, nivel VARCHAR)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_dias INTEGER;
+    v_bonus INTEGER;
+    v_total INTEGER;
+    v_nivel VARCHAR;
+BEGIN
+    -- Trava o cliente antes do INSERT, como registrar_pontos_lote(): senão a
+    -- chave estrangeira pega a trava compartilhada, o trigger de saldo tenta
+    -- subi-la para exclusiva e dois lançamentos simultâneos para o mesmo
+    -- cliente terminam em deadlock (cliente inexistente segue caindo na FK)
+    PERFORM 1 FROM clientes c WHERE c.id = p_cliente_id FOR UPDATE;
+
+    INSERT INTO pontuacoes (cliente_id, pontos, tipo, descricao, data_validade)
+    VALUES (p_cliente_id, p_pontos, p_tipo, p_descricao, NOW() + INTERVAL '90 days');
+
+    -- Dias visitados pelo mapa de visitas do cliente (ver sql/08_visitas.sql)
+    SELECT COALESCE(f.dias_visitados, 0) INTO v_dias
+    FROM frequencia_cliente(p_cliente_id, dia_negocio()) f;
+
+    v_bonus := bonus_frequencia(v_dias);
+
+    IF v_bonus > 0 THEN
+        INSERT INTO pontuacoes (cliente_id, pontos, tipo, descricao, data_validade)
+        VALUES (p_cliente_id, v_bonus, 'frequencia',
+                'Bônus de frequência: ' || v_dias || ' visitas em 30 dias',
+                NOW() + INTERVAL '90 days');
+    END IF;
+
+    -- Os triggers de pontuacoes já somaram os lotes; saldo_cliente() só aplica
+    -- alguma expiração pendente (ver sql/02_saldos.sql)
+    SELECT s.pontos_totais, s.nivel INTO v_total, v_nivel
+    FROM saldo_cliente(p_cliente_id) s;
+
+    UPDATE clientes
+    SET ultima_visita = NOW()
+    WHERE id = p_cliente_id;
+
+    -- Saldo novo para o ranking dos workers (sql/11_avisos_invalidacao.sql)
+    PERFORM publicar_clientes(ARRAY[p_cliente_id]);
+
+    RETURN QUERY SELECT v_total, v_bonus, v_dias, v_nivel;
+END
+$$;
+
+-- Aprovação/rejeição de uma solicitação; status: aprovada, rejeitada,
+-- nao_encontrada ou ja_processada
+CREATE OR REPLACE FUNCTION validar_solicitacao_pontos(
+    p_solicitacao_id INTEGER,
+    p_aprovar BOOLEAN,
+    p_validado_por VARCHAR DEFAULT 'admin'
+)
+RETURNS TABLE (status TEXT, cliente_id INTEGER, pontos_totais INTEGER, pontos_bonus INTEGER, nivel VARCHAR)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_solicitacao solicitacoes_pontos%ROWTYPE;
+    v_status TEXT;
+    v_resultado RECORD;
+BEGIN
+    SELECT * INTO v_solicitacao
+    FROM solicitacoes_pontos s
+    WHERE s.id = p_solicitacao_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT 'nao_encontrada'::TEXT, NULL::INTEGER, NULL::INTEGER, NULL::INTEGER, NULL::VARCHAR;
+        RETURN;
+    END IF;
+
+    IF v_solicitacao.status <> 'pendente' THEN
+        RETURN QUERY SELECT 'ja_processada'::TEXT, v_solicitacao.cliente_id, NULL::INTEGER, NULL::INTEGER, NULL::VARCHAR;
+        RETURN;
+    END IF;
+
+    v_status := CASE WHEN p_aprovar THEN 'aprovada' ELSE 'rejeitada' END;
+
+    UPDATE solicitacoes_pontos
+    SET status = v_status, data_validacao = NOW(), validado_por = p_validado_por
+    WHERE id = p_solicitacao_id;
+
+    IF NOT p_aprovar THEN
+        RETURN QUERY SELECT v_status, v_solicitacao.cliente_id, NULL::INTEGER, NULL::INTEGER, NULL::VARCHAR;
+        RETURN;
+    END IF;
+
+    SELECT * INTO v_resultado
+    FROM registrar_pontos(v_solicitacao.cliente_id, v_solicitacao.pontos_total, 'produto',
+                          'Produto consumido (Solicitação #' || p_solicitacao_id || ')');
+
+    RETURN QUERY SELECT v_status, v_solicitacao.cliente_id, v_resultado.pontos_totais,
+                        v_resultado.pontos_bonus, v_resultado.nivel;
+END
+$$;
@@ -0,0 +1,282 @@
+-- ============================================
+-- SALDO INCREMENTAL POR CLIENTE
+-- ============================================
+-- Execute este script no SQL Editor do Supabase Dashboard
+-- https://supabase.com/dashboard → Seu Projeto → SQL Editor
+-- (init_db() também aplica este arquivo; ele pode ser executado várias vezes)
+--
+-- clientes.pontos_totais passa a ser mantido incrementalmente:
+--   - cada INSERT em pontuacoes soma os lotes ainda válidos ao saldo;
+--   - clientes.proxima_expiracao guarda o menor data_validade ainda contado
+--     no saldo. Quando ele passa de NOW(), aplicar_expiracao() desconta só os
+--     lotes vencidos desde então (busca por índice) e avança o marcador;
+--   - clientes.pontos_expirados acumula o que já expirou.
+-- Lotes com data_validade >= proxima_expiracao (ou NULL) estão no saldo.
+-- Edições manuais em pontuacoes (UPDATE) não são acompanhadas: use
+-- verificar_saldos(TRUE) para detectar e corrigir a divergência.
+
+CREATE INDEX IF NOT EXISTS idx_pontuacoes_cliente_validade ON pontuacoes (cliente_id, data_validade);
+
+-- Recalcula saldo, expirados e próxima expiração a partir do extrato
+-- (todos os clientes quando p_ids é NULL)
+CREATE OR REPLACE FUNCTION recalcular_saldos(p_ids INTEGER[] DEFAULT NULL)
+RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_qtd INTEGER;
+BEGIN
+    WITH extrato AS (
+        SELECT p.cliente_id,
+               SUM(p.pontos) FILTER (WHERE p.data_validade IS NULL OR p.data_validade > NOW()) AS saldo,
+               SUM(p.pontos) FILTER (WHERE p.data_validade <= NOW()) AS expirados,
+               MIN(p.data_validade) FILTER (WHERE p.data_validade > NOW()) AS proxima
+        FROM pontuacoes p
+        WHERE p_ids IS NULL OR p.cliente_id = ANY(p_ids)
+        GROUP BY p.cliente_id
+    )
+    UPDATE clientes c
+    SET pontos_totais = COALESCE(e.saldo, 0),
+        pontos_expirados = COALESCE(e.expirados, 0),
+        proxima_expiracao = e.proxima,
+        nivel = nivel_para_pontos(COALESCE(e.saldo, 0)::INTEGER)
+    FROM clientes c2
+    LEFT JOIN extrato e ON e.cliente_id = c2.id
+    WHERE c.id = c2.id
+    AND (p_ids IS NULL OR c2.id = ANY(p_ids));
+
+    GET DIAGNOSTICS v_qtd = ROW_COUNT;
+    RETURN v_qtd;
+END
+$$;
+
+-- Migração: cria as colunas e reconstrói os saldos uma única vez
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema()
+        AND table_name = 'clientes' AND column_name = 'proxima_expiracao'
+    ) THEN
+        ALTER TABLE clientes ADD COLUMN proxima_expiracao TIMESTAMP;
+        ALTER TABLE clientes ADD COLUMN IF NOT EXISTS pontos_expirados INTEGER DEFAULT 0;
+        PERFORM recalcular_saldos();
+    END IF;
+END
+$$;
+
+-- Desconta os lotes vencidos de clientes JÁ TRAVADOS pelo chamador e avança
+-- proxima_expiracao (uma única instrução para o conjunto todo)
+CREATE OR REPLACE FUNCTION descontar_vencidos(p_ids INTEGER[])
+RETURNS TABLE (cliente_id INTEGER, pontos_totais INTEGER, nivel VARCHAR, pontos_vencidos INTEGER)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+BEGIN
+    RETURN QUERY
+    WITH vencidos AS (
+        SELECT c.id, COALESCE(SUM(p.pontos), 0)::INTEGER AS total
+        FROM clientes c
+        LEFT JOIN pontuacoes p
+            ON p.cliente_id = c.id
+            AND p.data_validade >= c.proxima_expiracao
+            AND p.data_validade <= NOW()
+        WHERE c.id = ANY(p_ids)
+        GROUP BY c.id
+    )
+    UPDATE clientes c
+    SET pontos_totais = COALESCE(c.pontos_totais, 0) - v.total,
+        pontos_expirados = COALESCE(c.pontos_expirados, 0) + v.total,
+        nivel = nivel_para_pontos(COALESCE(c.pontos_totais, 0) - v.total),
+        proxima_expiracao = (
+            SELECT MIN(p.data_validade) FROM pontuacoes p
+            WHERE p.cliente_id = c.id AND p.data_validade > NOW()
+        )
+    FROM vencidos v
+    WHERE c.id = v.id
+    RETURNING c.id, c.pontos_totais, c.nivel, v.total;
+END
+$$;
+
+-- Desconta do saldo os lotes vencidos dos clientes indicados e avança
+-- proxima_expiracao; clientes sem nada vencido não são tocados
+CREATE OR REPLACE FUNCTION aplicar_expiracao(p_ids INTEGER[])
+RETURNS TABLE (cliente_id INTEGER, pontos_totais INTEGER, nivel VARCHAR)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_ids INTEGER[];
+BEGIN
+    -- Trava primeiro; a instrução seguinte usa um snapshot novo, que já
+    -- enxerga os lotes confirmados por quem segurava a trava
+    SELECT array_agg(t.id) INTO v_ids
+    FROM (
+        SELECT c.id FROM clientes c
+        WHERE c.id = ANY(p_ids) AND c.proxima_expiracao <= NOW()
+        ORDER BY c.id
+        FOR UPDATE
+    ) t;
+
+    IF v_ids IS NULL THEN
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    SELECT d.cliente_id, d.pontos_totais, d.nivel FROM descontar_vencidos(v_ids) d;
+END
+$$;
+
+-- Saldo válido de um cliente em O(1): aplica a expiração pendente (se houver) e lê a linha
+CREATE OR REPLACE FUNCTION saldo_cliente(p_cliente_id INTEGER)
+RETURNS TABLE (pontos_totais INTEGER, pontos_expirados INTEGER, proxima_expiracao TIMESTAMP, nivel VARCHAR)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+BEGIN
+    PERFORM * FROM aplicar_expiracao(ARRAY[p_cliente_id]);
+
+    RETURN QUERY
+    SELECT COALESCE(c.pontos_totais, 0), COALESCE(c.pontos_expirados, 0), c.proxima_expiracao, c.nivel
+    FROM clientes c
+    WHERE c.id = p_cliente_id;
+END
+$$;
+
+-- Soma os novos lotes ao saldo ou, se já vencidos, aos expirados
+-- (uma atualização por cliente por instrução)
+CREATE OR REPLACE FUNCTION trg_pontuacoes_saldo_insert()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM 1 FROM clientes c
+    WHERE c.id IN (SELECT n.cliente_id FROM novos n)
+    ORDER BY c.id
+    FOR UPDATE;
+
+    UPDATE clientes c
+    SET pontos_totais = COALESCE(c.pontos_totais, 0) + n.total,
+        pontos_expirados = COALESCE(c.pontos_expirados, 0) + n.expirados,
+        nivel = nivel_para_pontos((COALESCE(c.pontos_totais, 0) + n.total)::INTEGER),
+        proxima_expiracao = LEAST(c.proxima_expiracao, n.proxima)
+    FROM (
+        SELECT cliente_id,
+               COALESCE(SUM(pontos) FILTER (WHERE data_validade IS NULL OR data_validade > NOW()), 0) AS total,
+               COALESCE(SUM(pontos) FILTER (WHERE data_validade <= NOW()), 0) AS expirados,
+               MIN(data_validade) FILTER (WHERE data_validade > NOW()) AS proxima
+        FROM novos
+        GROUP BY cliente_id
+    ) n
+    WHERE c.id = n.cliente_id;
+
+    RETURN NULL;
+END
+$$;
+
+-- Retira do saldo (ou dos expirados) os lotes apagados
+CREATE OR REPLACE FUNCTION trg_pontuacoes_saldo_delete()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE clientes c
+    SET pontos_totais = COALESCE(c.pontos_totais, 0) - r.no_saldo,
+        pontos_expirados = COALESCE(c.pontos_expirados, 0) - r.expirados,
+        nivel = nivel_para_pontos((COALESCE(c.pontos_totais, 0) - r.no_saldo)::INTEGER),
+        proxima_expiracao = CASE
+            WHEN r.menor_validade = c.proxima_expiracao THEN (
+                SELECT MIN(p.data_validade) FROM pontuacoes p
+                WHERE p.cliente_id = c.id AND p.data_validade >= c.proxima_expiracao
+            )
+            ELSE c.proxima_expiracao
+        END
+    FROM (
+        SELECT o.cliente_id,
+               COALESCE(SUM(o.pontos) FILTER (
+                   WHERE o.data_validade IS NULL OR o.data_validade >= c2.proxima_expiracao), 0) AS no_saldo,
+               COALESCE(SUM(o.pontos) FILTER (
+                   WHERE o.data_validade IS NOT NULL
+                   AND (c2.proxima_expiracao IS NULL OR o.data_validade < c2.proxima_expiracao)), 0) AS expirados,
+               MIN(o.data_validade) FILTER (WHERE o.data_validade >= c2.proxima_expiracao) AS menor_validade
+        FROM removidos o
+        JOIN clientes c2 ON c2.id = o.cliente_id
+        GROUP BY o.cliente_id
+    ) r
+    WHERE c.id = r.cliente_id;
+
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS pontuacoes_saldo_insert ON pontuacoes;
+CREATE TRIGGER pontuacoes_saldo_insert
+    AFTER INSERT ON pontuacoes
+    REFERENCING NEW TABLE AS novos
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_pontuacoes_saldo_insert();
+
+DROP TRIGGER IF EXISTS pontuacoes_saldo_delete ON pontuacoes;
+CREATE TRIGGER pontuacoes_saldo_delete
+    AFTER DELETE ON pontuacoes
+    REFERENCING OLD TABLE AS removidos
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_pontuacoes_saldo_delete();
+
+-- Compara o saldo mantido com o extrato e lista os clientes divergentes;
+-- com p_corrigir = TRUE também os recalcula
+CREATE OR REPLACE FUNCTION verificar_saldos(p_corrigir BOOLEAN DEFAULT FALSE)
+RETURNS TABLE (
+    cliente_id INTEGER,
+    saldo_armazenado INTEGER,
+    saldo_extrato INTEGER,
+    diferenca INTEGER,
+    proxima_expiracao_armazenada TIMESTAMP,
+    proxima_expiracao_extrato TIMESTAMP
+)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_ids INTEGER[] := '{}';
+    r RECORD;
+BEGIN
+    FOR r IN
+        WITH extrato AS (
+            SELECT p.cliente_id,
+                   SUM(p.pontos) FILTER (WHERE p.data_validade IS NULL OR p.data_validade > NOW()) AS saldo,
+                   MIN(p.data_validade) FILTER (WHERE p.data_validade > NOW()) AS proxima
+            FROM pontuacoes p
+            GROUP BY p.cliente_id
+        ),
+        -- Lotes já vencidos mas ainda não descontados não são divergência
+        pendente AS (
+            SELECT c.id, SUM(p.pontos) AS vencidos
+            FROM clientes c
+            JOIN pontuacoes p
+                ON p.cliente_id = c.id
+                AND p.data_validade >= c.proxima_expiracao
+                AND p.data_validade <= NOW()
+            WHERE c.proxima_expiracao <= NOW()
+            GROUP BY c.id
+        )
+        SELECT c.id,
+               (COALESCE(c.pontos_totais, 0) - COALESCE(pd.vencidos, 0))::INTEGER AS armazenado,
+               COALESCE(e.saldo, 0)::INTEGER AS calculado,
+               c.proxima_expiracao AS proxima_armazenada,
+               e.proxima AS proxima_calculada
+        FROM clientes c
+        LEFT JOIN extrato e ON e.cliente_id = c.id
+        LEFT JOIN pendente pd ON pd.id = c.id
+        WHERE COALESCE(c.pontos_totais, 0) - COALESCE(pd.vencidos, 0) <> COALESCE(e.saldo, 0)
+        OR (c.proxima_expiracao IS NULL AND e.proxima IS NOT NULL)
+        OR (c.proxima_expiracao > NOW() AND c.proxima_expiracao IS DISTINCT FROM e.proxima)
+        ORDER BY c.id
+    LOOP
+        cliente_id := r.id;
+        saldo_armazenado := r.armazenado;
+        saldo_extrato := r.calculado;
+        diferenca := r.armazenado - r.calculado;
+        proxima_expiracao_armazenada := r.proxima_armazenada;
+        proxima_expiracao_extrato := r.proxima_calculada;
+        v_ids := v_ids || r.id;
+        RETURN NEXT;
+    END LOOP;
+
+    IF p_corrigir AND array_length(v_ids, 1) > 0 THEN
+        PERFORM recalcular_saldos(v_ids);
+        PERFORM publicar_clientes(v_ids);
+    END IF;
+END
+$$;
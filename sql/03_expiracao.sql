@@ -0,0 +1,61 @@
+-- ============================================
+-- VARREDURA DE PONTOS EXPIRADOS
+-- ============================================
+-- Execute este script no SQL Editor do Supabase Dashboard
+-- https://supabase.com/dashboard → Seu Projeto → SQL Editor
+-- (init_db() também aplica este arquivo; ele pode ser executado várias vezes)
+--
+-- clientes.proxima_expiracao funciona como marca d'água por cliente: só quem
+-- tem proxima_expiracao <= NOW() tem lotes vencidos desde a última varredura.
+-- O índice parcial abaixo transforma essa busca em uma varredura de faixa que
+-- só toca os clientes vencidos, independente do tamanho de pontuacoes.
+
+CREATE INDEX IF NOT EXISTS idx_clientes_proxima_expiracao
+    ON clientes (proxima_expiracao)
+    WHERE proxima_expiracao IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS execucoes_expiracao (
+    id SERIAL PRIMARY KEY,
+    iniciado_em TIMESTAMP DEFAULT NOW(),
+    finalizado_em TIMESTAMP,
+    tamanho_lote INTEGER,
+    lotes INTEGER DEFAULT 0,
+    clientes_atualizados INTEGER DEFAULT 0,
+    pontos_expirados INTEGER DEFAULT 0,
+    duracao_ms NUMERIC(12, 3),
+    erro TEXT
+);
+
+-- Concessão da varredura (ver expiracao.py): a execução sem finalizado_em e
+-- com concessao_ate no futuro é a que está rodando. Cada lote renova o prazo,
+-- e a de um processo que morreu no meio deixa de valer sozinha
+ALTER TABLE execucoes_expiracao ADD COLUMN IF NOT EXISTS concessao_ate TIMESTAMP;
+
+-- Processa até p_limite clientes vencidos; clientes travados por outra
+-- transação (ex.: um lançamento em andamento) ficam para o próximo lote
+CREATE OR REPLACE FUNCTION expirar_saldos_lote(p_limite INTEGER)
+RETURNS TABLE (cliente_id INTEGER, pontos_totais INTEGER, nivel VARCHAR, pontos_vencidos INTEGER)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_ids INTEGER[];
+BEGIN
+    SELECT array_agg(t.id) INTO v_ids
+    FROM (
+        SELECT c.id FROM clientes c
+        WHERE c.proxima_expiracao <= NOW()
+        ORDER BY c.proxima_expiracao
+        LIMIT p_limite
+        FOR UPDATE SKIP LOCKED
+    ) t;
+
+    IF v_ids IS NULL THEN
+        RETURN;
+    END IF;
+
+    RETURN QUERY SELECT * FROM descontar_vencidos(v_ids);
+
+    -- Saldos mudaram: avisa o ranking dos workers (sql/11_avisos_invalidacao.sql)
+    PERFORM publicar_clientes(v_ids);
+END
+$$;
@@ -0,0 +1,22 @@
+-- ============================================
+-- PAGINAÇÃO POR CURSOR EM /api/clientes
+-- ============================================
+-- Execute este script no SQL Editor do Supabase Dashboard
+-- https://supabase.com/dashboard → Seu Projeto → SQL Editor
+-- (init_db() também aplica este arquivo; ele pode ser executado várias vezes)
+--
+-- A listagem é ordenada por (pontos_totais DESC, id DESC) e cada página
+-- continua a partir do último par (pontos_totais, id) da anterior:
+--   WHERE (pontos_totais, id) < (cursor) ORDER BY pontos_totais DESC, id DESC
+-- Com os índices abaixo qualquer página custa o mesmo que a primeira, ao
+-- contrário de OFFSET, que relê todas as linhas puladas.
+
+CREATE INDEX IF NOT EXISTS idx_clientes_pontos_id
+    ON clientes (pontos_totais DESC, id DESC);
+
+-- Filtro por nível mantém a mesma ordem de paginação
+CREATE INDEX IF NOT EXISTS idx_clientes_nivel_pontos_id
+    ON clientes (nivel, pontos_totais DESC, id DESC);
+
+-- Substituído por idx_clientes_pontos_id (mesmo prefixo)
+DROP INDEX IF EXISTS idx_clientes_pontos;
@@ -0,0 +1,278 @@
+-- ============================================
+-- BUSCA RÁPIDA DE CLIENTES (NOME OU TELEFONE)
+-- ============================================
+-- Execute este script no SQL Editor do Supabase Dashboard
+-- https://supabase.com/dashboard → Seu Projeto → SQL Editor
+-- (init_db() também aplica este arquivo; ele pode ser executado várias vezes)
+--
+-- Usada pelo balcão a cada tecla digitada (/api/clientes/busca):
+--   - clientes.nome_busca: nome sem acentos e em minúsculas, com índice de
+--     trigramas (pg_trgm) que resolve "contém" e btree para "começa com";
+--   - palavras_nomes: as palavras distintas dos nomes (alguns milhares, mesmo
+--     com milhões de clientes). Erros de digitação são corrigidos contra essa
+--     tabela pequena e a busca é refeita com as palavras corrigidas, em vez de
+--     calcular similaridade contra a tabela de clientes inteira;
+--   - clientes.telefone_busca: só os dígitos do telefone (sem +55), com
+--     índices para "começa com" e "termina com" (os últimos números, como o
+--     atendente costuma perguntar).
+-- Cada busca lê poucas entradas dos índices (ou percorre os clientes por
+-- pontos até achar `limite` deles, quando o termo é comum) e devolve no
+-- máximo `limite` linhas, então o custo praticamente não cresce com o número
+-- de clientes.
+-- Na primeira execução as duas colunas são calculadas para todos os
+-- clientes (reescreve a tabela uma vez).
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS fuzzystrmatch;
+
+CREATE OR REPLACE FUNCTION normalizar_busca(p_texto TEXT)
+RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT translate(lower(btrim(coalesce(p_texto, ''))),
+                     'áàâãäéèêëíìîïóòôõöúùûüçñ',
+                     'aaaaaeeeeiiiiooooouuuucn')
+$$;
+
+-- Só dígitos; o código do país (55) sai quando sobra um número completo com DDD
+CREATE OR REPLACE FUNCTION normalizar_telefone(p_texto TEXT)
+RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT regexp_replace(regexp_replace(coalesce(p_texto, ''), '[^0-9]', '', 'g'),
+                          '^55(?=[0-9]{10,11}$)', '')
+$$;
+
+ALTER TABLE clientes
+    ADD COLUMN IF NOT EXISTS nome_busca TEXT
+        GENERATED ALWAYS AS (normalizar_busca(nome)) STORED,
+    ADD COLUMN IF NOT EXISTS telefone_busca TEXT
+        GENERATED ALWAYS AS (normalizar_telefone(telefone)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_clientes_nome_busca_trgm
+    ON clientes USING gin (nome_busca gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_clientes_nome_busca
+    ON clientes (nome_busca COLLATE "C");
+
+-- COLLATE "C": LIKE 'prefixo%' vira uma faixa do índice, já na ordem do ORDER BY
+CREATE INDEX IF NOT EXISTS idx_clientes_telefone_busca
+    ON clientes (telefone_busca COLLATE "C");
+
+CREATE INDEX IF NOT EXISTS idx_clientes_telefone_busca_reverso
+    ON clientes (reverse(telefone_busca) COLLATE "C");
+
+-- Busca principal. Termos só com dígitos vão para o telefone (começa com,
+-- depois termina com); o resto, para o nome, em três faixas de similaridade:
+-- o nome começa com o termo (1.0), uma das outras palavras começa com ele
+-- (0.9) e, a partir de 3 letras, o termo no meio de uma palavra (0.7; com
+-- menos não há trigrama para procurar). Dentro da faixa, mais pontos
+-- primeiro. Uma faixa só é consultada se as anteriores não bastaram, e cada
+-- uma pede ao índice os primeiros por pontos (o planejador escolhe entre
+-- percorrer idx_clientes_pontos_id filtrando, para termos comuns, e juntar
+-- as entradas do índice do nome e ordenar, para os raros): o resultado é o
+-- top `limite` de verdade, esteja o cliente onde estiver na tabela.
+-- As consultas rodam por EXECUTE para serem planejadas com o termo real
+-- (o índice só resolve LIKE quando o planejador conhece o padrão).
+CREATE OR REPLACE FUNCTION buscar_clientes(p_termo TEXT, p_limite INTEGER DEFAULT 10)
+RETURNS TABLE (id INTEGER, nome VARCHAR, telefone VARCHAR, pontos_totais INTEGER,
+               nivel VARCHAR, ultima_visita TIMESTAMP, similaridade REAL)
+LANGUAGE plpgsql STABLE AS $$
+#variable_conflict use_column
+DECLARE
+    v_termo TEXT := normalizar_busca(p_termo);
+    v_digitos TEXT;
+    v_padrao TEXT;
+    v_ids INTEGER[];
+    v_faixas INTEGER[];
+    v_encontrados INTEGER[];
+    v_faixa INTEGER;
+BEGIN
+    IF v_termo ~ '^\+?[0-9 ()+.-]+$' THEN
+        v_digitos := regexp_replace(regexp_replace(v_termo, '^\+55', ''), '[^0-9]', '', 'g');
+        IF length(v_digitos) < 2 THEN
+            RETURN;
+        END IF;
+
+        RETURN QUERY EXECUTE $q$
+            WITH encontrados AS (
+                (SELECT c.id, 1.0::real AS similaridade FROM clientes c
+                 WHERE c.telefone_busca COLLATE "C" LIKE $1 || '%'
+                 ORDER BY c.telefone_busca COLLATE "C"
+                 LIMIT $3)
+                UNION ALL
+                (SELECT c.id, 0.9::real FROM clientes c
+                 WHERE reverse(c.telefone_busca) COLLATE "C" LIKE $2 || '%'
+                 ORDER BY reverse(c.telefone_busca) COLLATE "C"
+                 LIMIT $3)
+            )
+            SELECT c.id, c.nome, c.telefone, c.pontos_totais, c.nivel, c.ultima_visita,
+                   MAX(e.similaridade)
+            FROM encontrados e
+            JOIN clientes c ON c.id = e.id
+            GROUP BY c.id
+            ORDER BY 7 DESC, c.pontos_totais DESC, c.id
+            LIMIT $3
+        $q$ USING v_digitos, reverse(v_digitos), p_limite;
+        RETURN;
+    END IF;
+
+    IF length(v_termo) < 2 THEN
+        RETURN;
+    END IF;
+    v_padrao := replace(replace(replace(v_termo, '\', '\\'), '%', '\%'), '_', '\_');
+
+    -- Cada faixa pede `limite` + os já encontrados: quem já saiu numa faixa
+    -- anterior (um "jo jo" começa o nome e uma palavra) é descartado aqui, e
+    -- as faixas seguintes não precisam repetir as condições das anteriores,
+    -- o que estragaria a estimativa do planejador
+    FOREACH v_faixa IN ARRAY ARRAY[1, 2, 3] LOOP
+        EXIT WHEN coalesce(cardinality(v_ids), 0) >= p_limite;
+        CONTINUE WHEN v_faixa = 3 AND length(v_termo) < 3;
+
+        EXECUTE format($q$
+            SELECT array_agg(t.id) FROM (
+                SELECT id FROM clientes
+                WHERE %s
+                ORDER BY pontos_totais DESC, id DESC
+                LIMIT $2
+            ) t
+        $q$, CASE v_faixa
+                 WHEN 1 THEN $c$nome_busca COLLATE "C" LIKE $1 || '%'$c$
+                 WHEN 2 THEN $c$nome_busca LIKE '% ' || $1 || '%'$c$
+                 ELSE $c$nome_busca LIKE '%' || $1 || '%'$c$
+             END)
+        INTO v_encontrados USING v_padrao, p_limite + coalesce(cardinality(v_ids), 0);
+
+        SELECT coalesce(v_ids, '{}') || coalesce(array_agg(e.id ORDER BY e.ordem), '{}'),
+               coalesce(v_faixas, '{}') || coalesce(array_agg(v_faixa ORDER BY e.ordem), '{}')
+        INTO v_ids, v_faixas
+        FROM unnest(v_encontrados) WITH ORDINALITY AS e(id, ordem)
+        WHERE e.id <> ALL (coalesce(v_ids, '{}'));
+    END LOOP;
+
+    RETURN QUERY
+    SELECT c.id, c.nome, c.telefone, c.pontos_totais, c.nivel, c.ultima_visita,
+           (ARRAY[1.0, 0.9, 0.7]::real[])[e.faixa]
+    FROM unnest(v_ids, v_faixas) WITH ORDINALITY AS e(id, faixa, ordem)
+    JOIN clientes c ON c.id = e.id
+    ORDER BY e.ordem
+    LIMIT p_limite;
+END
+$$;
+
+-- Dicionário de palavras dos nomes. Palavras de clientes removidos ou
+-- renomeados continuam aqui; no pior caso sugerem uma correção que não acha ninguém.
+CREATE TABLE IF NOT EXISTS palavras_nomes (
+    palavra TEXT PRIMARY KEY
+);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM palavras_nomes) THEN
+        INSERT INTO palavras_nomes (palavra)
+        SELECT DISTINCT unnest(string_to_array(nome_busca, ' '))
+        FROM clientes
+        ON CONFLICT DO NOTHING;
+        DELETE FROM palavras_nomes WHERE palavra = '';
+    END IF;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION registrar_palavras_nomes()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO palavras_nomes (palavra)
+    SELECT DISTINCT p.palavra
+    FROM novos n, unnest(string_to_array(n.nome_busca, ' ')) AS p(palavra)
+    WHERE p.palavra <> ''
+    ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END
+$$;
+
+-- Nível de instrução para cargas em lote; UPDATE só quando o nome muda
+-- (os UPDATEs de saldo a cada lançamento não passam por aqui)
+DROP TRIGGER IF EXISTS clientes_palavras_insert ON clientes;
+CREATE TRIGGER clientes_palavras_insert
+    AFTER INSERT ON clientes
+    REFERENCING NEW TABLE AS novos
+    FOR EACH STATEMENT EXECUTE FUNCTION registrar_palavras_nomes();
+
+CREATE OR REPLACE FUNCTION registrar_palavras_nome_editado()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO palavras_nomes (palavra)
+    SELECT DISTINCT p.palavra
+    FROM unnest(string_to_array(NEW.nome_busca, ' ')) AS p(palavra)
+    WHERE p.palavra <> ''
+    ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS clientes_palavras_update ON clientes;
+CREATE TRIGGER clientes_palavras_update
+    AFTER UPDATE OF nome ON clientes
+    FOR EACH ROW
+    WHEN (OLD.nome IS DISTINCT FROM NEW.nome)
+    EXECUTE FUNCTION registrar_palavras_nome_editado();
+
+-- Complemento para erros de digitação ("jaoo slva"): troca cada palavra que
+-- não existe em nenhum nome pela mais próxima do dicionário (distância de
+-- edição; a última palavra é comparada só com o começo das palavras, porque
+-- ainda está sendo digitada) e refaz a busca principal, sem os clientes já
+-- encontrados. A aplicação só a chama quando
+-- a busca principal trouxe menos resultados que o limite.
+CREATE OR REPLACE FUNCTION buscar_clientes_aproximado(p_termo TEXT, p_limite INTEGER DEFAULT 10,
+                                                      p_excluir INTEGER[] DEFAULT '{}')
+RETURNS TABLE (id INTEGER, nome VARCHAR, telefone VARCHAR, pontos_totais INTEGER,
+               nivel VARCHAR, ultima_visita TIMESTAMP, similaridade REAL)
+LANGUAGE plpgsql STABLE AS $$
+#variable_conflict use_column
+DECLARE
+    v_palavras TEXT[] := array_remove(string_to_array(normalizar_busca(p_termo), ' '), '');
+    v_qtd INTEGER := coalesce(array_length(v_palavras, 1), 0);
+    v_corrigida TEXT;
+    v_mudou BOOLEAN := FALSE;
+BEGIN
+    IF v_qtd = 0 OR normalizar_busca(p_termo) ~ '^\+?[0-9 ()+.-]+$' THEN
+        RETURN;
+    END IF;
+
+    FOR i IN 1..v_qtd LOOP
+        CONTINUE WHEN length(v_palavras[i]) < 3;
+        CONTINUE WHEN EXISTS (SELECT 1 FROM palavras_nomes WHERE palavra = v_palavras[i]);
+        CONTINUE WHEN i = v_qtd AND EXISTS (
+            SELECT 1 FROM palavras_nomes WHERE palavra LIKE v_palavras[i] || '%'
+        );
+
+        SELECT d.palavra INTO v_corrigida
+        FROM (
+            SELECT palavra,
+                   levenshtein(CASE WHEN i = v_qtd THEN left(palavra, length(v_palavras[i])) ELSE palavra END,
+                               v_palavras[i]) AS distancia
+            FROM palavras_nomes
+        ) d
+        WHERE d.distancia <= CASE WHEN length(v_palavras[i]) <= 3 THEN 1 ELSE 2 END
+        ORDER BY d.distancia, abs(length(d.palavra) - length(v_palavras[i])),
+                 similarity(d.palavra, v_palavras[i]) DESC, d.palavra
+        LIMIT 1;
+
+        IF v_corrigida IS NOT NULL THEN
+            v_palavras[i] := v_corrigida;
+            v_mudou := TRUE;
+        END IF;
+    END LOOP;
+
+    IF NOT v_mudou THEN
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    SELECT b.id, b.nome, b.telefone, b.pontos_totais, b.nivel, b.ultima_visita, b.similaridade
+    FROM buscar_clientes(array_to_string(v_palavras, ' '), p_limite + coalesce(array_length(p_excluir, 1), 0)) b
+    WHERE b.id <> ALL (p_excluir)
+    LIMIT p_limite;
+END
+$$;
@@ -0,0 +1,104 @@
+-- ============================================
+-- LANÇAMENTO DE PONTOS EM LOTE (fechamento da noite)
+-- ============================================
+-- Execute este script no SQL Editor do Supabase Dashboard
+-- https://supabase.com/dashboard → Seu Projeto → SQL Editor
+-- (init_db() também aplica este arquivo; ele pode ser executado várias vezes)
+
+-- Mesmo efeito de chamar registrar_pontos() para cada item, em ordem, mas com
+-- instruções sobre o conjunto: uma trava por cliente, um INSERT com todos os
+-- lançamentos e bônus (o trigger de saldo roda uma vez) e um UPDATE de
+-- última visita. Os arrays são paralelos (um elemento por item); indice é a
+-- posição do item (a partir de 1). pontos_totais e nivel são o saldo logo
+-- depois daquele item, como se os itens tivessem sido lançados um a um.
+CREATE OR REPLACE FUNCTION registrar_pontos_lote(
+    p_clientes INTEGER[],
+    p_pontos INTEGER[],
+    p_tipos VARCHAR[],
+    p_descricoes TEXT[]
+)
+RETURNS TABLE (
+    indice INTEGER,
+    cliente_id INTEGER,
+    status TEXT,
+    pontos_totais INTEGER,
+    pontos_bonus INTEGER,
+    dias_visitados INTEGER,
+    nivel VARCHAR
+)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_hoje DATE := dia_negocio();
+    v_ids INTEGER[];
+    v_dias INTEGER[];
+BEGIN
+    -- Trava os clientes existentes em ordem de id (a mesma do trigger de saldo)
+    -- e conta os dias visitados de cada um pelo mapa de visitas (sql/08_visitas.sql)
+    SELECT array_agg(t.id ORDER BY t.id), array_agg(t.dias ORDER BY t.id)
+    INTO v_ids, v_dias
+    FROM (
+        SELECT c.id, visitas_contar(c.visitas_bits, c.visitas_dia_base, v_hoje) AS dias
+        FROM clientes c
+        WHERE c.id = ANY(p_clientes)
+        ORDER BY c.id
+        FOR UPDATE
+    ) t;
+
+    IF v_ids IS NOT NULL THEN
+        WITH itens AS (
+            SELECT i.ordem, i.cliente_id, i.pontos, i.tipo, i.descricao, f.dias
+            FROM unnest(p_clientes, p_pontos, p_tipos, p_descricoes)
+                 WITH ORDINALITY AS i(cliente_id, pontos, tipo, descricao, ordem)
+            JOIN unnest(v_ids, v_dias) AS f(id, dias) ON f.id = i.cliente_id
+        )
+        INSERT INTO pontuacoes (cliente_id, pontos, tipo, descricao, data_validade)
+        SELECT l.cliente_id, l.pontos, l.tipo, l.descricao, NOW() + INTERVAL '90 days'
+        FROM (
+            SELECT ordem, 0 AS bonus, cliente_id, pontos, tipo, descricao FROM itens
+            UNION ALL
+            SELECT ordem, 1, cliente_id, bonus_frequencia(dias), 'frequencia',
+                   'Bônus de frequência: ' || dias || ' visitas em 30 dias'
+            FROM itens
+            WHERE bonus_frequencia(dias) > 0
+        ) l
+        ORDER BY l.ordem, l.bonus;
+
+        PERFORM * FROM aplicar_expiracao(v_ids);
+
+        UPDATE clientes
+        SET ultima_visita = NOW()
+        WHERE id = ANY(v_ids);
+
+        -- Saldos novos para o ranking dos workers, como em registrar_pontos()
+        PERFORM publicar_clientes(v_ids);
+    END IF;
+
+    -- Saldo depois de cada item = saldo final menos o que os itens seguintes
+    -- do mesmo cliente somaram
+    RETURN QUERY
+    WITH itens AS (
+        SELECT i.ordem::INTEGER AS ordem, i.cliente_id, i.pontos, f.dias,
+               bonus_frequencia(f.dias) AS bonus, c.pontos_totais AS saldo_final
+        FROM unnest(p_clientes, p_pontos) WITH ORDINALITY AS i(cliente_id, pontos, ordem)
+        LEFT JOIN unnest(v_ids, v_dias) AS f(id, dias) ON f.id = i.cliente_id
+        LEFT JOIN clientes c ON c.id = f.id
+    ),
+    saldos AS (
+        SELECT itens.*,
+               (COALESCE(saldo_final, 0) - COALESCE(SUM(pontos + bonus) OVER (
+                   PARTITION BY itens.cliente_id ORDER BY ordem
+                   ROWS BETWEEN 1 FOLLOWING AND UNBOUNDED FOLLOWING
+               ), 0))::INTEGER AS saldo
+        FROM itens
+    )
+    SELECT s.ordem, s.cliente_id,
+           CASE WHEN s.dias IS NULL THEN 'cliente_nao_encontrado' ELSE 'ok' END,
+           CASE WHEN s.dias IS NULL THEN NULL ELSE s.saldo END,
+           CASE WHEN s.dias IS NULL THEN NULL ELSE s.bonus END,
+           s.dias,
+           CASE WHEN s.dias IS NULL THEN NULL ELSE nivel_para_pontos(s.saldo) END
+    FROM saldos s
+    ORDER BY s.ordem;
+END
+$$;
@@ -0,0 +1,105 @@
+-- ============================================
+-- VALIDAÇÃO DE SOLICITAÇÕES EM LOTE
+-- ============================================
+-- Execute este script no SQL Editor do Supabase Dashboard
+-- https://supabase.com/dashboard → Seu Projeto → SQL Editor
+-- (init_db() também aplica este arquivo; ele pode ser executado várias vezes)
+
+-- Fila de pendentes (listagem do admin e travas do lote)
+CREATE INDEX IF NOT EXISTS idx_solicitacoes_pendentes
+    ON solicitacoes_pontos (id) WHERE status = 'pendente';
+
+-- Aprova/rejeita várias solicitações de uma vez (arrays paralelos: id e
+-- decisão). As pendentes são travadas com SKIP LOCKED, então duas telas
+-- validando a mesma fila não esperam uma pela outra; as aprovadas viram
+-- lançamentos com registrar_pontos_lote() (um INSERT, saldo de cada cliente
+-- recalculado uma vez), em ordem de id. Um resultado por id, na ordem
+-- recebida; status: aprovada, rejeitada, ja_processada, em_processamento
+-- (travada por outra validação agora) ou nao_encontrada.
+CREATE OR REPLACE FUNCTION validar_solicitacoes_lote(
+    p_ids INTEGER[],
+    p_aprovar BOOLEAN[],
+    p_validado_por VARCHAR DEFAULT 'admin'
+)
+RETURNS TABLE (
+    solicitacao_id INTEGER,
+    status TEXT,
+    cliente_id INTEGER,
+    pontos_totais INTEGER,
+    pontos_bonus INTEGER,
+    nivel VARCHAR
+)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_travadas INTEGER[];
+    v_aprovadas INTEGER[];
+    v_clientes INTEGER[];
+    v_pontos INTEGER[];
+    v_descricoes TEXT[];
+    v_saldos INTEGER[];
+    v_bonus INTEGER[];
+    v_niveis VARCHAR[];
+BEGIN
+    SELECT array_agg(t.id) INTO v_travadas
+    FROM (
+        SELECT s.id FROM solicitacoes_pontos s
+        WHERE s.id = ANY(p_ids) AND s.status = 'pendente'
+        ORDER BY s.id
+        FOR UPDATE SKIP LOCKED
+    ) t;
+
+    IF v_travadas IS NOT NULL THEN
+        -- Id repetido no pedido: vale a primeira decisão
+        UPDATE solicitacoes_pontos s
+        SET status = CASE WHEN d.aprovar THEN 'aprovada' ELSE 'rejeitada' END,
+            data_validacao = NOW(),
+            validado_por = p_validado_por
+        FROM (
+            SELECT DISTINCT ON (u.id) u.id, u.aprovar
+            FROM unnest(p_ids, p_aprovar) WITH ORDINALITY AS u(id, aprovar, ordem)
+            ORDER BY u.id, u.ordem
+        ) d
+        WHERE s.id = d.id AND s.id = ANY(v_travadas);
+
+        SELECT array_agg(s.id ORDER BY s.id),
+               array_agg(s.cliente_id ORDER BY s.id),
+               array_agg(s.pontos_total ORDER BY s.id),
+               array_agg('Produto consumido (Solicitação #' || s.id || ')' ORDER BY s.id)
+        INTO v_aprovadas, v_clientes, v_pontos, v_descricoes
+        FROM solicitacoes_pontos s
+        WHERE s.id = ANY(v_travadas) AND s.status = 'aprovada';
+    END IF;
+
+    IF v_aprovadas IS NOT NULL THEN
+        SELECT array_agg(r.pontos_totais ORDER BY r.indice),
+               array_agg(r.pontos_bonus ORDER BY r.indice),
+               array_agg(r.nivel ORDER BY r.indice)
+        INTO v_saldos, v_bonus, v_niveis
+        FROM registrar_pontos_lote(
+            v_clientes, v_pontos,
+            array_fill('produto'::VARCHAR, ARRAY[cardinality(v_aprovadas)]),
+            v_descricoes
+        ) r;
+    END IF;
+
+    RETURN QUERY
+    SELECT d.id,
+           CASE
+               WHEN s.id IS NULL THEN 'nao_encontrada'
+               WHEN d.id = ANY(v_travadas) THEN s.status
+               WHEN s.status = 'pendente' THEN 'em_processamento'
+               ELSE 'ja_processada'
+           END::TEXT,
+           s.cliente_id, a.pontos_totais, a.pontos_bonus, a.nivel
+    FROM (
+        SELECT DISTINCT ON (u.id) u.id, u.ordem
+        FROM unnest(p_ids) WITH ORDINALITY AS u(id, ordem)
+        ORDER BY u.id, u.ordem
+    ) d
+    LEFT JOIN solicitacoes_pontos s ON s.id = d.id
+    LEFT JOIN unnest(v_aprovadas, v_saldos, v_bonus, v_niveis)
+        AS a(id, pontos_totais, pontos_bonus, nivel) ON a.id = d.id
+    ORDER BY d.ordem;
+END
+$$;
@@ -0,0 +1,133 @@
+-- ============================================
+-- MAPA DE VISITAS POR CLIENTE (bônus de frequência sem varrer checkins)
+-- ============================================
+-- Execute este script no SQL Editor do Supabase Dashboard
+-- https://supabase.com/dashboard → Seu Projeto → SQL Editor
+-- (init_db() também aplica este arquivo; ele pode ser executado várias vezes)
+--
+-- Cada cliente guarda os dias com check-in dos últimos 32 dias em um BIGINT:
+--   - clientes.visitas_dia_base é o dia do bit 0;
+--   - o bit i liga quando houve check-in em visitas_dia_base - i.
+-- Os dias são dias de negócio (checkins.dia_negocio, ver
+-- sql/09_checkin_dia_negocio.sql). Para contar os dias visitados até hoje,
+-- o mapa é deslocado de (hoje - visitas_dia_base) bits e os 30 bits mais
+-- baixos são contados (popcount). Os últimos 30 dias são hoje e os 29
+-- anteriores.
+-- Um trigger de INSERT em checkins mantém o mapa. Check-ins apagados ou
+-- editados não são acompanhados: use reconstruir_visitas().
+
+ALTER TABLE clientes ADD COLUMN IF NOT EXISTS visitas_bits BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE clientes ADD COLUMN IF NOT EXISTS visitas_dia_base DATE;
+
+-- Check-ins de um cliente por data (histórico em /api/cliente/checkins)
+CREATE INDEX IF NOT EXISTS idx_checkins_cliente_data ON checkins (cliente_id, data_checkin);
+
+-- Mapa com o bit 0 em p_para (bits que saem da janela de 32 dias são descartados)
+CREATE OR REPLACE FUNCTION visitas_deslocar(p_bits BIGINT, p_base DATE, p_para DATE)
+RETURNS BIGINT
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE
+        WHEN p_base IS NULL OR p_bits = 0 THEN 0
+        WHEN p_para - p_base >= 32 OR p_base - p_para >= 32 THEN 0
+        WHEN p_para >= p_base THEN (p_bits << (p_para - p_base)) & 4294967295
+        ELSE p_bits >> (p_base - p_para)
+    END
+$$;
+
+-- Dias distintos com check-in nos p_janela dias terminados em p_hoje
+-- (uma expressão só, sem chamar visitas_deslocar: é a conta do caminho quente)
+CREATE OR REPLACE FUNCTION visitas_contar(p_bits BIGINT, p_base DATE, p_hoje DATE, p_janela INTEGER DEFAULT 30)
+RETURNS INTEGER
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE
+        WHEN p_base IS NULL OR p_hoje - p_base >= p_janela OR p_base - p_hoje >= 32 THEN 0
+        ELSE bit_count(((CASE WHEN p_hoje >= p_base THEN p_bits << (p_hoje - p_base)
+                              ELSE p_bits >> (p_base - p_hoje) END)
+                        & ((1::BIGINT << p_janela) - 1))::BIT(64))::INTEGER
+    END
+$$;
+
+-- Acrescenta dias ao mapa; a base passa a ser o dia mais recente
+CREATE OR REPLACE FUNCTION visitas_marcar(p_bits BIGINT, p_base DATE, p_dias DATE[], OUT bits BIGINT, OUT base DATE)
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT visitas_deslocar(p_bits, p_base, b.base) | COALESCE(bit_or(visitas_deslocar(1, d.dia, b.base)), 0),
+           b.base
+    FROM (SELECT GREATEST(p_base, (SELECT MAX(x) FROM unnest(p_dias) AS x)) AS base) b
+    LEFT JOIN unnest(p_dias) AS d(dia) ON TRUE
+    GROUP BY b.base
+$$;
+
+-- Dias visitados nos 30 dias terminados em p_hoje (dia de negócio) e bônus
+-- correspondente, direto da linha do cliente
+DROP FUNCTION IF EXISTS frequencia_cliente(INTEGER);
+CREATE OR REPLACE FUNCTION frequencia_cliente(
+    p_cliente_id INTEGER,
+    p_hoje DATE,
+    OUT dias_visitados INTEGER,
+    OUT pontos_bonus INTEGER
+)
+LANGUAGE sql STABLE AS $$
+    SELECT f.dias, bonus_frequencia(f.dias)
+    FROM (
+        SELECT visitas_contar(c.visitas_bits, c.visitas_dia_base, p_hoje) AS dias
+        FROM clientes c
+        WHERE c.id = p_cliente_id
+    ) f
+$$;
+
+-- Refaz o mapa a partir de checkins (todos os clientes quando p_ids é NULL)
+CREATE OR REPLACE FUNCTION reconstruir_visitas(p_ids INTEGER[] DEFAULT NULL)
+RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_hoje DATE := dia_negocio();
+    v_qtd INTEGER;
+BEGIN
+    WITH mapas AS (
+        SELECT ch.cliente_id, bit_or(visitas_deslocar(1, ch.dia_negocio, v_hoje)) AS bits
+        FROM checkins ch
+        WHERE ch.dia_negocio >= v_hoje - 31
+        AND (p_ids IS NULL OR ch.cliente_id = ANY(p_ids))
+        GROUP BY ch.cliente_id
+    )
+    UPDATE clientes c
+    SET visitas_bits = COALESCE(m.bits, 0),
+        visitas_dia_base = CASE WHEN m.bits IS NULL THEN NULL ELSE v_hoje END
+    FROM clientes c2
+    LEFT JOIN mapas m ON m.cliente_id = c2.id
+    WHERE c.id = c2.id
+    AND (p_ids IS NULL OR c2.id = ANY(p_ids));
+
+    GET DIAGNOSTICS v_qtd = ROW_COUNT;
+    RETURN v_qtd;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION trg_checkins_visitas_insert()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE clientes c
+    SET (visitas_bits, visitas_dia_base) = (
+        SELECT m.bits, m.base FROM visitas_marcar(c.visitas_bits, c.visitas_dia_base, n.dias) m
+    )
+    FROM (
+        SELECT cliente_id, array_agg(DISTINCT dia_negocio) AS dias
+        FROM novos
+        WHERE dia_negocio IS NOT NULL
+        GROUP BY cliente_id
+    ) n
+    WHERE c.id = n.cliente_id;
+
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS checkins_visitas_insert ON checkins;
+CREATE TRIGGER checkins_visitas_insert
+    AFTER INSERT ON checkins
+    REFERENCING NEW TABLE AS novos
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_checkins_visitas_insert();
+
+-- A montagem inicial dos mapas a partir do histórico fica em
+-- sql/09_checkin_dia_negocio.sql, depois que checkins.dia_negocio é preenchido
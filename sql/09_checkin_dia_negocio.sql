@@ -0,0 +1,122 @@
+-- ============================================
+-- CHECK-IN POR DIA DE NEGÓCIO (um por cliente por noite)
+-- ============================================
+-- Execute este script no SQL Editor do Supabase Dashboard
+-- https://supabase.com/dashboard → Seu Projeto → SQL Editor
+-- (init_db() também aplica este arquivo; ele pode ser executado várias vezes)
+--
+-- O dia de negócio é a data no fuso do bar, com a virada na hora configurada.
+-- Com virada às 6h, quem chega às 23h e volta às 2h está na mesma noite.
+-- checkins.dia_negocio é gravado no INSERT. O índice único
+-- (cliente_id, dia_negocio) garante um check-in por noite mesmo com
+-- requisições simultâneas. Check-ins antigos repetidos na mesma noite ficam
+-- com dia_negocio NULL: continuam no histórico, mas não contam.
+
+ALTER TABLE configuracoes ADD COLUMN IF NOT EXISTS dia_negocio_fuso TEXT DEFAULT 'America/Sao_Paulo';
+ALTER TABLE configuracoes ADD COLUMN IF NOT EXISTS dia_negocio_virada_hora INTEGER DEFAULT 6;
+
+-- Dia de negócio de um instante, conforme a tabela configuracoes
+CREATE OR REPLACE FUNCTION dia_negocio(p_momento TIMESTAMPTZ DEFAULT NOW())
+RETURNS DATE
+LANGUAGE sql STABLE AS $$
+    SELECT ((p_momento AT TIME ZONE COALESCE(c.dia_negocio_fuso, 'America/Sao_Paulo'))
+            - make_interval(hours => COALESCE(c.dia_negocio_virada_hora, 6)))::DATE
+    FROM (SELECT 1) AS um
+    LEFT JOIN (SELECT * FROM configuracoes ORDER BY id LIMIT 1) AS c ON TRUE
+$$;
+
+ALTER TABLE checkins ADD COLUMN IF NOT EXISTS dia_negocio DATE;
+
+-- Preenche o dia de negócio a partir de data_checkin (hora local da sessão,
+-- como o DEFAULT NOW() grava) quando o INSERT não informa. A migração do
+-- SQLite (migrate_data_to_supabase.py) liga migracao.checkins_sem_dia na
+-- transação para gravar o histórico sem dia e preencher no fim, com
+-- preencher_dia_negocio()
+CREATE OR REPLACE FUNCTION trg_checkins_dia_negocio()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF NEW.dia_negocio IS NULL
+       AND current_setting('migracao.checkins_sem_dia', TRUE) IS DISTINCT FROM 'on' THEN
+        NEW.dia_negocio := dia_negocio(COALESCE(NEW.data_checkin, LOCALTIMESTAMP)::TIMESTAMPTZ);
+    END IF;
+    RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS checkins_dia_negocio ON checkins;
+CREATE TRIGGER checkins_dia_negocio
+    BEFORE INSERT ON checkins
+    FOR EACH ROW EXECUTE FUNCTION trg_checkins_dia_negocio();
+
+-- Histórico sem dia: o primeiro check-in (data_checkin, id) de cada noite
+-- fica com o dia, os repetidos com NULL; noites que já têm um check-in com
+-- dia não mudam. Usada abaixo e no fim da migração do SQLite, para o
+-- histórico sair igual pelos dois caminhos
+CREATE OR REPLACE FUNCTION preencher_dia_negocio()
+RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_qtd INTEGER;
+BEGIN
+    UPDATE checkins ch
+    SET dia_negocio = p.dia
+    FROM (
+        SELECT id, cliente_id, dia,
+               ROW_NUMBER() OVER (PARTITION BY cliente_id, dia ORDER BY data_checkin, id) AS ordem
+        FROM (
+            SELECT id, cliente_id, data_checkin, dia_negocio(data_checkin::TIMESTAMPTZ) AS dia
+            FROM checkins
+            WHERE dia_negocio IS NULL
+        ) d
+    ) p
+    WHERE ch.id = p.id AND p.ordem = 1
+      AND NOT EXISTS (SELECT 1 FROM checkins o WHERE o.cliente_id = p.cliente_id AND o.dia_negocio = p.dia);
+
+    GET DIAGNOSTICS v_qtd = ROW_COUNT;
+    RETURN v_qtd;
+END
+$$;
+
+-- Migração: preenche o histórico, cria o índice único e refaz os mapas de visitas
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_indexes
+        WHERE schemaname = current_schema() AND indexname = 'idx_checkins_cliente_dia_negocio'
+    ) THEN
+        PERFORM preencher_dia_negocio();
+
+        CREATE UNIQUE INDEX idx_checkins_cliente_dia_negocio ON checkins (cliente_id, dia_negocio);
+
+        PERFORM reconstruir_visitas();
+    END IF;
+END
+$$;
+
+-- Check-in em uma única instrução: o índice único decide se é o primeiro da
+-- noite (novo) ou repetido; devolve também a frequência atualizada
+CREATE OR REPLACE FUNCTION registrar_checkin(p_cliente_id INTEGER, p_localizacao TEXT)
+RETURNS TABLE (novo BOOLEAN, dias_visitados INTEGER, pontos_bonus INTEGER)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_hoje DATE := dia_negocio();
+    v_id INTEGER;
+BEGIN
+    INSERT INTO checkins (cliente_id, localizacao, dia_negocio)
+    VALUES (p_cliente_id, p_localizacao, v_hoje)
+    ON CONFLICT (cliente_id, dia_negocio) DO NOTHING
+    RETURNING id INTO v_id;
+
+    IF v_id IS NOT NULL THEN
+        UPDATE clientes
+        SET ultima_visita = NOW()
+        WHERE id = p_cliente_id;
+    END IF;
+
+    RETURN QUERY
+    SELECT v_id IS NOT NULL, COALESCE(f.dias_visitados, 0), COALESCE(f.pontos_bonus, 0)
+    FROM frequencia_cliente(p_cliente_id, v_hoje) f;
+END
+$$;
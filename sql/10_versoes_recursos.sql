@@ -0,0 +1,53 @@
+-- ============================================
+-- VERSÕES DOS RECURSOS LIDOS EM TODA PÁGINA (ETag / Last-Modified)
+-- ============================================
+-- Execute este script no SQL Editor do Supabase Dashboard
+-- https://supabase.com/dashboard → Seu Projeto → SQL Editor
+-- (init_db() também aplica este arquivo; ele pode ser executado várias vezes)
+--
+-- Uma linha por grupo de dados:
+--   - configuracoes: /api/configuracoes (e a parte dos níveis no ranking e
+--     nas estatísticas);
+--   - produtos: /api/produtos.
+-- Toda escrita que muda o grupo incrementa a versão na própria transação,
+-- como última instrução antes do commit: quem lê a versão nova já enxerga os
+-- dados novos, e a trava da linha dura só até o commit (sem risco de
+-- deadlock, porque depois dela a transação não trava mais nada). São
+-- escritas raras, do admin: as rotas chamam incrementar_versoes() antes do commit.
+-- Saldos e cadastro de clientes NÃO têm versão aqui: todo lançamento
+-- travaria a mesma linha até o commit, enfileirando as pontuações de todos os
+-- workers, e a ETag mudaria a cada lançamento justo no pico. O ranking tira a
+-- ETag do placar em memória e as estatísticas, do conteúdo em cache
+-- (ESTATISTICAS_CACHE_TTL); a linha 'clientes' de bancos antigos ficou sem uso.
+-- Os workers guardam as versões em cache; a resposta leva a versão como
+-- ETag e alterado_em como Last-Modified. incrementar_versoes() também avisa
+-- os outros workers por NOTIFY, que então descartam esse cache.
+
+CREATE TABLE IF NOT EXISTS versoes_recursos (
+    recurso TEXT PRIMARY KEY,
+    versao BIGINT NOT NULL DEFAULT 1,
+    alterado_em TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO versoes_recursos (recurso)
+VALUES ('configuracoes'), ('produtos')
+ON CONFLICT (recurso) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION incrementar_versoes(p_recursos TEXT[])
+RETURNS TABLE (recurso TEXT, versao BIGINT, alterado_em TIMESTAMPTZ)
+LANGUAGE plpgsql AS $$
+BEGIN
+    RETURN QUERY
+    UPDATE versoes_recursos v
+    SET versao = v.versao + 1,
+        alterado_em = clock_timestamp()
+    WHERE v.recurso = ANY(p_recursos)
+    RETURNING v.recurso, v.versao, v.alterado_em;
+
+    -- Aviso aos workers, entregue no commit (sql/11_avisos_invalidacao.sql)
+    PERFORM pg_notify('semaforo_invalidacao', json_build_object('versoes', json_object_agg(v.recurso, v.versao))::TEXT)
+    FROM versoes_recursos v
+    WHERE v.recurso = ANY(p_recursos)
+    HAVING COUNT(*) > 0;
+END
+$$;
@@ -0,0 +1,44 @@
+-- ============================================
+-- AVISOS DE INVALIDAÇÃO ENTRE WORKERS (LISTEN/NOTIFY)
+-- ============================================
+-- Execute este script no SQL Editor do Supabase Dashboard
+-- https://supabase.com/dashboard → Seu Projeto → SQL Editor
+-- (init_db() também aplica este arquivo; ele pode ser executado várias vezes)
+--
+-- Cada worker escuta o canal semaforo_invalidacao (invalidacao.py). O
+-- Postgres entrega o NOTIFY só no commit, na ordem dos commits, e descarta
+-- os de transações desfeitas: o aviso nunca chega antes dos dados. Avisos em
+-- JSON compacto, no máximo ~8000 bytes cada:
+--   {"clientes": [[id, pontos, nome], ...]}  saldo e nome atuais (ranking em memória)
+--   {"removidos": [id, ...]}                 clientes apagados
+--   {"versoes": {"produtos": 12, ...}}       versões novas (sql/10_versoes_recursos.sql)
+-- O aviso de versões sai de incrementar_versoes(), a última instrução das
+-- escritas de configurações e produtos; os lançamentos de pontos só mandam
+-- o de clientes.
+
+CREATE OR REPLACE FUNCTION publicar_clientes(p_ids INTEGER[])
+RETURNS VOID
+LANGUAGE plpgsql AS $$
+BEGIN
+    -- Partes de até ~7500 bytes (o nome é o que varia), pelo tamanho acumulado
+    PERFORM pg_notify('semaforo_invalidacao', json_build_object('clientes', json_agg(p.item ORDER BY p.id))::TEXT)
+    FROM (
+        SELECT i.id, i.item,
+               SUM(octet_length(i.item::TEXT) + 1) OVER (ORDER BY i.id) / 6500 AS parte
+        FROM (
+            SELECT c.id, json_build_array(c.id, c.pontos_totais, c.nome) AS item
+            FROM clientes c
+            WHERE c.id = ANY(p_ids)
+        ) i
+    ) p
+    GROUP BY p.parte;
+
+    PERFORM pg_notify('semaforo_invalidacao', json_build_object('removidos', json_agg(r.id))::TEXT)
+    FROM (
+        SELECT DISTINCT u.id, (DENSE_RANK() OVER (ORDER BY u.id) - 1) / 500 AS parte
+        FROM unnest(p_ids) AS u(id)
+        WHERE NOT EXISTS (SELECT 1 FROM clientes c WHERE c.id = u.id)
+    ) r
+    GROUP BY r.parte;
+END
+$$;
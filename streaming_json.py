@@ -0,0 +1,104 @@
+"""
+Respostas JSON em streaming: lê de um cursor nomeado no servidor em lotes e
+serializa à medida que envia, então a memória fica limitada ao tamanho do
+lote e não ao tamanho do resultado
+"""
+
+import uuid
+
+import psycopg2.extras
+
+import registro
+
+log = registro.obter('streaming_json')
+
+
+def linhas_em_lotes(pool, sql, params=(), tamanho_lote=1000,
+                    cursor_factory=psycopg2.extras.RealDictCursor):
+    """Gera listas de até `tamanho_lote` linhas (dicts) de um cursor nomeado.
+
+    Com `cursor_factory=None` as linhas vêm como tuplas (bem mais baratas
+    quando são muitas e não vão virar JSON). Usa uma conexão própria do pool, devolvida quando o gerador termina ou é
+    fechado (cliente desconectou), independente da conexão da requisição.
+    """
+    conn = pool.getconn()
+    try:
+        nome = f'stream_{uuid.uuid4().hex}'
+        with conn.cursor(name=nome, cursor_factory=cursor_factory) as cursor:
+            cursor.itersize = tamanho_lote
+            cursor.execute(sql, params)
+            while True:
+                lote = cursor.fetchmany(tamanho_lote)
+                if not lote:
+                    break
+                yield lote
+        conn.rollback()
+    except Exception:
+        log.exception('Erro no streaming de JSON')
+        raise
+    finally:
+        pool.putconn(conn)
+
+
+def com_primeiro_lote(lotes):
+    """Lê já o primeiro lote de `lotes` e devolve os lotes com ele de volta na frente.
+
+    Pegar a conexão e executar a consulta acontecem aqui, antes de a resposta
+    começar: um erro nessa fase vira uma resposta de erro comum, e não um
+    corpo cortado com status 200. Só falhas no meio do streaming cortam o corpo.
+    """
+    primeiro = next(lotes, None)
+    return _com_primeiro(primeiro, lotes)
+
+
+def _com_primeiro(primeiro, lotes):
+    try:
+        if primeiro is not None:
+            yield primeiro
+        yield from lotes
+    finally:
+        lotes.close()
+
+
+def _abertura(dumps, objeto, chave):
+    if objeto is None:
+        return '['
+    inicio = dumps(objeto)[:-1]
+    separador = ',' if objeto else ''
+    return f'{inicio}{separador}{dumps(chave)}:['
+
+
+def _pedaco(dumps, lote, primeiro):
+    pedaco = dumps(lote)[1:-1]
+    return pedaco if primeiro else ',' + pedaco
+
+
+def lista_json(lotes, dumps, objeto=None, chave=None):
+    """Serializa os lotes como uma lista JSON, pedaço a pedaço.
+
+    Sem `objeto`, gera `[...]`. Com `objeto` (dict já pronto), gera o objeto
+    com a lista como último campo, em `chave`.
+    """
+    yield _abertura(dumps, objeto, chave)
+    primeiro = True
+    for lote in lotes:
+        yield _pedaco(dumps, lote, primeiro)
+        primeiro = False
+    yield ']' if objeto is None else ']}'
+
+
+async def lista_json_async(lotes, dumps, objeto=None, chave=None):
+    """lista_json() para lotes vindos de um gerador assíncrono (app_async.py).
+
+    Fecha `lotes` ao terminar ou ser fechado (cliente desconectou), para o
+    gerador devolver sua conexão ao pool na hora, e não quando for coletado.
+    """
+    try:
+        yield _abertura(dumps, objeto, chave)
+        primeiro = True
+        async for lote in lotes:
+            yield _pedaco(dumps, lote, primeiro)
+            primeiro = False
+        yield ']' if objeto is None else ']}'
+    finally:
+        await lotes.aclose()